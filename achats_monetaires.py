@@ -0,0 +1,202 @@
+"""Achats au ratio monétaire (kgCO2e / € HT) à partir d'un export comptable.
+
+Un grand livre (une ligne par écriture : compte, libellé, montant HT et
+date) est rapproché de la table hors-ligne ``donnees/ratios_monetaires.csv`` :
+
+* règles par mots-clés du libellé (les plus spécifiques : « SNCF » sur un
+  compte 6251 est un train, pas un déplacement moyen) ; un seul motif
+  regex compilé couvre tous les mots-clés et n'est appliqué qu'aux
+  libellés distincts ;
+* sinon règles par préfixe de compte (plan comptable général), la plus
+  longue gagne (6156 avant 615), via un index préfixe -> règle.
+
+Les ratios sont exprimés en euros de ``ANNEE_RATIOS`` : les montants sont
+déflatés avec l'indice des prix à la consommation (INSEE) de leur année
+avant application du ratio. Les lignes non rapprochées sont renvoyées à
+part ; le résultat est agrégé par poste en quelques flux du journal.
+"""
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+FICHIER_RATIOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "donnees", "ratios_monetaires.csv")
+ANNEE_RATIOS = 2019
+
+# Indice des prix à la consommation, moyenne annuelle (INSEE, base 100 en 2015)
+INDICE_PRIX = {
+    2015: 100.00, 2016: 100.18, 2017: 101.21, 2018: 103.05, 2019: 104.20, 2020: 104.74,
+    2021: 106.47, 2022: 111.99, 2023: 117.32, 2024: 119.65, 2025: 120.90,
+}
+
+
+def _normaliser(serie):
+    """Minuscules sans accents (les libellés comptables sont saisis de toutes les façons)."""
+    return (serie.astype(str).str.lower().str.normalize("NFKD")
+            .str.encode("ascii", errors="ignore").str.decode("ascii"))
+
+
+class Referentiel:
+    """Règles de rapprochement compilées une fois (index des comptes + motif des mots-clés)."""
+
+    def __init__(self, regles):
+        self.regles = regles.reset_index(drop=True)
+        self.regles["compte"] = self.regles["compte"].fillna("").astype(str).str.strip()
+        par_mot = {}
+        for i, mots in self.regles["mots_cles"].fillna("").items():
+            for mot in filter(None, (m.strip() for m in _normaliser(pd.Series(mots.split("|"))))):
+                if mot in par_mot:
+                    raise ValueError(f"Mot-clé en double dans le référentiel : {mot}")
+                par_mot[mot] = i
+        self.par_mot = par_mot
+        # Les plus longs d'abord : « fournitures de bureau » avant « bureau »
+        alternatives = "|".join(re.escape(m) for m in sorted(par_mot, key=len, reverse=True))
+        self.motif = re.compile(rf"\b({alternatives})\b") if par_mot else None
+        comptes = self.regles[(self.regles["compte"] != "") & self.regles["mots_cles"].isna()]
+        self.par_longueur = {}
+        for i, compte in comptes["compte"].items():
+            self.par_longueur.setdefault(len(compte), {})[compte] = i
+        self.longueurs = sorted(self.par_longueur, reverse=True)
+
+    def rapprocher(self, comptes, libelles):
+        """Indice de règle de chaque ligne (-1 si non rapprochée) et mode de rapprochement."""
+        regle = np.full(len(comptes), -1)
+        mode = np.full(len(comptes), "", dtype=object)
+
+        # 1. Mots-clés : une recherche regex par libellé distinct
+        if self.motif is not None:
+            codes, uniques = pd.factorize(libelles)
+            trouves = _normaliser(pd.Series(uniques)).str.extract(self.motif, expand=False)
+            par_unique = trouves.map(self.par_mot).fillna(-1).astype(int).to_numpy()
+            candidate = par_unique[codes] if len(codes) else np.array([], dtype=int)
+            # Une règle mot-clé restreinte à un compte ne vaut que pour ce compte
+            restriction = self.regles["compte"].to_numpy()[np.maximum(candidate, 0)]
+            valide = candidate >= 0
+            for prefixe in set(restriction[valide]) - {""}:
+                valide &= (restriction != prefixe) | comptes.str.startswith(prefixe).to_numpy()
+            regle[valide], mode[valide] = candidate[valide], "mot-clé"
+
+        # 2. Comptes : préfixe le plus long d'abord
+        for longueur in self.longueurs:
+            reste = regle < 0
+            if not reste.any():
+                break
+            trouve = comptes.str[:longueur].map(self.par_longueur[longueur]).to_numpy()
+            ok = reste & pd.notna(trouve)
+            regle[ok], mode[ok] = trouve[ok].astype(int), "compte"
+        return regle, mode
+
+
+@functools.lru_cache(maxsize=1)
+def referentiel():
+    """Référentiel embarqué, compilé une fois par processus."""
+    return Referentiel(pd.read_csv(FICHIER_RATIOS, dtype={"compte": str}))
+
+
+def coefficient_deflation(annees, annee_ratios=ANNEE_RATIOS):
+    """€ courants de chaque année -> € de l'année des ratios (indice borné aux années connues)."""
+    connues = sorted(INDICE_PRIX)
+    annees = np.clip(np.asarray(annees, dtype=float), connues[0], connues[-1])
+    indice = np.interp(annees, connues, [INDICE_PRIX[a] for a in connues])
+    return INDICE_PRIX[annee_ratios] / indice
+
+
+# ==============================================================================
+# 1. LECTURE DU GRAND LIVRE
+# ==============================================================================
+def lire_grand_livre(df, annee_defaut):
+    """Export comptable brut -> DataFrame normalisé (compte, libellé, montant HT, année)."""
+    colonnes = {c.lower().replace(" ", "_").replace("é", "e"): c for c in df.columns}
+
+    def col(*noms):
+        return next((colonnes[n] for n in noms if n in colonnes), None)
+
+    c_compte, c_libelle = col("compte", "compte_general", "numero_de_compte", "n°_compte"), col("libelle", "intitule", "libelle_ecriture")
+    c_montant, c_debit, c_credit = col("montant", "montant_ht"), col("debit"), col("credit")
+    c_date = col("date", "date_ecriture", "date_piece")
+    if c_libelle is None or (c_montant is None and c_debit is None):
+        raise ValueError("Colonnes attendues : Libellé + Montant (ou Débit/Crédit), Compte recommandé")
+
+    def nombre(c):
+        brut = df[c].astype(str).str.replace(r"[\s €]", "", regex=True).str.replace(",", ".", regex=False)
+        return pd.to_numeric(brut, errors="coerce").fillna(0.0)
+
+    out = pd.DataFrame(index=df.index)
+    out["compte"] = df[c_compte].astype(str).str.strip().str.replace(r"\.0$", "", regex=True) if c_compte else ""
+    out["libelle"] = df[c_libelle].astype(str).str.strip()
+    # Avoirs : un crédit sur un compte de charge diminue la dépense
+    out["montant"] = nombre(c_montant) if c_montant else nombre(c_debit) - (nombre(c_credit) if c_credit else 0.0)
+    if c_date:
+        # ISO (2025-03-12) d'abord, puis format français (12/03/2025) : un export peut mélanger les deux
+        dates = pd.to_datetime(df[c_date], errors="coerce", format="ISO8601")
+        annee = dates.fillna(pd.to_datetime(df[c_date], errors="coerce", format="mixed", dayfirst=True)).dt.year
+    else:
+        annee = pd.Series(np.nan, index=df.index)
+    out["annee"] = annee.fillna(annee_defaut).astype(int)
+    return out
+
+
+# ==============================================================================
+# 2. CALCUL & AGRÉGATION
+# ==============================================================================
+def calculer(grand_livre, ref=None):
+    """Rapprochement + impacts (vectorisés) ; colonnes ajoutées : poste, ratio, montant déflaté, impact."""
+    ref = ref or referentiel()
+    regle, mode = ref.rapprocher(grand_livre["compte"], grand_livre["libelle"])
+    out = grand_livre.copy()
+    out["regle"], out["rapprochement"] = regle, mode
+    regles = ref.regles.reindex(regle)  # -1 -> ligne vide
+    for c in ("poste", "categorie", "ratio_kg_eur", "incertitude"):
+        out[c] = regles[c].to_numpy()
+    out["montant_deflate"] = out["montant"] * coefficient_deflation(out["annee"])
+    out["impact_kg"] = (out["montant_deflate"] * out["ratio_kg_eur"]).fillna(0.0)
+    return out
+
+
+def agreger_flux(lignes):
+    """Lignes rapprochées -> flux agrégés par poste (+ table des lignes non rapprochées)."""
+    rapprochees = lignes[lignes["regle"] >= 0]
+    rejets = lignes[lignes["regle"] < 0]
+    groupes = rapprochees.groupby(["categorie", "poste"], sort=True).agg(
+        montant=("montant", "sum"), montant_deflate=("montant_deflate", "sum"), impact=("impact_kg", "sum"),
+        incertitude=("incertitude", "max"), lignes=("montant", "size"), comptes=("compte", lambda c: ", ".join(sorted(set(c) - {""})[:4])))
+    flux = []
+    for (categorie, poste), g in groupes.iterrows():
+        if g["montant_deflate"] <= 0:
+            continue
+        flux.append({
+            "Catégorie": categorie, "Poste": poste, "Montant": g["montant"], "Montant déflaté": g["montant_deflate"],
+            "fe": g["impact"] / g["montant_deflate"], "Incertitude": int(g["incertitude"]),
+            "Détail": f"Ratio monétaire | {g['lignes']} écriture(s) | € {ANNEE_RATIOS} | comptes {g['comptes'] or 'n.c.'}",
+        })
+    return flux, rejets
+
+
+def non_rapprochees(rejets, n=50):
+    """Lignes non rapprochées regroupées par (compte, libellé), triées par montant."""
+    return (rejets.groupby(["compte", "libelle"], sort=False)
+            .agg(Montant=("montant", "sum"), Écritures=("montant", "size"))
+            .sort_values("Montant", ascending=False).head(n).reset_index())
+
+
+def analyser_grand_livre(contenu, nom, annee_defaut, progression=None):
+    """Fichier (octets CSV/Excel) -> (lignes calculées, flux, rejets) ; exécutable en tâche de fond."""
+    import io
+
+    def etape(fraction, message):
+        if progression:
+            progression(fraction, message)
+
+    etape(0.1, "Lecture de l'export comptable")
+    if nom.lower().endswith(".csv"):
+        df = pd.read_csv(io.BytesIO(contenu), sep=None, engine="python", dtype=str)
+    else:
+        df = pd.read_excel(io.BytesIO(contenu), dtype=str)
+    etape(0.4, f"Rapprochement de {len(df)} écritures")
+    lignes = calculer(lire_grand_livre(df, annee_defaut))
+    etape(0.9, "Agrégation par poste")
+    flux, rejets = agreger_flux(lignes)
+    etape(1.0, "Terminé")
+    return lignes, flux, rejets
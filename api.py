@@ -0,0 +1,474 @@
+"""API locale HTTP/JSON du moteur de calcul MSCAL.
+
+Usage :
+    python api.py [--hote 127.0.0.1] [--port 8765] [--charger mscal_bkp_x.json ...]
+
+Service autonome (bibliothèque standard + moteur ``calculs``) : boucle
+asyncio, cache partagé en mémoire par version des données, calculs
+lourds délégués à un pool de threads et export du journal en flux
+(NDJSON, Transfer-Encoding: chunked).
+
+Points d'entrée (``{e}`` = nom de l'entité, encodé dans l'URL) :
+    GET  /sante                        état du service
+    GET  /entites                      liste des entités chargées
+    POST /entites/{e}/flux             ingestion par lots {"flux": [{cat, item, val, unit, fe, incertitude, detail}, ...]}
+    PUT  /entites/{e}/params           mise à jour partielle des paramètres
+    POST /entites/{e}/restauration     remplace l'entité par une sauvegarde {"params", "db"}
+    GET  /entites/{e}/kpis             KPIs de la Control Tower
+    GET  /entites/{e}/scopes           synthèse par Scope
+    GET  /entites/{e}/pareto?n=10      classement Pareto des Items
+    POST /entites/{e}/scenarios        {"scenarios": [{leviers}...]} et/ou {"grille": {levier: [valeurs]}}
+    GET  /entites/{e}/journal          export du journal en NDJSON (streaming)
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from calculs import (
+    COUNTRY_DATA, DEFAULT_PARAMS, LEVIERS_DEFAUT, baseline_simulateur, calculer_kpis, creer_flux,
+    preparer_journal, reparer_params, simuler_scenario, table_pareto, table_scopes,
+)
+
+TAILLE_MAX_CORPS = 64 * 1024 * 1024
+TAILLE_BLOC_EXPORT = 1000
+MAX_SCENARIOS = 10000
+CHOIX_PARAMS = {"country_choice": set(COUNTRY_DATA), "mode_elec": {"annuel", "horaire"}}
+
+RAISONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class ErreurAPI(Exception):
+    """Erreur renvoyée au client avec un code HTTP."""
+
+    def __init__(self, statut, message):
+        super().__init__(message)
+        self.statut = statut
+
+
+# ==============================================================================
+# 1. ÉTAT PARTAGÉ (ENTITÉS + CACHE)
+# ==============================================================================
+class Entite:
+    """Journal et paramètres d'une entité ; ``revision`` change à chaque écriture."""
+
+    def __init__(self, nom, params=None, entries=None):
+        self.params = reparer_params(params)
+        self.params['entity_name'] = nom
+        self.entries = list(entries or [])
+        self.revision = 0
+
+
+class CacheResultats:
+    """Cache LRU partagé, clé = (entité, révision, requête)."""
+
+    def __init__(self, taille=256):
+        self.taille = taille
+        self.donnees = OrderedDict()
+        self.verrou = threading.Lock()
+
+    def obtenir(self, cle):
+        with self.verrou:
+            if cle in self.donnees:
+                self.donnees.move_to_end(cle)
+                return True, self.donnees[cle]
+        return False, None
+
+    def stocker(self, cle, valeur):
+        with self.verrou:
+            self.donnees[cle] = valeur
+            while len(self.donnees) > self.taille:
+                self.donnees.popitem(last=False)
+
+
+class EtatAPI:
+    def __init__(self):
+        self.entites = {}
+        self.cache = CacheResultats()
+
+    def entite(self, nom, creer=False):
+        if nom not in self.entites:
+            if not creer:
+                raise ErreurAPI(404, f"Entité inconnue : {nom}")
+            self.entites[nom] = Entite(nom)
+        return self.entites[nom]
+
+    async def calcul(self, ent, requete, fonction, *args):
+        """Exécute un calcul hors de la boucle, avec mise en cache par révision."""
+        cle = (ent.params['entity_name'], ent.revision, requete)
+        trouve, valeur = self.cache.obtenir(cle)
+        if trouve:
+            return valeur
+        if not ent.entries:
+            raise ErreurAPI(400, "Aucun flux enregistré pour cette entité")
+        # Copie figée : les ingestions concurrentes n'affectent pas ce calcul
+        entries, params = list(ent.entries), dict(ent.params)
+        valeur = await asyncio.get_running_loop().run_in_executor(None, fonction, entries, params, *args)
+        self.cache.stocker(cle, valeur)
+        return valeur
+
+
+# ==============================================================================
+# 2. CALCULS (exécutés dans le pool de threads)
+# ==============================================================================
+def _kpis(entries, params):
+    return calculer_kpis(preparer_journal(entries), params)
+
+
+def _scopes(entries, params):
+    return table_scopes(preparer_journal(entries)).to_dict(orient="records")
+
+
+def _pareto(entries, params, n):
+    return table_pareto(preparer_journal(entries)).head(n).to_dict(orient="records")
+
+
+def _scenarios(entries, params, scenarios):
+    base = baseline_simulateur(entries)
+    return {"baseline": {k: v for k, v in base.items() if k != "lignes"},  # tableaux par flux : internes
+            "resultats": [{"leviers": lv, **simuler_scenario(base, lv, params)} for lv in scenarios]}
+
+
+def lire_scenario(scenario):
+    """Valide un jeu de leviers ``{levier: nombre ou booléen}`` (400 si ce n'est pas un objet ou si un levier est inconnu)."""
+    if not isinstance(scenario, dict):
+        raise ErreurAPI(400, f"Scénario invalide (objet attendu) : {scenario!r}")
+    inconnus = set(scenario) - set(LEVIERS_DEFAUT)
+    if inconnus:
+        raise ErreurAPI(400, f"Leviers inconnus : {sorted(inconnus)}")
+    for levier, valeur in scenario.items():
+        if isinstance(LEVIERS_DEFAUT[levier], bool):
+            if not isinstance(valeur, bool):
+                raise ErreurAPI(400, f"Valeur invalide pour '{levier}' (booléen attendu) : {valeur!r}")
+        elif isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or not math.isfinite(valeur):
+            raise ErreurAPI(400, f"Valeur invalide pour '{levier}' : {valeur!r}")
+    return scenario
+
+
+def lire_params(corps):
+    """Valide une mise à jour partielle des paramètres (400 si une clé est inconnue ou une valeur du mauvais type).
+
+    Les nombres entiers des paramètres par défaut (effectifs, jours, année) restent entiers ;
+    tous les paramètres numériques sont positifs ou nuls.
+    """
+    if not isinstance(corps, dict):
+        raise ErreurAPI(400, "Le corps doit être un objet JSON")
+    inconnus = set(corps) - set(DEFAULT_PARAMS)
+    if inconnus:
+        raise ErreurAPI(400, f"Paramètres inconnus : {sorted(inconnus)}")
+    valides = {}
+    for cle, valeur in corps.items():
+        defaut = DEFAULT_PARAMS[cle]
+        if isinstance(defaut, str):
+            if not isinstance(valeur, str) or (cle in CHOIX_PARAMS and valeur not in CHOIX_PARAMS[cle]):
+                raise ErreurAPI(400, f"Valeur invalide pour '{cle}' : {valeur!r}")
+        elif isinstance(valeur, bool) or not isinstance(valeur, (int, float)) or not math.isfinite(valeur) or valeur < 0:
+            raise ErreurAPI(400, f"Valeur invalide pour '{cle}' (nombre positif attendu) : {valeur!r}")
+        elif isinstance(defaut, int):
+            if valeur != int(valeur):
+                raise ErreurAPI(400, f"Valeur invalide pour '{cle}' (entier attendu) : {valeur!r}")
+            valeur = int(valeur)
+        else:
+            valeur = float(valeur)
+        valides[cle] = valeur
+    return valides
+
+
+def developper_grille(grille):
+    """{levier: [valeurs]} -> liste des combinaisons (produit cartésien)."""
+    if not isinstance(grille, dict):
+        raise ErreurAPI(400, "La grille doit être un objet {levier: [valeurs]}")
+    inconnus = set(grille) - set(LEVIERS_DEFAUT)
+    if inconnus:
+        raise ErreurAPI(400, f"Leviers inconnus : {sorted(inconnus)}")
+    noms = list(grille)
+    valeurs = [v if isinstance(v, list) else [v] for v in grille.values()]
+    nb = 1
+    for v in valeurs:
+        nb *= len(v)
+    if nb > MAX_SCENARIOS:
+        raise ErreurAPI(400, f"Grille trop grande ({nb} scénarios > {MAX_SCENARIOS})")
+    return [lire_scenario(dict(zip(noms, combi))) for combi in itertools.product(*valeurs)]
+
+
+def lire_flux(ligne):
+    """Valide une ligne d'ingestion et la convertit au format du journal."""
+    try:
+        return creer_flux(str(ligne["cat"]), str(ligne["item"]), float(ligne["val"]), str(ligne.get("unit", "u")),
+                          float(ligne["fe"]), int(ligne.get("incertitude", 10)), str(ligne.get("detail", "")),
+                          ligne.get("annee"))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ErreurAPI(400, f"Flux invalide ({type(e).__name__}: {e}) : {ligne}")
+
+
+# ==============================================================================
+# 3. ROUTES
+# ==============================================================================
+async def r_sante(etat, requete):
+    return 200, {"statut": "ok", "entites": len(etat.entites)}
+
+
+async def r_entites(etat, requete):
+    return 200, [{"entite": nom, "flux": len(e.entries), "revision": e.revision} for nom, e in etat.entites.items()]
+
+
+async def r_flux(etat, requete, nom):
+    corps = requete.json()
+    lignes = corps.get("flux", []) if isinstance(corps, dict) else corps
+    if not isinstance(lignes, list):
+        raise ErreurAPI(400, "Le corps doit contenir une liste 'flux'")
+    nouveaux = [lire_flux(l) for l in lignes]  # Tout ou rien : validation avant écriture
+    ent = etat.entite(nom, creer=True)
+    ent.entries.extend(nouveaux)
+    ent.revision += 1
+    return 201, {"ajoutes": len(nouveaux), "total": len(ent.entries), "revision": ent.revision}
+
+
+async def r_params(etat, requete, nom):
+    nouveaux = lire_params(requete.json())  # Tout ou rien : validation avant écriture
+    ent = etat.entite(nom, creer=True)
+    ent.params.update(nouveaux)
+    ent.params['entity_name'] = nom
+    ent.revision += 1
+    return 200, {"params": ent.params, "revision": ent.revision}
+
+
+async def r_restauration(etat, requete, nom):
+    corps = requete.json()
+    if not isinstance(corps, dict) or not isinstance(corps.get('db', []), list):
+        raise ErreurAPI(400, "Sauvegarde invalide (attendu : {'params': {...}, 'db': [...]})")
+    ancienne = etat.entites.get(nom)
+    ent = Entite(nom, corps.get('params'), corps.get('db'))
+    ent.revision = ancienne.revision + 1 if ancienne else 0
+    etat.entites[nom] = ent
+    return 200, {"flux": len(ent.entries), "revision": ent.revision}
+
+
+async def r_kpis(etat, requete, nom):
+    ent = etat.entite(nom)
+    return 200, await etat.calcul(ent, "kpis", _kpis)
+
+
+async def r_scopes(etat, requete, nom):
+    ent = etat.entite(nom)
+    return 200, await etat.calcul(ent, "scopes", _scopes)
+
+
+async def r_pareto(etat, requete, nom):
+    ent = etat.entite(nom)
+    try:
+        n = int(requete.query.get("n", ["10"])[0])
+    except ValueError:
+        raise ErreurAPI(400, "Paramètre 'n' invalide")
+    if n < 0:
+        raise ErreurAPI(400, "Paramètre 'n' invalide (entier positif attendu)")
+    return 200, await etat.calcul(ent, ("pareto", n), _pareto, n)
+
+
+async def r_scenarios(etat, requete, nom):
+    ent = etat.entite(nom)
+    corps = requete.json()
+    if not isinstance(corps, dict):
+        raise ErreurAPI(400, "Le corps doit être un objet JSON")
+    if not isinstance(corps.get("scenarios", []), list):
+        raise ErreurAPI(400, "'scenarios' doit être une liste d'objets {levier: valeur}")
+    scenarios = [lire_scenario(sc) for sc in corps.get("scenarios", [])]
+    if corps.get("grille"):
+        scenarios += developper_grille(corps["grille"])
+    if len(scenarios) > MAX_SCENARIOS:
+        raise ErreurAPI(400, f"Trop de scénarios ({len(scenarios)} > {MAX_SCENARIOS})")
+    if not scenarios:
+        scenarios = [{}]
+    cle = ("scenarios", json.dumps(scenarios, sort_keys=True))
+    return 200, await etat.calcul(ent, cle, _scenarios, scenarios)
+
+
+async def r_journal(etat, requete, nom):
+    ent = etat.entite(nom)
+    entries = list(ent.entries)
+
+    async def blocs():
+        for debut in range(0, len(entries), TAILLE_BLOC_EXPORT):
+            bloc = entries[debut:debut + TAILLE_BLOC_EXPORT]
+            yield "".join(json_strict(e) + "\n" for e in bloc).encode("utf-8")
+            await asyncio.sleep(0)  # Laisse la boucle servir les autres clients
+    return 200, blocs()
+
+
+ROUTES = [
+    ("GET", r"/sante", r_sante),
+    ("GET", r"/entites", r_entites),
+    ("POST", r"/entites/([^/]+)/flux", r_flux),
+    ("PUT", r"/entites/([^/]+)/params", r_params),
+    ("POST", r"/entites/([^/]+)/restauration", r_restauration),
+    ("GET", r"/entites/([^/]+)/kpis", r_kpis),
+    ("GET", r"/entites/([^/]+)/scopes", r_scopes),
+    ("GET", r"/entites/([^/]+)/pareto", r_pareto),
+    ("POST", r"/entites/([^/]+)/scenarios", r_scenarios),
+    ("GET", r"/entites/([^/]+)/journal", r_journal),
+]
+ROUTES = [(m, re.compile(motif + "$"), f) for m, motif, f in ROUTES]
+
+
+# ==============================================================================
+# 4. SERVEUR HTTP (asyncio)
+# ==============================================================================
+class Requete:
+    def __init__(self, methode, cible, entetes, corps):
+        url = urlsplit(cible)
+        self.methode = methode
+        self.chemin = url.path.rstrip("/") or "/"
+        self.query = parse_qs(url.query)
+        self.entetes = entetes
+        self.corps = corps
+
+    def json(self):
+        try:
+            return json.loads(self.corps or b"null")
+        except ValueError:
+            raise ErreurAPI(400, "Corps JSON invalide")
+
+
+async def lire_requete(reader):
+    ligne = await reader.readline()
+    if not ligne:
+        return None
+    try:
+        methode, cible, _ = ligne.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise ErreurAPI(400, "Ligne de requête invalide")
+    entetes = {}
+    while True:
+        l = await reader.readline()
+        if l in (b"\r\n", b"\n", b""):
+            break
+        cle, _, valeur = l.decode("latin-1").partition(":")
+        entetes[cle.strip().lower()] = valeur.strip()
+    longueur = int(entetes.get("content-length", 0) or 0)
+    if longueur > TAILLE_MAX_CORPS:
+        raise ErreurAPI(413, "Corps de requête trop volumineux")
+    corps = await reader.readexactly(longueur) if longueur else b""
+    return Requete(methode.upper(), cible, entetes, corps)
+
+
+def _fini(valeur):
+    """NaN / ±Infinity (absents du JSON standard) -> null, récursivement ; nombres NumPy -> float."""
+    if isinstance(valeur, dict):
+        return {k: _fini(v) for k, v in valeur.items()}
+    if isinstance(valeur, (list, tuple)):
+        return [_fini(v) for v in valeur]
+    if hasattr(valeur, "dtype") and hasattr(valeur, "item"):
+        valeur = valeur.item()      # Scalaire NumPy -> type Python
+    if isinstance(valeur, float) and not math.isfinite(valeur):
+        return None
+    return valeur
+
+
+def json_strict(contenu):
+    """JSON valide (RFC 8259) : jamais de ``NaN`` / ``Infinity`` dans les réponses."""
+    return json.dumps(_fini(contenu), ensure_ascii=False, allow_nan=False, default=float)
+
+
+async def repondre(writer, statut, contenu, garder):
+    entetes = [f"HTTP/1.1 {statut} {RAISONS.get(statut, '')}",
+               f"Connection: {'keep-alive' if garder else 'close'}"]
+    if hasattr(contenu, "__aiter__"):
+        # Réponse en flux : un bloc HTTP par paquet de lignes NDJSON
+        entetes += ["Content-Type: application/x-ndjson; charset=utf-8", "Transfer-Encoding: chunked"]
+        writer.write(("\r\n".join(entetes) + "\r\n\r\n").encode("latin-1"))
+        async for bloc in contenu:
+            writer.write(b"%x\r\n" % len(bloc) + bloc + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+    else:
+        corps = json_strict(contenu).encode("utf-8")
+        entetes += ["Content-Type: application/json; charset=utf-8", f"Content-Length: {len(corps)}"]
+        writer.write(("\r\n".join(entetes) + "\r\n\r\n").encode("latin-1") + corps)
+    await writer.drain()
+
+
+async def router(etat, requete):
+    chemin_connu = False
+    for methode, motif, fonction in ROUTES:
+        m = motif.match(requete.chemin)
+        if m:
+            chemin_connu = True
+            if methode == requete.methode:
+                return await fonction(etat, requete, *[unquote(g) for g in m.groups()])
+    if chemin_connu:
+        raise ErreurAPI(405, f"Méthode {requete.methode} non autorisée sur {requete.chemin}")
+    raise ErreurAPI(404, f"Route inconnue : {requete.chemin}")
+
+
+def creer_gestionnaire(etat):
+    async def gerer_connexion(reader, writer):
+        try:
+            while True:
+                try:
+                    requete = await lire_requete(reader)
+                    if requete is None:
+                        break
+                    garder = requete.entetes.get("connection", "").lower() != "close"
+                    statut, contenu = await router(etat, requete)
+                except ErreurAPI as e:
+                    statut, contenu, garder = e.statut, {"erreur": str(e)}, False
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:  # Une erreur de calcul ne doit pas tuer le service
+                    statut, contenu, garder = 500, {"erreur": f"{type(e).__name__}: {e}"}, False
+                await repondre(writer, statut, contenu, garder)
+                if not garder:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+    return gerer_connexion
+
+
+async def demarrer(etat, hote="127.0.0.1", port=8765):
+    """Démarre le serveur (utilisable depuis un test : port=0 pour un port libre)."""
+    return await asyncio.start_server(creer_gestionnaire(etat), hote, port)
+
+
+def charger_sauvegarde(etat, chemin):
+    with open(chemin, encoding="utf-8") as f:
+        data = json.load(f)
+    params = reparer_params(data.get('params'))
+    nom = params['entity_name']
+    etat.entites[nom] = Entite(nom, params, data.get('db'))
+    return nom
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="API locale HTTP/JSON du moteur MSCAL.")
+    parser.add_argument("--hote", default="127.0.0.1", help="Adresse d'écoute (défaut : 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port d'écoute (défaut : 8765)")
+    parser.add_argument("--charger", nargs="*", default=[], help="Sauvegardes JSON à charger au démarrage")
+    args = parser.parse_args(argv)
+
+    etat = EtatAPI()
+    for chemin in args.charger:
+        print(f"📂 {Path(chemin).name} -> entité '{charger_sauvegarde(etat, chemin)}'")
+
+    async def servir():
+        serveur = await demarrer(etat, args.hote, args.port)
+        print(f"🌍 API MSCAL à l'écoute sur http://{args.hote}:{args.port}")
+        async with serveur:
+            await serveur.serve_forever()
+
+    try:
+        asyncio.run(servir())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
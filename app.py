@@ -1,10 +1,19 @@
 import streamlit as st
-import pandas as pd
 import datetime
-import altair as alt
 import io
 import json
 
+# Imports légers uniquement : pandas, altair et les modules de calcul sont
+# chargés à la demande dans les pages qui en ont besoin (démarrage rapide).
+from referentiel import DEFAULT_PARAMS, COUNTRY_DATA, creer_flux
+import perf
+import memoire
+import audit
+
+# Instrumentation du rerun (panneau "Performance" réservé à l'admin)
+chrono = perf.Chrono()
+chrono.etape("Configuration & Style")
+
 # ==============================================================================
 # 1. CONFIGURATION & STYLE
 # ==============================================================================
@@ -14,14 +23,15 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
-# Style CSS Amélioré
-st.markdown("""
+
+# Feuille de style unique (Général + Cartes + Onglets + Signature + Rapport + Impression)
+STYLE_CSS = """
     <style>
         /* Style général */
         .block-container {padding-top: 1rem;}
         h1 {color: #2c3e50;}
         h2 {color: #34495e;}
-        h3 {color: #16a085;} /* Un joli vert pour les sous-titres */
+        h3 {color: #2c3e50; font-weight: 600;}
         
         /* Style des "Cartes" de chiffres (Metrics) */
         [data-testid="stMetric"] {
@@ -36,31 +46,49 @@ st.markdown("""
         /* Style des Onglets */
         .stTabs [data-baseweb="tab-list"] { gap: 10px; }
         .stTabs [data-baseweb="tab"] {
-            height: 45px;
-            background-color: white;
+            height: 50px;
+            white-space: pre-wrap;
+            background-color: #f0f2f6;
             border-radius: 5px;
             border: 1px solid #ddd;
             font-weight: 600;
         }
         .stTabs [aria-selected="true"] {
-            background-color: #e8f5e9; /* Vert très clair quand sélectionné */
-            color: #1e8449;
+            background-color: #e8f0fe;
+            color: #1a73e8;
             border: 1px solid #1e8449;
         }
+        .stDataFrame {border: 1px solid #ddd; border-radius: 5px;}
 
-        /* Footer et Impression (inchangé) */
+        /* Footer (Signature) */
         .footer {
             position: fixed; bottom: 0; left: 0; width: 20%;
             background-color: #f0f2f6; color: #555;
             text-align: center; padding: 10px; font-size: 11px;
             border-top: 1px solid #ddd; z-index: 999;
         }
+
+        /* Rapport Officiel (page 5) */
+        .report-box {border: 2px solid #2c3e50; padding: 20px; border-radius: 10px; margin-bottom: 20px;}
+
+        /* Impression */
         @media print {
-            [data-testid="stSidebar"], .stButton, header {display: none;}
+            [data-testid="stSidebar"], .stButton, .stDeployButton, header, #MainMenu {display: none;}
             .block-container {padding-top: 0 !important;}
         }
     </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(STYLE_CSS, unsafe_allow_html=True)
+
+# Logos : lus et réduits une seule fois par processus (au lieu de relire les PNG à chaque rerun)
+@st.cache_resource
+def image_reduite(chemin, largeur):
+    from PIL import Image
+    with Image.open(chemin) as img:
+        img.thumbnail((largeur, largeur * 4))
+        sortie = io.BytesIO()
+        img.save(sortie, format="PNG", optimize=True)
+    return sortie.getvalue()
 
 # --- SÉCURITÉ : MOT DE PASSE et GESTION DES RÔLES ---
 
@@ -94,72 +122,16 @@ def check_password():
             
     return False
 
+chrono.etape("check_password")
 if not check_password():
+    chrono.terminer("Connexion")
     st.stop()
 
 
-# Style CSS (Signature + Titres + Ajustements)
-st.markdown("""
-    <style>
-        .footer {
-            position: fixed; bottom: 0; left: 0; width: 20%;
-            background-color: #f0f2f6; color: #555;
-            text-align: center; padding: 10px; font-size: 11px;
-            border-top: 1px solid #ddd; z-index: 999;
-        }
-        .block-container {padding-top: 1rem;}
-        h3 {color: #2c3e50; font-weight: 600;}
-        .stTabs [data-baseweb="tab-list"] { gap: 10px; }
-        .stTabs [data-baseweb="tab"] { height: 50px; white-space: pre-wrap; background-color: #f0f2f6; border-radius: 5px; }
-        .stTabs [aria-selected="true"] { background-color: #e8f0fe; color: #1a73e8; }
-        .stDataFrame {border: 1px solid #ddd; border-radius: 5px;}
-    </style>
-""", unsafe_allow_html=True)
-
 # ==============================================================================
 # 2. INITIALISATION MÉMOIRE & PARAMÈTRES (AUTO-RÉPARATION)
 # ==============================================================================
-DEFAULT_PARAMS = {
-    'entity_name': 'Promo MSCAL 2026',
-    'pop_etu': 20, 
-    'pop_alt': 5, 
-    'pop_prof': 2,
-    'jours_ouverture': 160,
-    'budget_co2': 3.5,
-    'country_choice': "France 🇫🇷",
-    
-    # --- FINANCE ---
-    'shadow_price': 100.0,
-    
-    # --- ÉNERGIE & EAU ---
-    'fe_elec': 0.060,       # Mix France
-    'fe_gaz': 0.227,        # Gaz naturel
-    'fe_eau': 0.132,        # Eau potable (m3)
-    'fe_dechet': 0.200,     # Déchets moyens
-    
-    # --- MOBILITÉ ---
-    'fe_voit': 0.190,       # Voiture thermique
-    'fe_voit_elec': 0.060,  # Voiture élec
-    'fe_avion_court': 0.258,
-    'fe_avion_long': 0.230,
-    'fe_tgv': 0.002,        # TGV
-    'fe_ter': 0.030,        # Train classique
-    'fe_bus': 0.100,        # Bus urbain
-    'fe_autocar': 0.030,    # Autocar
-    
-    # --- VIE & ACHATS ---
-    'fe_boeuf': 7.0,        # Repas Bœuf
-    'fe_volaille': 1.6,     # Repas Poulet
-    'fe_vege': 0.5,         # Repas Végétarien
-    'fe_cafe': 5.0,         # Café (kg)
-    
-    # --- NUMÉRIQUE (IT) ---
-    'fe_it_laptop': 156.0,  # PC Portable
-    'fe_it_desktop': 350.0, # PC Fixe
-    'fe_it_screen': 200.0,  # Écran 24"
-    'fe_it_smartphone': 60.0
-}
-
+chrono.etape("Initialisation Session")
 # Initialisation des paramètres avec Sécurité
 if 'params' not in st.session_state:
     st.session_state.params = DEFAULT_PARAMS.copy()
@@ -169,41 +141,151 @@ else:
         if key not in st.session_state.params:
             st.session_state.params[key] = value
 
-# Initialisation de la base de données des flux
+# Initialisation de la base de données des flux (stockage compact en colonnes)
 if 'db_entries' not in st.session_state:
-    st.session_state.db_entries = []
+    st.session_state.db_entries = memoire.JournalCompact()
+elif not isinstance(st.session_state.db_entries, memoire.JournalCompact):
+    # Restauration / effacement : on recompacte la liste de dicts
+    st.session_state.db_entries = memoire.JournalCompact(st.session_state.db_entries)
+if 'id_session' not in st.session_state:
+    import uuid
+    st.session_state.id_session = uuid.uuid4().hex
+
+# Journal d'audit append-only de la session (annuler / rétablir / historique)
+if 'audit' not in st.session_state:
+    with chrono.span("Ouverture Journal d'Audit"):
+        st.session_state.audit = audit.JournalAudit(f"{datetime.date.today()}_{st.session_state.id_session[:12]}",
+                                                    st.session_state.params, st.session_state.db_entries)
+
+# Journaux partagés par entité (saisie à plusieurs, voir journal_partage.py)
+@st.cache_resource
+def registre_partage():
+    from journal_partage import RegistrePartage
+    return RegistrePartage()
+
+# Console de requêtes ad hoc : tables en colonnes et résultats en cache, partagés par les admins (voir requetes.py)
+@st.cache_resource
+def console_requetes():
+    from requetes import ConsoleRequetes
+    return ConsoleRequetes()
+
+# Copie locale d'un journal partagé : on tire les écritures des autres avant d'afficher la page
+if st.session_state.get('replique') is not None and st.session_state.replique.en_retard:
+    conflit = st.session_state.replique.conflit
+    with chrono.span("Synchronisation Journal Partagé"):
+        st.session_state.replique.tirer(st.session_state.db_entries, st.session_state.params, st.session_state.audit)
+    if conflit:
+        st.warning(f"⚠️ Modification refusée : {conflit}. Le journal partagé a été rechargé, refaites la saisie si besoin.")
+
+# Comptage mémoire de la session + déchargement des journaux des sessions inactives
+with chrono.span("Comptage Mémoire Session") as mesure:
+    octets_par_cle = memoire.octets_session(st.session_state)
+    octets_hors_journal = sum(octets_par_cle.values()) - octets_par_cle['db_entries']
+    mesure["octets"] = sum(octets_par_cle.values())
+memoire.enregistrer_activite(st.session_state.id_session, st.session_state.db_entries, sum(octets_par_cle.values()))
+memoire.balayer_inactifs()
+
+# Ordonnanceur de tâches lourdes partagé par toutes les sessions du serveur (voir taches.py)
+@st.cache_resource
+def ordonnanceur():
+    from taches import Ordonnanceur
+    return Ordonnanceur()
+
+# Moteur multi-cœurs (pool de processus + baselines en mémoire partagée, voir parallele.py)
+@st.cache_resource
+def moteur_parallele():
+    from parallele import MoteurParallele
+    return MoteurParallele()
+
+# Version courte des données de la session : clé des tâches d'arrière-plan
+def version_journal():
+    return f"{st.session_state.id_session[:12]}.{st.session_state.db_entries.revision}"
+
+# Suivi d'une tâche d'arrière-plan : progression + annulation, True quand le résultat est prêt
+def suivre_tache(tache, libelle, delai=0.0):
+    if tache is None:
+        return False
+    if delai:
+        tache.attendre(delai)
+    if tache.annulee:
+        st.caption(f"⏹️ {libelle} annulé.")
+        return False
+    if tache.erreur:
+        st.error(f"Erreur ({libelle}) : {tache.erreur}")
+        return False
+    if tache.termine:
+        return True
+
+    # Rafraîchi seul chaque seconde : la page reste utilisable pendant le calcul
+    @st.fragment(run_every=1)
+    def suivi():
+        if tache.termine:
+            st.rerun()
+        c_prog, c_stop = st.columns([4, 1])
+        c_prog.progress(tache.progression, text=f"{libelle} : {tache.message}...")
+        if c_stop.button("⏹️ Annuler", key=f"annuler_{'_'.join(map(str, tache.cle))}"):
+            tache.annuler()
+            st.rerun()
+    suivi()
+    return False
 
-# Base de données des Pays
-COUNTRY_DATA = {
-    "France 🇫🇷": {"val": 0.060, "info": "Mix Nucléaire (Bas carbone)"},
-    "Allemagne 🇩🇪": {"val": 0.380, "info": "Mix Charbon/Renouvelable"},
-    "Europe (Moy) 🇪🇺": {"val": 0.255, "info": "Moyenne continentale"},
-    "USA 🇺🇸": {"val": 0.370, "info": "Mix Fossile prédominant"},
-    "Chine 🇨🇳": {"val": 0.550, "info": "Dominante Charbon"}
-}
+# Budget mémoire dur par session : protège le serveur partagé pendant les cours
+# (octets_journal : taille du journal après l'opération ; ajout, import en masse ou restauration)
+def budget_respecte(octets_journal):
+    octets_session = octets_hors_journal + octets_journal
+    if octets_session > memoire.BUDGET_SESSION_OCTETS:
+        st.error(f"⛔ Budget mémoire de la session atteint ({octets_session / 1024**2:.0f} Mo / "
+                 f"{memoire.BUDGET_SESSION_OCTETS / 1024**2:.0f} Mo). Sauvegardez puis effacez des données.")
+        return False
+    return True
+
+# Import en masse : contrôle du budget pour tout le lot avant d'écrire (pas d'import à moitié fait)
+def budget_import(flux):
+    return budget_respecte(st.session_state.db_entries.octets() + memoire.octets_journal(flux))
+
+# Ajout d'une ligne déjà construite au journal (via le journal d'audit)
+def ajouter_flux(entree):
+    if not budget_respecte(st.session_state.db_entries.octets()):
+        return False
+    st.session_state.audit.ajout(st.session_state.db_entries, st.session_state.params, entree)
+    return True
+
+# Ligne du journal pour l'année de reporting en cours
+def nouveau_flux(cat, item, val, unit, fe, incertitude, detail):
+    return creer_flux(cat, item, val, unit, fe, incertitude, detail, st.session_state.params.get('annee_reporting'))
 
 # Fonction de sauvegarde standardisée (Compatible Tableaux)
 def save_flux(cat, item, val, unit, fe, incertitude, detail):
-    impact = val * fe
-    marge = impact * (incertitude / 100.0)
-    st.session_state.db_entries.append({
-        "Catégorie": cat,
-        "Item": item,
-        "Quantité": f"{val} {unit}",
-        "Impact_kgCO2": float(impact), # Nom standardisé
-        "Incertitude": int(incertitude),
-        "Marge": float(marge),
-        "Détail": detail,
-        "Date": str(datetime.date.today())
-    })
+    return ajouter_flux(nouveau_flux(cat, item, val, unit, fe, incertitude, detail))
+
+# Inventaire des salles publié par les collègues (journal partagé) -> magasin de la session ; vrai s'il a changé
+def synchroniser_inventaire(replique):
+    lignes = replique.tirer_inventaire()
+    if lignes is None:
+        return False
+    if 'inventaire' in st.session_state:
+        return bool(st.session_state.inventaire.fusionner(lignes))
+    if not lignes:
+        return False
+    import inventaire
+    st.session_state.inventaire = inventaire.InventaireIndexe.depuis_export(lignes)
+    return True
+
+# Affichage des graphes Altair avec mesure du coût de sérialisation
+def afficher_graphe(chart, nom):
+    with chrono.span(f"Graphe {nom}") as mesure:
+        if perf.REGLAGES["detail"]:
+            mesure["octets"] = len(chart.to_json())
+        st.altair_chart(chart, use_container_width=True)
 
 # ==============================================================================
 # 3. BARRE LATÉRALE
 # ==============================================================================
+chrono.etape("Barre Latérale")
 with st.sidebar:
     
     try:
-        st.image("logo.png", use_container_width=True)
+        st.image(image_reduite("logo.png", 600), use_container_width=True)
     except:
         st.header("🌍 MSCAL ERP")
     # --- ZONE DE SAUVEGARDE/CHARGEMENT (Optimisée) ---
@@ -218,9 +300,16 @@ with st.sidebar:
         with col_save:
             session_data = {
                 'params': st.session_state.params,
-                'db': st.session_state.db_entries
+                'db': list(st.session_state.db_entries)
             }
-            session_json = json.dumps(session_data)
+            if st.session_state.get('parc_it') is not None:
+                registre = st.session_state.parc_it["registre"]
+                session_data['parc_it'] = registre.assign(type=registre["type"].astype(str)).to_dict("list")
+            if 'inventaire' in st.session_state:
+                session_data['inventaire'] = st.session_state.inventaire.exporter()
+            with chrono.span("Sérialisation Sauvegarde") as mesure:
+                session_json = json.dumps(session_data)
+                mesure["octets"] = len(session_json)
             st.download_button("⬇️ Sauver", session_json, f"mscal_bkp_{datetime.date.today()}.json", "application/json", use_container_width=True)
 
         # Bouton CHARGER
@@ -230,16 +319,81 @@ with st.sidebar:
         
         # Le chargeur de fichier juste en dessous, plus discret
         uploaded_json = st.file_uploader("Chargez votre fichier JSON ici", type=["json"], label_visibility="collapsed")
-        if uploaded_json is not None:
+        # Un fichier reste "chargé" dans le widget après le rerun : on ne le restaure qu'une fois
+        if uploaded_json is not None and st.session_state.get('import_traite') != uploaded_json.file_id:
             try:
                 data = json.load(uploaded_json)
-                if 'params' in data: st.session_state.params = data['params']
-                if 'db' in data: st.session_state.db_entries = data['db']
-                st.success("✅ Chargé !")
-                st.rerun()
+                st.session_state.import_traite = uploaded_json.file_id
+                if budget_respecte(memoire.octets_journal(data.get('db', [])) + memoire.taille_objet(data.get('inventaire'))):
+                    st.session_state.audit.restauration(
+                        st.session_state.db_entries, st.session_state.params,
+                        data.get('params', st.session_state.params), data.get('db', st.session_state.db_entries),
+                        f"Import {uploaded_json.name}")
+                    if data.get('parc_it'):
+                        import pandas as pd
+                        registre = pd.DataFrame(data['parc_it'])
+                        registre["type"] = registre["type"].astype("category")
+                        st.session_state.parc_it = {"cle": uploaded_json.file_id, "registre": registre}
+                    if data.get('inventaire') is not None:
+                        import inventaire
+                        st.session_state.inventaire = inventaire.InventaireIndexe.depuis_export(data['inventaire'])
+                        if st.session_state.get('replique') is not None:
+                            st.session_state.replique.publier_inventaire(data['inventaire'], remplacer=True)
+                    elif 'inventaire' in st.session_state:
+                        # Ancienne sauvegarde sans inventaire : les lignes dont le flux manque seront republiées
+                        st.session_state.inventaire.verifier_journal(st.session_state.db_entries)
+                    st.toast("✅ Chargé !")
+                    st.rerun()
             except:
                 st.error("Fichier invalide")
 
+    # --- TRAVAIL À PLUSIEURS (JOURNAL PARTAGÉ DE L'ENTITÉ) ---
+    entite = st.session_state.params['entity_name']
+    partage_actif = st.toggle(f"👥 Journal partagé ({entite})", key="partage_actif",
+                              help="Les sessions connectées à la même entité saisissent dans un journal commun : "
+                                   "chacune reçoit les ajouts / corrections des autres en quelques secondes.")
+    replique = st.session_state.get('replique')
+    if partage_actif:
+        nom_editeur = st.text_input("Votre nom", value=f"{st.session_state.user_role}-{st.session_state.id_session[:4]}", key="nom_editeur")
+        if replique is None or replique.partage.entite != entite:
+            from journal_partage import Replique
+            if replique is not None:
+                replique.quitter(st.session_state.audit)
+            replique = st.session_state.replique = Replique(registre_partage().journal(entite), nom_editeur)
+            replique.rejoindre(st.session_state.db_entries, st.session_state.params, st.session_state.audit)
+            if 'inventaire' in st.session_state:
+                # Même règle que le journal : l'inventaire local n'est publié que si celui de l'entité est vide,
+                # sinon il est remplacé par celui de l'entité
+                inv = st.session_state.inventaire
+                if not replique.partage.inventaire:
+                    replique.publier_inventaire({u: l for u, l in inv.exporter().items() if u not in inv.touches | inv.a_publier})
+                    inv.verifier_journal(st.session_state.db_entries)
+                else:
+                    del st.session_state.inventaire
+            synchroniser_inventaire(replique)
+        replique.auteur = nom_editeur
+
+        # Sondage léger : seule cette zone est réexécutée, la page n'est rechargée que s'il y a du nouveau
+        @st.fragment(run_every=2)
+        def synchro_partage():
+            if replique.conflit is not None:
+                st.rerun()
+            auteurs = replique.tirer(st.session_state.db_entries, st.session_state.params, st.session_state.audit)
+            if auteurs:
+                st.toast("🔄 " + ", ".join(f"{n} modification(s) de {a}" for a, n in auteurs.items()))
+            if synchroniser_inventaire(replique):
+                st.toast("🔄 Inventaire des salles mis à jour par un autre utilisateur")
+                auteurs = True
+            if auteurs:
+                st.rerun()
+            autres = [a for a in replique.partage.actifs() if a != replique.auteur]
+            st.caption(f"Version {replique.version} · {len(replique.partage)} flux · "
+                       + (f"avec {', '.join(autres)}" if autres else "seul(e) connecté(e)"))
+        synchro_partage()
+    elif replique is not None:
+        replique.quitter(st.session_state.audit)
+        st.session_state.replique = None
+
     st.markdown("### 🧭 Menu de Navigation")
     # --- DÉFINITION DU MENU SELON LE RÔLE ---
     if st.session_state.user_role == "admin":
@@ -250,7 +404,9 @@ with st.sidebar:
             "2. 📝 MESURER (Saisie Flux)", 
             "3. 📊 ANALYSER (Cockpit & KPIs)",
             "4. 🚀 AMÉLIORER (Simulateur)",
-            "5. 📄 CONTRÔLER (Rapport Final)"
+            "5. 📄 CONTRÔLER (Rapport Final)",
+            "6. ⏱️ PERFORMANCE (Admin)",
+            "7. 🔎 REQUÊTES (Admin)"
         ]
     else:
         # Le Visiteur/Étudiant voit une version simplifiée
@@ -281,11 +437,34 @@ with st.sidebar:
     else: color = "red"
     st.markdown(f":{color}[**{b_val:.1f} Tonnes / pers**]")
 
+    # Suivi en cours d'année : projection de fin d'année et épuisement du budget (voir suivi_budget.py),
+    # sur les pages de saisie et d'analyse seulement (pas de pandas chargé pour le guide)
+    if st.session_state.db_entries and nav.startswith(("2.", "3.")):
+        import suivi_budget
+        if "suivi_budget" not in st.session_state:
+            st.session_state.suivi_budget = suivi_budget.SuiviBudget()
+        with chrono.span("Suivi Budget"):
+            st.session_state.suivi_budget.actualiser(st.session_state.db_entries)
+            annee_suivi = int(st.session_state.params.get('annee_reporting', datetime.date.today().year))
+            suivi = suivi_budget.projeter(st.session_state.suivi_budget, annee_suivi, st.session_state.params)
+        st.progress(min(suivi["part_consommee"], 1.0), text=f"Budget {annee_suivi} consommé : {suivi['part_consommee']:.0%}")
+        if suivi["depassement"] > 0:
+            st.markdown(f":red[Projection : **{suivi['par_pers']:.2f} T/pers** (+{suivi['depassement']:.2f} T)]")
+        else:
+            st.markdown(f":green[Projection : **{suivi['par_pers']:.2f} T/pers** ({suivi['depassement']:.2f} T)]")
+        if suivi["date_epuisement"] is not None:
+            st.caption(f"⏳ Budget épuisé le {suivi['date_epuisement']:%d/%m/%Y} au rythme actuel ({suivi['profil']}).")
+        else:
+            st.caption(f"Rythme des {suivi_budget.FENETRE} derniers mois, {suivi['profil']}.")
+        with st.expander("📈 Trajectoire mensuelle", expanded=False):
+            st.line_chart(suivi["serie"][["Cumul", "Budget"]], height=160)
+
     # Bouton de nettoyage d'urgence (LA SOLUTION À TES PROBLÈMES)
     if st.session_state.db_entries:
         st.divider()
-        if st.button("🗑️ Effacer toutes les données"):
-            st.session_state.db_entries = []
+        if st.button("🗑️ Effacer toutes les données", help="Annulable depuis la page 2 (↩️ Annuler)."):
+            st.session_state.audit.restauration(st.session_state.db_entries, st.session_state.params,
+                                                st.session_state.params, [], "Effacement")
             st.rerun()
 
    
@@ -298,7 +477,7 @@ with st.sidebar:
     with c_logo_footer:
         # Affiche le logo en petit (comme une icône).
         # Ajuste "width=60" si tu le veux un peu plus grand ou plus petit.
-        st.image("logo_acs.png", width=60) 
+        st.image(image_reduite("logo_acs.png", 120), width=60) 
         
     with c_text_footer:
         # Le texte de signature, aligné à gauche pour coller au logo
@@ -316,6 +495,7 @@ with st.sidebar:
 # ==============================================================================
 # PAGE 0 : GUIDE & DÉFINITIONS
 # ==============================================================================
+chrono.etape(f"Page {nav.split(' ')[0]}")
 if "0." in nav:
     st.title("📘 Guide Utilisateur & Méthodologie")
     st.markdown("Bienvenue dans le **MSCAL Carbon ERP**. Ce guide vous explique les concepts clés et comment utiliser l'outil.")
@@ -354,6 +534,8 @@ if "0." in nav:
 # ==============================================================================
 
 if "1." in nav:
+    import pandas as pd
+
     st.title("⚙️ Paramétrage du Projet")
     st.markdown("Définissez le contexte, la population et les hypothèses techniques.")
 
@@ -367,6 +549,9 @@ if "1." in nav:
                 "Nom de l'entité", 
                 value=st.session_state.params['entity_name']
             )
+            st.session_state.params['annee_reporting'] = int(st.number_input(
+                "Année de reporting", 2000, 2100, int(st.session_state.params.get('annee_reporting', datetime.date.today().year)),
+                help="Année portée par chaque nouveau flux : les bilans de plusieurs années se comparent à l'étape 3."))
             
             st.markdown("**Détail des Effectifs :**")
             col_a, col_b, col_c = st.columns(3)
@@ -453,10 +638,38 @@ if "1." in nav:
                          col = next(x for x in df_cal.columns if x.lower() in ['type', 'statut'])
                          st.dataframe(df_cal[col].value_counts(), use_container_width=True)
 
+                    # Moteur de calendrier : présence jour par jour et par profil
+                    from calendrier import Calendrier, JOURS_SEMAINE, PROFILS, effectifs_params, lire_planning
+                    spec = lire_planning(df_cal)
+                    c_deb, c_fin, c_sem = st.columns(3)
+                    spec["debut"] = str(c_deb.date_input("Début de période", datetime.date.fromisoformat(spec["debut"])))
+                    spec["fin"] = str(c_fin.date_input("Fin de période", datetime.date.fromisoformat(spec["fin"])))
+                    spec["jours_semaine"] = c_sem.slider("Jours ouvrés / semaine", 1, 6, 5)
+                    jours_off = st.multiselect("💻 Jours en distanciel (tous profils)", JOURS_SEMAINE[:spec["jours_semaine"]])
+                    if jours_off:
+                        spec["distanciel"] = {"*": [JOURS_SEMAINE.index(j) for j in jours_off]}
+                    if spec["exhaustif"]:
+                        st.caption("Aucune ligne de fermeture : le fichier est lu comme la liste exhaustive des jours de cours.")
+
+                    cal = Calendrier(spec)
+                    jours_profils = cal.jours_par_profil()
+                    st.dataframe(pd.DataFrame({"Profil": PROFILS, "Jours sur site / an": jours_profils}).set_index("Profil").T, use_container_width=True)
+                    occupation = cal.occupation(effectifs_params(st.session_state.params))
+                    st.metric("Jours d'ouverture (calendrier exact)", f"{cal.nb_jours_ouverts} jours",
+                              f"{occupation.sum():,.0f} personnes-jours", delta_color="off")
+                    st.area_chart(pd.DataFrame({"Présents sur site": occupation}, index=pd.to_datetime(cal.jours)), height=180)
+
                     if st.button("Appliquer ce fichier"):
-                        st.session_state.params['jours_ouverture'] = len(df_cal)
+                        st.session_state.params['jours_ouverture'] = cal.nb_jours_ouverts
+                        st.session_state.params['calendrier'] = spec
                         st.rerun()
                 except: st.error("Erreur de format fichier")
+            if st.session_state.params.get('calendrier'):
+                spec_actif = st.session_state.params['calendrier']
+                st.info(f"📅 Calendrier actif : {spec_actif['debut']} → {spec_actif['fin']} (présence calculée jour par jour dans la page 2).")
+                if st.button("Désactiver le calendrier importé"):
+                    del st.session_state.params['calendrier']
+                    st.rerun()
             else:
                 # --- MODIFICATION EXCEL ICI ---
                 buffer_modele = io.BytesIO()
@@ -509,6 +722,33 @@ if "1." in nav:
             st.session_state.params['fe_eau'] = c2.number_input("Eau (kg/m3)", value=float(st.session_state.params['fe_eau']), format="%.3f")
             st.session_state.params['fe_dechet'] = c1.number_input("Déchets (kg/kg)", value=float(st.session_state.params['fe_dechet']), format="%.3f")
 
+            # MODE HORAIRE : profil d'intensité 8760 h du pays (fichier local mémoire-mappé)
+            st.markdown("##### ⏱️ Électricité : Intensité Horaire (Optionnel)")
+            from intensite_horaire import annees_disponibles, charger_profil, importer_csv
+            _, meta_elec = charger_profil(pays)
+            if meta_elec:
+                annees_elec = annees_disponibles(meta_elec)
+                st.caption(f"Profil {pays} : {meta_elec['heures']} heures depuis {meta_elec['debut']} (moyenne {meta_elec['moyenne']:.3f} kg/kWh).")
+                horaire = st.toggle("Calculer le Scope 2 de l'inventaire heure par heure", value=st.session_state.params.get('mode_elec') == "horaire",
+                                    disabled=not annees_elec, help="Usage horaire des équipements × intensité du réseau, au lieu du facteur annuel.")
+                st.session_state.params['mode_elec'] = "horaire" if horaire and annees_elec else "annuel"
+                if horaire and annees_elec:
+                    annee_actuelle = st.session_state.params.get('annee_elec', annees_elec[-1])
+                    st.session_state.params['annee_elec'] = st.selectbox(
+                        "Année de référence du profil", annees_elec,
+                        index=annees_elec.index(annee_actuelle) if annee_actuelle in annees_elec else len(annees_elec) - 1)
+            else:
+                st.session_state.params['mode_elec'] = "annuel"
+                st.caption(f"Aucun profil horaire local pour {pays} : importez un CSV horodaté (ex. export Electricity Maps ou éCO2mix).")
+            up_elec = st.file_uploader("Profil horaire (CSV : date/heure + intensité g ou kg CO2e/kWh)", type=["csv"], key="up_intensite")
+            if up_elec is not None and st.button(f"📥 Enregistrer ce profil pour {pays}"):
+                try:
+                    meta_elec = importer_csv(up_elec, pays)
+                    st.toast(f"✅ Profil enregistré : {meta_elec['heures']} heures ({', '.join(map(str, annees_disponibles(meta_elec))) or 'aucune année complète'}).")
+                    st.rerun()
+                except ValueError as e:
+                    st.error(f"Profil invalide : {e}")
+
         with t_mob:
             st.markdown("##### 🚗 Transport Terrestre")
             c1, c2 = st.columns(2)
@@ -516,6 +756,9 @@ if "1." in nav:
             st.session_state.params['fe_voit_elec'] = c2.number_input("Voiture Élec (kg/km)", value=float(st.session_state.params['fe_voit_elec']), format="%.3f")
             st.session_state.params['fe_bus'] = c1.number_input("Bus Urbain (kg/km)", value=float(st.session_state.params['fe_bus']), format="%.3f")
             st.session_state.params['fe_autocar'] = c2.number_input("Autocar (kg/km)", value=float(st.session_state.params['fe_autocar']), format="%.3f")
+            st.session_state.params['fe_covoit'] = c1.number_input("Covoiturage (kg/km/pers.)", value=float(st.session_state.params['fe_covoit']), format="%.3f")
+            st.session_state.params['fe_moto'] = c2.number_input("Moto / Scooter (kg/km)", value=float(st.session_state.params['fe_moto']), format="%.3f")
+            st.session_state.params['fe_metro'] = c1.number_input("Métro (kg/km)", value=float(st.session_state.params['fe_metro']), format="%.3f")
             
             st.divider()
             
@@ -544,6 +787,8 @@ if "1." in nav:
 # PAGE 2 : MESURER (SAISIE EXPERT DES FLUX)
 # ==============================================================================
 elif "2." in nav:
+    import pandas as pd
+
     st.title("📝 Mesure des Flux & Inventaires (Data Collection)")
     st.markdown("Approche 'Bottom-Up' : Saisie des inventaires physiques, des surfaces et des flux logistiques humains.")
 
@@ -560,36 +805,148 @@ elif "2." in nav:
         st.subheader("1. Asset Management (Équipements & Salles)")
         st.info("Ici, recensez tout le matériel présent dans les salles (Salle de classe, Bureaux Profs).")
         
-        if 'inventory_df' not in st.session_state:
-            st.session_state.inventory_df = pd.DataFrame(
-                [
-                    {"Objet": "Chaise Étudiant", "Qté": 30, "Poids/Conso": 5.0, "Type": "Mobilier (kg)", "Incertitude": 10},
-                    {"Objet": "Bureau Prof", "Qté": 2, "Poids/Conso": 25.0, "Type": "Mobilier (kg)", "Incertitude": 10},
-                    {"Objet": "Radiateur Élec", "Qté": 4, "Poids/Conso": 1500.0, "Type": "Élec (Watts)", "Incertitude": 5},
-                ]
-            )
-
-        edited_inv = st.data_editor(
-            st.session_state.inventory_df,
-            num_rows="dynamic", 
+        # Inventaire indexé (salle / type) : l'éditeur n'affiche qu'une page et seules les lignes modifiées sont appliquées
+        import inventaire
+        if 'inventaire' not in st.session_state:
+            st.session_state.inventaire = inventaire.InventaireIndexe(inventaire.LIGNES_DEMO)
+        inv = st.session_state.inventaire
+
+        c_salle, c_type_inv, c_page = st.columns([2, 2, 1])
+        salle = c_salle.selectbox("🚪 Salle", ["Toutes"] + inv.valeurs("Salle"), key="inv_salle")
+        type_inv = c_type_inv.selectbox("🏷️ Type", ["Tous"] + inv.valeurs("Type"), key="inv_type")
+        filtres = {"Salle": None if salle == "Toutes" else salle, "Type": None if type_inv == "Tous" else type_inv}
+        uids_filtre = inv.selection(**filtres)
+        nb_pages = max(1, -(-len(uids_filtre) // inventaire.TAILLE_PAGE))
+        num_page = 1
+        if nb_pages > 1:
+            st.session_state.inv_page = min(st.session_state.get("inv_page", 1), nb_pages)
+            num_page = c_page.number_input("Page", 1, nb_pages, key="inv_page")
+        uids_page = uids_filtre[(num_page - 1) * inventaire.TAILLE_PAGE:num_page * inventaire.TAILLE_PAGE]
+
+        # Le delta du widget (lignes ajoutées / modifiées / supprimées) est appliqué au magasin ;
+        # la clé suit la version du magasin pour repartir d'un état vide après chaque application
+        cle_editeur = f"inv_editeur_{inv.version}"
+
+        def appliquer_delta():
+            inv.appliquer(st.session_state[cle_editeur], uids_page, defauts={c: v for c, v in filtres.items() if v is not None})
+
+        st.data_editor(
+            inv.page(uids_page).reset_index(drop=True),
+            key=cle_editeur,
+            on_change=appliquer_delta,
+            num_rows="dynamic",
+            hide_index=True,
             column_config={
-                "Type": st.column_config.SelectboxColumn("Type Flux", options=["Mobilier (kg)", "Élec (Watts)", "Machine Spé (Watts)"]),
+                "Type": st.column_config.SelectboxColumn("Type Flux", options=inventaire.TYPES),
                 "Incertitude": st.column_config.NumberColumn("Marge Erreur %", min_value=0, max_value=50, format="%d%%")
             },
             use_container_width=True
         )
-        st.session_state.inventory_df = edited_inv 
-
-        if st.button("💾 Enregistrer cet Inventaire au Bilan"):
-            for i, row in edited_inv.iterrows():
-                if "Mobilier" in row["Type"]:
-                    impact = (row["Qté"] * row["Poids/Conso"] * 1.5) / 10 
-                    save_flux("Bâtiment", row["Objet"], row["Qté"], "u", 1.0, row["Incertitude"], "Amortissement 10 ans")
-                elif "Watts" in row["Type"]:
-                    heures = 8 
-                    kwh = (row["Qté"] * row["Poids/Conso"] * heures * st.session_state.params['jours_ouverture']) / 1000
-                    save_flux("Énergie", f"Conso {row['Objet']}", kwh, "kWh", st.session_state.params['fe_elec'], row["Incertitude"], "Scope 2")
-            st.success("Inventaire et Consommations énergétiques associés calculés !")
+        st.caption(f"{len(uids_filtre)} ligne(s) sur {len(inv)}" + (f" — page {num_page}/{nb_pages}" if nb_pages > 1 else ""))
+
+        # Scope 2 horaire (optionnel) : coefficients par kW de chaque profil d'usage (8760 h, en cache),
+        # puis produit ligne par ligne pour les seules lignes touchées (avec les flux dérivés)
+        coefficients = None
+        if st.session_state.params.get('mode_elec') == "horaire":
+            try:
+                from intensite_horaire import coefficients_horaires
+                with chrono.span("Scope 2 Horaire"):
+                    coefficients = coefficients_horaires(st.session_state.params['country_choice'], st.session_state.params.get('annee_elec'),
+                                                         st.session_state.params['jours_ouverture'], st.session_state.params.get('calendrier'))
+            except ValueError as e:
+                st.warning(f"Mode horaire indisponible ({e}) : facteur annuel utilisé.")
+
+        # Flux dérivés recalculés pour les seules lignes touchées, puis synchronisés (ajout / correction / suppression)
+        with chrono.span("Flux Inventaire"):
+            inv.actualiser_derives(st.session_state.params, coefficients)
+        if coefficients is not None and inv.horaire:
+            from intensite_horaire import par_heure
+            lignes_h = pd.DataFrame(inv.horaire.values())
+            with st.expander(f"⏱️ Scope 2 horaire ({st.session_state.params['annee_elec']}) : {lignes_h['kgCO2e'].sum():,.0f} kgCO2e", expanded=False):
+                st.dataframe(lignes_h[["Objet", "Type", "kWh", "kgCO2e", "fe_effectif", "part_pointe"]], hide_index=True, use_container_width=True,
+                             column_config={"kWh": st.column_config.NumberColumn(format="%.0f"), "kgCO2e": st.column_config.NumberColumn(format="%.1f"),
+                                            "fe_effectif": st.column_config.NumberColumn("Facteur effectif", format="%.3f"),
+                                            "part_pointe": st.column_config.NumberColumn("Part heures de pointe", format="percent")})
+                st.caption(f"Heures de pointe : intensité ≥ {coefficients['seuil_pointe']:.3f} kg/kWh (10 % des heures les plus carbonées). Émissions par heure de la journée :")
+                st.bar_chart(pd.DataFrame({"kgCO2e": par_heure(inv.horaire.values(), coefficients)}, index=[f"{h:02d}h" for h in range(24)]), height=180)
+        if st.button(f"💾 Enregistrer cet Inventaire au Bilan ({len(inv.a_publier)} ligne(s) à synchroniser)", disabled=not inv.a_publier):
+            ajouts, corrections, suppressions = inventaire.plan_synchronisation(inv, st.session_state.db_entries)
+            nouveaux_inv = [nouveau_flux(f["cat"], f["item"], f["val"], f["unit"], f["fe"], f["incertitude"], f["detail"]) for f in ajouts]
+            if budget_import(nouveaux_inv):
+                for i, f in corrections:
+                    st.session_state.audit.correction(st.session_state.db_entries, st.session_state.params, i,
+                                                      nouveau_flux(f["cat"], f["item"], f["val"], f["unit"], f["fe"], f["incertitude"], f["detail"]))
+                if suppressions:
+                    st.session_state.audit.suppression(st.session_state.db_entries, st.session_state.params, suppressions)
+                for e in nouveaux_inv:
+                    ajouter_flux(e)
+                if st.session_state.get('replique') is not None:
+                    st.session_state.replique.publier_inventaire({u: inv.lignes[u] for u in inv.a_publier if u in inv.lignes},
+                                                                 [u for u in inv.a_publier if u not in inv.lignes])
+                inv.a_publier.clear()
+                st.success(f"Inventaire synchronisé : {len(ajouts)} ajout(s), {len(corrections)} correction(s), {len(suppressions)} suppression(s).")
+
+        # RELEVÉS DE COMPTEURS : DOSSIER D'EXPORT DE LA GTB (LECTURE INCRÉMENTALE)
+        with st.expander("📟 Relevés de compteurs (dossier GTB surveillé)", expanded=False):
+            import os
+            import ingestion_compteurs as compteurs
+            from taches import empreinte
+            st.caption("Exports CSV de la GTB déposés dans le dossier : **Compteur**, **Horodatage**, **Valeur** (+ **Énergie** gaz/élec et **Unité** optionnelles). "
+                       "Seuls les fichiers et lignes nouveaux sont lus (point de reprise) ; les relevés sont agrégés par compteur et par mois "
+                       "en flux Énergie, mis à jour en place à chaque passage.")
+            dossier_gtb = st.text_input("Dossier surveillé", compteurs.DOSSIER_COMPTEURS, key="dossier_compteurs")
+            a_lire = compteurs.nouveautes(dossier_gtb)
+            c_etat, c_veille = st.columns([3, 2])
+            if not os.path.isdir(dossier_gtb):
+                c_etat.warning("Dossier introuvable.")
+            else:
+                c_etat.caption(f"{len(a_lire)} fichier(s) avec des relevés non lus." if a_lire else "✅ Tous les relevés du dossier sont intégrés.")
+            surveiller = c_veille.toggle("👁️ Surveiller le dossier", key="surveiller_compteurs", help="Vérifie le dossier toutes les 10 s et intègre les nouveaux relevés.")
+            c_ing, c_sync = st.columns(2)
+            if a_lire and (c_ing.button("🔄 Lire les nouveaux relevés") or surveiller):
+                st.session_state.tache_compteurs = ordonnanceur().soumettre(
+                    "compteurs", empreinte(a_lire), compteurs.ingerer, dossier_gtb, params={"dossier": dossier_gtb}, libelle="Relevés de compteurs")
+
+            def appliquer_compteurs(agregats_gtb):
+                flux_gtb = compteurs.flux_compteurs(agregats_gtb, st.session_state.params)
+                ajouts, corrections = compteurs.plan_upsert(st.session_state.db_entries, flux_gtb)
+                if not budget_import(ajouts):
+                    return 0, 0
+                for i, f in corrections:
+                    st.session_state.audit.correction(st.session_state.db_entries, st.session_state.params, i, f)
+                for f in ajouts:
+                    ajouter_flux(f)
+                return len(ajouts), len(corrections)
+
+            tache_gtb = st.session_state.get("tache_compteurs")
+            if tache_gtb is not None and suivre_tache(tache_gtb, "Lecture des relevés", delai=0.5):
+                if st.session_state.get("compteurs_appliques") != tache_gtb.cle:
+                    st.session_state.compteurs_appliques = tache_gtb.cle
+                    resultat_gtb = tache_gtb.resultat
+                    n_aj, n_corr = appliquer_compteurs(resultat_gtb["agregats"])
+                    st.toast(f"📟 {sum(n for _, n in resultat_gtb['fichiers'] if isinstance(n, int))} relevé(s) lus : "
+                             f"{n_aj} flux ajouté(s), {n_corr} mis à jour")
+                    for nom, n in resultat_gtb["fichiers"]:
+                        if not isinstance(n, int):
+                            st.warning(f"{nom} : {n} (fichier réécrit plus court que la partie déjà lue).")
+                    if resultat_gtb["rejets"]:
+                        st.warning(f"{resultat_gtb['rejets']} relevé(s) illisible(s) ignoré(s) (horodatage, valeur ou unité).")
+            agregats_gtb = compteurs.agregats(compteurs.lire_reprise(dossier_gtb))
+            if not agregats_gtb.empty:
+                # Un autre utilisateur peut avoir lu le dossier : le bilan de cette session se réaligne sur les totaux
+                if c_sync.button("🔁 Réaligner le Bilan sur les totaux"):
+                    n_aj, n_corr = appliquer_compteurs(agregats_gtb)
+                    st.success(f"{n_aj} flux ajouté(s), {n_corr} mis à jour.")
+                tableau_gtb = agregats_gtb.pivot_table(index=["compteur", "energie"], columns="periode", values="kWh", aggfunc="sum")
+                st.dataframe(tableau_gtb.iloc[:, -12:], use_container_width=True,
+                             column_config={p: st.column_config.NumberColumn(p, format="%.0f") for p in tableau_gtb.columns[-12:]})
+            if surveiller:
+                @st.fragment(run_every=10)
+                def veille_compteurs():
+                    # Simple stat du dossier : la page n'est relancée que s'il y a des octets nouveaux
+                    if compteurs.nouveautes(dossier_gtb) != a_lire:
+                        st.rerun()
+                veille_compteurs()
 
     # 2. LOGISTIQUE HUMAINE
     with tab_log:
@@ -612,6 +969,8 @@ elif "2." in nav:
                 
                 jours_presence = 0
                 txt_context = ""
+                rythme, mois, nb_visites = "", 6, 2
+                spec_cal = st.session_state.params.get('calendrier')
 
                 if "Initiale" in user_type:
                     st.caption("Cas classique : Présent toute l'année scolaire (Pré-Spé + Spé).")
@@ -620,7 +979,7 @@ elif "2." in nav:
                 elif "Alternant" in user_type:
                     st.caption("Cas complexe : Période école vs Période entreprise.")
                     c_a, c_b = st.columns(2)
-                    semaines_ecole = c_a.number_input("Semaines École (Total)", 1, 52, 20)
+                    semaines_ecole = c_a.number_input("Semaines École (Total)", 1, 52, 20, disabled=bool(spec_cal))
                     rythme = st.selectbox("Rythme Alternance", ["2 semaines / 2 semaines", "1 semaine / 3 semaines", "Autre"])
                     jours_presence = semaines_ecole * 5
                     txt_context = f"Rythme: {rythme}"
@@ -632,17 +991,22 @@ elif "2." in nav:
                 
                 elif "Prof" in user_type:
                     st.caption("Nos 2 profs fixes (Responsable Spé + Enseignant).")
-                    jours_presence = st.number_input("Jours présence site / an", 1, 250, 160)
+                    jours_presence = st.number_input("Jours présence site / an", 1, 250, 160, disabled=bool(spec_cal))
                 
                 elif "Intervenant" in user_type:
                     st.caption("Visiteurs ponctuels (Profs extérieurs, Pros).")
                     nb_visites = st.number_input("Nombre d'interventions / an", 1, 50, 2)
                     jours_presence = nb_visites
 
+                if spec_cal:
+                    from calendrier import JOURS_SEMAINE
+                    st.caption("📅 Calendrier importé actif : jours de présence calculés jour par jour.")
+                    jours_off_flux = st.multiselect("💻 Jours en distanciel (ce profil)", JOURS_SEMAINE[:spec_cal.get("jours_semaine", 5)])
+
                 st.divider()
                 st.markdown("**Logistique de Déplacement**")
                 c_t1, c_t2 = st.columns(2)
-                mode = c_t1.selectbox("Moyen de Transport", ["Voiture Thermique", "Voiture Élec", "Train/TER", "TGV", "Bus", "Avion"])
+                mode = c_t1.selectbox("Moyen de Transport", ["Voiture Thermique", "Voiture Élec", "Covoiturage", "Moto/Scooter", "Train/TER", "TGV", "Métro", "Bus", "Avion"])
                 dist = c_t2.number_input("Distance A/R (km)", 1, 10000, 30)
                 nb_pax = st.number_input("Nombre de personnes concernées", 1, 100, 1)
                 
@@ -652,14 +1016,81 @@ elif "2." in nav:
                     fe = 0.0
                     if "Thermique" in mode: fe = st.session_state.params['fe_voit']
                     elif "Voiture Élec" in mode: fe = st.session_state.params['fe_voit_elec']
+                    elif "Covoiturage" in mode: fe = st.session_state.params['fe_covoit']
+                    elif "Moto" in mode: fe = st.session_state.params['fe_moto']
                     elif "Train" in mode: fe = st.session_state.params['fe_ter']
                     elif "TGV" in mode: fe = st.session_state.params['fe_tgv']
+                    elif "Métro" in mode: fe = st.session_state.params['fe_metro']
                     elif "Bus" in mode: fe = st.session_state.params['fe_bus']
                     elif "Avion" in mode: fe = st.session_state.params['fe_avion_long']
 
+                    if spec_cal:
+                        # Présence exacte : matrice jours × profils du calendrier importé
+                        from calendrier import Calendrier, PROFILS, profil_depuis_libelle
+                        profil_cal = profil_depuis_libelle(user_type, rythme)
+                        if profil_cal is not None:
+                            cal = Calendrier(spec_cal, mois_echange=mois, nb_visites=nb_visites)
+                            if jours_off_flux:
+                                cal.appliquer_distanciel([JOURS_SEMAINE.index(j) for j in jours_off_flux], [profil_cal])
+                                txt_context = f"{txt_context} Distanciel: {', '.join(jours_off_flux)}".strip()
+                            jours_presence = int(cal.jours_par_profil()[PROFILS.index(profil_cal)])
+
                     total_km = dist * jours_presence * nb_pax
-                    save_flux("Mobilité", f"Trajet {user_type}", total_km, "km.pax", fe, incert, f"{mode} | {jours_presence}j/an | {txt_context}")
-                    st.success("Flux logistique ajouté !")
+                    if save_flux("Mobilité", f"Trajet {user_type}", total_km, "km.pax", fe, incert, f"{mode} | {jours_presence}j/an | {txt_context}"):
+                        st.success("Flux logistique ajouté !")
+
+        # IMPORT EN MASSE : ENQUÊTE DOMICILE-CAMPUS
+        with st.expander("📋 Import Enquête Domicile-Campus (en masse)", expanded=False):
+            st.caption("Une ligne par répondant : **Code Postal** (ou **Latitude/Longitude**) et **Mode** ; colonnes optionnelles **Profil**, **Personnes**, **Jours**. "
+                       "Distances calculées à vol d'oiseau × coefficient de détour routier, depuis une table de codes postaux embarquée (hors-ligne).")
+            up_enq = st.file_uploader("Fichier enquête (CSV/Excel)", type=["csv", "xlsx"], key="up_enquete")
+            if up_enq is None:
+                buffer_enq = io.BytesIO()
+                pd.DataFrame([{"Code Postal": "54000", "Mode": "Bus", "Profil": "Initiale", "Personnes": 1},
+                              {"Code Postal": "57000", "Mode": "Train/TER", "Profil": "Alternant 2/2", "Personnes": 1}]).to_excel(buffer_enq, index=False)
+                st.download_button("📥 Télécharger Modèle Enquête (.xlsx)", buffer_enq, "modele_enquete_mobilite.xlsx", "application/vnd.ms-excel")
+            else:
+                try:
+                    from trajets import CAMPUS, COEF_DETOUR, analyser_enquete
+                    c_e1, c_e2, c_e3 = st.columns(3)
+                    campus = dict(CAMPUS, lat=c_e1.number_input("Campus latitude", value=CAMPUS["lat"], format="%.4f"),
+                                  lon=c_e2.number_input("Campus longitude", value=CAMPUS["lon"], format="%.4f"))
+                    detour = c_e3.number_input("Coefficient de détour", 1.0, 2.0, COEF_DETOUR, 0.05)
+
+                    # Jours de présence par profil : calendrier importé s'il existe
+                    jours_profil = None
+                    if st.session_state.params.get('calendrier'):
+                        from calendrier import PROFILS, calendrier_params
+                        jours_profil = dict(zip(PROFILS, calendrier_params(st.session_state.params).jours_par_profil().tolist()))
+
+                    # Géocodage + agrégation en tâche de fond (une enquête de plusieurs milliers de lignes ne fige pas la page)
+                    tache_enq = ordonnanceur().soumettre(
+                        "enquete", up_enq.file_id, analyser_enquete, up_enq.getvalue(), up_enq.name, st.session_state.params,
+                        st.session_state.params['jours_ouverture'], campus, detour, jours_profil,
+                        params={"campus": campus, "detour": detour, "jours": jours_profil, "params": st.session_state.params},
+                        libelle="Géocodage enquête")
+                    if suivre_tache(tache_enq, "Géocodage de l'enquête", delai=0.5):
+                        enquete, flux_enq, rejets = tache_enq.resultat
+
+                        st.write(f"• Répondants : **{len(enquete)}** ({enquete['source'].value_counts().to_dict()}) — rejetés : **{len(rejets)}**")
+                        df_apercu = pd.DataFrame(flux_enq)
+                        if not df_apercu.empty:
+                            df_apercu["tCO2e"] = df_apercu["km_pax"] * df_apercu["fe"] / 1000
+                            st.dataframe(df_apercu[["Profil", "Mode", "Personnes", "km_pax", "tCO2e"]], hide_index=True, use_container_width=True,
+                                         column_config={"km_pax": st.column_config.NumberColumn("km.pax / an", format="%.0f"),
+                                                        "tCO2e": st.column_config.NumberColumn(format="%.2f")})
+                        if len(rejets):
+                            st.warning(f"{len(rejets)} ligne(s) sans localisation ou mode reconnu ont été ignorées.")
+                        incert_enq = st.slider("Marge d'incertitude (enquête)", 0, 50, 15)
+                        if st.button(f"➕ Ajouter {len(flux_enq)} flux agrégés au Bilan", disabled=not flux_enq):
+                            nouveaux_enq = [nouveau_flux("Mobilité", f"Trajet Enquête ({f['Profil']})", round(f["km_pax"]), "km.pax", f["fe"], incert_enq, f["Détail"])
+                                            for f in flux_enq]
+                            if budget_import(nouveaux_enq) and all(ajouter_flux(e) for e in nouveaux_enq):
+                                st.success(f"{len(flux_enq)} flux de mobilité ajoutés depuis l'enquête.")
+                except ValueError as e:
+                    st.error(f"Enquête invalide : {e}")
+                except Exception:
+                    st.error("Erreur de format fichier")
 
     # 3. CONSOMMABLES & SURFACES
     with tab_conso:
@@ -676,8 +1107,16 @@ elif "2." in nav:
                 if st.form_submit_button("Ajouter Bâtiment"):
                     fe = st.session_state.params['fe_gaz'] if "Gaz" in type_heat else st.session_state.params['fe_elec']
                     total_kwh = surface * ratio
-                    save_flux("Bâtiment", f"Chauffage ({type_heat})", total_kwh, "kWh", fe, 10, f"{surface} m²")
-                    st.success("Impact Bâtiment calculé.")
+                    detail = f"{surface} m²"
+                    if st.session_state.params.get('calendrier'):
+                        # Calendrier importé : la part de la conso liée à la fréquentation suit les personnes-jours
+                        from calendrier import calendrier_params, effectifs_params
+                        cal = calendrier_params(st.session_state.params)
+                        effectifs = effectifs_params(st.session_state.params)
+                        total_kwh = round(total_kwh * cal.facteur_batiment(effectifs))
+                        detail += f", {cal.personnes_jours(effectifs):,.0f} personnes-jours ({cal.taux_occupation(effectifs):.0%} d'occupation)"
+                    if save_flux("Bâtiment", f"Chauffage ({type_heat})", total_kwh, "kWh", fe, 10, detail):
+                        st.success("Impact Bâtiment calculé.")
 
         with c2:
             st.markdown("##### 🍔 Vie de Campus (Consommables)")
@@ -691,8 +1130,49 @@ elif "2." in nav:
                     if "Bœuf" in item: fe = st.session_state.params['fe_boeuf']
                     elif "Végé" in item: fe = st.session_state.params['fe_vege']
                     elif "Café" in item: fe = st.session_state.params['fe_cafe']
-                    save_flux("Achats", item, qte, "u", fe, incert_conso, "Conso courante")
-                    st.success("Ajouté.")
+                    if save_flux("Achats", item, qte, "u", fe, incert_conso, "Conso courante"):
+                        st.success("Ajouté.")
+
+        # IMPORT EN MASSE : GRAND LIVRE COMPTABLE (RATIOS MONÉTAIRES)
+        with st.expander("🧾 Import Grand Livre (achats au ratio monétaire)", expanded=False):
+            st.caption("Une ligne par écriture : **Compte**, **Libellé**, **Montant** HT (ou **Débit/Crédit**) et **Date**. "
+                       "Rapprochement par mots-clés du libellé puis par compte (plan comptable), ratios kgCO2e/€ déflatés (IPC INSEE). "
+                       "Évitez le double compte avec les flux déjà saisis en unités physiques (énergie, trajets...).")
+            up_gl = st.file_uploader("Export comptable (CSV/Excel)", type=["csv", "xlsx"], key="up_grand_livre")
+            if up_gl is None:
+                buffer_gl = io.BytesIO()
+                pd.DataFrame([{"Compte": "6251", "Libellé": "Billet SNCF Paris", "Montant": 120.50, "Date": "15/03/2025"},
+                              {"Compte": "2183", "Libellé": "Ordinateurs portables x10", "Montant": 9800, "Date": "02/09/2025"}]).to_excel(buffer_gl, index=False)
+                st.download_button("📥 Télécharger Modèle Grand Livre (.xlsx)", buffer_gl, "modele_grand_livre.xlsx", "application/vnd.ms-excel")
+            else:
+                from achats_monetaires import ANNEE_RATIOS, analyser_grand_livre, non_rapprochees
+                annee_gl = int(st.session_state.params.get('annee_reporting', datetime.date.today().year))
+                tache_gl = ordonnanceur().soumettre("grand_livre", up_gl.file_id, analyser_grand_livre, up_gl.getvalue(), up_gl.name, annee_gl,
+                                                    params={"annee": annee_gl}, libelle="Rapprochement grand livre")
+                if suivre_tache(tache_gl, "Rapprochement du grand livre", delai=0.5):
+                    lignes_gl, flux_gl, rejets_gl = tache_gl.resultat
+                    part_ok = 1 - rejets_gl["montant"].abs().sum() / max(lignes_gl["montant"].abs().sum(), 1e-9)
+                    st.write(f"• Écritures : **{len(lignes_gl)}** — rapprochées : **{part_ok:.0%}** du montant "
+                             f"({lignes_gl['rapprochement'].value_counts().drop('', errors='ignore').to_dict()})")
+                    df_apercu_gl = pd.DataFrame(flux_gl)
+                    if not df_apercu_gl.empty:
+                        df_apercu_gl["tCO2e"] = df_apercu_gl["Montant déflaté"] * df_apercu_gl["fe"] / 1000
+                        st.dataframe(df_apercu_gl[["Catégorie", "Poste", "Montant", "Montant déflaté", "fe", "tCO2e"]], hide_index=True, use_container_width=True,
+                                     column_config={"Montant": st.column_config.NumberColumn("Montant (€ courants)", format="%.0f"),
+                                                    "Montant déflaté": st.column_config.NumberColumn(f"€ {ANNEE_RATIOS}", format="%.0f"),
+                                                    "fe": st.column_config.NumberColumn("kgCO2e/€", format="%.3f"),
+                                                    "tCO2e": st.column_config.NumberColumn(format="%.2f")})
+                    if len(rejets_gl):
+                        st.warning(f"{len(rejets_gl)} écriture(s) non rapprochée(s) ({rejets_gl['montant'].sum():,.0f} €) : complétez le référentiel ou les libellés.".replace(",", " "))
+                        table_rejets = non_rapprochees(rejets_gl)
+                        st.dataframe(table_rejets, hide_index=True, use_container_width=True,
+                                     column_config={"Montant": st.column_config.NumberColumn(format="%.2f €")})
+                        st.download_button("📥 Lignes non rapprochées (.csv)", rejets_gl.to_csv(index=False).encode("utf-8"), "non_rapprochees.csv", "text/csv")
+                    if st.button(f"➕ Ajouter {len(flux_gl)} flux d'achats au Bilan", disabled=not flux_gl):
+                        nouveaux_gl = [nouveau_flux(f["Catégorie"], f"Achats (€) : {f['Poste']}", round(f["Montant déflaté"], 2), "€", f["fe"], f["Incertitude"], f["Détail"])
+                                       for f in flux_gl]
+                        if budget_import(nouveaux_gl) and all(ajouter_flux(e) for e in nouveaux_gl):
+                            st.success(f"{len(flux_gl)} flux d'achats ajoutés depuis le grand livre.")
 
     # 4. PARC NUMÉRIQUE
     with tab_it:
@@ -712,27 +1192,149 @@ elif "2." in nav:
                 elif "Écran" in mat: fe = st.session_state.params['fe_it_screen']
                 
                 impact_annuel = (fe / duree) * qte
-                save_flux("Numérique", f"Parc {mat}", qte, "u", (fe/duree), 10, f"Amortissement {duree} ans")
-                st.success(f"Parc IT ajouté : {impact_annuel:.1f} kgCO2e/an")
+                if save_flux("Numérique", f"Parc {mat}", qte, "u", (fe/duree), 10, f"Amortissement {duree} ans"):
+                    st.success(f"Parc IT ajouté : {impact_annuel:.1f} kgCO2e/an")
+
+        # IMPORT EN MASSE : REGISTRE DU PARC (UN ÉQUIPEMENT PAR LIGNE)
+        with st.expander("🗂️ Registre du parc (import en masse)", expanded=False):
+            st.caption("Une ligne par équipement (ou lot) : **Type**, **Date d'achat**, **Durée** de vie prévue, **Reconditionné** (oui/non) et **Quantité**. "
+                       "La fabrication est amortie année par année ; au simulateur, les leviers IT sont évalués sur la pyramide des âges du registre.")
+            up_parc = st.file_uploader("Registre du parc (CSV/Excel)", type=["csv", "xlsx"], key="up_parc")
+            if up_parc is None:
+                buffer_parc = io.BytesIO()
+                pd.DataFrame([{"Type": "PC Portable", "Date d'achat": "15/09/2022", "Durée": 5, "Reconditionné": "non", "Quantité": 1},
+                              {"Type": "Écran", "Date d'achat": "2021", "Durée": 7, "Reconditionné": "oui", "Quantité": 40}]).to_excel(buffer_parc, index=False)
+                st.download_button("📥 Télécharger Modèle Registre (.xlsx)", buffer_parc, "modele_registre_parc.xlsx", "application/vnd.ms-excel")
+            else:
+                import altair as alt
+                import parc_it
+                annee_parc = int(st.session_state.params.get('annee_reporting', datetime.date.today().year))
+                fe_parc = {cle: st.session_state.params[cle] for cle in parc_it.TYPES.values()}
+                tache_parc = ordonnanceur().soumettre("parc_it", up_parc.file_id, parc_it.analyser_registre, up_parc.getvalue(), up_parc.name,
+                                                      st.session_state.params, annee_parc, params={"annee": annee_parc, **fe_parc}, libelle="Registre du parc IT")
+                if suivre_tache(tache_parc, "Lecture du registre", delai=0.5):
+                    registre, flux_parc, rejets_parc = tache_parc.resultat
+                    q_parc = registre["quantite"].sum()
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Équipements", f"{q_parc:,.0f}".replace(",", " "))
+                    c2.metric("Âge moyen", f"{((annee_parc + 1 - registre['achat']) * registre['quantite']).sum() / max(q_parc, 1):.1f} ans")
+                    c3.metric("Reconditionnés", f"{parc_it.part_reconditionnee(registre):.0%}")
+                    if len(rejets_parc):
+                        st.warning(f"{len(rejets_parc)} ligne(s) ignorée(s) : date d'achat illisible ou postérieure à {annee_parc}.")
+
+                    # Matrice équipements × années agrégée par type : passé amorti et renouvellements à venir
+                    annees_parc = list(range(annee_parc - 5, max(parc_it.HORIZON, annee_parc + 1) + 1))
+                    par_type = parc_it.amortissement_par_type(registre, st.session_state.params, annees_parc)
+                    df_amort = par_type.rename_axis("Type").reset_index().melt("Type", var_name="Année", value_name="kgCO2e")
+                    df_amort["tCO2e"] = df_amort["kgCO2e"] / 1000
+                    chart_amort = alt.Chart(df_amort).mark_bar().encode(
+                        x=alt.X("Année:O"), y=alt.Y("sum(tCO2e):Q", title="Fabrication amortie (tCO2e)"),
+                        color="Type:N", tooltip=["Année", "Type", alt.Tooltip("tCO2e:Q", format=".2f")])
+                    repere = alt.Chart(pd.DataFrame({"Année": [annee_parc]})).mark_rule(color="red", strokeDash=[4, 4]).encode(x="Année:O")
+                    afficher_graphe(chart_amort + repere, "Amortissement Parc")
+                    st.caption("Sans renouvellement : la part future ne compte que le parc actuel.")
+
+                    df_flux_parc = pd.DataFrame(flux_parc)
+                    if not df_flux_parc.empty:
+                        df_flux_parc["tCO2e"] = df_flux_parc["Impact"] / 1000
+                        st.dataframe(df_flux_parc[["Type", "Quantité", "tCO2e", "Détail"]], hide_index=True, use_container_width=True,
+                                     column_config={"Quantité": st.column_config.NumberColumn(format="%.0f"),
+                                                    "tCO2e": st.column_config.NumberColumn(f"tCO2e {annee_parc}", format="%.2f")})
+                    # Les flux du registre remplacent ceux d'un import précédent (pas de double compte)
+                    anciens = [i for i, e in enumerate(st.session_state.db_entries) if str(e.get("Détail", "")).startswith("Registre parc")]
+                    libelle_parc = f"➕ {'Remplacer' if anciens else 'Ajouter'} les {len(flux_parc)} flux du registre au Bilan"
+                    nouveaux_parc = [nouveau_flux("Numérique", f"Parc {f['Type']}", round(f["Quantité"], 2), "u", f["fe"], 10, f["Détail"]) for f in flux_parc]
+                    if st.button(libelle_parc, disabled=not flux_parc) and budget_import(nouveaux_parc):
+                        if anciens:
+                            st.session_state.audit.suppression(st.session_state.db_entries, st.session_state.params, anciens)
+                        if all(ajouter_flux(e) for e in nouveaux_parc):
+                            st.session_state.parc_it = {"cle": up_parc.file_id, "registre": registre}
+                            st.success(f"{len(flux_parc)} flux du registre ajoutés ({q_parc:,.0f} équipements).".replace(",", " "))
 
     # --- TABLEAU DE CONTRÔLE FINAL ---
     st.divider()
     st.markdown("### 🔍 Journal des Flux (Contrôle Qualité)")
+
+    # --- ANNULER / RÉTABLIR (journal d'audit) ---
+    journal_audit = st.session_state.audit
+    c_undo, c_redo, c_hist = st.columns([1, 1, 3])
+    if c_undo.button("↩️ Annuler", disabled=not journal_audit.peut_annuler, use_container_width=True):
+        enr = journal_audit.annuler(st.session_state.db_entries, st.session_state.params)
+        st.toast(f"↩️ Annulé : {audit.LIBELLES.get(enr['op'], enr['op'])} ({audit.resume(enr)})")
+        st.rerun()
+    if c_redo.button("↪️ Rétablir", disabled=not journal_audit.peut_retablir, use_container_width=True):
+        enr = journal_audit.retablir(st.session_state.db_entries, st.session_state.params)
+        st.toast(f"↪️ Rétabli : {audit.LIBELLES.get(enr['op'], enr['op'])} ({audit.resume(enr)})")
+        st.rerun()
+    with c_hist.popover(f"🕓 Historique ({len(journal_audit)} opérations)", use_container_width=True):
+        hist = pd.DataFrame(journal_audit.historique(20))
+        st.dataframe(hist, hide_index=True, use_container_width=True)
+        # Pas de retour avant la dernière synchronisation partagée (écraserait le travail des collègues)
+        libelles_hist = {r["n"]: f"#{r['n']} · {r['op']} · {r['heure']}" for r in hist.to_dict("records") if r["n"] >= journal_audit.barriere}
+        noeud_cible = st.selectbox("Revenir à la version", list(libelles_hist), format_func=libelles_hist.get)
+        if st.button("⏪ Restaurer cette version", disabled=noeud_cible == journal_audit.tete):
+            etat = journal_audit.etat_a(noeud_cible)
+            journal_audit.restauration(st.session_state.db_entries, st.session_state.params, etat["params"], etat["db"], f"Retour à la version #{noeud_cible}")
+            st.rerun()
     
     if st.session_state.db_entries:
-        df_flux = pd.DataFrame(st.session_state.db_entries)
+        with chrono.span("DataFrame Journal"):
+            from calculs import journal_en_dataframe
+            df_flux = journal_en_dataframe(st.session_state.db_entries)
         
         # SÉCURITÉ AFFICHAGE (Contre les vieilles données)
         if "Impact_kgCO2" in df_flux.columns and "Marge" in df_flux.columns:
-            st.dataframe(
+            # --- CONTRÔLE QUALITÉ : doublons & valeurs aberrantes (voir qualite.py) ---
+            import qualite
+            with chrono.span("Contrôle Qualité"):
+                drapeaux = qualite.analyser(df_flux)
+                controle = qualite.synthese(df_flux, drapeaux)
+            if controle["nb_doublons"] or controle["nb_quasi_doublons"] or controle["nb_aberrants"]:
+                st.warning(f"⚠️ Contrôle qualité : **{controle['nb_doublons']}** doublon(s) exact(s), "
+                           f"**{controle['nb_quasi_doublons']}** quasi-doublon(s), **{controle['nb_aberrants']}** valeur(s) atypique(s) "
+                           f"({controle['part_suspecte']:.0%} de l'impact). Voir la colonne « Contrôle ».")
+                doublons = [int(i) for i in drapeaux.index[drapeaux["doublon"]]]
+                if doublons and st.button(f"🧹 Supprimer les {len(doublons)} doublon(s) exact(s)"):
+                    journal_audit.suppression(st.session_state.db_entries, st.session_state.params, doublons)
+                    st.toast(f"🧹 {len(doublons)} doublon(s) supprimé(s) (annulable)")
+                    st.rerun()
+            df_flux.insert(0, "Contrôle", drapeaux["motif"])
+
+            selection = st.dataframe(
                 df_flux,
                 column_config={
                     "Impact_kgCO2": st.column_config.NumberColumn("Impact (kgCO2e)", format="%.1f kg"),
                     "Marge": st.column_config.NumberColumn("± Marge", format="%.1f kg"),
                     "Incertitude": st.column_config.ProgressColumn("Incertitude", min_value=0, max_value=50, format="%d%%"),
                 },
-                use_container_width=True
+                use_container_width=True,
+                # Clé liée à la tête du journal : la sélection repart à zéro après chaque modification
+                on_select="rerun", selection_mode="multi-row", key=f"selection_journal_{journal_audit.tete}"
             )
+            lignes_choisies = [i for i in selection.selection.rows if i < len(df_flux)]
+
+            # --- CORRECTION / SUPPRESSION CIBLÉE ---
+            if lignes_choisies:
+                with st.container(border=True):
+                    st.markdown(f"**✏️ {len(lignes_choisies)} ligne(s) sélectionnée(s)**")
+                    i_edit = lignes_choisies[0]
+                    ligne = st.session_state.db_entries[i_edit]
+                    with st.form(f"correction_{i_edit}"):
+                        st.caption(f"Correction de la ligne {i_edit} (la marge est recalculée).")
+                        c_f1, c_f2 = st.columns(2)
+                        n_item = c_f1.text_input("Item", ligne.get("Item", ""))
+                        n_qte = c_f2.text_input("Quantité", ligne.get("Quantité", ""))
+                        n_impact = c_f1.number_input("Impact (kgCO2e)", value=float(ligne.get("Impact_kgCO2", 0) or 0), format="%.3f")
+                        n_incert = c_f2.slider("Incertitude %", 0, 50, int(ligne.get("Incertitude", 10) or 0))
+                        n_detail = st.text_input("Détail", ligne.get("Détail", ""))
+                        if st.form_submit_button("💾 Enregistrer la correction"):
+                            corrigee = dict(ligne, Item=n_item, Quantité=n_qte, Impact_kgCO2=float(n_impact),
+                                            Incertitude=int(n_incert), Marge=float(n_impact) * n_incert / 100.0, Détail=n_detail)
+                            journal_audit.correction(st.session_state.db_entries, st.session_state.params, i_edit, corrigee)
+                            st.rerun()
+                    if st.button(f"🗑️ Supprimer les {len(lignes_choisies)} ligne(s) sélectionnée(s)"):
+                        journal_audit.suppression(st.session_state.db_entries, st.session_state.params, lignes_choisies)
+                        st.rerun()
             
             tot = df_flux["Impact_kgCO2"].sum()
             marge_tot = df_flux["Marge"].sum()
@@ -750,7 +1352,10 @@ elif "2." in nav:
 # PAGE 3 : ANALYSER (TABLEAU DE BORD DÉCISIONNEL & SCOPES)
 # ==============================================================================
 elif "3." in nav:
-    import altair as alt 
+    import pandas as pd
+    import altair as alt
+    import qualite
+    from calculs import preparer_journal, calculer_kpis, table_pareto
     
     st.title("📊 Cockpit de Performance & Analyse")
     st.markdown("Analyse fine des impacts, identification des leviers et contrôle de la qualité de donnée.")
@@ -758,52 +1363,37 @@ elif "3." in nav:
     if not st.session_state.db_entries:
         st.warning("⚠️ Aucune donnée disponible. Veuillez remplir l'étape 2 'MESURER' d'abord.")
     else:
-        # 1. PRÉPARATION DE LA DATA (ETL)
-        df = pd.DataFrame(st.session_state.db_entries)
-        
-        # Sécurité : On s'assure que les colonnes numériques sont bien des nombres
-        df["Impact_kgCO2"] = pd.to_numeric(df["Impact_kgCO2"], errors='coerce').fillna(0)
-        df["Marge"] = pd.to_numeric(df["Marge"], errors='coerce').fillna(0)
-        
-        # --- AJOUT INTELLIGENT : DÉTECTION DES SCOPES ---
-        # (Sert à rendre le KPI "Part Scope 3" plus précis et à créer le graphique Scope)
-        def get_scope(row):
-            detail = str(row.get("Détail", ""))
-            if "Scope 1" in detail: return "Scope 1"
-            if "Scope 2" in detail: return "Scope 2"
-            if "Scope 3" in detail: return "Scope 3"
-            
-            cat = str(row.get("Catégorie", ""))
-            item = str(row.get("Item", ""))
-            if "Bâtiment" in cat or "Énergie" in cat:
-                if "Gaz" in item or "Fioul" in item: return "Scope 1"
-                if "Élec" in item or "Chauffage" in item or "Radiateur" in item: return "Scope 2"
-            return "Scope 3"
-
-        df["Scope"] = df.apply(get_scope, axis=1)
-        # ------------------------------------------------
-
-        # --- MOTEUR DE CALCUL DES KPIs (Tes calculs originaux) ---
-        # A. Totaux
-        total_co2_t = df["Impact_kgCO2"].sum() / 1000.0
-        total_marge_t = df["Marge"].sum() / 1000.0
-        
-        # B. Population & Ratios
-        pop_totale = st.session_state.params['pop_etu'] + st.session_state.params['pop_alt'] + st.session_state.params['pop_prof']
-        if pop_totale == 0: pop_totale = 1
-        
-        ratio_pers = total_co2_t / pop_totale
-        budget_cible = float(st.session_state.params['budget_co2'])
-        
-        # C. Financier
-        cout_carbone = total_co2_t * st.session_state.params['shadow_price']
-        
-        # D. Qualité de Donnée (DQI)
-        if total_co2_t > 0:
-            dqi_score = 10 - (df["Marge"].sum() / df["Impact_kgCO2"].sum() * 20) 
-        else:
-            dqi_score = 0
-        dqi_score = max(0, min(10, dqi_score))
+        # 1. PRÉPARATION DE LA DATA (ETL) + DÉTECTION DES SCOPES
+        with chrono.span("DataFrame + Scopes"):
+            df = preparer_journal(st.session_state.db_entries)
+
+        # --- HISTORIQUE PLURIANNUEL : cube agrégé par année (voir historique.py) ---
+        import historique
+        if "historique" not in st.session_state:
+            st.session_state.historique = historique.EntrepotHistorique()
+        entrepot = st.session_state.historique
+        with chrono.span("Cube Annuel"):
+            entrepot.actualiser(st.session_state.db_entries, df)
+        annees_bilan = entrepot.annees
+        annee_analyse = annees_bilan[-1]
+        if len(annees_bilan) > 1:
+            annee_ref = int(st.session_state.params.get('annee_reporting', annee_analyse))
+            annee_analyse = st.selectbox("📅 Année analysée", annees_bilan[::-1],
+                                         index=annees_bilan[::-1].index(annee_ref) if annee_ref in annees_bilan else 0,
+                                         help="Le journal contient plusieurs années : KPIs et graphes portent sur l'année choisie.")
+            df = df[(historique.annees_flux(df) == annee_analyse).to_numpy()]
+
+        # --- MOTEUR DE CALCUL DES KPIs (voir calculs.py) ---
+        with chrono.span("Contrôle Qualité"):
+            drapeaux = qualite.analyser(df)
+        with chrono.span("KPIs"):
+            kpis = calculer_kpis(df, st.session_state.params, drapeaux)
+        total_co2_t = kpis["total_co2_t"]
+        total_marge_t = kpis["total_marge_t"]
+        ratio_pers = kpis["ratio_pers"]
+        budget_cible = kpis["budget_cible"]
+        cout_carbone = kpis["cout_carbone"]
+        dqi_score = kpis["dqi_score"]
 
         # --- ZONE 1 : CONTROL TOWER (Tes 8 KPIs conservés) ---
         st.markdown("### 🎛️ Control Tower")
@@ -817,25 +1407,22 @@ elif "3." in nav:
         
         k3.metric("Coût Fantôme (Risque)", f"{cout_carbone:,.0f} €", f"Prix: {st.session_state.params['shadow_price']}€/T")
         
-        intensite_jour = (total_co2_t * 1000) / st.session_state.params['jours_ouverture']
-        k4.metric("Intensité Quotidienne", f"{intensite_jour:.0f} kgCO2e/j", "Jours ouvrés")
+        k4.metric("Intensité Quotidienne", f"{kpis['intensite_jour']:.0f} kgCO2e/j", "Jours ouvrés")
 
         # LIGNE 2 : PERFORMANCE SUPPLY CHAIN
         k5, k6, k7, k8 = st.columns(4)
         
-        # AMÉLIORATION ICI : On utilise la nouvelle colonne Scope pour être plus précis
-        scope3_items = df[df['Scope'] == 'Scope 3']['Impact_kgCO2'].sum() / 1000
-        part_scope3 = (scope3_items / total_co2_t) * 100 if total_co2_t > 0 else 0
-        
-        k5.metric("Part du Scope 3", f"{part_scope3:.1f} %", "Dépendance Extérieure")
+        k5.metric("Part du Scope 3", f"{kpis['part_scope3']:.1f} %", "Dépendance Extérieure")
         
         dqi_color = "normal" if dqi_score > 7 else "inverse"
-        k6.metric("Indice Qualité Donnée (DQI)", f"{dqi_score:.1f} / 10", "Fiabilité", delta_color=dqi_color)
+        nb_suspects = kpis["nb_doublons"] + kpis["nb_quasi_doublons"] + kpis["nb_aberrants"]
+        k6.metric("Indice Qualité Donnée (DQI)", f"{dqi_score:.1f} / 10",
+                  f"{nb_suspects} ligne(s) suspecte(s)" if nb_suspects else "Fiabilité", delta_color=dqi_color,
+                  help="Incertitude déclarée, pénalisée par la part d'impact en doublon ou atypique (onglet 🧪 Qualité).")
         
         k7.metric("Nombre de Flux", len(df), "Lignes saisies")
         
-        bat_impact = df[df['Catégorie'] == 'Bâtiment']['Impact_kgCO2'].sum()
-        k8.metric("Impact Bâtiment Seul", f"{bat_impact/1000:.1f} T", "Scope 1 & 2")
+        k8.metric("Impact Bâtiment Seul", f"{kpis['bat_impact_t']:.1f} T", "Scope 1 & 2")
 
         st.divider()
 
@@ -843,7 +1430,7 @@ elif "3." in nav:
         st.markdown("### 🔭 Analyse Visuelle & Stratégique")
         
         # AJOUT de l'onglet "🏗️ Scopes (ISO)" dans la liste
-        t_rep, t_scope, t_pareto, t_matrix, t_pop = st.tabs(["🍩 Répartition", "🏗️ Scopes (ISO)", "📉 Pareto (80/20)", "🎯 Matrice Priorité", "👥 Par Population"])
+        t_rep, t_scope, t_pareto, t_matrix, t_pop, t_qual, t_hist = st.tabs(["🍩 Répartition", "🏗️ Scopes (ISO)", "📉 Pareto (80/20)", "🎯 Matrice Priorité", "👥 Par Population", "🧪 Qualité Donnée", "📅 Historique N/N-1"])
         
         # GRAPHE 1 : DONUT (Amélioré par rapport au Pie Chart classique)
         with t_rep:
@@ -856,7 +1443,7 @@ elif "3." in nav:
                     order=alt.Order("Impact_kgCO2", sort="descending"),
                     tooltip=["Catégorie", alt.Tooltip("Impact_kgCO2", format=".1f")]
                 ).properties(title="Répartition par Grand Poste")
-                st.altair_chart(chart_donut, use_container_width=True)
+                afficher_graphe(chart_donut, "Répartition")
             
             with c2:
                 st.markdown("**Top 3 Contributeurs :**")
@@ -873,19 +1460,17 @@ elif "3." in nav:
                 color=alt.Color('Scope', scale=alt.Scale(domain=['Scope 1', 'Scope 2', 'Scope 3'], range=['#e74c3c', '#f1c40f', '#3498db'])),
                 tooltip=['Scope', 'sum(Impact_kgCO2)']
             ).properties(height=300)
-            st.altair_chart(bar_scope, use_container_width=True)
+            afficher_graphe(bar_scope, "Scopes")
 
         # GRAPHE 3 : PARETO (Ton code original)
         with t_pareto:
             st.caption("Le diagramme de Pareto permet d'identifier les 'Vital Few' : les 20% d'actions qui génèrent 80% de l'impact.")
-            df_pareto = df.groupby("Item")["Impact_kgCO2"].sum().reset_index().sort_values("Impact_kgCO2", ascending=False)
-            df_pareto["Cumul"] = df_pareto["Impact_kgCO2"].cumsum()
-            df_pareto["Cumul_Pct"] = df_pareto["Cumul"] / df_pareto["Impact_kgCO2"].sum()
+            df_pareto = table_pareto(df)
             
             base = alt.Chart(df_pareto.head(10)).encode(x=alt.X('Item', sort=None))
             bars = base.mark_bar().encode(y='Impact_kgCO2', tooltip=['Item', 'Impact_kgCO2'])
             line = base.mark_line(color='red').encode(y='Cumul_Pct', tooltip=[alt.Tooltip('Cumul_Pct', format='.0%')])
-            st.altair_chart((bars + line).resolve_scale(y='independent'), use_container_width=True)
+            afficher_graphe((bars + line).resolve_scale(y='independent'), "Pareto")
 
         # GRAPHE 4 : MATRICE (Ton code original)
         with t_matrix:
@@ -897,7 +1482,7 @@ elif "3." in nav:
                 color='Catégorie',
                 tooltip=['Item', 'Impact_kgCO2', 'Incertitude', 'Détail']
             ).interactive()
-            st.altair_chart(scatter, use_container_width=True)
+            afficher_graphe(scatter, "Matrice")
 
         # GRAPHE 5 : POPULATION (Ton code original)
         with t_pop:
@@ -909,29 +1494,109 @@ elif "3." in nav:
                     color='Catégorie',
                     tooltip=['Détail', 'Impact_kgCO2']
                 )
-                st.altair_chart(chart_pop, use_container_width=True)
+                afficher_graphe(chart_pop, "Population")
             else:
                 st.info("Pas assez de données de mobilité pour ce graphique.")
 
+        # GRAPHE 6 : CONTRÔLE QUALITÉ (doublons & valeurs aberrantes, voir qualite.py)
+        with t_qual:
+            st.caption(f"Doublons exacts (hors date), quasi-doublons (même poste, impact à ±{qualite.TOLERANCE_QUASI:.0%}) "
+                       f"et valeurs atypiques (z-score robuste > {qualite.SEUIL_Z} par Catégorie/Item).")
+            q1, q2, q3, q4 = st.columns(4)
+            q1.metric("Doublons exacts", kpis["nb_doublons"])
+            q2.metric("Quasi-doublons", kpis["nb_quasi_doublons"])
+            q3.metric("Valeurs atypiques", kpis["nb_aberrants"])
+            q4.metric("Impact suspect", f"{kpis['part_suspecte']:.1%}", "Pénalité DQI", delta_color="off")
+            suspects = df.join(drapeaux[["motif", "z_quantite", "z_unitaire"]])[drapeaux["motif"] != ""]
+            if suspects.empty:
+                st.success("✅ Aucun doublon ni valeur atypique détecté.")
+            else:
+                st.dataframe(suspects.sort_values("Impact_kgCO2", ascending=False)[
+                    ["motif", "Catégorie", "Item", "Quantité", "Impact_kgCO2", "z_quantite", "z_unitaire", "Détail"]],
+                    column_config={"motif": "Contrôle",
+                                   "Impact_kgCO2": st.column_config.NumberColumn("Impact (kgCO2e)", format="%.1f kg"),
+                                   "z_quantite": st.column_config.NumberColumn("z Quantité", format="%.1f"),
+                                   "z_unitaire": st.column_config.NumberColumn("z Impact/unité", format="%.1f")},
+                    use_container_width=True)
+                st.caption("Corrigez ou supprimez ces lignes depuis le Journal des Flux (étape 2), l'opération est annulable.")
+
+        # GRAPHE 7 : HISTORIQUE PLURIANNUEL (cube annuel précalculé, voir historique.py)
+        with t_hist:
+            totaux = entrepot.totaux()
+            chart_annees = alt.Chart(totaux.reset_index()).mark_bar(cornerRadius=5).encode(
+                x=alt.X("Année:O", title=None),
+                y=alt.Y("Impact_t:Q", title="T CO2e"),
+                color=alt.condition(alt.datum.Année == annee_analyse, alt.value("#e74c3c"), alt.value("#95a5a6")),
+                tooltip=["Année:O", alt.Tooltip("Impact_t:Q", format=".2f"), alt.Tooltip("Marge_t:Q", format=".2f"), "Flux:Q"]
+            ).properties(height=250, title="Empreinte par année de reporting")
+            afficher_graphe(chart_annees, "Historique")
+
+            if len(annees_bilan) < 2:
+                st.info(f"Une seule année dans le journal ({annee_analyse}). Importez un bilan passé ci-dessous pour comparer.")
+            else:
+                c_h1, c_h2, c_h3 = st.columns(3)
+                niveau = c_h1.radio("Niveau", list(historique.NIVEAUX), horizontal=True)
+                precedentes = [a for a in annees_bilan if a != annee_analyse]
+                annee_comp = c_h2.selectbox("Comparer à", precedentes[::-1])
+                c_h3.metric(f"Écart {annee_analyse} vs {annee_comp}",
+                            f"{totaux.loc[annee_analyse, 'Impact_t']:.2f} T",
+                            f"{totaux.loc[annee_analyse, 'Impact_t'] - totaux.loc[annee_comp, 'Impact_t']:+.2f} T", delta_color="inverse")
+                with chrono.span("Écarts N/N-1"):
+                    ecarts = entrepot.ecarts_longs(niveau, annee_analyse, annee_comp)
+                st.dataframe(ecarts, hide_index=True, use_container_width=True, column_config={
+                    "Référence": st.column_config.NumberColumn(f"{annee_comp} (T)", format="%.2f"),
+                    "Année": st.column_config.NumberColumn(f"{annee_analyse} (T)", format="%.2f"),
+                    "Écart": st.column_config.NumberColumn("Écart (T)", format="%+.2f"),
+                    "Écart %": st.column_config.NumberColumn(format="percent"),
+                })
+                with st.expander("🗓️ Toutes les années (T CO2e et écarts annuels)"):
+                    valeurs, deltas, _ = entrepot.comparer(niveau)
+                    valeurs, deltas = valeurs.rename(columns=str), deltas.rename(columns=lambda a: f"Δ {a}")
+                    st.dataframe(valeurs.join(deltas).style.format("{:.2f}", subset=list(valeurs.columns))
+                                 .format("{:+.2f}", subset=list(deltas.columns)), use_container_width=True)
+
+            # Import d'un bilan passé (fichier de sauvegarde JSON) rattaché à une année
+            with st.expander("📥 Archiver un bilan passé"):
+                c_a1, c_a2 = st.columns([2, 1])
+                fichier_passe = c_a1.file_uploader("Sauvegarde JSON d'une année précédente", type=["json"], key="up_historique")
+                annee_passee = c_a2.number_input("Année du bilan", 2000, 2100, int(annee_analyse) - 1)
+                st.caption("Les flux de cette année déjà présents dans le journal sont remplacés (opération annulable).")
+                if fichier_passe is not None and st.button(f"📚 Archiver comme bilan {annee_passee}"):
+                    flux_passes = json.load(fichier_passe).get("db", [])
+                    conserves = [e for e, a in zip(st.session_state.db_entries, historique.annees_flux(
+                        historique.journal_en_dataframe(st.session_state.db_entries))) if a != annee_passee]
+                    nouveau_journal = conserves + [dict(e, Année=int(annee_passee)) for e in flux_passes]
+                    if budget_respecte(memoire.octets_journal(nouveau_journal)):
+                        st.session_state.audit.restauration(st.session_state.db_entries, st.session_state.params, st.session_state.params,
+                                                            nouveau_journal, f"Bilan {annee_passee} ({fichier_passe.name})")
+                        st.toast(f"📚 {len(flux_passes)} flux archivés pour {annee_passee}")
+                        st.rerun()
+
         # --- ZONE 3 : EXPORT & RAPPORT (Ta section originale avec xlsxwriter) ---
         st.divider()
         st.subheader("📄 Export & Reporting")
         
         col_ex1, col_ex2 = st.columns(2)
         with col_ex1:
-            st.info("💡 **Pour générer un PDF :** Utilisez la fonction 'Imprimer' de votre navigateur (Ctrl+P) et choisissez 'Enregistrer au format PDF'.")
+            st.info("💡 **Pour générer un PDF :** Rendez-vous à l'étape 5 'CONTRÔLER' (bouton 'Générer le Rapport PDF').")
             
         with col_ex2:
-            buffer_analyse = io.BytesIO()
-            with pd.ExcelWriter(buffer_analyse, engine='xlsxwriter') as writer:
-                df.to_excel(writer, index=False, sheet_name='Données Calculées')
-                
-            st.download_button(
-                label="📥 Télécharger Données (.xlsx)",
-                data=buffer_analyse,
-                file_name=f"Donnees_Analyse_{datetime.date.today()}.xlsx",
-                mime="application/vnd.ms-excel"
-            )
+            # Export en tâche de fond : à 100k flux l'écriture xlsx prend plusieurs secondes
+            from calculs import classeur_excel
+            params_export = {"annee": int(annee_analyse)}
+            tache_xlsx = ordonnanceur().obtenir("excel_donnees", version_journal(), params_export)
+            if tache_xlsx is None or tache_xlsx.annulee:
+                if st.button("⚙️ Préparer l'export Excel (.xlsx)", use_container_width=True):
+                    ordonnanceur().soumettre("excel_donnees", version_journal(), classeur_excel, {'Données Calculées': df},
+                                             params=params_export, libelle="Export Excel (données)")
+                    st.rerun()
+            elif suivre_tache(tache_xlsx, "Export Excel"):
+                st.download_button(
+                    label="📥 Télécharger Données (.xlsx)",
+                    data=tache_xlsx.resultat,
+                    file_name=f"Donnees_Analyse_{datetime.date.today()}.xlsx",
+                    mime="application/vnd.ms-excel"
+                )
             
         with st.expander("Voir le Tableau de Synthèse Complet", expanded=False):
             st.dataframe(df, use_container_width=True)
@@ -939,7 +1604,11 @@ elif "3." in nav:
 # PAGE 4 : SIMULER (VERSION ROBUSTE V4)
 # ==============================================================================
 elif "4." in nav:
-    import altair as alt 
+    import numpy as np
+    import pandas as pd
+    import altair as alt
+    import scenarios
+    from calculs import LEVIERS_DEFAUT, baseline_simulateur, simuler_scenario
     
     st.title("🚀 Simulateur de Transition & Plan d'Action")
     st.markdown("Pilotez la décarbonation : Démographie, Distanciel et Leviers techniques.")
@@ -947,47 +1616,52 @@ elif "4." in nav:
     if not st.session_state.db_entries:
         st.warning("⚠️ Aucune donnée de référence. Veuillez saisir des flux à l'étape 2.")
     else:
-        # --- 1. CALCUL DE LA BASELINE (SITUATION 2026) ---
-        df_base = pd.DataFrame(st.session_state.db_entries)
-        df_base["Impact_kgCO2"] = pd.to_numeric(df_base["Impact_kgCO2"], errors='coerce').fillna(0)
-        
-        # --- CORRECTION DES LIAISONS (Recherche élargie) ---
-        # On s'assure de tout attraper, même si c'est écrit "Radiateur" ou "Fuel"
-        
-        # 1. MOBILITÉ
-        # On cherche dans Catégorie OU Item
-        mask_mob = df_base.apply(lambda x: any(k in str(x['Catégorie']).lower() for k in ['mobilit', 'logisti', 'transport', 'déplacement']) or any(k in str(x['Item']).lower() for k in ['voiture', 'train', 'avion', 'tgv', 'bus']), axis=1)
-        ref_mob = df_base[mask_mob]['Impact_kgCO2'].sum()
-
-        # 2. BÂTIMENT & ÉNERGIE
-        # On sépare l'Élec du Chauffage pour appliquer les bons leviers
-        df_bat = df_base[df_base.apply(lambda x: any(k in str(x['Catégorie']).lower() for k in ['bâtiment', 'batiment', 'énergie', 'energie']), axis=1)]
-        
-        ref_ener_elec = 0.0
-        ref_ener_heat = 0.0
-        
-        for i, row in df_bat.iterrows():
-            txt = (str(row['Item']) + " " + str(row['Détail'])).lower()
-            # Si ça parle de Watt, KWh, Elec, Ampoule -> C'est de l'élec
-            if any(k in txt for k in ['elec', 'élec', 'watt', 'kwh', 'led', 'ampoule', 'ordinateur', 'ecran']):
-                ref_ener_elec += row['Impact_kgCO2']
-            else:
-                # Tout le reste du bâtiment est considéré comme du chauffage (Gaz, Fioul, Radiateur, Eau chaude...)
-                ref_ener_heat += row['Impact_kgCO2']
-
-        # 3. IT & RESSOURCES
-        mask_it = df_base['Catégorie'].str.contains("Numérique|IT|Informatique|Digital", case=False, na=False)
-        ref_it = df_base[mask_it]['Impact_kgCO2'].sum()
-        
-        mask_food = df_base.apply(lambda x: any(k in str(x['Item']).lower() for k in ['repas', 'café', 'boisson', 'snack', 'restau']), axis=1)
-        ref_food = df_base[mask_food]['Impact_kgCO2'].sum()
-        
-        mask_waste = df_base['Catégorie'].str.contains("Déchet|Achat|Fourniture", case=False, na=False)
-        ref_waste = df_base[mask_waste]['Impact_kgCO2'].sum()
-        
-        total_ref = df_base["Impact_kgCO2"].sum()
+        # --- 1. CALCUL DE LA BASELINE (ANNÉE DE RÉFÉRENCE, voir calculs.py) ---
+        import historique
+        entries_base = st.session_state.db_entries
+        if "historique" not in st.session_state:
+            st.session_state.historique = historique.EntrepotHistorique()
+        with chrono.span("Cube Annuel"):
+            st.session_state.historique.actualiser(entries_base)
+        annees_bilan = st.session_state.historique.annees
+        annee_base = annees_bilan[-1]
+        if len(annees_bilan) > 1:
+            annee_ref = int(st.session_state.params.get('annee_reporting', annees_bilan[-1]))
+            annee_base = st.selectbox("📅 Année de référence (baseline)", annees_bilan[::-1],
+                                      index=annees_bilan[::-1].index(annee_ref) if annee_ref in annees_bilan else 0,
+                                      help="Le simulateur part du bilan de l'année choisie.")
+            entries_base = historique.filtrer_annee(entries_base, annee_base)
+        # Registre du parc IT : courbes de réponse aux leviers (recalculées si l'année ou les facteurs changent)
+        parc = st.session_state.get("parc_it")
+        cle_parc = None
+        if parc is not None:
+            import parc_it
+            cle_parc = (parc["cle"], int(annee_base), *(st.session_state.params[c] for c in parc_it.TYPES.values()))
+            if parc.get("cle_courbes") != cle_parc:
+                parc["courbes"] = parc_it.courbes_leviers(parc["registre"], st.session_state.params, int(annee_base))
+                parc["cle_courbes"] = cle_parc
+        # Baseline flux par flux recalculée seulement quand le journal (ou l'année, ou le registre) change
+        cle_base = (id(st.session_state.db_entries), st.session_state.db_entries.revision, annee_base if len(annees_bilan) > 1 else None, cle_parc)
+        if st.session_state.get("baseline_cache", (None,))[0] != cle_base:
+            # Tâche de fond : les petits journaux répondent dans le délai d'attente, les gros affichent une progression
+            tache_base = ordonnanceur().soumettre("baseline", version_journal(), baseline_simulateur, entries_base,
+                                                  parc=parc["courbes"] if parc is not None else None,
+                                                  params={"annee": annee_base, "parc": cle_parc}, libelle="Baseline simulateur")
+            with chrono.span("Baseline (masques NumPy)"):
+                pret = suivre_tache(tache_base, "Calcul de la baseline", delai=0.5)
+            if not pret:
+                st.stop()
+            st.session_state.baseline_cache = (cle_base, tache_base.resultat)
+        base = st.session_state.baseline_cache[1]
+        total_ref = base["total_ref"]
 
         # --- 2. TABLEAU DE BORD DES LEVIERS ---
+        # Positions conservées hors de la page : Streamlit oublie l'état des widgets non affichés
+        if "leviers" not in st.session_state:
+            st.session_state.leviers = dict(LEVIERS_DEFAUT)
+        for cle_levier, position in st.session_state.leviers.items():
+            st.session_state.setdefault(cle_levier, position)
+
         with st.container(border=True):
             st.subheader("🎛️ Cockpit de Pilotage")
             
@@ -997,108 +1671,72 @@ elif "4." in nav:
             # ONGLET 1 : STRATÉGIE
             with t_strat:
                 c1, c2 = st.columns(2)
-                sim_pop_growth = c1.slider("📈 Évolution Effectifs", -20, 50, 0, format="%+d%%", help="Impact structurel de la croissance de l'école.")
-                sim_remote_days = c2.slider("💻 Jours en Distanciel / sem", 0, 5, 0, format="%d j", help="Agit massivement sur les trajets domicile-travail.")
+                sim_pop_growth = c1.slider("📈 Évolution Effectifs", -20, 50, format="%+d%%", key="sim_pop_growth", help="Impact structurel de la croissance de l'école.")
+                sim_remote_days = c2.slider("💻 Jours en Distanciel / sem", 0, 5, format="%d j", key="sim_remote_days", help="Agit massivement sur les trajets domicile-travail.")
                 st.caption(f"Note : Le distanciel réduit les trajets quotidiens de {sim_remote_days*20}% mécaniquement.")
 
             # ONGLET 2 : MOBILITÉ (J'ai remis ton slider de Sobriété !)
             with t_mob:
                 c1, c2 = st.columns(2)
-                sim_mob_reduce = c1.slider("📉 Sobriété Km (Réduction Volontaire)", 0, 50, 0, format="-%d%%", help="Ex: Moins de voyages, optimisation des tournées.")
-                sim_mob_train = c2.checkbox("🚆 Report Modal (Interdiction Avion)", help="Bascule les trajets avion vers le train.")
-                sim_mob_carpool = c1.slider("🚙 Taux Covoiturage", 1.0, 4.0, 1.0, step=0.1, help="Nb pers. / voiture.")
-                sim_mob_soft = c2.checkbox("🚲 Plan Vélo (Trajets courts)", help="Report de 15% des trajets voiture vers vélo.")
+                sim_mob_reduce = c1.slider("📉 Sobriété Km (Réduction Volontaire)", 0, 50, format="-%d%%", key="sim_mob_reduce", help="Ex: Moins de voyages, optimisation des tournées.")
+                sim_mob_train = c2.checkbox("🚆 Report Modal (Interdiction Avion)", key="sim_mob_train", help="Bascule les trajets avion vers le train.")
+                sim_mob_carpool = c1.slider("🚙 Taux Covoiturage", 1.0, 4.0, step=0.1, key="sim_mob_carpool", help="Nb pers. / voiture.")
+                sim_mob_soft = c2.checkbox("🚲 Plan Vélo (Trajets courts)", key="sim_mob_soft", help="Report de 15% des trajets voiture vers vélo.")
 
             # ONGLET 3 : BÂTIMENT
             with t_bat:
                 c1, c2 = st.columns(2)
-                sim_elec_green = c1.checkbox("⚡ Contrat Électricité Verte", help="Passe le facteur d'émission élec proche de 0.")
-                sim_solar = c1.slider("☀️ Panneaux Solaires (Autoconsommation)", 0, 50, 0, format="%d%% besoin")
-                sim_heat = c2.slider("🔥 Isolation & Sobriété (19°C)", 0, 50, 0, format="-%d%%", help="Agit sur le Chauffage/Radiateurs.")
-                sim_led = c2.checkbox("💡 Relamping LED Total", help="-50% sur l'éclairage.")
+                sim_elec_green = c1.checkbox("⚡ Contrat Électricité Verte", key="sim_elec_green", help="Passe le facteur d'émission élec proche de 0.")
+                sim_solar = c1.slider("☀️ Panneaux Solaires (Autoconsommation)", 0, 50, format="%d%% besoin", key="sim_solar")
+                sim_heat = c2.slider("🔥 Isolation & Sobriété (19°C)", 0, 50, format="-%d%%", key="sim_heat", help="Agit sur le Chauffage/Radiateurs.")
+                sim_led = c2.checkbox("💡 Relamping LED Total", key="sim_led", help="-50% sur l'éclairage.")
 
             # ONGLET 4 : IT & RESSOURCES
             with t_res:
                 c1, c2 = st.columns(2)
-                sim_it_life = c1.slider("⏳ Durée de vie IT (+ années)", 0, 5, 0, help="Garder les PC plus longtemps.")
-                sim_it_refurb = c1.slider("♻️ Part d'achat Reconditionné", 0, 100, 0, format="%d%%")
-                sim_food_vege = c2.slider("🥗 Menus Végétariens", 0, 100, 0, format="%d%% repas")
-                sim_waste = c2.slider("🗑️ Réduction Déchets", 0, 50, 0, format="-%d%%")
+                sim_it_life = c1.slider("⏳ Durée de vie IT (+ années)", 0, 5, key="sim_it_life", help="Garder les PC plus longtemps.")
+                sim_it_refurb = c1.slider("♻️ Part d'achat Reconditionné", 0, 100, format="%d%%", key="sim_it_refurb")
+                if base.get("parc") is not None and base["lignes"]["parc"].any():
+                    courbes = base["parc"]
+                    equipements = f"{courbes['equipements']:,.0f}".replace(",", " ")
+                    c1.caption(f"🗂️ Registre : {equipements} équipements, âge moyen {courbes['age_moyen']:.1f} ans, "
+                               f"{courbes['r0']:.0%} reconditionnés — amortissement {courbes['horizon']} "
+                               f"×{float(parc_it.facteur_parc(courbes, sim_it_life, sim_it_refurb / 100)):.2f} vs statu quo.")
+                sim_food_vege = c2.slider("🥗 Menus Végétariens", 0, 100, format="%d%% repas", key="sim_food_vege")
+                sim_waste = c2.slider("🗑️ Réduction Déchets", 0, 50, format="-%d%%", key="sim_waste")
 
         # --- 3. MOTEUR DE CALCUL ---
-        
-        # A. FACTEUR DÉMOGRAPHIQUE
-        coeff_pop = 1 + (sim_pop_growth / 100.0)
-        
-        # B. CALCUL MOBILITÉ
-        # 1. Effet Pop
-        mob_v1 = ref_mob * coeff_pop 
-        # 2. Effet Distanciel (1j = 20% de moins)
-        ratio_pres = (5 - sim_remote_days) / 5.0
-        mob_v2 = mob_v1 * ratio_pres
-        # 3. Effet Sobriété Km (Le levier que tu voulais garder)
-        mob_v3 = mob_v2 * (1 - sim_mob_reduce/100.0)
-        
-        # 4. Report Train (sur part avion estimée)
-        part_avion = mob_v3 * 0.30 
-        gain_train = (part_avion * 0.90) if sim_mob_train else 0
-        mob_v4 = mob_v3 - gain_train
-        
-        # 5. Covoit & Vélo
-        mob_v5 = mob_v4 / sim_mob_carpool
-        gain_velo = mob_v5 * 0.15 if sim_mob_soft else 0
-        
-        final_mob = mob_v5 - gain_velo
-        gain_total_mob = (ref_mob * coeff_pop) - final_mob
-
-        # C. CALCUL ÉNERGIE
-        ener_elec_v1 = ref_ener_elec * coeff_pop
-        ener_heat_v1 = ref_ener_heat * coeff_pop
-        
-        # Chauffage (Isolation) -> Agit sur Gaz, Fioul ET Radiateurs
-        final_heat = ener_heat_v1 * (1 - sim_heat/100.0)
-        
-        # Élec
-        elec_v2 = ener_elec_v1 * 0.90 if sim_led else ener_elec_v1
-        elec_v3 = elec_v2 * (1 - sim_solar/100.0)
-        final_elec = elec_v3 * 0.10 if sim_elec_green else elec_v3
-        
-        gain_total_ener = (ener_elec_v1 + ener_heat_v1) - (final_heat + final_elec)
-
-        # D. CALCUL RESSOURCES
-        it_v1 = ref_it * coeff_pop
-        food_v1 = ref_food * coeff_pop
-        waste_v1 = ref_waste * coeff_pop
-        
-        it_v2 = it_v1 / (1 + (sim_it_life / 4.0))
-        ratio_recond = (1 - sim_it_refurb/100) * 1.0 + (sim_it_refurb/100) * 0.2
-        final_it = it_v2 * ratio_recond
-        
-        final_food = food_v1 * (1 - sim_food_vege/100) + (food_v1 * sim_food_vege/100 * 0.15)
-        final_waste = waste_v1 * (1 - sim_waste/100.0)
-        
-        gain_total_res = (it_v1 + food_v1 + waste_v1) - (final_it + final_food + final_waste)
-
-        # E. SYNTHÈSE
-        total_ref_projete = total_ref * coeff_pop
-        total_final = final_mob + final_heat + final_elec + final_it + final_food + final_waste
+        leviers = {
+            'sim_pop_growth': sim_pop_growth, 'sim_remote_days': sim_remote_days,
+            'sim_mob_reduce': sim_mob_reduce, 'sim_mob_train': sim_mob_train,
+            'sim_mob_carpool': sim_mob_carpool, 'sim_mob_soft': sim_mob_soft,
+            'sim_elec_green': sim_elec_green, 'sim_solar': sim_solar,
+            'sim_heat': sim_heat, 'sim_led': sim_led,
+            'sim_it_life': sim_it_life, 'sim_it_refurb': sim_it_refurb,
+            'sim_food_vege': sim_food_vege, 'sim_waste': sim_waste,
+        }
+        st.session_state.leviers = leviers
+        with chrono.span("Moteur Leviers"):
+            res = simuler_scenario(base, leviers, st.session_state.params)
+        gain_total_mob = res["gain_total_mob"]
+        gain_total_ener = res["gain_total_ener"]
+        gain_total_res = res["gain_total_res"]
+        total_final = res["total_final"]
         
         # --- 4. VISUALISATION ---
         st.divider()
         st.subheader("📉 Trajectoire & Résultats 2030")
 
         k1, k2, k3, k4 = st.columns(4)
-        k1.metric("Référence 2026", f"{total_ref/1000:.1f} T")
+        k1.metric(f"Référence {annee_base}", f"{total_ref/1000:.1f} T")
         
-        delta_pop = total_ref_projete - total_ref
+        delta_pop = res["delta_pop"]
         k2.metric("Impact Démographique", f"{delta_pop/1000:+.1f} T", "Inertiel", delta_color="off")
         
-        total_economy = total_ref_projete - total_final
+        total_economy = res["total_economy"]
         k3.metric("Gains Actions", f"-{total_economy/1000:.1f} T", delta="Économie", delta_color="inverse")
         
-        pop_projete = (st.session_state.params['pop_etu'] + st.session_state.params['pop_alt'] + st.session_state.params['pop_prof']) * coeff_pop
-        if pop_projete == 0: pop_projete = 1
-        ratio_final = (total_final / 1000) / pop_projete
+        ratio_final = res["ratio_final"]
         cible = st.session_state.params['budget_co2']
         
         k4.metric("Atterrissage / Pers.", f"{ratio_final:.2f} T", f"Cible: {cible} ({'✅' if ratio_final <= cible else '⚠️'})", delta_color="inverse")
@@ -1108,23 +1746,7 @@ elif "4." in nav:
         
         with g1:
             st.markdown("**🌊 Cascade des Gains (Waterfall)**")
-            wf_data = [
-                {"Etape": "1. Base 2026", "Val": total_ref/1000, "Type": "Base", "Order": 1},
-                {"Etape": "2. Effet Pop.", "Val": delta_pop/1000, "Type": "Hausse", "Order": 2},
-                {"Etape": "3. Gain Mobilité", "Val": -gain_total_mob/1000, "Type": "Baisse", "Order": 3},
-                {"Etape": "4. Gain Énergie", "Val": -gain_total_ener/1000, "Type": "Baisse", "Order": 4},
-                {"Etape": "5. Gain Ressources", "Val": -gain_total_res/1000, "Type": "Baisse", "Order": 5},
-                {"Etape": "6. Arrivée 2030", "Val": total_final/1000, "Type": "Final", "Order": 6}
-            ]
-            df_wf = pd.DataFrame(wf_data)
-            
-            df_wf["prev"] = df_wf["Val"].cumsum().shift(1).fillna(0)
-            df_wf["start"] = df_wf["prev"]
-            df_wf["end"] = df_wf["prev"] + df_wf["Val"]
-            df_wf.loc[df_wf["Type"] == "Base", "start"] = 0
-            df_wf.loc[df_wf["Type"] == "Base", "end"] = df_wf["Val"]
-            df_wf.loc[df_wf["Type"] == "Final", "start"] = 0
-            df_wf.loc[df_wf["Type"] == "Final", "end"] = df_wf["Val"]
+            df_wf = scenarios.cascade(res, annee_base)
             
             chart_wf = alt.Chart(df_wf).mark_bar().encode(
                 x=alt.X("Etape", sort=alt.SortField("Order"), axis=alt.Axis(labelAngle=-45)),
@@ -1133,7 +1755,7 @@ elif "4." in nav:
                 color=alt.Color("Type", scale=alt.Scale(domain=["Base", "Hausse", "Baisse", "Final"], range=["#95a5a6", "#e74c3c", "#27ae60", "#2c3e50"])),
                 tooltip=["Etape", alt.Tooltip("Val", format=".1f", title="Volume")]
             ).properties(height=350)
-            st.altair_chart(chart_wf, use_container_width=True)
+            afficher_graphe(chart_wf, "Cascade")
 
         with g2:
             st.markdown("**💰 Contribution des Gains**")
@@ -1150,59 +1772,175 @@ elif "4." in nav:
                     color=alt.Color("Source", scale=alt.Scale(scheme='set2')),
                     tooltip=["Source", alt.Tooltip("Gain", format=".1f")]
                 )
-                st.altair_chart(chart_donut, use_container_width=True)
+                afficher_graphe(chart_donut, "Contribution Gains")
             else:
                 st.caption("Activez des leviers pour voir la répartition des gains.")
+
+        # --- 5. BIBLIOTHÈQUE & COMPARAISON DE SCÉNARIOS (voir scenarios.py) ---
+        st.divider()
+        st.subheader("📚 Bibliothèque de Scénarios")
+        bibliotheque = st.session_state.params.get('scenarios', {})
+
+        def charger_scenario(nom):
+            # Rappel avant le rerun : les widgets reprennent les positions enregistrées
+            st.session_state.leviers = scenarios.normaliser(st.session_state.params['scenarios'][nom])
+            for cle_levier, position in st.session_state.leviers.items():
+                st.session_state[cle_levier] = position
+
+        c_s1, c_s2 = st.columns(2)
+        with c_s1.form("enregistrer_scenario", clear_on_submit=True):
+            nom_scenario = st.text_input("Nom du scénario", placeholder="Ex : Plan Vélo + LED")
+            if st.form_submit_button("💾 Enregistrer le réglage courant") and nom_scenario.strip():
+                scenarios.enregistrer(st.session_state.params, nom_scenario.strip(), leviers)
+                st.toast(f"💾 Scénario « {nom_scenario.strip()} » enregistré (inclus dans la sauvegarde JSON)")
+                st.rerun()
+        with c_s2:
+            if bibliotheque:
+                nom_choisi = st.selectbox("Scénarios enregistrés", list(bibliotheque))
+                c_b1, c_b2 = st.columns(2)
+                c_b1.button("📂 Charger", on_click=charger_scenario, args=(nom_choisi,), use_container_width=True)
+                if c_b2.button("🗑️ Supprimer", use_container_width=True):
+                    scenarios.supprimer(st.session_state.params, nom_choisi)
+                    st.rerun()
+            else:
+                st.info("Aucun scénario enregistré : réglez les leviers puis donnez-leur un nom.")
+
+        if bibliotheque:
+            choix = st.multiselect("Scénarios à comparer", list(bibliotheque), default=list(bibliotheque)[:4])
+            a_comparer = {scenarios.SCENARIO_COURANT: leviers, **{n: bibliotheque[n] for n in choix}}
+            if "cache_scenarios" not in st.session_state:
+                st.session_state.cache_scenarios = scenarios.CacheScenarios()
+            with chrono.span("Comparaison Scénarios (lot)"):
+                comparaison = st.session_state.cache_scenarios.comparer(base, a_comparer, st.session_state.params)
+
+            synthese_sc = pd.DataFrame({
+                "Arrivée 2030 (T)": comparaison["total_final"] / 1000,
+                "Gain Mobilité (T)": comparaison["gain_total_mob"] / 1000,
+                "Gain Énergie (T)": comparaison["gain_total_ener"] / 1000,
+                "Gain Ressources (T)": comparaison["gain_total_res"] / 1000,
+                "T / pers.": comparaison["ratio_final"],
+                "Cible": np.where(comparaison["ratio_final"] <= cible, "✅", "⚠️"),
+                "Leviers vs réglage courant": pd.Series(scenarios.differences(a_comparer, scenarios.SCENARIO_COURANT)),
+            })
+            st.dataframe(synthese_sc, use_container_width=True, column_config={
+                c: st.column_config.NumberColumn(format="%.2f") for c in synthese_sc.columns[:5]})
+
+            c_w, c_g = st.columns([3, 2])
+            with c_w:
+                chart_wfs = alt.Chart(scenarios.cascades(comparaison, annee_base)).mark_bar().encode(
+                    x=alt.X("Etape", sort=alt.SortField("Order"), axis=alt.Axis(labelAngle=-45, title=None)),
+                    y=alt.Y("start", title="Tonnes CO2e"),
+                    y2="end",
+                    color=alt.Color("Type", scale=alt.Scale(domain=["Base", "Hausse", "Baisse", "Final"], range=["#95a5a6", "#e74c3c", "#27ae60", "#2c3e50"]), legend=None),
+                    tooltip=["Scénario", "Etape", alt.Tooltip("Val", format=".1f", title="Volume")]
+                ).properties(width=180, height=260).facet(column=alt.Column("Scénario", title=None, sort=list(a_comparer)))
+                afficher_graphe(chart_wfs, "Cascades Scénarios")
+            with c_g:
+                gains_sc = (comparaison[list(scenarios.POSTES_GAINS)].rename(columns=scenarios.POSTES_GAINS) / 1000).rename_axis("Scénario").reset_index()
+                chart_gains = alt.Chart(gains_sc.melt("Scénario", var_name="Source", value_name="Gain")).mark_bar().encode(
+                    y=alt.Y("Scénario", sort=list(a_comparer), title=None),
+                    x=alt.X("Gain", title="Gains (T CO2e)"),
+                    color=alt.Color("Source", scale=alt.Scale(scheme='set2')),
+                    tooltip=["Scénario", "Source", alt.Tooltip("Gain", format=".2f")]
+                ).properties(height=260)
+                afficher_graphe(chart_gains, "Gains Scénarios")
+
+        # --- 5. ANALYSES AVANCÉES (MULTI-CŒURS) ---
+        st.divider()
+        st.subheader("🎲 Analyses Avancées (multi-cœurs)")
+        import parallele
+        moteur = moteur_parallele()
+        st.caption(f"{moteur.workers} cœur(s) ; journal partagé entre processus au-delà de {parallele.SEUIL_PARALLELE:,} flux "
+                   f"({'actif' if moteur.parallele(base) else 'calcul local'} pour ces {len(base['lignes']['impact']):,} flux).".replace(",", " "))
+        t_mc, t_sens, t_grille = st.tabs(["🎲 Monte Carlo (incertitude)", "🌪️ Sensibilité des leviers", "🔢 Grille de scénarios"])
+
+        with t_mc:
+            c_m1, c_m2 = st.columns([3, 1])
+            tirages = c_m1.select_slider("Nombre de tirages", [200, 500, 1000, 2000, 5000], value=1000)
+            params_mc = {"leviers": leviers, "tirages": tirages, "params": st.session_state.params}
+            if c_m2.button("▶️ Lancer", key="lancer_mc", use_container_width=True):
+                ordonnanceur().soumettre("monte_carlo", base["version"], moteur.monte_carlo, base, leviers, st.session_state.params,
+                                         tirages=tirages, params=params_mc, libelle="Monte Carlo")
+            tache_mc = ordonnanceur().obtenir("monte_carlo", base["version"], params_mc)
+            if tache_mc is not None and suivre_tache(tache_mc, "Monte Carlo"):
+                tirages_mc = tache_mc.resultat
+                q = parallele.quantiles(tirages_mc)
+                m1, m2, m3 = st.columns(3)
+                m1.metric(f"Référence {annee_base} (P50)", f"{q.loc['Référence', 'P50']:.1f} T", f"IC 90 % : {q.loc['Référence', 'P5']:.1f} – {q.loc['Référence', 'P95']:.1f} T", delta_color="off")
+                m2.metric("Arrivée 2030 (P50)", f"{q.loc['Final', 'P50']:.1f} T", f"IC 90 % : {q.loc['Final', 'P5']:.1f} – {q.loc['Final', 'P95']:.1f} T", delta_color="off")
+                pop_2030 = res["total_final"] / 1000 / res["ratio_final"] if res["ratio_final"] else 1
+                m3.metric("Probabilité d'atteindre la cible", f"{(tirages_mc['Final'] / 1000 / pop_2030 <= cible).mean():.0%}",
+                          f"Cible : {cible} T / pers.", delta_color="off")
+                chart_mc = alt.Chart((tirages_mc[["Référence", "Final"]] / 1000).melt(var_name="Bilan", value_name="Tonnes")).mark_area(opacity=0.5, interpolate="step").encode(
+                    x=alt.X("Tonnes:Q", bin=alt.Bin(maxbins=60), title="Tonnes CO2e"),
+                    y=alt.Y("count()", stack=None, title="Tirages"),
+                    color=alt.Color("Bilan", scale=alt.Scale(range=["#95a5a6", "#2c3e50"]))
+                ).properties(height=260)
+                afficher_graphe(chart_mc, "Distribution Monte Carlo")
+                st.dataframe(parallele.quantiles(tirages_mc, ["Référence", "Final", *parallele.SCOPES_CODES]),
+                             use_container_width=True, column_config={c: st.column_config.NumberColumn(format="%.2f T") for c in ["P5", "P50", "P95"]})
+
+        with t_sens:
+            params_sens = {"leviers": leviers, "params": st.session_state.params}
+            if st.button("▶️ Balayer tous les leviers", key="lancer_sens"):
+                ordonnanceur().soumettre("sensibilite", base["version"], moteur.sensibilite, base, leviers, st.session_state.params,
+                                         params=params_sens, libelle="Sensibilité leviers")
+            tache_sens = ordonnanceur().obtenir("sensibilite", base["version"], params_sens)
+            if tache_sens is not None and suivre_tache(tache_sens, "Sensibilité"):
+                _, tornade = tache_sens.resultat
+                tornade = tornade[tornade["Amplitude"] > 0].melt(["Levier", "Amplitude"], ["Mini", "Maxi"], var_name="Borne", value_name="Écart (t)")
+                chart_tornade = alt.Chart(tornade).mark_bar().encode(
+                    y=alt.Y("Levier", sort=alt.SortField("Amplitude", order="descending"), title=None),
+                    x=alt.X("Écart (t)", title="Écart au réglage courant (T CO2e, bornes du levier)"),
+                    color=alt.condition(alt.datum["Écart (t)"] > 0, alt.value("#e74c3c"), alt.value("#27ae60")),
+                    tooltip=["Levier", "Borne", alt.Tooltip("Écart (t)", format=".2f")]
+                ).properties(height=320)
+                afficher_graphe(chart_tornade, "Tornade Sensibilité")
+
+        with t_grille:
+            c_g1, c_g2 = st.columns(2)
+            axe_x = c_g1.selectbox("Levier (axe X)", list(parallele.PLAGES_LEVIERS), index=list(parallele.PLAGES_LEVIERS).index('sim_heat'))
+            axe_y = c_g2.selectbox("Levier (axe Y)", [k for k in parallele.PLAGES_LEVIERS if k != axe_x], index=0)
+            pas_grille = st.slider("Positions par levier", 3, 21, 11, step=2)
+
+            def valeurs_axe(cle):
+                bas, haut = parallele.PLAGES_LEVIERS[cle]
+                return [bas, haut] if cle in parallele.BINAIRES else np.linspace(bas, haut, pas_grille).round(2).tolist()
+            axes = {axe_x: valeurs_axe(axe_x), axe_y: valeurs_axe(axe_y)}
+            params_grille = {"axes": axes, "leviers": leviers, "params": st.session_state.params}
+            if st.button(f"▶️ Évaluer {len(axes[axe_x]) * len(axes[axe_y])} scénarios", key="lancer_grille"):
+                ordonnanceur().soumettre("grille", base["version"], moteur.grille, base, axes, leviers, st.session_state.params,
+                                         params=params_grille, libelle="Grille de scénarios")
+            tache_grille = ordonnanceur().obtenir("grille", base["version"], params_grille)
+            if tache_grille is not None and suivre_tache(tache_grille, "Grille"):
+                grille = tache_grille.resultat.assign(Tonnes=lambda g: g["total_final"] / 1000)
+                chart_grille = alt.Chart(grille).mark_rect().encode(
+                    x=alt.X(f"{axe_x}:O", title=axe_x), y=alt.Y(f"{axe_y}:O", title=axe_y, sort="descending"),
+                    color=alt.Color("Tonnes:Q", scale=alt.Scale(scheme="redyellowgreen", reverse=True), title="Arrivée 2030 (T)"),
+                    tooltip=[axe_x, axe_y, alt.Tooltip("Tonnes", format=".2f"), alt.Tooltip("ratio_final", format=".2f", title="T / pers.")]
+                ).properties(height=320)
+                afficher_graphe(chart_grille, "Grille Scénarios")
 # ==============================================================================
 # PAGE 5 : RAPPORT & EXPORT (OFFICIAL REPORTING)
 # ==============================================================================
 elif "5." in nav:
+    import pandas as pd
+    from calculs import (
+        preparer_journal, population_totale, calculer_kpis, table_scopes, top_postes, generer_analyse_auto,
+    )
+
     st.title("📄 Édition du Rapport Officiel")
     
-    # --- CSS SPÉCIAL IMPRESSION ---
-    st.markdown("""
-        <style>
-            @media print {
-                [data-testid="stSidebar"] {display: none;}
-                .stButton {display: none;}
-                .stDeployButton {display: none;}
-                header {display: none;}
-                #MainMenu {display: none;}
-                .block-container {padding-top: 0 !important;}
-            }
-            .report-box {border: 2px solid #2c3e50; padding: 20px; border-radius: 10px; margin-bottom: 20px;}
-        </style>
-    """, unsafe_allow_html=True)
-
     if not st.session_state.db_entries:
         st.warning("⚠️ Aucune donnée à rapporter.")
     else:
-        # PRÉPARATION DES DONNÉES
-        df = pd.DataFrame(st.session_state.db_entries)
-        
-        # Nettoyage
-        df["Impact_kgCO2"] = pd.to_numeric(df["Impact_kgCO2"], errors='coerce').fillna(0)
-        df["Marge"] = pd.to_numeric(df["Marge"], errors='coerce').fillna(0)
-        
-        # Fonction Scope
-        def detect_scope(row):
-            detail = str(row.get("Détail", ""))
-            if "Scope 1" in detail: return "Scope 1"
-            if "Scope 2" in detail: return "Scope 2"
-            if "Scope 3" in detail: return "Scope 3"
-            cat = str(row.get("Catégorie", ""))
-            item = str(row.get("Item", ""))
-            if "Bâtiment" in cat or "Énergie" in cat:
-                if "Gaz" in item or "Fioul" in item: return "Scope 1"
-                if "Élec" in item or "Chauffage" in item: return "Scope 2"
-            return "Scope 3"
-
-        df["Scope"] = df.apply(detect_scope, axis=1)
+        # PRÉPARATION DES DONNÉES (Nettoyage + Scopes, voir calculs.py)
+        with chrono.span("DataFrame + Scopes"):
+            df = preparer_journal(st.session_state.db_entries)
         
         tot_co2 = df["Impact_kgCO2"].sum() / 1000
         tot_marge = df["Marge"].sum() / 1000
-        pop = st.session_state.params['pop_etu'] + st.session_state.params['pop_alt'] + st.session_state.params['pop_prof']
-        if pop == 0: pop = 1
+        pop = population_totale(st.session_state.params)
         ratio = (tot_co2 * 1000) / pop
         
         # --- CONFIGURATION ---
@@ -1212,39 +1950,9 @@ elif "5." in nav:
             auteur = c1.text_input("Auteur du rapport", "Département Supply Chain & RSE")
             version = c2.text_input("Version", f"V1.0 - {datetime.date.today()}")
             
-            # --- LE CERVEAU DE L'ASSISTANT (Logique Expert) ---
-            def generer_analyse_auto():
-                analyse = []
-                # 1. Analyse Globale
-                analyse.append(f"Le bilan carbone global s'élève à {tot_co2:.1f} Tonnes CO2e.")
-                
-                # 2. Analyse de l'Objectif
-                delta = ratio - st.session_state.params['budget_co2']
-                if delta <= 0:
-                    analyse.append(f"✅ EXCELLENT : Avec {ratio:.1f} T/pers, l'objectif ({st.session_state.params['budget_co2']} T) est atteint.")
-                else:
-                    analyse.append(f"⚠️ ATTENTION : Le ratio de {ratio:.1f} T/pers dépasse la cible de +{delta:.1f} T.")
-
-                # 3. Identification du Hotspot (Le plus gros pollueur)
-                top_item = df.groupby("Catégorie")["Impact_kgCO2"].sum().idxmax()
-                top_val = df.groupby("Catégorie")["Impact_kgCO2"].sum().max() / 1000
-                part = (top_val / tot_co2) * 100
-                analyse.append(f"Le poste critique est '{top_item}' qui représente {part:.0f}% des émissions ({top_val:.1f} T).")
-
-                # 4. Analyse Qualité Donnée
-                if tot_marge / tot_co2 < 0.10:
-                    analyse.append("La qualité des données est jugée fiable (incertitude < 10%).")
-                else:
-                    analyse.append("Des efforts de collecte sont nécessaires pour réduire l'incertitude actuelle.")
-                
-                # 5. Conclusion
-                analyse.append("RECOMMANDATION : Prioriser les actions de réduction sur le premier poste d'émission identifié ci-dessus.")
-                
-                return " ".join(analyse)
-
             # Bouton Magique
             if st.button("✨ Générer l'analyse par l'IA (Auto-Writing)"):
-                st.session_state['auto_comment'] = generer_analyse_auto()
+                st.session_state['auto_comment'] = generer_analyse_auto(df, st.session_state.params)
             
             # Zone de texte (qui prend le texte généré ou reste vide)
             valeur_texte = st.session_state.get('auto_comment', "Cliquez sur le bouton magique ci-dessus pour générer l'analyse...")
@@ -1271,14 +1979,11 @@ elif "5." in nav:
 
         st.subheader("3. Détail des Émissions par Scope (ISO 14064)")
         if "Scope" in df.columns:
-            df_scope = df.groupby("Scope")["Impact_kgCO2"].sum().reset_index()
-            df_scope["Tonnes CO2e"] = df_scope["Impact_kgCO2"] / 1000
-            df_scope["Part (%)"] = (df_scope["Impact_kgCO2"] / df["Impact_kgCO2"].sum()) * 100
+            df_scope = table_scopes(df)
             st.table(df_scope[["Scope", "Tonnes CO2e", "Part (%)"]].style.format({"Tonnes CO2e": "{:.2f}", "Part (%)": "{:.1f}%"}))
 
         st.subheader("4. Top 5 des Postes d'Émission (Pareto)")
-        df_top = df.groupby(["Catégorie", "Item"])["Impact_kgCO2"].sum().reset_index().sort_values("Impact_kgCO2", ascending=False).head(5)
-        df_top["Tonnes"] = df_top["Impact_kgCO2"] / 1000
+        df_top = top_postes(df, 5)
         st.table(df_top[["Catégorie", "Item", "Tonnes"]].style.format({"Tonnes": "{:.2f}"}))
 
         st.markdown("<br><br><br>", unsafe_allow_html=True)
@@ -1291,25 +1996,208 @@ elif "5." in nav:
         # --- BOUTONS D'ACTION (NOUVEAU : EXPORT EXCEL) ---
         col_btn1, col_btn2 = st.columns(2)
         with col_btn1:
-            st.success("🖨️ **Pour imprimer :** Faites `Ctrl + P` et choisissez 'Enregistrer au format PDF'.")
+            # Rendu PDF côté serveur par l'ordonnanceur de tâches (cache par version des données)
+            from rapport_pdf import rendre_rapport_pdf
+            params_pdf = {"params": st.session_state.params, "auteur": auteur, "version": version, "commentaires": commentaires}
+            if st.button("🧾 Générer le Rapport PDF", use_container_width=True):
+                rapport = {
+                    "params": dict(st.session_state.params),
+                    "df": df,
+                    "kpis": calculer_kpis(df, st.session_state.params),
+                    "df_scope": df_scope,
+                    "df_top": df_top,
+                }
+                ordonnanceur().soumettre("pdf", version_journal(), rendre_rapport_pdf, rapport, auteur, version, commentaires,
+                                         params=params_pdf, libelle="Rapport PDF")
+
+            tache_pdf = ordonnanceur().obtenir("pdf", version_journal(), params_pdf)
+            if tache_pdf is None or tache_pdf.annulee:
+                st.caption("Le PDF est produit sur le serveur, sans passer par l'impression du navigateur.")
+            elif suivre_tache(tache_pdf, "Rendu PDF"):
+                st.download_button(
+                    label="📥 Télécharger le Rapport PDF",
+                    data=tache_pdf.resultat,
+                    file_name=f"Bilan_Carbone_{st.session_state.params['entity_name']}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
         
         with col_btn2:
-            # 1. Création du buffer mémoire
-            buffer = io.BytesIO()
-            
-            # 2. Écriture du fichier Excel dans le buffer
-            with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-                # Onglet 1 : Données Brutes
-                df.to_excel(writer, index=False, sheet_name='Données Brutes')
-                
-                # Onglet 2 : Synthèse par Scope (Petit bonus !)
-                if "Scope" in df.columns:
-                    df_scope.to_excel(writer, index=False, sheet_name='Synthèse Scope')
-                
-            # 3. Préparation du téléchargement
-            st.download_button(
-                label="📥 Télécharger le Rapport Excel (.xlsx)",
-                data=buffer,
-                file_name=f"Bilan_Carbone_{st.session_state.params['entity_name']}.xlsx",
-                mime="application/vnd.ms-excel"
-            )
\ No newline at end of file
+            # Classeur écrit en tâche de fond (Données Brutes + Synthèse par Scope)
+            from calculs import classeur_excel
+            feuilles = {'Données Brutes': df}
+            if "Scope" in df.columns:
+                feuilles['Synthèse Scope'] = df_scope
+            tache_xlsx = ordonnanceur().obtenir("excel_rapport", version_journal())
+            if tache_xlsx is None or tache_xlsx.annulee:
+                if st.button("⚙️ Préparer le Rapport Excel (.xlsx)", use_container_width=True):
+                    ordonnanceur().soumettre("excel_rapport", version_journal(), classeur_excel, feuilles, libelle="Export Excel (rapport)")
+                    st.rerun()
+            elif suivre_tache(tache_xlsx, "Export Excel"):
+                st.download_button(
+                    label="📥 Télécharger le Rapport Excel (.xlsx)",
+                    data=tache_xlsx.resultat,
+                    file_name=f"Bilan_Carbone_{st.session_state.params['entity_name']}.xlsx",
+                    mime="application/vnd.ms-excel"
+                )
+
+# ==============================================================================
+# PAGE 6 : PERFORMANCE (ADMIN UNIQUEMENT)
+# ==============================================================================
+elif "6." in nav and st.session_state.user_role == "admin":
+    import pandas as pd
+
+    st.title("⏱️ Instrumentation des Reruns")
+    st.markdown("Temps passé par section du script, deltas mémoire et tailles des charges utiles (sauvegarde, graphes, Excel).")
+
+    with st.container(border=True):
+        c1, c2, c3 = st.columns(3)
+        perf.REGLAGES["detail"] = c1.toggle("🔬 Mesures détaillées", value=perf.REGLAGES["detail"], help="Active tracemalloc (deltas mémoire) et la taille JSON des graphes. Ralentit un peu les reruns.")
+        if c2.button("🧪 Profiler le prochain rerun (cProfile)"):
+            perf.REGLAGES["profil"] = True
+            st.toast("Naviguez vers la page à profiler : le prochain rerun sera enregistré.")
+        c3.caption(f"Historique : {perf.NB_RERUNS} derniers reruns par page (processus serveur).")
+
+    froid_ms, premiers = perf.demarrage()
+    if premiers:
+        budget = perf.BUDGET_PREMIER_AFFICHAGE_MS
+        mediane_premier = sorted(premiers)[len(premiers) // 2]
+        d1, d2 = st.columns(2)
+        d1.metric("Démarrage à froid (1er rerun processus)", f"{froid_ms:.0f} ms")
+        d2.metric("1er affichage après connexion (médiane)", f"{mediane_premier:.0f} ms",
+                  f"Budget {budget} ms ({'✅' if mediane_premier <= budget else '⚠️'})", delta_color="off")
+
+    with st.expander("💾 Mémoire des sessions", expanded=False):
+        m1, m2 = st.columns(2)
+        m1.metric("Cette session", f"{sum(memoire.octets_session(st.session_state).values()) / 1024:.0f} Ko",
+                  f"Budget {memoire.BUDGET_SESSION_OCTETS / 1024**2:.0f} Mo", delta_color="off")
+        m2.metric("Journal compact", f"{st.session_state.db_entries.octets() / 1024:.0f} Ko",
+                  f"{len(st.session_state.db_entries)} flux", delta_color="off")
+        detail_cles = pd.DataFrame(sorted(memoire.octets_session(st.session_state).items(), key=lambda kv: -kv[1]), columns=["Clé", "Octets"])
+        st.dataframe(detail_cles, hide_index=True, use_container_width=True)
+        st.markdown(f"**Sessions du serveur** (déchargement sur disque après {memoire.DELAI_INACTIVITE_S // 60} min d'inactivité)")
+        st.dataframe(pd.DataFrame(memoire.etat_sessions()), hide_index=True, use_container_width=True,
+                     column_config={"Journal (Ko)": st.column_config.NumberColumn(format="%.0f"),
+                                    "Session (Ko)": st.column_config.NumberColumn(format="%.0f"),
+                                    "Inactif (s)": st.column_config.NumberColumn(format="%.0f")})
+
+    with st.expander("👥 Journaux partagés", expanded=False):
+        journaux = registre_partage().etat()
+        if journaux:
+            st.dataframe(pd.DataFrame(journaux), hide_index=True, use_container_width=True)
+        else:
+            st.caption("Aucune session n'a activé le journal partagé.")
+
+    with st.expander("🧵 Tâches d'arrière-plan", expanded=False):
+        taches_serveur = ordonnanceur().etat()
+        if not taches_serveur:
+            st.caption("Aucune tâche soumise (exports, rendus PDF, géocodage, baseline).")
+        else:
+            st.dataframe(pd.DataFrame(taches_serveur), hide_index=True, use_container_width=True,
+                         column_config={"Progression": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0)})
+
+    pages = [p for p in perf.pages_mesurees() if not p.startswith("6.")]
+    if not pages:
+        st.info("Aucun rerun mesuré pour l'instant. Naviguez dans l'application pour alimenter l'historique.")
+    else:
+        page_choisie = st.selectbox("Page analysée", pages)
+        reruns = perf.historique(page_choisie)
+
+        totaux = pd.DataFrame([{"Heure": r["heure"], "Total (ms)": r["total_ms"]} for r in reruns])
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Dernier rerun", f"{totaux['Total (ms)'].iloc[-1]:.0f} ms")
+        k2.metric("Médiane", f"{totaux['Total (ms)'].median():.0f} ms")
+        k3.metric("Pire", f"{totaux['Total (ms)'].max():.0f} ms", f"{len(reruns)} reruns", delta_color="off")
+
+        df_mes = pd.DataFrame([dict(m, Rerun=i + 1) for i, r in enumerate(reruns) for m in r["mesures"]])
+        df_mes["Section"] = df_mes.apply(lambda m: ("    ↳ " if m["niveau"] else "") + m["nom"], axis=1)
+
+        st.markdown("**Dernier rerun (détail)**")
+        dernier = df_mes[df_mes["Rerun"] == len(reruns)]
+        st.dataframe(
+            dernier[["Section", "ms", "memoire_ko", "octets"]],
+            column_config={
+                "ms": st.column_config.NumberColumn("Durée", format="%.1f ms"),
+                "memoire_ko": st.column_config.NumberColumn("Δ Mémoire", format="%.0f Ko"),
+                "octets": st.column_config.NumberColumn("Taille", format="%d o"),
+            },
+            hide_index=True, use_container_width=True
+        )
+
+        st.markdown("**Évolution par section (N derniers reruns)**")
+        pivot = df_mes.pivot_table(index="Rerun", columns="nom", values="ms", aggfunc="sum")
+        st.line_chart(pivot)
+
+        profil = perf.dernier_profil(page_choisie)
+        if profil:
+            with st.expander(f"🧪 Profil cProfile ({profil['heure']})"):
+                st.code(profil["texte"])
+                st.download_button("📥 Télécharger le profil (.prof)", profil["octets"], f"profil_{page_choisie.split(' ')[0]}.prof", "application/octet-stream")
+
+# ==============================================================================
+# PAGE 7 : CONSOLE DE REQUÊTES (ADMIN UNIQUEMENT)
+# ==============================================================================
+elif "7." in nav and st.session_state.user_role == "admin":
+    import requetes
+
+    st.title("🔎 Console de Requêtes")
+    st.markdown("Regroupements, filtres et tableaux croisés à la demande sur le journal des flux. "
+                "Les résultats sont mis en cache par version du journal : toute saisie les invalide.")
+
+    # --- Données interrogées : journal de la session ou journaux partagés de toutes les entités ---
+    journaux = sorted(registre_partage().journaux.values(), key=lambda j: j.entite)
+    portee = st.radio("Données", ["Journal de la session", "Journaux partagés (toutes entités)"], horizontal=True, key="req_portee",
+                      disabled=not journaux, help=None if journaux else "Aucune session n'a activé le journal partagé.")
+    if portee == "Journal de la session" or not journaux:
+        entries, entite = st.session_state.db_entries, st.session_state.params['entity_name']
+        version = ("session", id(entries), entries.revision, entite)
+        charger = lambda: [(entite, entries)]
+    else:
+        version = ("partage",) + tuple((j.entite, j.version) for j in journaux)
+        charger = lambda: [(j.entite, [e for _, _, e in j.instantane()[1]]) for j in journaux]
+    console = console_requetes()
+    with chrono.span("Table en Colonnes (Requêtes)"):
+        table = console.table(version, charger)
+
+    with st.container(border=True):
+        c1, c2, c3 = st.columns([2, 1, 1])
+        lignes = c1.multiselect("🧱 Lignes (regrouper par)", requetes.DIMENSIONS, default=["Catégorie"], key="req_lignes")
+        colonne = c2.selectbox("📐 Colonnes (tableau croisé)", ["—"] + [d for d in requetes.DIMENSIONS if d not in lignes], key="req_colonne")
+        mesure = c3.selectbox("📏 Mesure", list(requetes.MESURES), key="req_mesure")
+        f1, f2 = st.columns([2, 1])
+        dims_filtre = f1.multiselect("🔽 Filtrer sur", requetes.DIMENSIONS, key="req_dims_filtre")
+        recherche = f2.text_input("🔤 Item ou détail contient", key="req_recherche")
+        filtres = {}
+        if dims_filtre:
+            for col, dim in zip(st.columns(len(dims_filtre)), dims_filtre):
+                filtres[dim] = col.multiselect(dim, table.valeurs(dim), key=f"req_filtre_{dim}")
+
+    requete = {"lignes": lignes, "colonne": None if colonne == "—" else colonne, "mesure": mesure, "filtres": filtres, "recherche": recherche}
+    try:
+        with chrono.span("Exécution Requête"):
+            res, en_cache, duree_ms = console.interroger(version, charger, requete)
+    except ValueError as e:
+        st.error(f"❌ {e}")
+    else:
+        k1, k2, k3 = st.columns(3)
+        k1.metric("Flux retenus", f"{res['flux']:,}".replace(",", " "), f"sur {table.n:,}".replace(",", " "), delta_color="off")
+        k2.metric("Groupes", f"{res['groupes']:,}".replace(",", " "))
+        k3.metric("Durée", f"{duree_ms:.1f} ms", "⚡ cache" if en_cache else "calculée", delta_color="off")
+        st.dataframe(res["resultat"].round(3), use_container_width=True)
+        if res["tronque"]:
+            st.caption(f"Affichage des {requetes.LIGNES_MAX} plus gros groupes sur {res['groupes']}.")
+        if "Jeton du détail" in lignes + [colonne]:
+            st.caption("ℹ️ Regroupement par jeton : un flux compte une fois par jeton de son détail, les totaux se recoupent.")
+        st.download_button("📥 Exporter le résultat (.csv)", res["resultat"].to_csv().encode("utf-8"), "requete_journal.csv", "text/csv")
+
+    etat_console = console.etat()
+    st.caption(f"Cache serveur : {etat_console['resultats']} résultat(s), {etat_console['tables']} table(s) en colonnes · "
+               f"{etat_console['succes']} requête(s) servie(s) depuis le cache, {etat_console['echecs']} calculée(s).")
+
+# Changements de facteurs du rerun -> journal d'audit (annulables)
+st.session_state.audit.suivre_params(st.session_state.db_entries, st.session_state.params)
+
+# Premier affichage de la session après connexion (mesuré contre le budget de démarrage)
+premier_affichage = not st.session_state.get('deja_affiche', False)
+st.session_state.deja_affiche = True
+chrono.terminer(nav, premier_affichage=premier_affichage)
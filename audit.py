@@ -0,0 +1,290 @@
+"""Journal d'audit append-only : annuler/rétablir et reconstruction à une date.
+
+Chaque modification de la session (ajout, correction, suppression d'un
+flux, changement de facteurs, restauration) est ajoutée en fin d'un
+fichier JSONL local. Une opération est un nœud qui pointe vers l'état
+sur lequel elle s'applique (``base``) ; les déplacements de la tête
+(annuler / rétablir) sont eux aussi ajoutés, jamais réécrits.
+
+Des instantanés compressés sont écrits toutes les ``INTERVALLE_INSTANTANE``
+opérations : reconstruire l'état d'un nœud ne rejoue que les opérations
+depuis l'instantané le plus proche. Annuler et rétablir appliquent
+l'inverse (ou la reprise) d'une seule opération sur l'état vivant.
+
+Les opérations venues d'ailleurs (tirage ou rechargement d'un journal
+partagé) sont des *barrières* : annuler s'arrête devant la dernière, pour
+ne jamais défaire — et republier à l'envers — le travail d'un collègue.
+
+Un ``observateur`` optionnel reçoit l'effet de chaque opération sur le
+journal des flux (``ajout``, ``correction``, ``suppression`` ou
+``remplacement``), y compris pour annuler / rétablir : c'est par là que
+la copie locale d'un journal partagé publie ses écritures
+(``journal_partage.py``).
+"""
+import datetime
+import gzip
+import json
+import os
+import re
+import threading
+from array import array
+
+DOSSIER_AUDIT = os.environ.get("MSCAL_AUDIT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "journal_audit"))
+INTERVALLE_INSTANTANE = 200
+
+LIBELLES = {"init": "Ouverture", "add": "Ajout", "edit": "Correction", "delete": "Suppression",
+            "param": "Facteurs", "restore": "Restauration"}
+
+
+def _remplacer(entries, params, etat):
+    entries.clear()
+    entries.extend(etat["db"])
+    params.clear()
+    params.update(etat["params"])
+
+
+class JournalAudit:
+    """Historique arborescent des opérations d'une session (fichier JSONL)."""
+
+    def __init__(self, nom, params, entries, dossier=DOSSIER_AUDIT, intervalle=INTERVALLE_INSTANTANE):
+        os.makedirs(dossier, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9_-]+", "_", nom).strip("_") or "session"
+        self.chemin = os.path.join(dossier, f"{slug}.jsonl")
+        self.dossier_instantanes = os.path.join(dossier, f"{slug}.instantanes")
+        self.intervalle = intervalle
+        self._verrou = threading.Lock()
+        self._offsets = array("q")      # position de chaque nœud dans le fichier
+        self._bases = array("q")        # nœud parent (-1 pour la racine)
+        self._depuis_instantane = array("q")
+        self._instantanes = set()
+        self._refaire = []
+        self.tete = -1
+        self.barriere = 0               # Dernier nœud qu'annuler ne peut pas défaire
+        self._params = {}
+        self.observateur = None
+        if os.path.exists(self.chemin):
+            self._indexer()
+        else:
+            self._noeud({"op": "init"}, params, entries, instantane=True)
+        self._params = json.loads(json.dumps(params, default=str))
+
+    # --- Fichier ---
+    def _ecrire(self, enr):
+        ligne = (json.dumps(enr, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with open(self.chemin, "ab") as f:
+            offset = f.tell()
+            f.write(ligne)
+        return offset
+
+    def _lire(self, noeud):
+        with open(self.chemin, "rb") as f:
+            f.seek(self._offsets[noeud])
+            return json.loads(f.readline())
+
+    def _indexer(self):
+        """Reconstruit l'index des nœuds d'un fichier existant (reprise après redémarrage)."""
+        with open(self.chemin, "rb") as f:
+            offset = 0
+            for ligne in f:
+                enr = json.loads(ligne)
+                if "n" in enr:
+                    self._offsets.append(offset)
+                    self._bases.append(enr["base"])
+                    distance = 0 if enr.get("instantane") else self._depuis_instantane[enr["base"]] + 1
+                    self._depuis_instantane.append(distance)
+                    if enr.get("instantane"):
+                        self._instantanes.add(enr["n"])
+                    if enr.get("barriere"):
+                        self.barriere = enr["n"]
+                self.tete = enr.get("tete", enr.get("n", self.tete))
+                offset += len(ligne)
+
+    def _fichier_instantane(self, noeud):
+        return os.path.join(self.dossier_instantanes, f"{noeud}.json.gz")
+
+    def _instantane(self, noeud, params, entries):
+        os.makedirs(self.dossier_instantanes, exist_ok=True)
+        with gzip.open(self._fichier_instantane(noeud), "wt", encoding="utf-8", compresslevel=1) as f:
+            json.dump({"params": params, "db": list(entries)}, f, ensure_ascii=False, default=str)
+        self._instantanes.add(noeud)
+        self._depuis_instantane[noeud] = 0
+
+    def _charger_instantane(self, noeud):
+        with gzip.open(self._fichier_instantane(noeud), "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _notifier(self, effet, *args):
+        if self.observateur is not None:
+            self.observateur(effet, *args)
+
+    # --- Nœuds ---
+    def _noeud(self, enr, params, entries, instantane=False, barriere=False):
+        with self._verrou:
+            n = len(self._offsets)
+            base = self.tete
+            distance = 0 if base < 0 else self._depuis_instantane[base] + 1
+            instantane = instantane or distance >= self.intervalle
+            enr = dict(enr, n=n, base=base, t=datetime.datetime.now().isoformat(timespec="seconds"), instantane=instantane)
+            if barriere:
+                enr["barriere"] = True
+                self.barriere = n
+            self._offsets.append(self._ecrire(enr))
+            self._bases.append(base)
+            self._depuis_instantane.append(distance)
+            self.tete = n
+            self._refaire.clear()
+            if instantane:
+                self._instantane(n, params, entries)
+            return n
+
+    def _deplacer_tete(self, noeud):
+        self.tete = noeud
+        self._ecrire({"tete": noeud, "t": datetime.datetime.now().isoformat(timespec="seconds")})
+
+    # ==========================================================================
+    # OPÉRATIONS (mutent l'état vivant puis ajoutent le nœud au journal)
+    # ``barriere=True`` : opération distante, qu'annuler ne doit pas défaire
+    # ==========================================================================
+    def ajout(self, entries, params, entree, barriere=False):
+        entries.append(entree)
+        self._noeud({"op": "add", "i": len(entries) - 1, "entree": entree}, params, entries, barriere=barriere)
+        self._notifier("ajout", len(entries) - 1, entree)
+
+    def correction(self, entries, params, i, apres, barriere=False):
+        avant = entries[i]
+        entries[i] = apres
+        self._noeud({"op": "edit", "i": i, "avant": avant, "apres": apres}, params, entries, barriere=barriere)
+        self._notifier("correction", i, apres)
+
+    def suppression(self, entries, params, indices, barriere=False):
+        indices = sorted(set(indices))
+        avant = [entries[i] for i in indices]
+        for i in reversed(indices):
+            del entries[i]
+        self._noeud({"op": "delete", "i": indices, "avant": avant}, params, entries, barriere=barriere)
+        self._notifier("suppression", indices)
+
+    def restauration(self, entries, params, nouveaux_params, nouvelles_entries, motif="Restauration", barriere=False):
+        """Remplace tout l'état (import JSON, effacement) : instantanés avant et après."""
+        if self._depuis_instantane[self.tete] != 0:
+            self._instantane(self.tete, params, entries)
+        # Copies détachées : les nouvelles valeurs peuvent être l'état courant lui-même (effacement)
+        _remplacer(entries, params, {"params": json.loads(json.dumps(nouveaux_params, default=str)), "db": list(nouvelles_entries)})
+        self._noeud({"op": "restore", "motif": motif, "nb": len(entries)}, params, entries, instantane=True, barriere=barriere)
+        self._params = json.loads(json.dumps(params, default=str))
+        self._notifier("remplacement", list(entries))
+
+    def suivre_params(self, entries, params):
+        """Journalise les changements de facteurs depuis le dernier appel (fin de rerun)."""
+        courant = json.loads(json.dumps(params, default=str))
+        if courant == self._params:
+            return False
+        avant = {k: self._params.get(k) for k in courant if courant[k] != self._params.get(k)}
+        retires = [k for k in self._params if k not in courant]
+        self._noeud({"op": "param", "avant": avant, "apres": {k: courant[k] for k in avant}, "retires": retires,
+                     "valeurs_retirees": {k: self._params[k] for k in retires}}, params, entries)
+        self._params = courant
+        return True
+
+    # ==========================================================================
+    # ANNULER / RÉTABLIR (une opération, appliquée sur l'état vivant)
+    # ==========================================================================
+    def _appliquer(self, enr, entries, params, sens, notifier=True):
+        op = enr["op"]
+        notifier = self._notifier if notifier else (lambda *a: None)
+        if op == "add":
+            if sens > 0:
+                entries.insert(enr["i"], enr["entree"])
+                notifier("ajout", enr["i"], enr["entree"])
+            else:
+                del entries[enr["i"]]
+                notifier("suppression", [enr["i"]])
+        elif op == "edit":
+            entries[enr["i"]] = enr["apres"] if sens > 0 else enr["avant"]
+            notifier("correction", enr["i"], entries[enr["i"]])
+        elif op == "delete":
+            if sens > 0:
+                for i in reversed(enr["i"]): del entries[i]
+                notifier("suppression", enr["i"])
+            else:
+                for i, e in zip(enr["i"], enr["avant"]):
+                    entries.insert(i, e)
+                    notifier("ajout", i, e)
+        elif op == "param":
+            if sens > 0:
+                params.update(enr["apres"])
+                for k in enr["retires"]: params.pop(k, None)
+            else:
+                params.update(enr["avant"])
+                params.update(enr["valeurs_retirees"])
+                for k, v in enr["avant"].items():
+                    if v is None and k not in enr["valeurs_retirees"]: params.pop(k, None)
+        elif op == "restore":
+            _remplacer(entries, params, self._charger_instantane(enr["n"] if sens > 0 else enr["base"]))
+            notifier("remplacement", list(entries))
+
+    @property
+    def peut_annuler(self):
+        # La tête ne remonte jamais avant la dernière barrière : les nœuds suivants ont un numéro supérieur
+        return self.tete > self.barriere
+
+    @property
+    def peut_retablir(self):
+        return bool(self._refaire)
+
+    def annuler(self, entries, params):
+        if not self.peut_annuler:
+            return None
+        enr = self._lire(self.tete)
+        self._appliquer(enr, entries, params, -1)
+        self._refaire.append(self.tete)
+        self._deplacer_tete(enr["base"])
+        self._params = json.loads(json.dumps(params, default=str))
+        return enr
+
+    def retablir(self, entries, params):
+        if not self.peut_retablir:
+            return None
+        noeud = self._refaire.pop()
+        enr = self._lire(noeud)
+        self._appliquer(enr, entries, params, +1)
+        self._deplacer_tete(noeud)
+        self._params = json.loads(json.dumps(params, default=str))
+        return enr
+
+    # ==========================================================================
+    # RECONSTRUCTION À UN NŒUD / HISTORIQUE
+    # ==========================================================================
+    def etat_a(self, noeud):
+        """État {params, db} au nœud donné : instantané le plus proche + rejeu du chemin."""
+        chemin = []
+        while noeud not in self._instantanes:
+            chemin.append(noeud)
+            noeud = self._bases[noeud]
+        etat = self._charger_instantane(noeud)
+        params, entries = etat["params"], etat["db"]
+        for n in reversed(chemin):
+            self._appliquer(self._lire(n), entries, params, +1, notifier=False)
+        return {"params": params, "db": entries}
+
+    def historique(self, nb=20):
+        """Les ``nb`` derniers nœuds de la branche courante (du plus récent au plus ancien)."""
+        lignes, noeud = [], self.tete
+        while noeud >= 0 and len(lignes) < nb:
+            enr = self._lire(noeud)
+            lignes.append({"n": noeud, "heure": enr["t"], "op": LIBELLES.get(enr["op"], enr["op"]), "resume": resume(enr)})
+            noeud = enr["base"]
+        return lignes
+
+    def __len__(self):
+        return len(self._offsets)
+
+
+def resume(enr):
+    op = enr["op"]
+    if op == "add": return f"{enr['entree'].get('Catégorie', '')} · {enr['entree'].get('Item', '')}"
+    if op == "edit": return f"Ligne {enr['i']} · {enr['apres'].get('Item', '')}"
+    if op == "delete": return f"{len(enr['i'])} ligne(s)"
+    if op == "param": return ", ".join(f"{k}: {enr['avant'][k]} → {enr['apres'][k]}" for k in list(enr["apres"])[:3])
+    if op == "restore": return f"{enr.get('motif', '')} ({enr.get('nb', 0)} flux)"
+    return ""
@@ -0,0 +1,131 @@
+"""Génération par lots des rapports MSCAL à partir des sauvegardes JSON.
+
+Usage :
+    python batch_rapports.py <dossier_sauvegardes> [-o rapports] [-j 4]
+
+Chaque fichier ``mscal_bkp_*.json`` (format du bouton "⬇️ Sauver") produit
+un classeur Excel "Bilan_Carbone_<entité>.xlsx" (Synthèse, Scopes, Top 5,
+Données Brutes). Une synthèse consolidée regroupe toutes les entités.
+Le travail est réparti sur un pool de processus ; le nombre de tâches
+en vol est borné pour limiter la mémoire consommée.
+"""
+import argparse
+import concurrent.futures as cf
+import json
+import os
+import re
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+from calculs import SCOPES, construire_rapport, ecrire_rapport_excel
+
+
+def nom_fichier_sur(nom):
+    """Nettoie un nom d'entité pour en faire un nom de fichier."""
+    nom = re.sub(r"[^\w\-]+", "_", str(nom), flags=re.UNICODE).strip("_")
+    return nom or "Entite"
+
+
+def traiter_sauvegarde(chemin, dossier_sortie):
+    """Tâche exécutée dans un processus : une sauvegarde -> un classeur Excel.
+
+    Seul un petit résumé (KPIs) remonte au processus principal, les
+    DataFrames restent dans le processus de travail.
+    """
+    resume = {"Fichier": Path(chemin).name}
+    try:
+        with open(chemin, encoding="utf-8") as f:
+            data = json.load(f)
+        entries = data.get('db', [])
+        if not entries:
+            resume["Erreur"] = "Aucun flux dans la sauvegarde"
+            return resume
+
+        rapport = construire_rapport(entries, data.get('params'))
+        entite = rapport["params"]['entity_name']
+        sortie = Path(dossier_sortie) / f"Bilan_Carbone_{nom_fichier_sur(entite)}_{nom_fichier_sur(Path(chemin).stem)}.xlsx"
+        ecrire_rapport_excel(rapport, sortie)
+
+        kpis = rapport["kpis"]
+        par_scope = rapport["df_scope"].set_index("Scope")["Tonnes CO2e"]
+        resume.update({
+            "Entité": entite,
+            "Population": kpis["pop_totale"],
+            "Empreinte (T CO2e)": kpis["total_co2_t"],
+            "Marge (T CO2e)": kpis["total_marge_t"],
+            "Ratio (T/pers)": kpis["ratio_pers"],
+            "Budget (T/pers)": kpis["budget_cible"],
+            "Coût Fantôme (€)": kpis["cout_carbone"],
+            "DQI": kpis["dqi_score"],
+            "Nb Flux": kpis["nb_flux"],
+            "Poste #1": rapport["df_top"]["Item"].iloc[0] if not rapport["df_top"].empty else "",
+            "Analyse": rapport["analyse"],
+            "Classeur": sortie.name,
+        })
+        for scope in SCOPES:
+            resume[f"{scope} (T)"] = float(par_scope.get(scope, 0.0))
+    except Exception as e:  # Un fichier corrompu ne doit pas bloquer le lot
+        resume["Erreur"] = f"{type(e).__name__}: {e}"
+    return resume
+
+
+def executer_lot(fichiers, dossier_sortie, workers=None, max_en_vol=None):
+    """Répartit les sauvegardes sur un pool de processus (fenêtre bornée)."""
+    workers = workers or os.cpu_count() or 1
+    max_en_vol = max_en_vol or 2 * workers
+    options = {"max_workers": workers}
+    if sys.version_info >= (3, 11):
+        # Recyclage régulier des processus pour rendre la mémoire au système
+        options["max_tasks_per_child"] = 20
+
+    resumes = []
+    a_faire = iter(fichiers)
+    with cf.ProcessPoolExecutor(**options) as pool:
+        en_vol = set()
+        for chemin in a_faire:
+            en_vol.add(pool.submit(traiter_sauvegarde, str(chemin), str(dossier_sortie)))
+            if len(en_vol) >= max_en_vol:
+                termines, en_vol = cf.wait(en_vol, return_when=cf.FIRST_COMPLETED)
+                resumes.extend(t.result() for t in termines)
+        resumes.extend(t.result() for t in cf.as_completed(en_vol))
+    return sorted(resumes, key=lambda r: r["Fichier"])
+
+
+def ecrire_synthese(resumes, dossier_sortie):
+    """Écrit la synthèse consolidée multi-entités."""
+    df = pd.DataFrame(resumes)
+    sortie = Path(dossier_sortie) / "Synthese_Consolidee.xlsx"
+    with pd.ExcelWriter(sortie, engine='xlsxwriter') as writer:
+        df.to_excel(writer, index=False, sheet_name='Synthèse Entités')
+    return sortie
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Génération par lots des rapports Bilan Carbone MSCAL.")
+    parser.add_argument("dossier", help="Dossier contenant les sauvegardes JSON")
+    parser.add_argument("-o", "--sortie", default="rapports", help="Dossier de sortie des classeurs (défaut : rapports)")
+    parser.add_argument("-m", "--motif", default="mscal_bkp_*.json", help="Motif des fichiers de sauvegarde")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Nombre de processus (défaut : nb de cœurs)")
+    parser.add_argument("--max-en-vol", type=int, default=None, help="Tâches soumises simultanément (défaut : 2 x workers)")
+    args = parser.parse_args(argv)
+
+    fichiers = sorted(Path(args.dossier).glob(args.motif))
+    if not fichiers:
+        print(f"Aucune sauvegarde '{args.motif}' trouvée dans {args.dossier}")
+        return 1
+
+    Path(args.sortie).mkdir(parents=True, exist_ok=True)
+    resumes = executer_lot(fichiers, args.sortie, args.workers, args.max_en_vol)
+    synthese = ecrire_synthese(resumes, args.sortie)
+
+    erreurs = [r for r in resumes if r.get("Erreur")]
+    print(f"✅ {len(resumes) - len(erreurs)} rapport(s) générés, {len(erreurs)} erreur(s). Synthèse : {synthese}")
+    for r in erreurs:
+        print(f"  ⚠️ {r['Fichier']} : {r['Erreur']}")
+    return 0 if not erreurs else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+"""Benchmark reproductible des chemins de calcul de l'application.
+
+Usage :
+    python bench.py [--tailles 1000 10000 100000 1000000] [-r 3] [-o bench_output.json]
+    python bench.py --comparer avant.json apres.json
+
+Génère des journaux synthétiques (graine fixe) au format de ``save_flux``
+avec les catégories de la page 2, puis chronomètre les vrais chemins de
+code : reconstruction du DataFrame, classification des scopes, KPIs de
+la page 3, tableaux Pareto, masques et leviers de la page 4 (Monte Carlo
+et sensibilité sur tous les cœurs), export Excel et sauvegarde/restauration
+JSON. Les résultats sont écrits en JSON
+pour comparer deux versions avant/après une optimisation.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import pandas as pd
+
+import qualite
+from parallele import MoteurParallele
+from calculs import (
+    DEFAULT_PARAMS, LEVIERS_DEFAUT, baseline_simulateur, calculer_kpis, construire_rapport, creer_flux,
+    ecrire_rapport_excel, preparer_journal, scopes_vectorises, simuler_scenario, table_pareto, table_scopes,
+    top_postes,
+)
+
+TAILLES_DEFAUT = [1000, 10000, 100000, 1000000]
+GRAINE = 2026
+
+# Leviers "tous actifs" : chaque branche du moteur est exercée
+LEVIERS_BENCH = dict(LEVIERS_DEFAUT, sim_pop_growth=10, sim_remote_days=2, sim_mob_reduce=10, sim_mob_train=True,
+                     sim_mob_carpool=1.5, sim_mob_soft=True, sim_elec_green=True, sim_solar=20, sim_heat=15,
+                     sim_led=True, sim_it_life=2, sim_it_refurb=30, sim_food_vege=40, sim_waste=20)
+
+# ==============================================================================
+# 1. JOURNAUX SYNTHÉTIQUES (mêmes générateurs que les formulaires de la page 2)
+# ==============================================================================
+PROFILS = ["🎓 Étudiant Initiale (Continu)", "💼 Étudiant Alternant (Rythmé)", "🌍 Étudiant Échange",
+           "👨‍🏫 Prof Fixe (ENSAIA)", "🎤 Intervenant Extérieur"]
+MODES = {"Voiture Thermique": 'fe_voit', "Voiture Élec": 'fe_voit_elec', "Train/TER": 'fe_ter',
+         "TGV": 'fe_tgv', "Bus": 'fe_bus', "Avion": 'fe_avion_long'}
+MOBILIER = ["Chaise Étudiant", "Bureau Prof", "Table", "Armoire"]
+ELEC = ["Radiateur Élec", "Vidéoprojecteur", "Imprimante", "Éclairage Salle"]
+CONSOS = {"Repas Bœuf": 'fe_boeuf', "Repas Végé": 'fe_vege', "Café": 'fe_cafe', "Papier (Rames)": None, "Goodies Promo": None}
+MATERIELS = {"PC Portable": 'fe_it_laptop', "PC Fixe": 'fe_it_desktop', "Écran": 'fe_it_screen',
+             "Smartphone": None, "Vidéoprojecteur": None}
+
+
+def _flux_aleatoire(rng, p):
+    tirage = rng.random()
+    if tirage < 0.40:
+        profil, mode = rng.choice(PROFILS), rng.choice(list(MODES))
+        jours = rng.randint(2, 200)
+        return creer_flux("Mobilité", f"Trajet {profil}", rng.randint(1, 800) * jours * rng.randint(1, 5), "km.pax",
+                          p[MODES[mode]], rng.choice([5, 10, 20, 30]), f"{mode} | {jours}j/an | ")
+    if tirage < 0.55:
+        objet = rng.choice(MOBILIER)
+        return creer_flux("Bâtiment", objet, rng.randint(1, 40), "u", 1.0, 10, "Amortissement 10 ans")
+    if tirage < 0.65:
+        objet = rng.choice(ELEC)
+        kwh = rng.randint(1, 10) * rng.uniform(50, 2000) * 8 * p['jours_ouverture'] / 1000
+        return creer_flux("Énergie", f"Conso {objet}", kwh, "kWh", p['fe_elec'], 5, "Scope 2")
+    if tirage < 0.72:
+        source = rng.choice(["Gaz", "Électricité", "Réseau Urbain"])
+        surface = rng.randint(20, 2000)
+        fe = p['fe_gaz'] if source == "Gaz" else p['fe_elec']
+        return creer_flux("Bâtiment", f"Chauffage ({source})", surface * rng.randint(50, 250), "kWh", fe, 10, f"{surface} m²")
+    if tirage < 0.90:
+        item = rng.choice(list(CONSOS))
+        fe = p[CONSOS[item]] if CONSOS[item] else 1.0
+        return creer_flux("Achats", item, rng.randint(1, 10000), "u", fe, rng.choice([10, 20, 30]), "Conso courante")
+    mat = rng.choice(list(MATERIELS))
+    duree = rng.randint(1, 8)
+    fe = p[MATERIELS[mat]] if MATERIELS[mat] else 100
+    return creer_flux("Numérique", f"Parc {mat}", rng.randint(1, 500), "u", fe / duree, 10, f"Amortissement {duree} ans")
+
+
+def journal_synthetique(n, graine=GRAINE, params=None):
+    """Journal reproductible de ``n`` flux (graine fixe)."""
+    rng = random.Random(graine)
+    p = params or DEFAULT_PARAMS
+    return [_flux_aleatoire(rng, p) for _ in range(n)]
+
+
+# ==============================================================================
+# 2. MESURES
+# ==============================================================================
+def chronometrer(fonction, repetitions):
+    """Renvoie (min, médiane) en millisecondes sur ``repetitions`` exécutions."""
+    durees = []
+    for _ in range(repetitions):
+        t0 = time.perf_counter()
+        fonction()
+        durees.append((time.perf_counter() - t0) * 1000)
+    return min(durees), statistics.median(durees)
+
+
+def cas_de_mesure(entries, params, max_excel, moteur):
+    """Liste ordonnée (nom, fonction) des chemins de code mesurés (``moteur`` : ``MoteurParallele`` du run)."""
+    df_brut = pd.DataFrame(entries)
+    df = preparer_journal(entries)
+    base = baseline_simulateur(entries)
+    sauvegarde = json.dumps({'params': params, 'db': entries})
+    rapport = construire_rapport(entries, params) if len(entries) <= max_excel else None
+
+    def excel():
+        ecrire_rapport_excel(rapport, io.BytesIO())
+
+    cas = [
+        ("dataframe_rebuild", lambda: pd.DataFrame(entries)),
+        ("scope_classification", lambda: scopes_vectorises(*(df_brut[c].astype(str) for c in ("Catégorie", "Item", "Détail")))),
+        ("preparer_journal", lambda: preparer_journal(entries)),
+        ("kpis_page3", lambda: calculer_kpis(df, params)),
+        ("controle_qualite", lambda: qualite.analyser(df)),
+        ("table_scopes", lambda: table_scopes(df)),
+        ("pareto_items", lambda: table_pareto(df)),
+        ("top5_postes", lambda: top_postes(df, 5)),
+        ("baseline_masques_page4", lambda: baseline_simulateur(entries)),
+        ("moteur_leviers_page4", lambda: simuler_scenario(base, LEVIERS_BENCH, params)),
+        ("monte_carlo_500_page4", lambda: moteur.monte_carlo(base, LEVIERS_BENCH, params, tirages=500)),
+        ("sensibilite_page4", lambda: moteur.sensibilite(base, LEVIERS_BENCH, params)),
+        ("sauvegarde_json", lambda: json.dumps({'params': params, 'db': entries})),
+        ("restauration_json", lambda: json.loads(sauvegarde)),
+    ]
+    if rapport is not None:
+        cas.append(("export_excel", excel))
+    return cas
+
+
+def environnement():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plateforme": platform.platform(),
+        "processeurs": os.cpu_count(),
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def executer(tailles, repetitions, max_excel, verbeux=True):
+    params = dict(DEFAULT_PARAMS)
+    resultats = []
+    # Un seul moteur (pool de processus + mémoire partagée) pour tout le run, fermé même en cas d'erreur
+    moteur = MoteurParallele()
+    try:
+        for n in tailles:
+            t0 = time.perf_counter()
+            entries = journal_synthetique(n, params=params)
+            generation_ms = (time.perf_counter() - t0) * 1000
+            if verbeux:
+                print(f"— {n:>9,} flux (génération {generation_ms:.0f} ms)", file=sys.stderr)
+            for nom, fonction in cas_de_mesure(entries, params, max_excel, moteur):
+                mini, mediane = chronometrer(fonction, repetitions)
+                resultats.append({"cas": nom, "taille": n, "min_ms": round(mini, 3), "mediane_ms": round(mediane, 3),
+                                  "repetitions": repetitions})
+                if verbeux:
+                    print(f"   {nom:<26} min {mini:>10.1f} ms   médiane {mediane:>10.1f} ms", file=sys.stderr)
+            del entries
+    finally:
+        moteur.fermer()
+    return {"environnement": environnement(), "graine": GRAINE, "resultats": resultats}
+
+
+def comparer(avant, apres):
+    """Affiche les ratios de temps médian entre deux fichiers de résultats."""
+    ref = {(r["cas"], r["taille"]): r["mediane_ms"] for r in avant["resultats"]}
+    print(f"{'cas':<26} {'taille':>9} {'avant ms':>11} {'après ms':>11} {'gain':>7}")
+    for r in apres["resultats"]:
+        cle = (r["cas"], r["taille"])
+        if cle in ref and r["mediane_ms"] > 0:
+            print(f"{r['cas']:<26} {r['taille']:>9} {ref[cle]:>11.1f} {r['mediane_ms']:>11.1f} {ref[cle] / r['mediane_ms']:>6.1f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark des chemins de calcul MSCAL sur journaux synthétiques.")
+    parser.add_argument("--tailles", type=int, nargs="+", default=TAILLES_DEFAUT, help="Nombre de flux par journal")
+    parser.add_argument("-r", "--repetitions", type=int, default=3, help="Exécutions par cas (défaut : 3)")
+    parser.add_argument("--max-excel", type=int, default=100000, help="Taille max pour le cas export_excel (défaut : 100000)")
+    parser.add_argument("-o", "--sortie", default="bench_output.json", help="Fichier JSON de résultats")
+    parser.add_argument("--comparer", nargs=2, metavar=("AVANT", "APRES"), help="Compare deux fichiers de résultats")
+    args = parser.parse_args(argv)
+
+    if args.comparer:
+        with open(args.comparer[0]) as f1, open(args.comparer[1]) as f2:
+            comparer(json.load(f1), json.load(f2))
+        return 0
+
+    resultats = executer(args.tailles, args.repetitions, args.max_excel)
+    with open(args.sortie, "w", encoding="utf-8") as f:
+        json.dump(resultats, f, indent=2, ensure_ascii=False)
+    print(f"✅ Résultats écrits dans {args.sortie}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
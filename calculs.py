@@ -0,0 +1,470 @@
+"""Moteur de calcul MSCAL (indépendant de Streamlit).
+
+Regroupe la logique partagée par l'application, le traitement par lots
+et les outils annexes : détection des scopes, KPIs, tableaux Pareto,
+rédaction automatique de l'analyse et simulateur de transition.
+Les paramètres par défaut et ``creer_flux`` sont dans ``referentiel``.
+"""
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+
+import parc_it
+import qualite
+from referentiel import (  # noqa: F401 (ré-exportés pour les outils en ligne de commande)
+    COUNTRY_DATA, DEFAULT_PARAMS, SCOPES, creer_flux, reparer_params, version_donnees,
+)
+
+# ==============================================================================
+# PRÉPARATION DE LA DATA (ETL)
+# ==============================================================================
+def detect_scope(row):
+    """Classe une ligne du journal dans le Scope 1, 2 ou 3 (GHG Protocol)."""
+    detail = str(row.get("Détail", ""))
+    if "Scope 1" in detail: return "Scope 1"
+    if "Scope 2" in detail: return "Scope 2"
+    if "Scope 3" in detail: return "Scope 3"
+
+    cat = str(row.get("Catégorie", ""))
+    item = str(row.get("Item", ""))
+    if "Bâtiment" in cat or "Énergie" in cat:
+        if "Gaz" in item or "Fioul" in item: return "Scope 1"
+        if "Élec" in item or "Chauffage" in item or "Radiateur" in item: return "Scope 2"
+    return "Scope 3"
+
+
+def journal_en_dataframe(entries):
+    """Journal (liste de dicts ou ``JournalCompact``) -> DataFrame brut."""
+    if hasattr(entries, "vers_dataframe"):
+        return entries.vers_dataframe()
+    return pd.DataFrame(entries)
+
+
+def preparer_journal(entries):
+    """Journal brut -> DataFrame nettoyé avec la colonne Scope."""
+    df = journal_en_dataframe(entries)
+
+    # Sécurité : On s'assure que les colonnes numériques sont bien des nombres
+    df["Impact_kgCO2"] = pd.to_numeric(df["Impact_kgCO2"], errors='coerce').fillna(0)
+    df["Marge"] = pd.to_numeric(df["Marge"], errors='coerce').fillna(0)
+
+    vide = pd.Series("", index=df.index)
+    codes = scopes_vectorises(*(df.get(c, vide).astype(str) for c in ("Catégorie", "Item", "Détail")))
+    df["Scope"] = np.asarray(SCOPES, dtype=object)[codes]
+    return df
+
+
+def population_totale(params):
+    """Effectif total (jamais nul pour éviter les divisions par zéro)."""
+    pop = int(params['pop_etu']) + int(params['pop_alt']) + int(params['pop_prof'])
+    return pop if pop > 0 else 1
+
+
+# ==============================================================================
+# MOTEUR DE CALCUL DES KPIs
+# ==============================================================================
+def calculer_kpis(df, params, drapeaux=None):
+    """Calcule les 8 KPIs de la Control Tower à partir du journal préparé.
+
+    ``drapeaux`` : résultat de ``qualite.analyser(df)`` s'il est déjà calculé.
+    """
+    # A. Totaux
+    total_co2_t = df["Impact_kgCO2"].sum() / 1000.0
+    total_marge_t = df["Marge"].sum() / 1000.0
+
+    # B. Population & Ratios
+    pop_totale = population_totale(params)
+    ratio_pers = total_co2_t / pop_totale
+    budget_cible = float(params['budget_co2'])
+
+    # C. Financier
+    cout_carbone = total_co2_t * params['shadow_price']
+
+    # D. Qualité de Donnée (DQI) : incertitude déclarée, pénalisée par la part
+    # de l'impact portée par des doublons ou des valeurs aberrantes (qualite.py)
+    if total_co2_t > 0:
+        dqi_score = 10 - (df["Marge"].sum() / df["Impact_kgCO2"].sum() * 20)
+    else:
+        dqi_score = 0
+    dqi_score = max(0, min(10, dqi_score))
+    controle = qualite.synthese(df, qualite.analyser(df) if drapeaux is None else drapeaux)
+    dqi_score *= 1 - controle["part_suspecte"]
+
+    jours = params['jours_ouverture'] or 1
+    intensite_jour = (total_co2_t * 1000) / jours
+
+    scope3 = df[df['Scope'] == 'Scope 3']['Impact_kgCO2'].sum() / 1000
+    part_scope3 = (scope3 / total_co2_t) * 100 if total_co2_t > 0 else 0
+
+    bat_impact = df[df['Catégorie'] == 'Bâtiment']['Impact_kgCO2'].sum()
+
+    return {
+        "total_co2_t": float(total_co2_t),
+        "total_marge_t": float(total_marge_t),
+        "pop_totale": pop_totale,
+        "ratio_pers": float(ratio_pers),
+        "budget_cible": budget_cible,
+        "delta_obj": float(budget_cible - ratio_pers),
+        "cout_carbone": float(cout_carbone),
+        "dqi_score": float(dqi_score),
+        "intensite_jour": float(intensite_jour),
+        "part_scope3": float(part_scope3),
+        "nb_flux": int(len(df)),
+        "bat_impact_t": float(bat_impact / 1000),
+        **controle,
+    }
+
+
+def table_scopes(df):
+    """Synthèse par Scope (ISO 14064) : kg, tonnes et part du total."""
+    df_scope = df.groupby("Scope")["Impact_kgCO2"].sum().reset_index()
+    df_scope["Tonnes CO2e"] = df_scope["Impact_kgCO2"] / 1000
+    total = df["Impact_kgCO2"].sum()
+    df_scope["Part (%)"] = (df_scope["Impact_kgCO2"] / total) * 100 if total else 0.0
+    return df_scope
+
+
+def table_pareto(df):
+    """Classement Pareto (80/20) des Items avec cumul."""
+    df_pareto = df.groupby("Item")["Impact_kgCO2"].sum().reset_index().sort_values("Impact_kgCO2", ascending=False)
+    df_pareto["Cumul"] = df_pareto["Impact_kgCO2"].cumsum()
+    df_pareto["Cumul_Pct"] = df_pareto["Cumul"] / df_pareto["Impact_kgCO2"].sum()
+    return df_pareto
+
+
+def top_postes(df, n=5):
+    """Top N des postes d'émission (Catégorie x Item) en tonnes."""
+    df_top = df.groupby(["Catégorie", "Item"])["Impact_kgCO2"].sum().reset_index().sort_values("Impact_kgCO2", ascending=False).head(n)
+    df_top["Tonnes"] = df_top["Impact_kgCO2"] / 1000
+    return df_top
+
+
+# ==============================================================================
+# ASSISTANT DE RÉDACTION (Logique Expert)
+# ==============================================================================
+def generer_analyse_auto(df, params):
+    """Rédige la note de synthèse du rapport à partir du journal préparé."""
+    analyse = []
+    tot_co2 = df["Impact_kgCO2"].sum() / 1000
+    tot_marge = df["Marge"].sum() / 1000
+    ratio = tot_co2 / population_totale(params)
+    budget = params['budget_co2']
+
+    # 1. Analyse Globale
+    analyse.append(f"Le bilan carbone global s'élève à {tot_co2:.1f} Tonnes CO2e.")
+
+    # 2. Analyse de l'Objectif
+    delta = ratio - budget
+    if delta <= 0:
+        analyse.append(f"✅ EXCELLENT : Avec {ratio:.1f} T/pers, l'objectif ({budget} T) est atteint.")
+    else:
+        analyse.append(f"⚠️ ATTENTION : Le ratio de {ratio:.1f} T/pers dépasse la cible de +{delta:.1f} T.")
+
+    # 3. Identification du Hotspot (Le plus gros pollueur)
+    par_cat = df.groupby("Catégorie")["Impact_kgCO2"].sum()
+    if tot_co2 > 0:
+        top_item = par_cat.idxmax()
+        top_val = par_cat.max() / 1000
+        part = (top_val / tot_co2) * 100
+        analyse.append(f"Le poste critique est '{top_item}' qui représente {part:.0f}% des émissions ({top_val:.1f} T).")
+
+        # 4. Analyse Qualité Donnée
+        if tot_marge / tot_co2 < 0.10:
+            analyse.append("La qualité des données est jugée fiable (incertitude < 10%).")
+        else:
+            analyse.append("Des efforts de collecte sont nécessaires pour réduire l'incertitude actuelle.")
+
+    # 5. Conclusion
+    analyse.append("RECOMMANDATION : Prioriser les actions de réduction sur le premier poste d'émission identifié ci-dessus.")
+
+    return " ".join(analyse)
+
+
+def construire_rapport(entries, params):
+    """Assemble toutes les briques du rapport officiel (page 5) pour un journal."""
+    params = reparer_params(params)
+    df = preparer_journal(entries)
+    return {
+        "params": params,
+        "df": df,
+        "kpis": calculer_kpis(df, params),
+        "df_scope": table_scopes(df),
+        "df_top": top_postes(df, 5),
+        "analyse": generer_analyse_auto(df, params),
+    }
+
+
+def ecrire_rapport_excel(rapport, destination, progression=None):
+    """Écrit le classeur Excel complet d'un rapport (fichier ou buffer)."""
+    kpis = rapport["kpis"]
+    df_synthese = pd.DataFrame([
+        {"Indicateur": "Entité", "Valeur": rapport["params"]['entity_name']},
+        {"Indicateur": "Empreinte Totale (T CO2e)", "Valeur": round(kpis["total_co2_t"], 3)},
+        {"Indicateur": "Marge d'Erreur (T CO2e)", "Valeur": round(kpis["total_marge_t"], 3)},
+        {"Indicateur": "Ratio / Personne (T)", "Valeur": round(kpis["ratio_pers"], 3)},
+        {"Indicateur": "Budget Cible (T/pers)", "Valeur": kpis["budget_cible"]},
+        {"Indicateur": "Coût Fantôme (€)", "Valeur": round(kpis["cout_carbone"], 0)},
+        {"Indicateur": "Intensité Quotidienne (kg/j)", "Valeur": round(kpis["intensite_jour"], 1)},
+        {"Indicateur": "Part du Scope 3 (%)", "Valeur": round(kpis["part_scope3"], 1)},
+        {"Indicateur": "Indice Qualité Donnée (DQI)", "Valeur": round(kpis["dqi_score"], 1)},
+        {"Indicateur": "Nombre de Flux", "Valeur": kpis["nb_flux"]},
+        {"Indicateur": "Analyse", "Valeur": rapport["analyse"]},
+    ])
+    ecrire_classeur({'Synthèse': df_synthese, 'Synthèse Scope': rapport["df_scope"], 'Top 5': rapport["df_top"],
+                     'Données Brutes': rapport["df"]}, destination, progression)
+
+
+def ecrire_classeur(feuilles, destination, progression=None):
+    """Écrit ``{onglet: DataFrame}`` dans un classeur Excel (fichier ou buffer)."""
+    with pd.ExcelWriter(destination, engine='xlsxwriter') as writer:
+        for i, (onglet, df) in enumerate(feuilles.items()):
+            if progression:
+                progression(i / len(feuilles), f"Onglet {onglet}")
+            df.to_excel(writer, index=False, sheet_name=onglet)
+        if progression:
+            progression(0.95, "Compression du classeur")
+
+
+def classeur_excel(feuilles, progression=None):
+    """Octets .xlsx de ``{onglet: DataFrame}`` (exécutable par l'ordonnanceur de tâches)."""
+    buffer = io.BytesIO()
+    ecrire_classeur(feuilles, buffer, progression)
+    return buffer.getvalue()
+
+
+def rapport_excel(rapport, progression=None):
+    """Octets .xlsx du rapport officiel complet (exécutable par l'ordonnanceur de tâches)."""
+    buffer = io.BytesIO()
+    ecrire_rapport_excel(rapport, buffer, progression)
+    return buffer.getvalue()
+
+
+# ==============================================================================
+# SIMULATEUR DE TRANSITION (PAGE 4)
+# ==============================================================================
+# Position "neutre" de chaque levier du cockpit de pilotage
+LEVIERS_DEFAUT = {
+    'sim_pop_growth': 0,      # % évolution effectifs
+    'sim_remote_days': 0,     # jours de distanciel / semaine
+    'sim_mob_reduce': 0,      # % sobriété km
+    'sim_mob_train': False,   # report modal avion -> train
+    'sim_mob_carpool': 1.0,   # pers. / voiture
+    'sim_mob_soft': False,    # plan vélo
+    'sim_elec_green': False,  # contrat électricité verte
+    'sim_solar': 0,           # % autoconsommation solaire
+    'sim_heat': 0,            # % isolation & sobriété
+    'sim_led': False,         # relamping LED
+    'sim_it_life': 0,         # + années de durée de vie IT
+    'sim_it_refurb': 0,       # % achat reconditionné
+    'sim_food_vege': 0,       # % menus végétariens
+    'sim_waste': 0,           # % réduction déchets
+}
+
+
+# Postes de la baseline (un seul par flux, testés dans cet ordre)
+POSTES_SIMULATEUR = ["mob", "ener_elec", "ener_heat", "it", "food", "waste", "autre"]
+MODES_SIMULATEUR = {"autre": 0, "avion": 1, "voiture": 2, "voiture_elec": 3}
+REPAS_CARNES = {"aucun": 0, "boeuf": 1, "volaille": 2}
+
+
+def _contient(serie, motif, case=False):
+    return serie.str.contains(motif, case=case, regex=True, na=False).to_numpy()
+
+
+def scopes_vectorises(cat, item, detail):
+    """Scope (0, 1, 2 pour Scope 1, 2, 3) de chaque flux : mêmes règles que ``detect_scope``, vectorisées."""
+    energie = _contient(cat, "Bâtiment|Énergie", case=True)
+    return np.select([_contient(detail, "Scope 1", case=True), _contient(detail, "Scope 2", case=True), _contient(detail, "Scope 3", case=True),
+                      energie & _contient(item, "Gaz|Fioul", case=True),
+                      energie & _contient(item, "Élec|Chauffage|Radiateur", case=True)], [0, 1, 2, 0, 1], 2)
+
+
+def baseline_simulateur(entries, progression=None, parc=None):
+    """Situation de référence flux par flux : poste, attributs utiles aux leviers et totaux.
+
+    Renvoie les totaux ``ref_*`` par grand poste (comme avant) et, dans
+    ``lignes``, des tableaux NumPy alignés sur le journal (impact, poste,
+    mode, km, trajets quotidiens, éclairage, chauffage, repas carnés) sur
+    lesquels ``simuler_scenario`` applique les leviers par masques.
+    ``parc`` : courbes de réponse du registre IT (``parc_it.courbes_leviers``),
+    appliquées aux flux issus du registre.
+    """
+    if progression:
+        progression(0.05, "Lecture du journal")
+    df_base = journal_en_dataframe(entries)
+    if df_base.empty:
+        df_base = pd.DataFrame(columns=["Catégorie", "Item", "Quantité", "Impact_kgCO2", "Détail"])
+    impact = pd.to_numeric(df_base["Impact_kgCO2"], errors='coerce').fillna(0).to_numpy(dtype=float)
+    cat = df_base["Catégorie"].astype(str)
+    cat_min, item = cat.str.lower(), df_base["Item"].astype(str).str.lower()
+    txt = item + " " + df_base.get("Détail", pd.Series("", index=df_base.index)).astype(str).str.lower()
+
+    # --- 1. POSTE DE CHAQUE FLUX (recherche élargie, sans double compte) ---
+    mob = _contient(cat_min, "mobilit|logisti|transport|déplacement") | _contient(item, "voiture|train|avion|tgv|bus")
+    bat = _contient(cat_min, "bâtiment|batiment|énergie|energie")
+    chauffage = bat & _contient(txt, "chauffage|radiateur|gaz|fioul|fuel|réseau|eau chaude|bois|granul|pompe à chaleur")
+    # Si ça parle de Watt, KWh, Elec, Ampoule -> C'est de l'élec ; le mobilier amorti n'est pas du chauffage
+    elec = bat & _contient(txt, "elec|élec|watt|kwh|led|ampoule|ordinateur|ecran|éclairage")
+    # "IT" en mot entier et sensible à la casse (sinon "Mobilité" serait du numérique)
+    it = _contient(cat, "Numérique|Informatique|Digital") | _contient(cat, r"\bIT\b", case=True)
+    food = _contient(item, "repas|café|boisson|snack|restau")
+    waste = _contient(cat_min, "déchet|achat|fourniture")
+    poste = np.select([mob, elec, chauffage, it, food, waste], range(6), len(POSTES_SIMULATEUR) - 1).astype(np.int8)
+
+    # --- 2. ATTRIBUTS DES FLUX POUR LES LEVIERS ---
+    if progression:
+        progression(0.6, "Attributs des flux")
+    valeur, unite = qualite.parser_quantites(df_base["Quantité"])
+    km = np.where(unite.str.startswith("km").to_numpy(), valeur.to_numpy(dtype=float), np.nan)
+    mode = np.select([_contient(txt, r"avion|\bvols?\b|aérien"), _contient(txt, r"voiture [ée]lec"), _contient(txt, "voiture|auto")],
+                     [MODES_SIMULATEUR["avion"], MODES_SIMULATEUR["voiture_elec"], MODES_SIMULATEUR["voiture"]], 0)
+    repas = np.select([food & _contient(item, "bœuf|boeuf|viande|steak|burger"), food & _contient(item, "poulet|volaille")],
+                      [REPAS_CARNES["boeuf"], REPAS_CARNES["volaille"]], 0)
+    # Scope de chaque flux et incertitude déclarée
+    detail = df_base.get("Détail", pd.Series("", index=df_base.index)).astype(str)
+    scope = scopes_vectorises(cat, df_base["Item"].astype(str), detail)
+    incertitude = pd.to_numeric(df_base.get("Incertitude", pd.Series(0, index=df_base.index)), errors='coerce').fillna(0)
+    lignes = {
+        "impact": impact,
+        "poste": poste,
+        "mode": np.where(mob, mode, 0).astype(np.int8),
+        "km": km,
+        "quotidien": mob & _contient(txt, r"\d+\s*j/an"),   # trajets domicile-campus (jours de présence)
+        "eclairage": elec & _contient(txt, "éclairage|eclairage|led|ampoule|lumi|lampe|néon|neon|spot"),
+        "chauffage": chauffage,
+        "repas": repas.astype(np.int8),
+        "elec": elec,
+        "parc": it & _contient(detail, "^Registre parc", case=True),
+        "scope": scope.astype(np.int8),
+        "incertitude": incertitude.to_numpy(dtype=float) / 100.0,
+    }
+    indicatrices = np.zeros((len(impact), len(POSTES_SIMULATEUR)))
+    indicatrices[np.arange(len(impact)), poste] = 1.0
+    lignes["indicatrices"] = indicatrices
+    refs = impact @ indicatrices
+
+    empreinte = hashlib.sha1()
+    for v in lignes.values():
+        empreinte.update(np.ascontiguousarray(v).tobytes())
+    if parc is not None:
+        empreinte.update(np.concatenate([parc["A"], parc["B"], [parc["r0"]]]).tobytes())
+    return {
+        **{f"ref_{p}": float(r) for p, r in zip(POSTES_SIMULATEUR, refs)},
+        "total_ref": float(impact.sum()),
+        "lignes": lignes,
+        "parc": parc,
+        "version": empreinte.hexdigest()[:16],
+    }
+
+
+def facteurs_leviers(lignes, leviers, params, parc=None):
+    """Coefficient multiplicatif de chaque flux pour des positions de leviers complètes.
+
+    Renvoie ``(facteur, coeff_pop)`` de formes (scénarios, flux) et
+    (scénarios, 1) ; utilisé par ``simuler_scenario`` et par le moteur
+    multi-cœurs (``parallele.py``). Avec ``parc`` (courbes du registre IT),
+    les leviers IT des flux du registre suivent la pyramide des âges réelle.
+    """
+    L, lv = lignes, leviers
+
+    def levier(cle):
+        # (scénarios, 1) : se diffuse sur l'axe des flux
+        return np.asarray(lv[cle], dtype=float)[..., None]
+
+    # A. FACTEUR DÉMOGRAPHIQUE
+    coeff_pop = 1 + (levier('sim_pop_growth') / 100.0)
+    facteur = np.ones_like(L["impact"]) * coeff_pop
+
+    # B. MOBILITÉ
+    avion, voiture = L["mode"] == MODES_SIMULATEUR["avion"], np.isin(L["mode"], [MODES_SIMULATEUR["voiture"], MODES_SIMULATEUR["voiture_elec"]])
+    # 1. Distanciel : seuls les trajets quotidiens (1j = 20% de moins)
+    facteur = facteur * np.where(L["quotidien"], (5 - levier('sim_remote_days')) / 5.0, 1.0)
+    # 2. Sobriété Km : tous les flux de mobilité
+    facteur = facteur * np.where(L["poste"] == 0, 1 - levier('sim_mob_reduce') / 100.0, 1.0)
+    # 3. Report modal : les vols réels re-tarifés au facteur TGV (km connus, sinon rapport des facteurs)
+    fe_vol = np.divide(L["impact"], L["km"], out=np.full_like(L["impact"], params['fe_avion_long']), where=L["km"] > 0)
+    ratio_train = np.where(avion, params['fe_tgv'] / np.where(fe_vol > 0, fe_vol, params['fe_avion_long']), 1.0)
+    facteur = facteur * (1 + levier('sim_mob_train') * (ratio_train - 1))
+    # 4. Covoiturage (voitures seulement) puis Plan Vélo (15% des trajets quotidiens en voiture)
+    facteur = facteur * np.where(voiture, 1 / levier('sim_mob_carpool'), 1.0)
+    facteur = facteur * np.where(voiture & L["quotidien"], 1 - 0.15 * levier('sim_mob_soft'), 1.0)
+
+    # C. ÉNERGIE
+    # Isolation & sobriété : tout ce qui chauffe (gaz, fioul, réseau, radiateurs électriques)
+    facteur = facteur * np.where(L["chauffage"], 1 - levier('sim_heat') / 100.0, 1.0)
+    # Élec : LED (-50% sur l'éclairage), solaire puis contrat vert sur l'électricité
+    facteur = facteur * np.where(L["eclairage"], 1 - 0.50 * levier('sim_led'), 1.0)
+    facteur = facteur * np.where(L["elec"], (1 - levier('sim_solar') / 100.0) * (1 - 0.90 * levier('sim_elec_green')), 1.0)
+
+    # D. RESSOURCES
+    # Parc IT : courbes du registre (renouvellements décalés) si disponibles, sinon forfait
+    registre = (L["poste"] == 3) & L["parc"] if parc is not None else np.zeros_like(L["parc"])
+    est_it = (L["poste"] == 3) & ~registre
+    facteur = facteur * np.where(est_it, 1 / (1 + levier('sim_it_life') / 4.0), 1.0)
+    facteur = facteur * np.where(est_it, 1 - levier('sim_it_refurb') / 100 * 0.8, 1.0)
+    if parc is not None:
+        facteur = facteur * np.where(registre, parc_it.facteur_parc(parc, levier('sim_it_life'), levier('sim_it_refurb') / 100), 1.0)
+    # Menus végétariens : une part des repas carnés remplacée au facteur végé
+    ratio_vege = np.select([L["repas"] == REPAS_CARNES["boeuf"], L["repas"] == REPAS_CARNES["volaille"]],
+                           [params['fe_vege'] / params['fe_boeuf'], params['fe_vege'] / params['fe_volaille']], 1.0)
+    facteur = facteur * (1 + levier('sim_food_vege') / 100 * (ratio_vege - 1))
+    facteur = facteur * np.where(L["poste"] == 5, 1 - levier('sim_waste') / 100.0, 1.0)
+    return facteur, coeff_pop
+
+
+def simuler_scenario(base, leviers, params):
+    """Applique les leviers du cockpit flux par flux et renvoie la trajectoire.
+
+    Chaque levier ne touche que les flux concernés (masques NumPy sur les
+    tableaux de la baseline) : le report modal re-tarife les seuls vols au
+    facteur TGV, le covoiturage ne divise que les trajets en voiture, le
+    LED ne réduit que l'éclairage, les menus végétariens ne remplacent que
+    les repas carnés. Les leviers peuvent être des tableaux NumPy (un
+    élément par scénario) : le lot est évalué en un seul passage (scénarios
+    × flux) ; les cases à cocher agissent comme des coefficients 0/1.
+    """
+    lv = dict(LEVIERS_DEFAUT)
+    lv.update(leviers or {})
+    L = base["lignes"]
+    scalaire = all(np.ndim(v) == 0 for v in lv.values())
+    facteur, coeff_pop = facteurs_leviers(L, lv, params, base.get("parc"))
+
+    # E. SYNTHÈSE PAR POSTE (scénarios × postes)
+    finals = (L["impact"] * facteur) @ L["indicatrices"]
+    projetes = (L["impact"] @ L["indicatrices"]) * coeff_pop
+    sortie = (lambda x: float(np.squeeze(x))) if scalaire else (lambda x: np.asarray(x).reshape(-1))
+    final = {p: finals[..., i] for i, p in enumerate(POSTES_SIMULATEUR)}
+    projete = {p: projetes[..., i] for i, p in enumerate(POSTES_SIMULATEUR)}
+    coeff_pop = coeff_pop[..., 0]
+
+    total_ref = base["total_ref"]
+    total_ref_projete = total_ref * coeff_pop
+    total_final = finals.sum(axis=-1)
+    gain_total_mob = projete["mob"] - final["mob"]
+    gain_total_ener = (projete["ener_elec"] + projete["ener_heat"]) - (final["ener_elec"] + final["ener_heat"])
+    gain_total_res = sum(projete[p] - final[p] for p in ("it", "food", "waste"))
+
+    pop_projete = (int(params['pop_etu']) + int(params['pop_alt']) + int(params['pop_prof'])) * coeff_pop
+    pop_projete = pop_projete + (pop_projete == 0)
+
+    return {
+        "coeff_pop": sortie(coeff_pop),
+        "total_ref": total_ref,
+        "total_ref_projete": sortie(total_ref_projete),
+        "delta_pop": sortie(total_ref_projete - total_ref),
+        "final_mob": sortie(final["mob"]),
+        "final_heat": sortie(final["ener_heat"]),
+        "final_elec": sortie(final["ener_elec"]),
+        "final_it": sortie(final["it"]),
+        "final_food": sortie(final["food"]),
+        "final_waste": sortie(final["waste"]),
+        "final_autre": sortie(final["autre"]),
+        "gain_total_mob": sortie(gain_total_mob),
+        "gain_total_ener": sortie(gain_total_ener),
+        "gain_total_res": sortie(gain_total_res),
+        "total_final": sortie(total_final),
+        "total_economy": sortie(total_ref_projete - total_final),
+        "ratio_final": sortie((total_final / 1000) / pop_projete),
+    }
@@ -0,0 +1,181 @@
+"""Moteur de calendrier : présence jour par jour et par profil de population.
+
+Le planning importé (page 1) est converti en une spécification compacte
+(stockée dans ``params['calendrier']``, donc sauvegardée avec le projet),
+puis en matrice NumPy jours × profils (1 = présent sur site). Les
+jours de présence, kilomètres et personnes-jours se déduisent par
+produits matriciels, exactement sur toute l'année universitaire.
+"""
+import numpy as np
+
+PROFILS = ("Initiale", "Alternant 2/2", "Alternant 1/3", "Échange", "Prof", "Intervenant")
+JOURS_SEMAINE = ("Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim")
+
+# Types de lignes du planning qui ferment le site (comparaison en minuscules, sans accents)
+TYPES_FERMES = ("vacance", "ferie", "fermeture", "ferme", "conge", "pont")
+
+# Part de la consommation d'un bâtiment tertiaire qui dépend de sa fréquentation
+# (le reste : enveloppe, maintien hors gel, veilles) -- ordre de grandeur ADEME
+PART_OCCUPATION = 0.4
+
+
+def _sans_accents(txt):
+    return str(txt).lower().translate(str.maketrans("éèêëàâîïôûüç", "eeeeaaiiouuc"))
+
+
+def _iso(d):
+    return str(np.datetime64(d, "D"))
+
+
+# ==============================================================================
+# 1. LECTURE DU PLANNING -> SPÉCIFICATION
+# ==============================================================================
+def lire_planning(df_cal, jours_semaine=5):
+    """DataFrame du planning (colonnes Date, Type/Statut, Fin optionnelle) -> spécification.
+
+    Si le fichier contient des lignes de fermeture (vacances, fériés...),
+    il décrit des exceptions : les jours ouvrés de la période sont ouverts
+    sauf ces dates. Sinon, il est la liste exhaustive des jours de cours.
+    """
+    import pandas as pd
+
+    colonnes = {c.lower(): c for c in df_cal.columns}
+    if "date" not in colonnes:
+        raise ValueError("Colonne 'Date' absente du planning")
+    col_type = colonnes.get("type") or colonnes.get("statut")
+    col_fin = colonnes.get("fin")
+
+    def dates(serie):
+        # ISO (2026-09-01) d'abord, puis format français (01/09/2026)
+        iso = pd.to_datetime(serie, errors="coerce", format="ISO8601")
+        return iso.fillna(pd.to_datetime(serie, errors="coerce", format="mixed", dayfirst=True))
+
+    debuts = dates(df_cal[colonnes["date"]])
+    fins = dates(df_cal[col_fin]) if col_fin else debuts
+    fins = fins.fillna(debuts)
+    types = df_cal[col_type].map(_sans_accents) if col_type else pd.Series("", index=df_cal.index)
+    valides = debuts.notna()
+    if not valides.any():
+        raise ValueError("Aucune date lisible dans le planning")
+
+    fermes, ouverts = [], []
+    for d0, d1, t in zip(debuts[valides], fins[valides], types[valides]):
+        plage = np.arange(np.datetime64(d0.date(), "D"), np.datetime64(max(d0, d1).date(), "D") + 1)
+        (fermes if any(f in t for f in TYPES_FERMES) else ouverts).extend(plage)
+
+    return {
+        "debut": _iso(debuts.min().date()),
+        "fin": _iso(max(debuts.max(), fins.max()).date()),
+        "jours_semaine": int(jours_semaine),
+        "exhaustif": not fermes,
+        "fermes": sorted({_iso(d) for d in fermes}),
+        "ouverts": sorted({_iso(d) for d in ouverts}),
+        "distanciel": {},
+    }
+
+
+# ==============================================================================
+# 2. MATRICE DE PRÉSENCE
+# ==============================================================================
+class Calendrier:
+    """Matrice de présence jours × profils construite depuis une spécification."""
+
+    def __init__(self, spec, mois_echange=6, nb_visites=2):
+        self.spec = spec
+        debut, fin = np.datetime64(spec["debut"], "D"), np.datetime64(spec["fin"], "D")
+        self.jours = np.arange(debut, fin + 1)
+        num = self.jours.astype("int64")
+        self.jour_semaine = (num + 3) % 7          # 1970-01-01 était un jeudi ; lundi = 0
+        self.semaine = (num - num[0] + self.jour_semaine[0]) // 7 if len(num) else num
+
+        fermes = np.array(spec.get("fermes", []), dtype="datetime64[D]")
+        ouverts = np.array(spec.get("ouverts", []), dtype="datetime64[D]")
+        if spec.get("exhaustif"):
+            self.ouvert = np.isin(self.jours, ouverts)
+        else:
+            ouvres = self.jour_semaine < spec.get("jours_semaine", 5)
+            self.ouvert = (ouvres & ~np.isin(self.jours, fermes)) | np.isin(self.jours, ouverts)
+
+        self.presence = self._matrice(mois_echange, nb_visites)
+        for profil, jours_off in (spec.get("distanciel") or {}).items():
+            self.appliquer_distanciel(jours_off, [profil] if profil in PROFILS else PROFILS)
+
+    def _matrice(self, mois_echange, nb_visites):
+        o = self.ouvert
+        arrivee = self.jours[-1] - int(round(mois_echange * 30.44)) if len(self.jours) else None
+        visites = np.zeros_like(o)
+        idx_ouverts = np.flatnonzero(o)
+        if len(idx_ouverts) and nb_visites > 0:
+            visites[idx_ouverts[np.unique(np.linspace(0, len(idx_ouverts) - 1, int(nb_visites)).round().astype(int))]] = True
+        colonnes = [
+            o,                                           # Initiale : tous les jours de cours
+            o & ((self.semaine // 2) % 2 == 0),          # Alternant 2 sem. école / 2 sem. entreprise
+            o & (self.semaine % 4 == 0),                 # Alternant 1 sem. école / 3 sem. entreprise
+            o & (self.jours > arrivee),                  # Échange : arrive après la pré-spécialisation
+            o,                                           # Prof fixe
+            visites,                                     # Intervenant : visites réparties sur l'année
+        ]
+        return np.column_stack(colonnes).astype(np.uint8)
+
+    def appliquer_distanciel(self, jours_off, profils=PROFILS):
+        """Retire la présence sur site les jours de semaine donnés (0 = lundi)."""
+        masque = np.isin(self.jour_semaine, list(jours_off))
+        for profil in profils:
+            self.presence[masque, PROFILS.index(profil)] = 0
+
+    # --- Agrégats (produits matriciels) ---
+    @property
+    def nb_jours_ouverts(self):
+        return int(self.ouvert.sum())
+
+    def jours_par_profil(self):
+        """Jours de présence sur site de chaque profil (vecteur aligné sur PROFILS)."""
+        return np.ones(len(self.jours), dtype=np.int64) @ self.presence
+
+    def kilometres(self, profils, distances, personnes):
+        """Km.pax annuels de plusieurs trajets (profil, distance A/R, personnes) en un produit."""
+        jours = self.jours_par_profil()[np.asarray([PROFILS.index(p) for p in profils], dtype=int)]
+        return jours * np.asarray(distances, dtype=float) * np.asarray(personnes, dtype=float)
+
+    def occupation(self, effectifs):
+        """Personnes présentes chaque jour : matrice de présence · effectifs par profil."""
+        vecteur = np.array([effectifs.get(p, 0) for p in PROFILS], dtype=float)
+        return self.presence @ vecteur
+
+    def personnes_jours(self, effectifs):
+        return float(self.occupation(effectifs).sum())
+
+    def taux_occupation(self, effectifs):
+        """Personnes-jours réels / personnes-jours si tout l'effectif venait chaque jour ouvert."""
+        capacite = sum(effectifs.values()) * self.nb_jours_ouverts
+        return self.personnes_jours(effectifs) / capacite if capacite else 1.0
+
+    def facteur_batiment(self, effectifs, part_occupation=PART_OCCUPATION):
+        """Coefficient appliqué au ratio kWh/m²/an : seule la part liée à l'occupation
+        (ventilation, ECS, éclairage, consignes) suit le taux d'occupation."""
+        return (1 - part_occupation) + part_occupation * self.taux_occupation(effectifs)
+
+
+def calendrier_params(params, **options):
+    """Calendrier du projet (``params['calendrier']``) ou None s'il n'a pas été importé."""
+    spec = params.get("calendrier")
+    return Calendrier(spec, **options) if spec else None
+
+
+def profil_depuis_libelle(user_type, rythme=""):
+    """Libellé du formulaire de la page 2 -> profil du calendrier (None si non couvert)."""
+    if "Initiale" in user_type: return "Initiale"
+    if "Alternant" in user_type:
+        if rythme.startswith("2 semaines"): return "Alternant 2/2"
+        if rythme.startswith("1 semaine"): return "Alternant 1/3"
+        return None
+    if "Échange" in user_type: return "Échange"
+    if "Prof" in user_type: return "Prof"
+    if "Intervenant" in user_type: return "Intervenant"
+    return None
+
+
+def effectifs_params(params, rythme_alternants="Alternant 2/2"):
+    """Effectifs de la page 1 ventilés sur les profils du calendrier."""
+    return {"Initiale": params.get("pop_etu", 0), rythme_alternants: params.get("pop_alt", 0), "Prof": params.get("pop_prof", 0)}
+
@@ -0,0 +1,230 @@
+"""Test de charge multi-sessions de ``app.py`` (streamlit.testing AppTest).
+
+Usage :
+    python charge.py [-u 10] [-i 3] [--part-admin 0.5] [-o charge_output.json]
+
+Chaque utilisateur simulé ouvre sa propre session headless, se connecte
+(admin ou visiteur) via ``check_password``, parcourt les pages du menu
+``nav``, soumet les formulaires de la page 2 et bouge les curseurs de la
+page 4. Les N utilisateurs tournent en parallèle dans des threads d'un
+même processus, sur un seul « serveur » simulé (``serveur_partage``) :
+runtime, caches ``st.cache_data`` / ``st.cache_resource`` et script
+compilé sont communs, comme pour les sessions d'un vrai serveur. Le
+rapport donne les percentiles de latence par page et la mémoire par
+session.
+"""
+import argparse
+import concurrent.futures as cf
+import json
+import os
+import pickle
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+from streamlit.testing.v1 import AppTest, app_test, local_script_runner
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+MOTS_DE_PASSE = {"admin": "MSCAL2026", "guest": "GUEST"}
+
+FORMULAIRES_PAGE2 = ["Calculer Flux Humain", "Ajouter Bâtiment", "Ajouter Conso", "Calculer Impact IT",
+                     "💾 Enregistrer cet Inventaire au Bilan"]
+CURSEURS_PAGE4 = {"💻 Jours en Distanciel / sem": (0, 5), "📉 Sobriété Km (Réduction Volontaire)": (0, 50),
+                  "🔥 Isolation & Sobriété (19°C)": (0, 50), "🥗 Menus Végétariens": (0, 100)}
+
+
+def serveur_partage():
+    """Fait tourner toutes les sessions AppTest du processus sur un même serveur simulé.
+
+    AppTest crée à chaque rerun son propre runtime (remis à ``None`` en fin
+    de rerun) et son propre cache de bytecode : des sessions en threads se
+    marchent dessus (« Runtime hasn't been created », compilation
+    concurrente du script). On installe un runtime unique (médias, cache
+    ``st.cache_data``) et un seul cache du script compilé, comme ``Runtime``
+    le fait pour toutes les sessions d'un serveur.
+    """
+    from unittest.mock import MagicMock
+
+    from streamlit.components.v2.component_manager import BidiComponentManager
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.dataframe_source_manager import DataframeSourceManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    serveur = MagicMock(spec=Runtime)
+    serveur.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    serveur.dataframe_source_mgr = DataframeSourceManager()
+    serveur.cache_storage_manager = MemoryCacheStorageManager()
+    composants = BidiComponentManager()
+    composants.discover_and_register_components(start_file_watching=False)
+    serveur.bidi_component_registry = composants
+    Runtime.instance = classmethod(lambda cls: serveur)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    script = ScriptCache()
+    app_test.ScriptCache = local_script_runner.ScriptCache = lambda: script
+    return serveur
+
+
+class ErreurScenario(Exception):
+    """L'application a levé une exception pendant le parcours."""
+
+
+def taille_session(at):
+    """Taille approximative (octets) de l'état de session sérialisé."""
+    total = 0
+    for valeur in at.session_state.to_dict().values():
+        try:
+            total += len(pickle.dumps(valeur, protocol=pickle.HIGHEST_PROTOCOL))
+        except Exception:
+            total += sys.getsizeof(valeur)
+    return total
+
+
+class Utilisateur:
+    """Une session simulée ; chaque interaction est chronométrée par page."""
+
+    def __init__(self, numero, role, timeout):
+        self.numero = numero
+        self.role = role
+        self.rng = random.Random(numero)
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        self.mesures = []
+
+    def _executer(self, page, action):
+        t0 = time.perf_counter()
+        action()
+        self.mesures.append((page, (time.perf_counter() - t0) * 1000))
+        if self.at.exception:
+            raise ErreurScenario(f"{page} : {self.at.exception[0].message}")
+
+    def _widget(self, collection, label):
+        for w in collection:
+            if w.label == label:
+                return w
+        return None
+
+    def connexion(self):
+        self._executer("Connexion (affichage)", self.at.run)
+        self.at.text_input[0].input(MOTS_DE_PASSE[self.role])
+        self._executer("Connexion (check_password)", self._widget(self.at.button, "Se connecter").click().run)
+
+    def aller(self, prefixe):
+        nav = self._widget(self.at.radio, "Séquence de travail")
+        option = next((o for o in nav.options if o.startswith(prefixe)), None)
+        if option is None:
+            return False
+        self._executer(option, nav.set_value(option).run)
+        return True
+
+    def saisir_page2(self):
+        for label in FORMULAIRES_PAGE2:
+            bouton = self._widget(self.at.button, label)
+            if bouton is not None:
+                self._executer("2. Soumission formulaire", bouton.click().run)
+
+    def bouger_curseurs(self):
+        for label, (mini, maxi) in CURSEURS_PAGE4.items():
+            curseur = self._widget(self.at.slider, label)
+            if curseur is not None:
+                self._executer("4. Mouvement curseur", curseur.set_value(self.rng.randint(mini, maxi)).run)
+
+    def parcours(self, iterations):
+        self.connexion()
+        for _ in range(iterations):
+            for prefixe in ["0.", "1.", "2.", "3.", "4.", "5."]:
+                if not self.aller(prefixe):
+                    continue
+                if prefixe == "2.":
+                    self.saisir_page2()
+                elif prefixe == "4.":
+                    self.bouger_curseurs()
+        return {"utilisateur": self.numero, "role": self.role, "mesures": self.mesures,
+                "octets_session": taille_session(self.at), "flux": len(self.at.session_state.db_entries)}
+
+
+def lancer_utilisateur(numero, role, iterations, timeout):
+    u = Utilisateur(numero, role, timeout)
+    try:
+        return u.parcours(iterations)
+    except Exception as e:
+        return {"utilisateur": numero, "role": role, "mesures": u.mesures, "erreur": f"{type(e).__name__}: {e}"}
+
+
+def percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    k = (len(valeurs) - 1) * p / 100
+    bas = int(k)
+    haut = min(bas + 1, len(valeurs) - 1)
+    return valeurs[bas] + (valeurs[haut] - valeurs[bas]) * (k - bas)
+
+
+def synthese(sessions, duree_s):
+    par_page = defaultdict(list)
+    for s in sessions:
+        for page, ms in s["mesures"]:
+            par_page[page].append(ms)
+    pages = [{"page": page, "n": len(v), "p50_ms": percentile(v, 50), "p90_ms": percentile(v, 90),
+              "p99_ms": percentile(v, 99), "max_ms": max(v)} for page, v in sorted(par_page.items())]
+    memoires = [s["octets_session"] for s in sessions if "octets_session" in s]
+    return {
+        "utilisateurs": len(sessions),
+        "duree_s": duree_s,
+        "interactions": sum(len(s["mesures"]) for s in sessions),
+        "debit_par_s": sum(len(s["mesures"]) for s in sessions) / duree_s if duree_s else 0,
+        "erreurs": [{"utilisateur": s["utilisateur"], "erreur": s["erreur"]} for s in sessions if "erreur" in s],
+        "memoire_session_moy_o": statistics.mean(memoires) if memoires else 0,
+        "memoire_session_max_o": max(memoires) if memoires else 0,
+        "pages": pages,
+    }
+
+
+def afficher(res):
+    print(f"\n👥 {res['utilisateurs']} sessions | {res['interactions']} interactions en {res['duree_s']:.1f} s "
+          f"({res['debit_par_s']:.1f} /s) | {len(res['erreurs'])} erreur(s)")
+    print(f"💾 Mémoire / session : moy {res['memoire_session_moy_o'] / 1024:.0f} Ko, max {res['memoire_session_max_o'] / 1024:.0f} Ko\n")
+    print(f"{'page':<40} {'n':>5} {'p50':>9} {'p90':>9} {'p99':>9} {'max':>9}")
+    for p in res["pages"]:
+        print(f"{p['page'][:40]:<40} {p['n']:>5} {p['p50_ms']:>7.0f}ms {p['p90_ms']:>7.0f}ms {p['p99_ms']:>7.0f}ms {p['max_ms']:>7.0f}ms")
+    for e in res["erreurs"]:
+        print(f"  ⚠️ utilisateur {e['utilisateur']} : {e['erreur']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge multi-sessions de l'application MSCAL (AppTest).")
+    parser.add_argument("-u", "--utilisateurs", type=int, default=10, help="Sessions simultanées (défaut : 10)")
+    parser.add_argument("-i", "--iterations", type=int, default=2, help="Tours complets du menu par session (défaut : 2)")
+    parser.add_argument("--part-admin", type=float, default=0.5, help="Part des sessions admin (défaut : 0.5)")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout d'un rerun en secondes")
+    parser.add_argument("--seuil-p90", type=float, default=None, help="Échec si le p90 d'une page dépasse ce seuil (ms)")
+    parser.add_argument("-o", "--sortie", default=None, help="Fichier JSON de résultats (optionnel)")
+    args = parser.parse_args(argv)
+
+    nb_admin = round(args.utilisateurs * args.part_admin)
+    roles = ["admin"] * nb_admin + ["guest"] * (args.utilisateurs - nb_admin)
+
+    serveur_partage()
+    t0 = time.perf_counter()
+    with cf.ThreadPoolExecutor(max_workers=args.utilisateurs) as pool:
+        sessions = list(pool.map(lambda a: lancer_utilisateur(*a),
+                                 [(i, role, args.iterations, args.timeout) for i, role in enumerate(roles)]))
+    res = synthese(sessions, time.perf_counter() - t0)
+
+    afficher(res)
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2, ensure_ascii=False)
+    if res["erreurs"]:
+        return 2
+    lentes = [p for p in res["pages"] if args.seuil_p90 and p["p90_ms"] > args.seuil_p90]
+    for p in lentes:
+        print(f"  🐢 Régression : {p['page']} p90 {p['p90_ms']:.0f} ms > {args.seuil_p90:.0f} ms")
+    return 3 if lentes else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
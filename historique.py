@@ -0,0 +1,96 @@
+"""Historique pluriannuel du bilan : agrégats par année et écarts N/N-1.
+
+Chaque flux porte une année de reporting (``Année``, à défaut l'année de
+sa date de saisie). Le journal est réduit une fois par révision en un
+cube ``Année × Scope × Catégorie × Item`` (quelques centaines de lignes) :
+toutes les comparaisons entre années, à n'importe quel niveau, sont ensuite
+des pivots et différences vectorisées sur ce cube, sans relire le journal.
+"""
+import numpy as np
+import pandas as pd
+
+from calculs import journal_en_dataframe, preparer_journal
+
+# Niveaux de comparaison -> colonnes de regroupement du cube
+NIVEAUX = {
+    "Scope": ["Scope"],
+    "Catégorie": ["Catégorie"],
+    "Item": ["Catégorie", "Item"],
+}
+
+
+def annees_flux(df):
+    """Année de reporting de chaque ligne : colonne ``Année`` sinon les 4 premiers caractères de ``Date``."""
+    date = df["Date"].astype(str).str[:4] if "Date" in df.columns else pd.Series(np.nan, index=df.index)
+    annee = pd.to_numeric(df["Année"], errors="coerce") if "Année" in df.columns else pd.Series(np.nan, index=df.index)
+    return annee.fillna(pd.to_numeric(date, errors="coerce")).fillna(0).astype(int)
+
+
+def filtrer_annee(entries, annee):
+    """Flux d'une année (liste de dicts), par ex. pour la baseline du simulateur."""
+    df = journal_en_dataframe(entries)
+    if df.empty:
+        return []
+    masque = (annees_flux(df) == int(annee)).to_numpy()
+    return [e for e, garde in zip(entries, masque) if garde]
+
+
+def construire_cube(df):
+    """Journal préparé -> cube agrégé (Année, Scope, Catégorie, Item) : impact, marge, nombre de flux."""
+    if df.empty:
+        return pd.DataFrame(columns=["Année", "Scope", "Catégorie", "Item", "Impact_kgCO2", "Marge", "Flux"])
+    cles = pd.DataFrame({"Année": annees_flux(df), "Scope": df["Scope"], "Catégorie": df["Catégorie"], "Item": df["Item"]})
+    return (pd.concat([cles, df[["Impact_kgCO2", "Marge"]]], axis=1)
+            .groupby(["Année", "Scope", "Catégorie", "Item"], sort=True, observed=True)
+            .agg(Impact_kgCO2=("Impact_kgCO2", "sum"), Marge=("Marge", "sum"), Flux=("Impact_kgCO2", "size"))
+            .reset_index())
+
+
+class EntrepotHistorique:
+    """Cube annuel mis en cache par révision du journal (un par session)."""
+
+    def __init__(self):
+        self.cle = None
+        self.cube = construire_cube(pd.DataFrame())
+
+    def actualiser(self, entries, df=None):
+        """Recalcule le cube si le journal a changé (``df`` : journal déjà préparé, optionnel)."""
+        cle = (id(entries), getattr(entries, "revision", None), len(entries))
+        if cle != self.cle or getattr(entries, "revision", None) is None:
+            self.cube = construire_cube(preparer_journal(entries) if df is None else df)
+            self.cle = cle
+        return self.cube
+
+    @property
+    def annees(self):
+        return sorted(int(a) for a in self.cube["Année"].unique())
+
+    def totaux(self):
+        """Total par année (tCO2e, marge, nombre de flux)."""
+        t = self.cube.groupby("Année").agg(Impact_kgCO2=("Impact_kgCO2", "sum"), Marge=("Marge", "sum"), Flux=("Flux", "sum"))
+        return t.assign(Impact_t=t["Impact_kgCO2"] / 1000, Marge_t=t["Marge"] / 1000)
+
+    def comparer(self, niveau="Scope", annees=None):
+        """Pivot années en colonnes + écarts N/N-1 (absolus en tCO2e et relatifs).
+
+        Renvoie ``(valeurs, ecarts, ecarts_pct)`` : trois DataFrames indexés
+        par les clés du niveau, colonnes = années (triées).
+        """
+        cube = self.cube if annees is None else self.cube[self.cube["Année"].isin(annees)]
+        valeurs = cube.pivot_table(index=NIVEAUX[niveau], columns="Année", values="Impact_kgCO2", aggfunc="sum", fill_value=0.0) / 1000
+        valeurs = valeurs.sort_index(axis=1)
+        ecarts = valeurs.diff(axis=1).iloc[:, 1:]
+        precedent = valeurs.shift(axis=1).iloc[:, 1:]
+        ecarts_pct = ecarts / precedent.where(precedent != 0)
+        return valeurs, ecarts, ecarts_pct
+
+    def ecarts_longs(self, niveau, annee, reference):
+        """Table longue (poste, année N, référence, écart, écart %) triée par écart absolu décroissant."""
+        valeurs, _, _ = self.comparer(niveau, [reference, annee])
+        for a in (reference, annee):
+            if a not in valeurs.columns:
+                valeurs[a] = 0.0
+        out = pd.DataFrame({"Référence": valeurs[reference], "Année": valeurs[annee]})
+        out["Écart"] = out["Année"] - out["Référence"]
+        out["Écart %"] = out["Écart"] / out["Référence"].where(out["Référence"] != 0)
+        return out.reindex(out["Écart"].abs().sort_values(ascending=False).index).reset_index()
@@ -0,0 +1,203 @@
+"""Ingestion des relevés de compteurs (GTB) déposés dans un dossier surveillé.
+
+La gestion technique du bâtiment exporte ses relevés d'intervalle en CSV
+(une ligne par compteur et pas de temps : compteur, horodatage, valeur,
+énergie et unité optionnelles) dans un dossier local. Plutôt qu'une
+estimation « surface × ratio », l'énergie mesurée entre dans le bilan :
+
+* un point de reprise (``.mscal_reprise.json`` dans le dossier) mémorise
+  l'octet lu de chaque fichier : seuls les nouveaux fichiers et les lignes
+  ajoutées à la fin d'un fichier sont lus (une ligne incomplète en cours
+  d'écriture attend le passage suivant) ;
+* les relevés sont agrégés par compteur et par mois (rééchantillonnage
+  pandas), et les totaux mensuels sont conservés dans le point de reprise :
+  un nouveau fichier s'ajoute aux totaux sans relire les anciens ;
+* chaque (compteur, mois) devient un flux Énergie du journal, mis à jour
+  en place s'il existe déjà (étiquette ``Compteur <id> | <AAAA-MM>``).
+"""
+import io
+import json
+import os
+import re
+import threading
+
+import pandas as pd
+
+from referentiel import creer_flux
+
+DOSSIER_COMPTEURS = os.environ.get("MSCAL_COMPTEURS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "releves_compteurs"))
+FICHIER_REPRISE = ".mscal_reprise.json"
+PERIODE = "MS"                  # Agrégation mensuelle (début de mois)
+INCERTITUDE_COMPTEUR = 2        # Mesure directe : marge faible
+# Énergie -> (clé du facteur d'émission, libellé, scope)
+ENERGIES = {
+    "elec": ('fe_elec', "Élec", "Scope 2"),
+    "gaz": ('fe_gaz', "Gaz", "Scope 1"),
+}
+UNITES_KWH = {"wh": 0.001, "kwh": 1.0, "mwh": 1000.0, "m3": 11.2}   # Gaz : PCS moyen 11,2 kWh/m³
+MOTIF_ETIQUETTE = re.compile(r"Compteur (.+?) \| (\d{4}-\d{2})")
+
+_VERROU = threading.Lock()      # Un seul passage d'ingestion à la fois par processus (point de reprise partagé)
+
+
+def normaliser_energie(serie):
+    bas = serie.astype(str).str.lower()
+    return pd.Series("elec", index=serie.index).mask(bas.str.contains("gaz|gas|ch4"), "gaz")
+
+
+# ==============================================================================
+# 1. POINT DE REPRISE
+# ==============================================================================
+def lire_reprise(dossier):
+    """``{"fichiers": {nom: octets lus}, "agregats": {"compteur|energie|AAAA-MM": [kWh, relevés]}}``."""
+    try:
+        with open(os.path.join(dossier, FICHIER_REPRISE), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"fichiers": {}, "agregats": {}}
+
+
+def ecrire_reprise(dossier, reprise):
+    # Écriture atomique : un arrêt en cours de route laisse l'ancien point de reprise intact
+    chemin = os.path.join(dossier, FICHIER_REPRISE)
+    with open(chemin + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(reprise, f, ensure_ascii=False)
+    os.replace(chemin + ".tmp", chemin)
+
+
+def nouveautes(dossier, reprise=None):
+    """Fichiers CSV ayant des octets non lus : ``[(nom, octets lus, taille)]`` (simple ``stat``, sans lecture)."""
+    if not os.path.isdir(dossier):
+        return []
+    lus = (reprise or lire_reprise(dossier))["fichiers"]
+    trouves = []
+    for nom in sorted(os.listdir(dossier)):
+        if nom.lower().endswith(".csv"):
+            taille = os.path.getsize(os.path.join(dossier, nom))
+            if taille != lus.get(nom, 0):
+                trouves.append((nom, lus.get(nom, 0), taille))
+    return trouves
+
+
+def _lire_suite(chemin, debut):
+    """(en-tête, nouvelles lignes complètes, octet de fin) d'un fichier lu à partir de ``debut``."""
+    with open(chemin, "rb") as f:
+        entete = f.readline()
+        f.seek(max(debut, len(entete)))
+        suite = f.read()
+    fin_complete = suite.rfind(b"\n") + 1      # Dernière ligne sans retour chariot : en cours d'écriture
+    return entete, suite[:fin_complete], max(debut, len(entete)) + fin_complete
+
+
+# ==============================================================================
+# 2. LECTURE & RÉÉCHANTILLONNAGE
+# ==============================================================================
+def lire_releves(contenu):
+    """Octets CSV (en-tête + lignes) -> DataFrame normalisé (compteur, energie, horodatage, kwh)."""
+    separateur = ";" if contenu[:contenu.find(b"\n")].count(b";") else ","
+    df = pd.read_csv(io.BytesIO(contenu), sep=separateur, dtype=str)
+    colonnes = {c.lower().strip().replace(" ", "_").replace("é", "e"): c for c in df.columns}
+
+    def col(*noms):
+        return next((colonnes[n] for n in noms if n in colonnes), None)
+
+    c_compteur, c_date = col("compteur", "id_compteur", "point", "meter", "meter_id"), col("horodatage", "date", "timestamp", "datetime")
+    c_valeur = col("valeur", "kwh", "consommation", "energie_kwh", "value")
+    c_energie, c_unite = col("energie", "fluide", "type_energie"), col("unite", "unit")
+    if c_compteur is None or c_date is None or c_valeur is None:
+        raise ValueError("Colonnes attendues : Compteur, Horodatage, Valeur (Énergie et Unité optionnelles)")
+
+    out = pd.DataFrame(index=df.index)
+    out["compteur"] = df[c_compteur].astype(str).str.strip()
+    out["energie"] = normaliser_energie(df[c_energie] if c_energie else df[c_compteur])
+    # Horodatages ISO (2025-03-04 10:30) d'abord, sinon format français jour/mois
+    iso = pd.to_datetime(df[c_date], errors="coerce", format="ISO8601")
+    out["horodatage"] = iso.fillna(pd.to_datetime(df[c_date].where(iso.isna()), errors="coerce", dayfirst=True, format="mixed"))
+    valeur = pd.to_numeric(df[c_valeur].astype(str).str.replace(",", ".", regex=False).str.replace(r"\s", "", regex=True), errors="coerce")
+    unite = df[c_unite].astype(str).str.strip().str.lower().str.replace("³", "3") if c_unite else pd.Series("kwh", index=df.index)
+    out["kwh"] = valeur * unite.map(UNITES_KWH)
+    return out
+
+
+def reechantillonner(releves, periode=PERIODE):
+    """Relevés d'intervalle -> totaux par compteur, énergie et période (kWh, nombre de relevés)."""
+    return (releves.groupby(["compteur", "energie", pd.Grouper(key="horodatage", freq=periode)])["kwh"]
+            .agg(kwh="sum", releves="size").reset_index())
+
+
+def ingerer(dossier=DOSSIER_COMPTEURS, progression=None):
+    """Lit les octets nouveaux du dossier, cumule les totaux mensuels et avance le point de reprise.
+
+    Renvoie ``{"fichiers": [(nom, lignes lues)], "rejets": n, "modifies": [clés], "agregats": DataFrame}`` ;
+    exécutable en tâche de fond.
+    """
+    with _VERROU:
+        reprise = lire_reprise(dossier)
+        a_lire = nouveautes(dossier, reprise)
+        lus, rejets, modifies = [], 0, set()
+        for k, (nom, debut, taille) in enumerate(a_lire):
+            if progression:
+                progression(k / max(len(a_lire), 1), f"Lecture de {nom}")
+            if taille < debut:
+                # Fichier réécrit plus court : le relire doublerait les totaux, on le signale sans y toucher
+                lus.append((nom, "tronqué, ignoré"))
+                continue
+            entete, suite, fin = _lire_suite(os.path.join(dossier, nom), debut)
+            reprise["fichiers"][nom] = fin
+            if not suite.strip():
+                continue
+            releves = lire_releves(entete + suite)
+            valides = releves.dropna(subset=["horodatage", "kwh"])
+            rejets += len(releves) - len(valides)
+            for _, g in reechantillonner(valides).iterrows():
+                cle = f"{g['compteur']}|{g['energie']}|{g['horodatage']:%Y-%m}"
+                total = reprise["agregats"].setdefault(cle, [0.0, 0])
+                total[0] += float(g["kwh"])
+                total[1] += int(g["releves"])
+                modifies.add(cle)
+            lus.append((nom, len(releves)))
+        if a_lire:
+            ecrire_reprise(dossier, reprise)
+    if progression:
+        progression(1.0, "Terminé")
+    return {"fichiers": lus, "rejets": rejets, "modifies": sorted(modifies), "agregats": agregats(reprise)}
+
+
+def agregats(reprise):
+    """Totaux du point de reprise en DataFrame (compteur, energie, periode, kWh, relevés)."""
+    lignes = [cle.split("|") + valeurs for cle, valeurs in reprise["agregats"].items()]
+    return pd.DataFrame(lignes, columns=["compteur", "energie", "periode", "kWh", "releves"]).sort_values(["compteur", "periode"], ignore_index=True)
+
+
+# ==============================================================================
+# 3. FLUX DU JOURNAL (MISE À JOUR EN PLACE)
+# ==============================================================================
+def flux_compteurs(agregats, params):
+    """Un flux Énergie par compteur et par mois (date = premier jour du mois)."""
+    flux = []
+    for g in agregats.itertuples(index=False):
+        cle_fe, libelle, scope = ENERGIES[g.energie]
+        flux.append(creer_flux("Énergie", f"{libelle} (Compteur {g.compteur})", round(g.kWh, 3), "kWh", params[cle_fe], INCERTITUDE_COMPTEUR,
+                               f"{scope} | Compteur {g.compteur} | {g.periode} | {g.releves} relevés", int(g.periode[:4]),
+                               date=f"{g.periode}-01"))
+    return flux
+
+
+def plan_upsert(entries, flux):
+    """Flux à ajouter et ``(indice, flux)`` à corriger (même compteur et mois, valeur ou facteur changés)."""
+    positions = {}
+    if len(entries):
+        df = entries.vers_dataframe() if hasattr(entries, "vers_dataframe") else pd.DataFrame(list(entries))
+        etiquettes = df["Détail"].astype(str).str.extract(MOTIF_ETIQUETTE)
+        for i, (compteur, periode) in etiquettes.dropna().iterrows():
+            positions[(compteur, periode)] = (i, df.at[i, "Quantité"], df.at[i, "Impact_kgCO2"])
+    ajouts, corrections = [], []
+    for f in flux:
+        cle = MOTIF_ETIQUETTE.search(f["Détail"]).groups()
+        if cle not in positions:
+            ajouts.append(f)
+        else:
+            i, quantite, impact = positions[cle]
+            if quantite != f["Quantité"] or abs(impact - f["Impact_kgCO2"]) > 1e-9:
+                corrections.append((int(i), f))
+    return ajouts, corrections
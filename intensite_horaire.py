@@ -0,0 +1,250 @@
+"""Intensité carbone horaire de l'électricité (mode optionnel « horaire »).
+
+Les profils pays (kgCO2e/kWh, pas horaire, éventuellement pluriannuels)
+sont stockés dans ``donnees/intensite/`` en binaires ``.npy`` décrits par
+``index.json``, et lus en ``mmap_mode='r'`` : seule l'année utilisée est
+paginée en mémoire, et le cache disque du système est partagé par toutes
+les sessions. Le Scope 2 des lignes « Élec (Watts) » et « Machine Spé
+(Watts) » de l'inventaire devient un produit horaire usage × intensité,
+avec la part émise pendant les heures de pointe.
+"""
+import functools
+import json
+import os
+import re
+
+import numpy as np
+
+DOSSIER_INTENSITE = os.environ.get(
+    "MSCAL_INTENSITE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "donnees", "intensite"))
+QUANTILE_POINTE = 0.90     # Heures de pointe = 10 % des heures les plus carbonées de l'année
+
+
+def _plage(debut, fin, hors=0.0):
+    """Profil 24 h : 1 entre ``debut`` et ``fin``, ``hors`` le reste du temps."""
+    h = np.full(24, hors, dtype=np.float32)
+    h[debut:fin] = 1.0
+    return h
+
+
+# Profils d'usage journaliers (fraction de la puissance appelée, heure par heure)
+PROFILS_USAGE = {
+    # Équipements des salles : 8 h de fonctionnement les jours d'ouverture (hypothèse historique)
+    "Élec (Watts)": {"ouvre": _plage(9, 17), "ferme": np.zeros(24, dtype=np.float32)},
+    # Machines spécifiques (labos) : 8h-18h en service, 20 % en veille le reste du temps
+    "Machine Spé (Watts)": {"ouvre": _plage(8, 18, 0.2), "ferme": np.full(24, 0.2, dtype=np.float32)},
+}
+
+
+# ==============================================================================
+# 1. STOCKAGE : INDEX + BINAIRES MÉMOIRE-MAPPÉS
+# ==============================================================================
+def _slug(pays):
+    return re.sub(r"[^a-z0-9]+", "_", pays.lower().encode("ascii", "ignore").decode()).strip("_") or "pays"
+
+
+def lire_index(dossier=DOSSIER_INTENSITE):
+    try:
+        with open(os.path.join(dossier, "index.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _ecrire_index(index, dossier):
+    chemin = os.path.join(dossier, "index.json")
+    with open(chemin + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f, indent=2, ensure_ascii=False)
+    os.replace(chemin + ".tmp", chemin)
+
+
+@functools.lru_cache(maxsize=16)
+def _memmap(chemin, mtime):
+    return np.load(chemin, mmap_mode="r")
+
+
+def charger_profil(pays, dossier=DOSSIER_INTENSITE):
+    """(série mémoire-mappée, métadonnées) du pays, ou (None, None) s'il n'y a pas de profil."""
+    meta = lire_index(dossier).get(pays)
+    if not meta:
+        return None, None
+    chemin = os.path.join(dossier, meta["fichier"])
+    return _memmap(chemin, os.path.getmtime(chemin)), meta
+
+
+def annees_disponibles(meta):
+    """Années civiles entièrement couvertes par le profil."""
+    debut = np.datetime64(meta["debut"], "h")
+    fin = debut + meta["heures"]
+    annees = range(int(str(debut)[:4]), int(str(fin)[:4]) + 1)
+    return [a for a in annees if np.datetime64(f"{a}-01-01T00", "h") >= debut and np.datetime64(f"{a + 1}-01-01T00", "h") <= fin]
+
+
+def importer_csv(source, pays, dossier=DOSSIER_INTENSITE):
+    """CSV horodaté (ex. export Electricity Maps / RTE éCO2mix) -> binaire .npy + entrée d'index.
+
+    Colonnes détectées : la première contenant date/time/heure, puis la
+    première colonne numérique contenant intens/co2 (sinon la suivante).
+    Les valeurs en g/kWh sont converties en kg/kWh ; la série est remise
+    au pas horaire (trous interpolés). Les horodatages avec décalage
+    (``Z``, ``+01:00``) sont ramenés à l'heure locale du pays, celle des
+    profils d'usage ; sans décalage, ils sont supposés déjà locaux.
+    """
+    import pandas as pd
+
+    from referentiel import COUNTRY_DATA
+
+    df = pd.read_csv(source, sep=None, engine="python")
+    col_t = next((c for c in df.columns if any(k in c.lower() for k in ("date", "time", "heure"))), df.columns[0])
+    numeriques = [c for c in df.columns if c != col_t and pd.to_numeric(df[c], errors="coerce").notna().mean() > 0.9]
+    col_v = next((c for c in numeriques if any(k in c.lower() for k in ("intens", "co2"))), numeriques[0] if numeriques else None)
+    if col_v is None:
+        raise ValueError("Aucune colonne d'intensité numérique trouvée")
+
+    textes = df[col_t].astype(str).str.strip()
+    fuseau = COUNTRY_DATA.get(pays, {}).get("fuseau", "UTC")
+    if textes.str.contains(r"(?:Z|[+-]\d{2}:?\d{2})$").any():
+        horodates = pd.to_datetime(textes, errors="coerce", utc=True).dt.tz_convert(fuseau).dt.tz_localize(None)
+    else:
+        horodates = pd.to_datetime(textes, errors="coerce")
+    serie = pd.Series(pd.to_numeric(df[col_v], errors="coerce").to_numpy(), index=horodates)
+    serie = serie[serie.index.notna()].sort_index()
+    serie = serie[~serie.index.duplicated()].resample("h").mean().interpolate(limit_direction="both")
+    if len(serie) < 24:
+        raise ValueError("Série trop courte (moins de 24 heures)")
+    if serie.median() > 5:  # g/kWh
+        serie = serie / 1000
+
+    os.makedirs(dossier, exist_ok=True)
+    fichier = f"{_slug(pays)}.npy"
+    np.save(os.path.join(dossier, fichier), serie.to_numpy(dtype=np.float32))
+    meta = {"fichier": fichier, "debut": serie.index[0].strftime("%Y-%m-%dT%H"), "heures": int(len(serie)),
+            "unite": "kgCO2e/kWh", "fuseau": fuseau, "moyenne": float(serie.mean()), "source": getattr(source, "name", str(source))}
+    index = lire_index(dossier)
+    index[pays] = meta
+    _ecrire_index(index, dossier)
+    return meta
+
+
+def intensite_annee(pays, annee, dossier=DOSSIER_INTENSITE):
+    """Vue (sans copie) sur les heures de l'année ``annee`` du profil pays."""
+    serie, meta = charger_profil(pays, dossier)
+    if serie is None:
+        raise ValueError(f"Aucun profil horaire pour {pays}")
+    if annee not in annees_disponibles(meta):
+        raise ValueError(f"Année {annee} non couverte par le profil {pays}")
+    i0 = int((np.datetime64(f"{annee}-01-01T00", "h") - np.datetime64(meta["debut"], "h")).astype(int))
+    n = int((np.datetime64(f"{annee + 1}-01-01T00", "h") - np.datetime64(f"{annee}-01-01T00", "h")).astype(int))
+    return serie[i0:i0 + n]
+
+
+# ==============================================================================
+# 2. PROFILS D'USAGE & CALCUL DU SCOPE 2 HORAIRE
+# ==============================================================================
+def jours_ouverts_annee(annee, jours_ouverture, spec_calendrier=None):
+    """Poids d'ouverture de chaque jour de ``annee`` (0/1, ou mis à l'échelle de ``jours_ouverture``).
+
+    Avec un calendrier importé, ses jours ouverts sont reportés sur
+    ``annee`` au même jour/mois (l'année universitaire chevauche deux
+    années civiles). Sinon : jours ouvrés lun-ven, pondérés pour totaliser
+    ``jours_ouverture`` jours comme le calcul annuel.
+    """
+    jours = np.arange(np.datetime64(f"{annee}-01-01"), np.datetime64(f"{annee + 1}-01-01"))
+    if spec_calendrier:
+        from calendrier import Calendrier
+
+        cal = Calendrier(spec_calendrier)
+        ouverts = cal.jours[cal.ouvert]
+        jour_an = (ouverts - ouverts.astype("datetime64[Y]")).astype(int)
+        poids = np.zeros(len(jours))
+        poids[np.minimum(jour_an, len(jours) - 1)] = 1.0
+        return poids
+    ouvres = ((jours.astype("int64") + 3) % 7 < 5).astype(float)
+    return ouvres * (jours_ouverture / ouvres.sum())
+
+
+def matrice_usage(types, poids_jours):
+    """Usage horaire (types × heures de l'année) par produit jour × profil journalier."""
+    lignes = []
+    for t in types:
+        p = PROFILS_USAGE[t]
+        # Part ouverte du jour : profil "ouvre" ; part restante : profil "ferme"
+        ouvert = np.minimum(poids_jours, 1.0)[:, None]
+        jour = poids_jours[:, None] * p["ouvre"][None, :] + (1 - ouvert) * p["ferme"][None, :]
+        lignes.append(jour.ravel())
+    return np.vstack(lignes)
+
+
+@functools.lru_cache(maxsize=8)
+def _coefficients(pays, annee, jours_ouverture, calendrier_json, dossier, mtime):
+    intensite = np.asarray(intensite_annee(pays, annee, dossier), dtype=np.float64)
+    types = list(PROFILS_USAGE)
+    usage = matrice_usage(types, jours_ouverts_annee(annee, jours_ouverture, json.loads(calendrier_json)))
+    seuil = float(np.quantile(intensite, QUANTILE_POINTE))
+    pointe = intensite >= seuil
+    kwh_par_kw = usage.sum(axis=1)                       # (types,)
+    kg_par_kw = usage @ intensite                        # produit horaire usage × intensité
+    return {
+        "types": types, "seuil_pointe": seuil, "intensite_moyenne": float(intensite.mean()),
+        "kwh_par_kw": kwh_par_kw, "kg_par_kw": kg_par_kw,
+        "kg_pointe_par_kw": usage[:, pointe] @ intensite[pointe],
+        "par_heure_par_kw": (usage * intensite).reshape(len(types), -1, 24).sum(axis=1),   # (types, 24)
+    }
+
+
+def coefficients_horaires(pays, annee, jours_ouverture, spec_calendrier=None, dossier=DOSSIER_INTENSITE):
+    """kWh, kgCO2e et part de pointe par kW installé de chaque profil d'usage.
+
+    Seule étape coûteuse (produits sur les 8760 heures) : mise en cache
+    par processus, invalidée par un nouvel import du profil pays.
+    """
+    _, meta = charger_profil(pays, dossier)
+    if meta is None:
+        raise ValueError(f"Aucun profil horaire pour {pays}")
+    mtime = os.path.getmtime(os.path.join(dossier, meta["fichier"]))
+    return _coefficients(pays, annee, jours_ouverture, json.dumps(spec_calendrier, sort_keys=True), dossier, mtime)
+
+
+def _nombre(valeur):
+    try:
+        nombre = float(valeur)
+    except (TypeError, ValueError):
+        return 0.0
+    return nombre if np.isfinite(nombre) else 0.0
+
+
+def ligne_horaire(ligne, coefficients):
+    """Scope 2 horaire d'une ligne d'inventaire (dict) ou None si son type n'a pas de profil d'usage."""
+    if ligne.get("Type") not in coefficients["types"]:
+        return None
+    t = coefficients["types"].index(ligne["Type"])
+    kw = _nombre(ligne.get("Qté")) * _nombre(ligne.get("Poids/Conso")) / 1000
+    kwh, kg = coefficients["kwh_par_kw"][t], coefficients["kg_par_kw"][t]
+    return {"Objet": ligne.get("Objet"), "Type": ligne["Type"], "kW": kw, "kWh": kw * kwh, "kgCO2e": kw * kg,
+            "fe_effectif": kg / kwh if kwh > 0 else 0.0,
+            "part_pointe": coefficients["kg_pointe_par_kw"][t] / kg if kg > 0 else 0.0}
+
+
+def par_heure(lignes, coefficients):
+    """Émissions (kgCO2e) par heure de la journée pour des lignes issues de ``ligne_horaire``."""
+    kw_par_type = np.zeros(len(coefficients["types"]))
+    for l in lignes:
+        kw_par_type[coefficients["types"].index(l["Type"])] += l["kW"]
+    return kw_par_type @ coefficients["par_heure_par_kw"]
+
+
+def scope2_horaire(inventaire, pays, annee, jours_ouverture, spec_calendrier=None, dossier=DOSSIER_INTENSITE):
+    """Scope 2 horaire des lignes Watts d'un inventaire (DataFrame).
+
+    Renvoie ``{"lignes": DataFrame, "par_heure": array(24), "seuil_pointe",
+    "intensite_moyenne"}`` ; chaque ligne porte kWh, kgCO2e, facteur
+    effectif et part émise aux heures de pointe.
+    """
+    import pandas as pd
+
+    coefficients = coefficients_horaires(pays, annee, jours_ouverture, spec_calendrier, dossier)
+    lignes = {uid: ligne_horaire(ligne, coefficients) for uid, ligne in inventaire.to_dict("index").items()}
+    lignes = {uid: l for uid, l in lignes.items() if l is not None}
+    return {"lignes": pd.DataFrame.from_dict(lignes, orient="index", columns=["Objet", "Type", "kW", "kWh", "kgCO2e", "fe_effectif", "part_pointe"]),
+            "par_heure": par_heure(lignes.values(), coefficients),
+            "seuil_pointe": coefficients["seuil_pointe"], "intensite_moyenne": coefficients["intensite_moyenne"]}
@@ -0,0 +1,267 @@
+"""Inventaire des salles (mobilier, équipements électriques) : stockage indexé et édition par deltas.
+
+Le tableau de l'inventaire n'est plus recopié en entier à chaque saisie :
+
+* les lignes vivent dans un ``InventaireIndexe`` (clé stable ``uid`` ->
+  ligne) indexé par salle et par type, d'où l'on extrait des pages ;
+* ``st.data_editor`` n'affiche qu'une page ; son état de widget
+  (``edited_rows`` / ``added_rows`` / ``deleted_rows``, positions dans la
+  page) est appliqué au magasin par ``appliquer`` ;
+* les flux dérivés (amortissement du mobilier, consommation électrique)
+  sont recalculés pour les seules lignes touchées, puis synchronisés dans
+  le journal par ajout, correction ou suppression des flux concernés
+  (chaque flux porte l'étiquette ``Inventaire #uid`` dans son détail).
+
+Les ``uid`` sont aléatoires (uuid4) : les lignes d'une sauvegarde
+restaurée ou d'un collègue sur le journal partagé ne peuvent pas
+reprendre l'étiquette d'une autre ligne. Le magasin est sauvegardé avec
+le projet (``exporter`` / ``depuis_export``) et publié dans le journal
+partagé (``fusionner``).
+"""
+import re
+import uuid
+
+import pandas as pd
+
+from intensite_horaire import ligne_horaire
+
+COLONNES = ["Salle", "Objet", "Qté", "Poids/Conso", "Type", "Incertitude"]
+TYPES = ["Mobilier (kg)", "Élec (Watts)", "Machine Spé (Watts)"]
+INDEXEES = ("Salle", "Type")
+TAILLE_PAGE = 100
+HEURES_JOUR = 8            # Durée d'usage quotidienne des équipements (mode annuel)
+ETIQUETTE = "Inventaire #"
+MOTIF_ETIQUETTE = re.compile(re.escape(ETIQUETTE) + r"([0-9a-f]+)")
+LIGNES_DEMO = [
+    {"Salle": "Salle de classe", "Objet": "Chaise Étudiant", "Qté": 30, "Poids/Conso": 5.0, "Type": "Mobilier (kg)", "Incertitude": 10},
+    {"Salle": "Bureau Prof", "Objet": "Bureau Prof", "Qté": 2, "Poids/Conso": 25.0, "Type": "Mobilier (kg)", "Incertitude": 10},
+    {"Salle": "Salle de classe", "Objet": "Radiateur Élec", "Qté": 4, "Poids/Conso": 1500.0, "Type": "Élec (Watts)", "Incertitude": 5},
+]
+
+
+class InventaireIndexe:
+    """Lignes d'inventaire par clé stable, index salle / type et suivi des lignes touchées."""
+
+    def __init__(self, lignes=()):
+        self.lignes = {}                           # uid -> ligne (dict des COLONNES)
+        self.index = {c: {} for c in INDEXEES}     # colonne -> valeur -> {uid}
+        self.version = 0
+        self.touches = set()                       # uids ajoutés / modifiés / supprimés depuis le dernier calcul des flux
+        self.derives = {}                          # uid -> flux dérivé (ou None)
+        self.horaire = {}                          # uid -> Scope 2 horaire de la ligne (mode horaire)
+        self.a_publier = set()                     # uids dont le flux a changé depuis la dernière synchronisation du journal
+        self.distants = set()                      # uids reçus avec leur flux déjà au journal (sauvegarde, collègue)
+        self.cle_calcul = None
+        for ligne in lignes:
+            self.ajouter(ligne)
+
+    @classmethod
+    def depuis_export(cls, lignes):
+        """Magasin reconstruit depuis ``exporter`` (sauvegarde JSON, journal partagé)."""
+        inventaire = cls()
+        for uid, ligne in lignes.items():
+            inventaire.ajouter(ligne, uid=uid)
+        inventaire.distants = set(inventaire.lignes)
+        return inventaire
+
+    def exporter(self):
+        """Lignes ``{uid: ligne}`` (sérialisables en JSON)."""
+        return {uid: dict(ligne) for uid, ligne in self.lignes.items()}
+
+    # --- Index ---
+    def _indexer(self, uid, ligne, retirer=False):
+        for c in INDEXEES:
+            uids = self.index[c].setdefault(ligne.get(c), set())
+            if retirer:
+                uids.discard(uid)
+                if not uids:
+                    del self.index[c][ligne.get(c)]
+            else:
+                uids.add(uid)
+
+    # --- Écritures ---
+    def ajouter(self, ligne, defauts=None, uid=None):
+        uid = uid or uuid.uuid4().hex
+        complete = {c: None for c in COLONNES}
+        complete.update(defauts or {})
+        complete.update({c: v for c, v in ligne.items() if c in COLONNES and v is not None})
+        self.lignes[uid] = complete
+        self._indexer(uid, complete)
+        self.touches.add(uid)
+        self.version += 1
+        return uid
+
+    def modifier(self, uid, changements):
+        ligne = self.lignes[uid]
+        self._indexer(uid, ligne, retirer=True)
+        ligne.update({c: v for c, v in changements.items() if c in COLONNES})
+        self._indexer(uid, ligne)
+        self.touches.add(uid)
+        self.version += 1
+
+    def supprimer(self, uid):
+        self._indexer(uid, self.lignes.pop(uid), retirer=True)
+        self.touches.add(uid)
+        self.version += 1
+
+    def fusionner(self, lignes):
+        """Aligne le magasin sur les lignes publiées par d'autres sessions.
+
+        Les lignes modifiées ici et pas encore enregistrées au bilan sont
+        conservées ; les autres suivent la version publiée (leurs flux
+        sont déjà dans le journal partagé). Renvoie les uids changés.
+        """
+        locales = self.touches | self.a_publier
+        changes = set()
+        for uid in [u for u in self.lignes if u not in lignes and u not in locales]:
+            self.supprimer(uid)
+            changes.add(uid)
+        for uid, ligne in lignes.items():
+            if uid in locales or self.lignes.get(uid) == ligne:
+                continue
+            if uid in self.lignes:
+                self.modifier(uid, ligne)
+            else:
+                self.ajouter(ligne, uid=uid)
+            changes.add(uid)
+        self.distants |= changes
+        return changes
+
+    def appliquer(self, delta, uids_page, defauts=None):
+        """État d'un ``st.data_editor`` affichant ``uids_page`` -> lignes touchées (uids).
+
+        ``defauts`` complète les lignes ajoutées (salle / type du filtre de la page).
+        """
+        touches = set()
+        for position, changements in delta.get("edited_rows", {}).items():
+            uid = uids_page[int(position)]
+            self.modifier(uid, changements)
+            touches.add(uid)
+        for position in delta.get("deleted_rows", []):
+            uid = uids_page[int(position)]
+            self.supprimer(uid)
+            touches.add(uid)
+        for ligne in delta.get("added_rows", []):
+            if any(v is not None for v in ligne.values()):
+                touches.add(self.ajouter(ligne, defauts))
+        return touches
+
+    # --- Lectures ---
+    def selection(self, **filtres):
+        """uids (ordre d'ajout) des lignes ayant les valeurs demandées (``Salle=...``, ``Type=...``)."""
+        uids = None
+        for c, valeur in filtres.items():
+            if valeur is not None:
+                trouves = self.index[c].get(valeur, set())
+                uids = trouves if uids is None else uids & trouves
+        return list(self.lignes) if uids is None else [u for u in self.lignes if u in uids]
+
+    def page(self, uids):
+        """Lignes ``uids`` en DataFrame (index = uid) pour l'éditeur."""
+        return pd.DataFrame([self.lignes[u] for u in uids], index=pd.Index(uids, name="uid"), columns=COLONNES)
+
+    def dataframe(self):
+        return self.page(list(self.lignes))
+
+    def valeurs(self, colonne):
+        return sorted(v for v in self.index[colonne] if v is not None)
+
+    def __len__(self):
+        return len(self.lignes)
+
+    # --- Flux dérivés (incrémentaux) ---
+    def actualiser_derives(self, params, coefficients=None):
+        """Recalcule les flux des lignes touchées (toutes si les paramètres ont changé) ; renvoie les uids recalculés.
+
+        ``coefficients`` (``intensite_horaire.coefficients_horaires``) active
+        le Scope 2 horaire, calculé lui aussi ligne par ligne. Les lignes dont
+        le flux change sont ajoutées à ``a_publier``, sauf celles reçues avec
+        leur flux (``distants``).
+        """
+        cle = (params['fe_elec'], params['jours_ouverture'], params.get('mode_elec'), params.get('annee_elec'), params.get('country_choice'),
+               repr(params.get('calendrier')), id(coefficients) if coefficients is not None else None)
+        a_calculer = set(self.lignes) | set(self.derives) if cle != self.cle_calcul else set(self.touches)
+        for uid in a_calculer:
+            if uid not in self.lignes:
+                self.derives.pop(uid, None)
+                self.horaire.pop(uid, None)
+                if uid not in self.distants:
+                    self.a_publier.add(uid)
+                continue
+            ligne_h = ligne_horaire(self.lignes[uid], coefficients) if coefficients is not None else None
+            if ligne_h is None:
+                self.horaire.pop(uid, None)
+            else:
+                self.horaire[uid] = ligne_h
+            flux = flux_ligne(uid, self.lignes[uid], params, ligne_h)
+            if flux != self.derives.get(uid) and uid not in self.distants:
+                self.a_publier.add(uid)
+            self.derives[uid] = flux
+        self.cle_calcul = cle
+        self.touches.clear()
+        self.distants.clear()
+        return a_calculer
+
+    def verifier_journal(self, entries):
+        """Remet à publier les lignes dont le flux manque au journal (journal remplacé sans l'inventaire)."""
+        positions = positions_journal(entries)
+        self.a_publier |= {uid for uid, flux in self.derives.items() if flux is not None and uid not in positions}
+
+
+def _nombre(valeur):
+    nombre = pd.to_numeric(valeur, errors="coerce")
+    return 0.0 if pd.isna(nombre) else float(nombre)
+
+
+def flux_ligne(uid, ligne, params, ligne_h=None):
+    """Flux du bilan dérivé d'une ligne (mêmes règles que l'ancien enregistrement) ou None."""
+    type_ = str(ligne.get("Type") or "")
+    objet, qte = str(ligne.get("Objet") or "Équipement"), _nombre(ligne.get("Qté"))
+    incertitude = _nombre(ligne.get("Incertitude"))
+    etiquette = f"{ETIQUETTE}{uid} | {ligne.get('Salle') or 'Sans salle'}"
+    if "Mobilier" in type_:
+        return {"cat": "Bâtiment", "item": objet, "val": qte, "unit": "u", "fe": 1.0, "incertitude": incertitude,
+                "detail": f"Amortissement 10 ans | {etiquette}"}
+    if ligne_h is not None:
+        return {"cat": "Énergie", "item": f"Conso {objet}", "val": float(ligne_h["kWh"]), "unit": "kWh", "fe": float(ligne_h["fe_effectif"]),
+                "incertitude": incertitude,
+                "detail": f"Scope 2 | Horaire {params['annee_elec']} | Pointe {ligne_h['part_pointe']:.0%} | {etiquette}"}
+    if "Watts" in type_:
+        kwh = (qte * _nombre(ligne.get("Poids/Conso")) * HEURES_JOUR * params['jours_ouverture']) / 1000
+        return {"cat": "Énergie", "item": f"Conso {objet}", "val": kwh, "unit": "kWh", "fe": params['fe_elec'], "incertitude": incertitude,
+                "detail": f"Scope 2 | {etiquette}"}
+    return None
+
+
+# ==============================================================================
+# SYNCHRONISATION AVEC LE JOURNAL
+# ==============================================================================
+def positions_journal(entries):
+    """uid d'inventaire -> indice du flux correspondant dans le journal."""
+    if not len(entries):
+        return {}
+    details = entries.vers_dataframe()["Détail"] if hasattr(entries, "vers_dataframe") else pd.Series([e.get("Détail") for e in entries])
+    uids = details.astype(str).str.extract(MOTIF_ETIQUETTE, expand=False).dropna()
+    return {u: int(i) for i, u in uids.items()}
+
+
+def plan_synchronisation(inventaire, entries, uids=None):
+    """Opérations à faire dans le journal pour aligner les flux des lignes ``uids`` (``a_publier`` par défaut).
+
+    Renvoie ``(ajouts, corrections, suppressions)`` : flux à ajouter,
+    ``(indice, flux)`` à corriger, indices à supprimer.
+    """
+    positions = positions_journal(entries)
+    uids = inventaire.a_publier if uids is None else set(uids)
+    ajouts, corrections, suppressions = [], [], []
+    for uid in sorted(uids):
+        flux = inventaire.derives.get(uid) if uid in inventaire.lignes else None
+        i = positions.get(uid)
+        if flux is None:
+            if i is not None:
+                suppressions.append(i)
+        elif i is None:
+            ajouts.append(flux)
+        else:
+            corrections.append((i, flux))
+    return ajouts, corrections, suppressions
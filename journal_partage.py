@@ -0,0 +1,294 @@
+"""Journal des flux partagé par entité entre les sessions du serveur.
+
+Plusieurs personnes saisissent en même temps le bilan d'une même entité
+(l'une la mobilité, l'autre le parc IT) : au lieu de fusionner des
+sauvegardes JSON, chaque session tient une copie locale (``db_entries``)
+d'un ``JournalPartage`` commun.
+
+* Chaque ligne a un identifiant stable (``uid``) et une version de ligne
+  (``rv``) ; le journal a une version globale incrémentée à chaque écriture.
+* Concurrence optimiste : un ajout ne peut pas entrer en conflit ; une
+  correction ou une suppression porte la version de ligne lue et échoue
+  (``ConflitVersion``, sans rien écrire) si quelqu'un l'a changée entre-temps.
+  Le verrou n'est tenu que le temps d'un contrôle et d'une écriture en
+  mémoire : les rédacteurs ne se bloquent pas.
+* Les opérations récentes sont conservées : une session en retard ne tire
+  que le delta depuis sa dernière version connue (journal complet
+  seulement si elle est trop en retard).
+
+La ``Replique`` fait le lien avec la session : branchée comme observateur
+du journal d'audit, elle publie les écritures locales (ajout, correction,
+suppression, restauration, annuler / rétablir) et applique les deltas
+distants via le journal d'audit (l'historique local reste complet).
+L'inventaire des salles dont dérivent certains flux est publié à côté
+(dernière version de chaque ligne), pour que les sessions ne recréent pas
+en local des lignes déjà saisies par un collègue.
+"""
+import threading
+import time
+import uuid
+from collections import deque
+
+TAILLE_HISTORIQUE = 5000       # Opérations conservées pour les deltas
+DELTA_MAX = 500                # Au-delà, la copie locale est rechargée en bloc
+PRESENCE_S = 60                # Un éditeur est « actif » s'il a tiré depuis moins d'une minute
+
+
+class ConflitVersion(Exception):
+    """Des lignes ont changé depuis leur lecture : l'écriture est refusée."""
+
+    def __init__(self, message, uids=()):
+        super().__init__(message)
+        self.uids = list(uids)
+
+
+class JournalPartage:
+    """Lignes versionnées d'une entité + historique borné des opérations."""
+
+    PARTAGE_SERVEUR = True     # Commun à toutes les sessions : hors budget mémoire de session
+
+    def __init__(self, entite, taille_historique=TAILLE_HISTORIQUE):
+        self.entite = entite
+        self.lignes = {}            # uid -> (rv, entree), dans l'ordre d'ajout
+        self.version = 0
+        self.operations = deque(maxlen=taille_historique)  # (version, op, uid, rv, entree, auteur, origine)
+        self.editeurs = {}          # auteur -> dernier accès
+        self.inventaire = {}        # uid -> ligne de l'inventaire des salles (publiée avec ses flux)
+        self.version_inventaire = 0
+        self._suivant = 1
+        self._verrou = threading.Lock()
+
+    # --- Écritures ---
+    def _noter(self, op, uid, rv, entree, auteur, origine):
+        self.version += 1
+        self.operations.append((self.version, op, uid, rv, entree, auteur, origine))
+
+    def _controler(self, attendues):
+        perimes = [uid for uid, rv in attendues.items() if uid not in self.lignes or self.lignes[uid][0] != rv]
+        if perimes:
+            raise ConflitVersion(f"{len(perimes)} ligne(s) modifiée(s) ou supprimée(s) par un autre utilisateur", perimes)
+
+    def _inserer(self, entrees, auteur, origine):
+        cles = []
+        for entree in entrees:
+            uid, self._suivant = self._suivant, self._suivant + 1
+            self.lignes[uid] = (1, dict(entree))
+            self._noter("ajout", uid, 1, self.lignes[uid][1], auteur, origine)
+            cles.append((uid, 1))
+        return cles
+
+    def _retirer(self, uids, auteur, origine):
+        for uid in list(uids):
+            del self.lignes[uid]
+            self._noter("suppression", uid, None, None, auteur, origine)
+
+    def ajouter(self, entrees, auteur, origine=None):
+        """Ajoute des lignes ; renvoie leurs ``(uid, rv)``."""
+        with self._verrou:
+            return self._inserer(entrees, auteur, origine)
+
+    def modifier(self, uid, rv, entree, auteur, origine=None):
+        """Remplace une ligne lue en version ``rv`` ; renvoie la nouvelle version de ligne."""
+        with self._verrou:
+            self._controler({uid: rv})
+            self.lignes[uid] = (rv + 1, dict(entree))
+            self._noter("correction", uid, rv + 1, self.lignes[uid][1], auteur, origine)
+            return rv + 1
+
+    def supprimer(self, attendues, auteur, origine=None):
+        """Supprime ``{uid: rv}`` (tout ou rien)."""
+        with self._verrou:
+            self._controler(attendues)
+            self._retirer(attendues, auteur, origine)
+
+    def remplacer(self, attendues, entrees, auteur, origine=None):
+        """Remplace tout le journal (restauration) si personne n'y a écrit depuis la lecture."""
+        with self._verrou:
+            self._controler(attendues)
+            inconnues = set(self.lignes) - set(attendues)
+            if inconnues:
+                raise ConflitVersion(f"{len(inconnues)} ligne(s) ajoutée(s) entre-temps par un autre utilisateur", inconnues)
+            self._retirer(self.lignes, auteur, origine)
+            return self._inserer(entrees, auteur, origine)
+
+    def publier_inventaire(self, lignes, supprimes=(), remplacer=False):
+        """Publie des lignes d'inventaire ; renvoie les versions d'inventaire avant et après."""
+        with self._verrou:
+            avant = self.version_inventaire
+            if remplacer:
+                self.inventaire = {}
+            self.inventaire.update({uid: dict(ligne) for uid, ligne in lignes.items()})
+            for uid in supprimes:
+                self.inventaire.pop(uid, None)
+            self.version_inventaire += 1
+            return avant, self.version_inventaire
+
+    # --- Lectures ---
+    def instantane(self):
+        """``(version, [(uid, rv, entree), ...])`` cohérents."""
+        with self._verrou:
+            return self.version, [(uid, rv, dict(e)) for uid, (rv, e) in self.lignes.items()]
+
+    def depuis(self, version, auteur=None):
+        """Opérations postérieures à ``version`` ; ``None`` si elles ne sont plus toutes conservées."""
+        with self._verrou:
+            if auteur is not None:
+                self.editeurs[auteur] = time.time()  # Chaque sondage vaut signal de présence
+            if version == self.version:
+                return self.version, []
+            if not self.operations or self.operations[0][0] > version + 1:
+                return self.version, None
+            ops = [op for op in self.operations if op[0] > version]
+            return self.version, ops
+
+    def inventaire_depuis(self, version):
+        """``(version, {uid: ligne})`` de l'inventaire publié, lignes ``None`` s'il n'a pas changé."""
+        with self._verrou:
+            if version == self.version_inventaire:
+                return version, None
+            return self.version_inventaire, {uid: dict(ligne) for uid, ligne in self.inventaire.items()}
+
+    def actifs(self):
+        limite = time.time() - PRESENCE_S
+        with self._verrou:
+            return sorted(a for a, t in self.editeurs.items() if t >= limite)
+
+    def __len__(self):
+        return len(self.lignes)
+
+
+class RegistrePartage:
+    """Journaux partagés du serveur, un par entité."""
+
+    PARTAGE_SERVEUR = True     # Commun à toutes les sessions : hors budget mémoire de session
+
+    def __init__(self):
+        self.journaux = {}
+        self._verrou = threading.Lock()
+
+    def journal(self, entite):
+        with self._verrou:
+            if entite not in self.journaux:
+                self.journaux[entite] = JournalPartage(entite)
+            return self.journaux[entite]
+
+    def etat(self):
+        with self._verrou:
+            journaux = list(self.journaux.values())
+        return [{"Entité": j.entite, "Flux": len(j), "Version": j.version, "Éditeurs actifs": ", ".join(j.actifs())} for j in journaux]
+
+
+class Replique:
+    """Copie locale (``db_entries`` d'une session) d'un ``JournalPartage``."""
+
+    def __init__(self, partage, auteur):
+        self.partage = partage
+        self.auteur = auteur
+        self.origine = uuid.uuid4().hex  # Reconnaît ses propres opérations dans les deltas
+        self.version = -1
+        self.version_inventaire = -1
+        self.uids = []          # uid de chaque ligne locale (même ordre que db_entries)
+        self.rv = {}            # uid -> version de ligne connue
+        self.conflit = None     # Dernier conflit (message) ; la copie est rechargée au prochain tirage
+        self._distant = False   # Vrai pendant l'application d'un delta (pas de republication)
+
+    @property
+    def en_retard(self):
+        return self.conflit is not None or self.partage.version != self.version
+
+    # --- Connexion ---
+    def rejoindre(self, entries, params, audit):
+        """Branche la session : publie le journal local si le partagé est vide, puis s'aligne dessus."""
+        if not len(self.partage) and len(entries):
+            self.partage.ajouter(list(entries), self.auteur, self.origine)
+        audit.observateur = self.publier
+        self._recharger(entries, params, audit, "Connexion au journal partagé")
+        self.partage.depuis(self.version, self.auteur)
+
+    def quitter(self, audit):
+        if audit.observateur == self.publier:
+            audit.observateur = None
+
+    def _recharger(self, entries, params, audit, motif):
+        version, lignes = self.partage.instantane()
+        self._distant = True
+        try:
+            audit.restauration(entries, params, params, [e for _, _, e in lignes], motif, barriere=True)
+        finally:
+            self._distant = False
+        self.uids = [uid for uid, _, _ in lignes]
+        self.rv = {uid: rv for uid, rv, _ in lignes}
+        self.version, self.conflit = version, None
+
+    # --- Écritures locales -> journal partagé (observateur du journal d'audit) ---
+    def publier(self, effet, *args):
+        if self._distant or self.conflit is not None:
+            return
+        try:
+            if effet == "ajout":
+                i, entree = args
+                (uid, rv), = self.partage.ajouter([entree], self.auteur, self.origine)
+                self.uids.insert(i, uid)
+                self.rv[uid] = rv
+            elif effet == "correction":
+                i, entree = args
+                uid = self.uids[i]
+                self.rv[uid] = self.partage.modifier(uid, self.rv[uid], entree, self.auteur, self.origine)
+            elif effet == "suppression":
+                indices = args[0]
+                self.partage.supprimer({self.uids[i]: self.rv[self.uids[i]] for i in indices}, self.auteur, self.origine)
+                for i in sorted(indices, reverse=True):
+                    self.rv.pop(self.uids.pop(i), None)
+            elif effet == "remplacement":
+                cles = self.partage.remplacer(dict(self.rv), args[0], self.auteur, self.origine)
+                self.uids = [uid for uid, _ in cles]
+                self.rv = dict(cles)
+        except ConflitVersion as e:
+            # L'écriture locale est refusée : la copie sera rechargée depuis le journal partagé
+            self.conflit = str(e)
+
+    def publier_inventaire(self, lignes, supprimes=(), remplacer=False):
+        avant, apres = self.partage.publier_inventaire(lignes, supprimes, remplacer)
+        if avant == self.version_inventaire:
+            self.version_inventaire = apres  # Personne n'a publié entre-temps : rien à tirer
+
+    # --- Journal partagé -> copie locale ---
+    def tirer_inventaire(self):
+        """Inventaire publié ``{uid: ligne}`` s'il a changé depuis le dernier tirage, sinon None."""
+        self.version_inventaire, lignes = self.partage.inventaire_depuis(self.version_inventaire)
+        return lignes
+
+    def tirer(self, entries, params, audit):
+        """Applique les changements des autres sessions ; renvoie ``{auteur: nb d'opérations}``."""
+        if self.conflit is not None:
+            self._recharger(entries, params, audit, "Rechargement après conflit")
+            return {}
+        version, ops = self.partage.depuis(self.version, self.auteur)
+        if ops is None or len(ops) > DELTA_MAX:
+            self._recharger(entries, params, audit, "Synchronisation du journal partagé")
+            return {"(rechargement)": 1}
+        auteurs = {}
+        self._distant = True
+        try:
+            for _, op, uid, rv, entree, auteur, origine in ops:
+                if origine == self.origine:
+                    continue  # Opération de cette session, déjà appliquée
+                if op == "ajout" and uid not in self.rv:
+                    audit.ajout(entries, params, entree, barriere=True)
+                    self.uids.append(uid)
+                elif op == "correction" and self.rv.get(uid, rv) < rv:
+                    audit.correction(entries, params, self.uids.index(uid), entree, barriere=True)
+                elif op == "suppression" and uid in self.rv:
+                    audit.suppression(entries, params, [self.uids.index(uid)], barriere=True)
+                    self.uids.remove(uid)
+                else:
+                    continue
+                if rv is None:
+                    del self.rv[uid]
+                else:
+                    self.rv[uid] = rv
+                auteurs[auteur] = auteurs.get(auteur, 0) + 1
+        finally:
+            self._distant = False
+        self.version = version
+        return auteurs
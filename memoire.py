@@ -0,0 +1,431 @@
+"""Budget mémoire par session : journal compact, comptage et déchargement.
+
+``JournalCompact`` remplace la liste de dictionnaires ``db_entries`` :
+il se manipule comme une liste (append, index, itération, len) mais
+stocke les flux en colonnes (``array`` pour les nombres, chaînes
+internées et codées par dictionnaire pour les catégories, items,
+détails et dates). Un journal inactif peut être déchargé sur disque et
+rechargé à la demande au premier accès.
+"""
+import os
+import pickle
+import sys
+import tempfile
+import threading
+import time
+import types
+import weakref
+from array import array
+from collections import deque
+from collections.abc import MutableSequence
+
+BUDGET_SESSION_OCTETS = 64 * 1024 * 1024   # Plafond dur par session
+DELAI_INACTIVITE_S = 15 * 60               # Déchargement après 15 min sans rerun
+DOSSIER_DECHARGE = os.path.join(tempfile.gettempdir(), "mscal_sessions")
+
+_ABSENT = object()
+
+
+class _Colonne:
+    """Une colonne typée : 'f' (float), 'i' (entier), 's' (chaîne codée) ou 'o' (objet)."""
+
+    __slots__ = ("type", "valeurs", "absents")
+
+    def __init__(self, type_, n_absents=0):
+        self.type = type_
+        self.valeurs = {"f": lambda: array("d"), "i": lambda: array("q"), "s": lambda: array("I"), "o": list}[type_]()
+        self.absents = set(range(n_absents))
+        for _ in range(n_absents):
+            self.valeurs.append(_neutre(type_))
+
+
+def _type_de(valeur):
+    if isinstance(valeur, bool):
+        return "o"
+    if isinstance(valeur, float):
+        return "f"
+    if isinstance(valeur, int) and -2 ** 63 <= valeur < 2 ** 63:
+        return "i"
+    if isinstance(valeur, str):
+        return "s"
+    return "o"
+
+
+def _neutre(type_):
+    return {"f": 0.0, "i": 0, "s": 0, "o": _ABSENT}[type_]
+
+
+class JournalCompact(MutableSequence):
+    """Journal des flux stocké en colonnes, compatible avec une liste de dicts."""
+
+    def __init__(self, entries=()):
+        self._verrou = threading.RLock()
+        self._cles = []
+        self._colonnes = {}
+        self._vocab = [None]           # code 0 réservé
+        self._codes = {}
+        self._octets_vocab = 0
+        self._n = 0
+        self._fichier = None
+        self.revision = 0
+        self.dernier_acces = time.monotonic()
+        self.extend(entries)
+
+    # --- Encodage ---
+    def _coder(self, txt):
+        code = self._codes.get(txt)
+        if code is None:
+            txt = sys.intern(txt)
+            code = len(self._vocab)
+            self._vocab.append(txt)
+            self._codes[txt] = code
+            self._octets_vocab += sys.getsizeof(txt)
+        return code
+
+    def _degrader(self, col):
+        """Convertit une colonne typée en colonne objet (valeurs hétérogènes)."""
+        anciens = [self._lire(col, i) for i in range(self._n)]
+        col.type, col.valeurs = "o", anciens
+
+    def _ecrire(self, col, i, valeur, inserer=False):
+        if valeur is not _ABSENT and col.type != "o" and _type_de(valeur) != col.type:
+            self._degrader(col)
+        if valeur is _ABSENT:
+            stocke = _neutre(col.type)
+        elif col.type == "s":
+            stocke = self._coder(valeur)
+        else:
+            stocke = valeur
+        if inserer:
+            col.valeurs.insert(i, stocke)
+        else:
+            col.valeurs[i] = stocke
+        if valeur is _ABSENT:
+            col.absents.add(i)
+        else:
+            col.absents.discard(i)
+
+    def _lire(self, col, i):
+        if i in col.absents:
+            return _ABSENT
+        v = col.valeurs[i]
+        return self._vocab[v] if col.type == "s" else v
+
+    def _colonne(self, cle, valeur):
+        col = self._colonnes.get(cle)
+        if col is None:
+            col = _Colonne(_type_de(valeur), self._n)
+            self._colonnes[cle] = col
+            self._cles.append(sys.intern(cle) if isinstance(cle, str) else cle)
+        return col
+
+    def _decaler_absents(self, i, pas):
+        for col in self._colonnes.values():
+            if col.absents:
+                col.absents = {j + pas if j >= i else j for j in col.absents if j != i or pas > 0}
+
+    # --- Protocole liste ---
+    def _pret(self):
+        """Recharge le journal s'il a été déchargé et note l'accès."""
+        self.dernier_acces = time.monotonic()
+        if self._fichier is not None:
+            self._recharger()
+
+    def __len__(self):
+        with self._verrou:
+            self._pret()
+            return self._n
+
+    def _index(self, i):
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError("index du journal hors limites")
+        return i
+
+    def __getitem__(self, i):
+        with self._verrou:
+            self._pret()
+            if isinstance(i, slice):
+                return [self[j] for j in range(*i.indices(self._n))]
+            i = self._index(i)
+            ligne = {}
+            for cle in self._cles:
+                v = self._lire(self._colonnes[cle], i)
+                if v is not _ABSENT:
+                    ligne[cle] = v
+            return ligne
+
+    def __setitem__(self, i, entree):
+        with self._verrou:
+            self._pret()
+            i = self._index(i)
+            for cle, valeur in entree.items():
+                self._colonne(cle, valeur)
+            for cle in self._cles:
+                self._ecrire(self._colonnes[cle], i, entree.get(cle, _ABSENT))
+            self.revision += 1
+
+    def __delitem__(self, i):
+        with self._verrou:
+            self._pret()
+            i = self._index(i)
+            for col in self._colonnes.values():
+                del col.valeurs[i]
+                col.absents.discard(i)
+            self._decaler_absents(i, -1)
+            self._n -= 1
+            self.revision += 1
+
+    def insert(self, i, entree):
+        with self._verrou:
+            self._pret()
+            i = max(0, min(self._n + i if i < 0 else i, self._n))
+            if i < self._n:
+                self._decaler_absents(i, +1)
+            for cle, valeur in entree.items():
+                self._colonne(cle, valeur)
+            for cle in self._cles:
+                self._ecrire(self._colonnes[cle], i, entree.get(cle, _ABSENT), inserer=True)
+            self._n += 1
+            self.revision += 1
+
+    def append(self, entree):
+        self.insert(self._n if self._fichier is None else len(self), entree)
+
+    def clear(self):
+        with self._verrou:
+            if self._fichier is not None:
+                self._nettoyage()
+                self._fichier = None
+            self._cles, self._colonnes, self._vocab, self._codes = [], {}, [None], {}
+            self._octets_vocab = 0
+            self._n = 0
+            self.revision += 1
+
+    def __iter__(self):
+        with self._verrou:
+            self._pret()
+            lignes = [self[i] for i in range(self._n)]
+        return iter(lignes)
+
+    def __bool__(self):
+        return len(self) > 0
+
+    def __eq__(self, autre):
+        return list(self) == list(autre)
+
+    def __repr__(self):
+        return f"JournalCompact({len(self)} flux, {self.octets() / 1024:.0f} Ko)"
+
+    # --- Accès colonnes (DataFrame sans matérialiser les dicts) ---
+    def vers_dataframe(self):
+        import numpy as np
+        import pandas as pd
+
+        with self._verrou:
+            self._pret()
+            vocab = np.array(self._vocab, dtype=object)
+            donnees = {}
+            for cle in self._cles:
+                col = self._colonnes[cle]
+                if col.type == "s":
+                    valeurs = vocab[np.frombuffer(col.valeurs, dtype=np.uint32)] if self._n else np.array([], dtype=object)
+                elif col.type == "o":
+                    valeurs = np.array([None if v is _ABSENT else v for v in col.valeurs], dtype=object)
+                else:
+                    valeurs = np.array(col.valeurs)
+                if col.absents:
+                    valeurs = valeurs.astype(object) if col.type != "f" else valeurs.copy()
+                    valeurs[list(col.absents)] = np.nan if col.type == "f" else None
+                donnees[cle] = valeurs
+            return pd.DataFrame(donnees, columns=self._cles)
+
+    # --- Comptage mémoire ---
+    def octets(self):
+        """Empreinte mémoire estimée du journal (0 s'il est déchargé)."""
+        with self._verrou:
+            if self._fichier is not None:
+                return 0
+            total = self._octets_vocab + sys.getsizeof(self._vocab) + sys.getsizeof(self._codes)
+            for col in self._colonnes.values():
+                if col.type == "o":
+                    total += sys.getsizeof(col.valeurs) + sum(sys.getsizeof(v) for v in col.valeurs)
+                else:
+                    total += col.valeurs.buffer_info()[1] * col.valeurs.itemsize
+                total += sys.getsizeof(col.absents) if col.absents else 0
+            return total
+
+    # --- Déchargement sur disque ---
+    @property
+    def decharge(self):
+        return self._fichier is not None
+
+    def decharger(self, dossier=DOSSIER_DECHARGE):
+        """Écrit les colonnes sur disque et libère la mémoire (rechargement paresseux)."""
+        with self._verrou:
+            if self._fichier is not None or self._n == 0:
+                return
+            os.makedirs(dossier, exist_ok=True)
+            fd, chemin = tempfile.mkstemp(prefix="journal_", suffix=".pkl", dir=dossier)
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(self._etat(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._cles, self._colonnes, self._vocab, self._codes = [], {}, [None], {}
+            self._fichier = chemin
+            self._nettoyage = weakref.finalize(self, _supprimer, chemin)
+
+    def _recharger(self):
+        chemin = self._fichier
+        with open(chemin, "rb") as f:
+            self._fichier = None
+            self._restaurer(pickle.load(f))
+        self._nettoyage.detach()
+        _supprimer(chemin)
+
+    def _etat(self):
+        return {"cles": self._cles, "colonnes": {c: (col.type, col.valeurs, col.absents) for c, col in self._colonnes.items()},
+                "vocab": self._vocab, "n": self._n, "revision": self.revision}
+
+    def _restaurer(self, etat):
+        self._cles = etat["cles"]
+        self._colonnes = {}
+        for cle, (type_, valeurs, absents) in etat["colonnes"].items():
+            col = _Colonne.__new__(_Colonne)
+            col.type, col.valeurs, col.absents = type_, valeurs, absents
+            self._colonnes[cle] = col
+        self._vocab = [None] + [sys.intern(t) for t in etat["vocab"][1:]]
+        self._codes = {t: i for i, t in enumerate(self._vocab) if i}
+        self._octets_vocab = sum(sys.getsizeof(t) for t in self._vocab[1:])
+        self._n = etat["n"]
+        self.revision = etat["revision"]
+
+    def __getstate__(self):
+        with self._verrou:
+            self._pret()
+            return self._etat()
+
+    def __setstate__(self, etat):
+        self._verrou = threading.RLock()
+        self._fichier = None
+        self.dernier_acces = time.monotonic()
+        self._restaurer(etat)
+
+
+def _supprimer(chemin):
+    try:
+        os.remove(chemin)
+    except OSError:
+        pass
+
+
+# ==============================================================================
+# COMPTAGE PAR SESSION & BALAYAGE DES SESSIONS INACTIVES
+# ==============================================================================
+_sessions = {}      # id_session -> {"journal": weakref, "octets": int, "acces": float}
+_verrou_sessions = threading.Lock()
+
+
+# Objets sans contenu propre à la session (leur taille est celle de l'en-tête)
+_OPAQUES = (str, bytes, bytearray, int, float, complex, bool, type(None), type, types.ModuleType, types.FunctionType,
+            types.BuiltinFunctionType, types.MethodType, weakref.ref)
+
+
+def taille_objet(obj, _vus=None):
+    """Taille récursive approximative d'un objet Python.
+
+    Parcourt les conteneurs, les DataFrame / Series et les attributs
+    (``__dict__``, ``__slots__``) des objets de session : journal d'audit,
+    inventaire, suivi du budget, réplique, entrepôt historique... Les objets
+    communs à tout le serveur (attribut de classe ``PARTAGE_SERVEUR``) ne
+    sont pas comptés ; ``_vus`` évite de compter deux fois un objet partagé
+    entre plusieurs clés.
+    """
+    _vus = set() if _vus is None else _vus
+    total, pile = 0, [obj]
+    while pile:     # Parcours itératif : pas de limite de récursion sur les structures profondes
+        o = pile.pop()
+        if id(o) in _vus:
+            continue
+        _vus.add(id(o))
+        if getattr(type(o), "PARTAGE_SERVEUR", False):
+            continue
+        if isinstance(o, JournalCompact):
+            total += o.octets()
+            continue
+        if hasattr(o, "memory_usage") and (hasattr(o, "columns") or hasattr(o, "dtype")):  # DataFrame, Series, Index
+            usage = o.memory_usage(deep=True)
+            total += int(usage.sum() if hasattr(usage, "sum") else usage)
+            continue
+        total += sys.getsizeof(o)
+        if isinstance(o, _OPAQUES):
+            continue
+        if isinstance(o, dict):
+            pile.extend(o.keys())
+            pile.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            pile.extend(o)
+        elif getattr(o, "dtype", None) == object and hasattr(o, "ravel"):   # Tableau NumPy d'objets
+            pile.extend(o.ravel().tolist())
+        else:
+            if hasattr(o, "__dict__"):
+                pile.append(vars(o))
+            for attribut in getattr(type(o), "__slots__", ()):
+                if hasattr(o, attribut):
+                    pile.append(getattr(o, attribut))
+    return total
+
+
+def octets_session(etat):
+    """Octets par clé de l'état de session (``st.session_state`` ou dict), chaque objet compté une fois."""
+    vus = set()
+    return {cle: taille_objet(etat[cle], vus) for cle in list(etat.keys())}
+
+
+def octets_journal(entrees):
+    """Octets qu'occuperaient ``entrees`` (liste de dicts) dans un journal compact."""
+    return JournalCompact(entrees).octets()
+
+
+def enregistrer_activite(id_session, journal, octets):
+    """Note l'activité d'une session (appelé à chaque rerun)."""
+    with _verrou_sessions:
+        _sessions[id_session] = {"journal": weakref.ref(journal), "octets": octets, "acces": time.monotonic()}
+
+
+def balayer_inactifs(delai_s=DELAI_INACTIVITE_S, dossier=DOSSIER_DECHARGE):
+    """Décharge sur disque les journaux des sessions inactives ; oublie les sessions fermées."""
+    maintenant = time.monotonic()
+    with _verrou_sessions:
+        entrees = list(_sessions.items())
+    decharges = 0
+    for id_session, info in entrees:
+        journal = info["journal"]()
+        if journal is None:
+            with _verrou_sessions:
+                _sessions.pop(id_session, None)
+            continue
+        if maintenant - info["acces"] > delai_s and not journal.decharge and len(journal):
+            journal.decharger(dossier)
+            decharges += 1
+    return decharges
+
+
+def etat_sessions():
+    """Vue du panneau admin : une ligne par session connue."""
+    maintenant = time.monotonic()
+    with _verrou_sessions:
+        entrees = list(_sessions.items())
+    lignes = []
+    for id_session, info in entrees:
+        journal = info["journal"]()
+        if journal is None:
+            continue
+        lignes.append({
+            "Session": id_session[:8],
+            "Flux": journal._n,
+            "Journal (Ko)": journal.octets() / 1024,
+            "Session (Ko)": info["octets"] / 1024,
+            "Déchargé": journal.decharge,
+            "Inactif (s)": maintenant - info["acces"],
+        })
+    return lignes
@@ -0,0 +1,264 @@
+"""Moteur d'exécution multi-cœurs des analyses lourdes du simulateur (page 4).
+
+Les tableaux de la baseline (impact, incertitude, poste, scope et attributs
+des leviers) sont copiés une seule fois en mémoire partagée
+(``multiprocessing.shared_memory``) par version de baseline. Les processus
+du pool s'y attachent par nom et gardent la vue NumPy : une tâche ne
+transporte que quelques paramètres (graine, tranche de scénarios), jamais
+le journal. Les résultats partiels sont réduits dans le processus appelant.
+
+Trois analyses :
+
+* ``monte_carlo`` : propagation de l'incertitude déclarée de chaque flux
+  (tirages lognormaux indépendants) sur le bilan de référence et la
+  trajectoire des leviers ; tirages par tranches, graines dérivées d'une
+  ``SeedSequence`` (résultat identique quel que soit le nombre de cœurs) ;
+* ``grille`` : produit cartésien de positions de leviers ;
+* ``sensibilite`` : balayage de chaque levier seul autour du réglage courant.
+
+Sous ``SEUIL_PARALLELE`` flux (ou avec un seul cœur), tout tourne dans le
+processus courant : le coût de démarrage du pool dépasserait le gain.
+"""
+import atexit
+import concurrent.futures as cf
+import itertools
+import os
+import threading
+from collections import OrderedDict
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from calculs import LEVIERS_DEFAUT, facteurs_leviers, simuler_scenario
+
+SEUIL_PARALLELE = 20_000       # Flux en dessous desquels le pool n'est pas utilisé
+TIRAGES_PAR_TACHE = 25         # Tirages Monte Carlo par tâche (25 x 100k flux = 20 Mo par worker)
+SCENARIOS_PAR_TACHE = 16       # Scénarios de grille évalués ensemble (simuler_scenario vectorisé)
+BASELINES_PUBLIEES = 4         # Segments de mémoire partagée conservés (versions de baseline)
+Z_95 = 1.96                    # L'incertitude saisie est une demi-largeur d'intervalle à 95 %
+
+TABLEAUX = ["impact", "incertitude", "poste", "scope", "mode", "km", "quotidien", "eclairage", "chauffage", "repas", "elec", "parc", "indicatrices"]
+SCOPES_CODES = ["Scope 1", "Scope 2", "Scope 3"]
+
+# Plages des leviers (bornes des curseurs de la page 4) pour la sensibilité et les grilles
+PLAGES_LEVIERS = {
+    'sim_pop_growth': (-20, 50), 'sim_remote_days': (0, 5), 'sim_mob_reduce': (0, 50), 'sim_mob_train': (0, 1),
+    'sim_mob_carpool': (1.0, 4.0), 'sim_mob_soft': (0, 1), 'sim_elec_green': (0, 1), 'sim_solar': (0, 50),
+    'sim_heat': (0, 50), 'sim_led': (0, 1), 'sim_it_life': (0, 5), 'sim_it_refurb': (0, 100),
+    'sim_food_vege': (0, 100), 'sim_waste': (0, 50),
+}
+BINAIRES = {k for k, v in LEVIERS_DEFAUT.items() if isinstance(v, bool)}
+
+
+# ==============================================================================
+# 1. CALCULS D'UNE TRANCHE (identiques en local et dans les workers)
+# ==============================================================================
+def _tranche_monte_carlo(lignes, leviers, params, graine, tirages, parc=None):
+    """``tirages`` échantillons -> (totaux référence, totaux finaux, finaux par scope)."""
+    rng = np.random.default_rng(graine)
+    impact = lignes["impact"]
+    facteur, _ = facteurs_leviers(lignes, leviers, params, parc)
+    impact_final = (impact * facteur).reshape(-1)
+    # Lognormale de moyenne 1 : pas d'émissions négatives, espérance inchangée
+    sigma = np.log1p(lignes["incertitude"]) / Z_95
+    bruit = np.exp(sigma * rng.standard_normal((tirages, impact.size)) - sigma ** 2 / 2)
+    scopes = np.zeros((impact.size, len(SCOPES_CODES)))
+    scopes[np.arange(impact.size), lignes["scope"]] = 1.0
+    finaux = bruit * impact_final
+    return bruit @ impact, finaux.sum(axis=1), finaux @ scopes
+
+
+def _tranche_scenarios(lignes, total_ref, lots, params, parc=None):
+    """Lot de positions (dict de tableaux) -> dict de tableaux de résultats."""
+    return simuler_scenario({"lignes": lignes, "total_ref": total_ref, "parc": parc}, lots, params)
+
+
+# ==============================================================================
+# 2. CÔTÉ WORKER : ATTACHEMENT AUX SEGMENTS PARTAGÉS
+# ==============================================================================
+_ATTACHES = OrderedDict()  # version -> (segments, lignes) dans chaque processus du pool
+
+
+def _lignes_partagees(descripteur):
+    version = descripteur["version"]
+    if version not in _ATTACHES:
+        segments, lignes = [], {}
+        for cle, (nom, forme, dtype) in descripteur["tableaux"].items():
+            shm = shared_memory.SharedMemory(name=nom)
+            segments.append(shm)
+            lignes[cle] = np.ndarray(forme, dtype=np.dtype(dtype), buffer=shm.buf)
+            lignes[cle].flags.writeable = False
+        _ATTACHES[version] = (segments, lignes)
+        while len(_ATTACHES) > BASELINES_PUBLIEES:
+            anciens, _ = _ATTACHES.popitem(last=False)[1]
+            for shm in anciens:
+                shm.close()
+    _ATTACHES.move_to_end(version)
+    return _ATTACHES[version][1]
+
+
+def _worker_monte_carlo(descripteur, leviers, params, graine, tirages):
+    return _tranche_monte_carlo(_lignes_partagees(descripteur), leviers, params, graine, tirages, descripteur["parc"])
+
+
+def _worker_scenarios(descripteur, lots, params):
+    return _tranche_scenarios(_lignes_partagees(descripteur), descripteur["total_ref"], lots, params, descripteur["parc"])
+
+
+# ==============================================================================
+# 3. MOTEUR (PROCESSUS APPELANT)
+# ==============================================================================
+class MoteurParallele:
+    """Pool de processus + baselines publiées en mémoire partagée (un par serveur)."""
+
+    PARTAGE_SERVEUR = True     # Commun à toutes les sessions : hors budget mémoire de session
+
+    def __init__(self, workers=None, seuil=SEUIL_PARALLELE):
+        self.workers = workers or os.cpu_count() or 1
+        self.seuil = seuil
+        self.pool = None
+        self.publiees = OrderedDict()  # version -> (segments, descripteur)
+        self.verrou = threading.Lock()
+        atexit.register(self.fermer)
+
+    # --- Publication ---
+    def publier(self, base):
+        """Copie les tableaux de la baseline en mémoire partagée (une fois par version)."""
+        version = base["version"]
+        with self.verrou:
+            if version in self.publiees:
+                self.publiees.move_to_end(version)
+                return self.publiees[version][1]
+            segments, tableaux = [], {}
+            for cle in TABLEAUX:
+                src = np.ascontiguousarray(base["lignes"][cle])
+                shm = shared_memory.SharedMemory(create=True, size=max(src.nbytes, 1))
+                np.ndarray(src.shape, dtype=src.dtype, buffer=shm.buf)[...] = src
+                segments.append(shm)
+                tableaux[cle] = (shm.name, src.shape, src.dtype.str)
+            descripteur = {"version": version, "total_ref": base["total_ref"], "parc": base.get("parc"), "tableaux": tableaux}
+            self.publiees[version] = (segments, descripteur)
+            while len(self.publiees) > BASELINES_PUBLIEES:
+                self._liberer(self.publiees.popitem(last=False)[1][0])
+            return descripteur
+
+    @staticmethod
+    def _liberer(segments):
+        for shm in segments:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def fermer(self):
+        with self.verrou:
+            if self.pool is not None:
+                self.pool.shutdown(cancel_futures=True)
+                self.pool = None
+            for segments, _ in self.publiees.values():
+                self._liberer(segments)
+            self.publiees.clear()
+
+    def parallele(self, base):
+        """Vrai si les analyses de cette baseline tournent sur le pool (sinon dans le processus courant)."""
+        return self.workers > 1 and len(base["lignes"]["impact"]) >= self.seuil
+
+    def _pool(self):
+        with self.verrou:
+            if self.pool is None:
+                self.pool = cf.ProcessPoolExecutor(max_workers=self.workers)
+            return self.pool
+
+    def _executer(self, base, local, distant, lots, progression=None, libelle="Calcul"):
+        """Évalue ``lots`` (arguments par tâche) en local ou sur le pool ; résultats dans l'ordre."""
+        def etape(i):
+            if progression:
+                progression(i / len(lots), f"{libelle} : tranche {i}/{len(lots)}")
+
+        if not self.parallele(base):
+            resultats = []
+            for i, args in enumerate(lots):
+                etape(i)
+                resultats.append(local(base["lignes"], *args))
+            return resultats
+        descripteur = self.publier(base)
+        futurs = [self._pool().submit(distant, descripteur, *args) for args in lots]
+        try:
+            for i, _ in enumerate(cf.as_completed(futurs)):
+                etape(i)  # Lève TacheAnnulee si l'utilisateur a annulé
+            return [f.result() for f in futurs]
+        finally:
+            for f in futurs:
+                f.cancel()
+
+    # --- Analyses ---
+    def monte_carlo(self, base, leviers, params, tirages=1000, graine=2030, progression=None):
+        """Distribution du bilan de référence et de la trajectoire (kgCO2e) sous incertitude.
+
+        Renvoie un DataFrame d'un tirage par ligne : ``Référence``, ``Final``
+        et le final par scope.
+        """
+        lv = dict(LEVIERS_DEFAUT, **(leviers or {}))
+        tailles = [TIRAGES_PAR_TACHE] * (tirages // TIRAGES_PAR_TACHE) + ([tirages % TIRAGES_PAR_TACHE] if tirages % TIRAGES_PAR_TACHE else [])
+        graines = np.random.SeedSequence(graine).spawn(len(tailles))
+        lots = [(lv, params, g, n) for g, n in zip(graines, tailles)]
+
+        def local(lignes, *lot):
+            return _tranche_monte_carlo(lignes, *lot, base.get("parc"))
+
+        parts = self._executer(base, local, _worker_monte_carlo, lots, progression, "Monte Carlo")
+        ref, final, scopes = (np.concatenate(p) for p in zip(*parts))
+        return pd.DataFrame({"Référence": ref, "Final": final, **{s: scopes[:, i] for i, s in enumerate(SCOPES_CODES)}})
+
+    def evaluer(self, base, positions, params, progression=None, libelle="Scénarios"):
+        """Liste de positions de leviers -> DataFrame de résultats (une ligne par position)."""
+        positions = [dict(LEVIERS_DEFAUT, **p) for p in positions]
+        lots = []
+        for debut in range(0, len(positions), SCENARIOS_PAR_TACHE):
+            tranche = positions[debut:debut + SCENARIOS_PAR_TACHE]
+            lots.append(({k: np.array([p[k] for p in tranche], dtype=float) for k in LEVIERS_DEFAUT}, params))
+
+        def local(lignes, lot, params):
+            return _tranche_scenarios(lignes, base["total_ref"], lot, params, base.get("parc"))
+
+        parts = self._executer(base, local, _worker_scenarios, lots, progression, libelle)
+        resultats = pd.concat([pd.DataFrame({k: np.broadcast_to(v, len(lot[0]['sim_pop_growth'])) for k, v in r.items()})
+                               for r, lot in zip(parts, lots)], ignore_index=True)
+        return pd.concat([pd.DataFrame(positions), resultats], axis=1)
+
+    def grille(self, base, axes, leviers, params, progression=None):
+        """Produit cartésien ``{levier: valeurs}`` autour du réglage ``leviers``."""
+        noms = list(axes)
+        positions = [dict(leviers, **dict(zip(noms, combinaison))) for combinaison in itertools.product(*axes.values())]
+        return self.evaluer(base, positions, params, progression, "Grille de scénarios")
+
+    def sensibilite(self, base, leviers, params, pas=6, plages=None, progression=None):
+        """Balayage de chaque levier seul (``pas`` positions de sa plage), les autres au réglage courant.
+
+        Renvoie ``(balayage, tornade)`` : toutes les évaluations, puis l'écart
+        de total final (tCO2e) aux bornes de chaque levier, trié par amplitude.
+        """
+        plages = plages or PLAGES_LEVIERS
+        positions, etiquettes = [], []
+        for cle, (bas, haut) in plages.items():
+            valeurs = [bas, haut] if cle in BINAIRES else np.linspace(bas, haut, pas).tolist()
+            for v in valeurs:
+                positions.append(dict(leviers, **{cle: v}))
+                etiquettes.append(cle)
+        balayage = self.evaluer(base, [dict(leviers)] + positions, params, progression, "Sensibilité")
+        courant = balayage["total_final"].iloc[0]
+        balayage = balayage.iloc[1:].assign(Levier=etiquettes).reset_index(drop=True)
+        balayage["Écart (t)"] = (balayage["total_final"] - courant) / 1000
+        tornade = (balayage.groupby("Levier", sort=False)["Écart (t)"].agg(Mini="min", Maxi="max")
+                   .assign(Amplitude=lambda t: t["Maxi"] - t["Mini"])
+                   .sort_values("Amplitude", ascending=False).reset_index())
+        return balayage, tornade
+
+
+def quantiles(tirages, colonnes=("Référence", "Final"), niveaux=(0.05, 0.5, 0.95)):
+    """Résumé P5 / P50 / P95 (tCO2e) d'un tableau de tirages Monte Carlo."""
+    q = tirages[list(colonnes)].quantile(list(niveaux)) / 1000
+    q.index = [f"P{round(n * 100)}" for n in niveaux]
+    return q.T
@@ -0,0 +1,237 @@
+"""Registre du parc numérique : un équipement par ligne, amortissement pluriannuel.
+
+Le formulaire « Parc Numérique » agrège un type d'équipement en une ligne
+``fe / durée`` sans date d'achat. Le registre (type, date d'achat, durée de
+vie prévue, reconditionné, quantité) importé en masse permet :
+
+* l'amortissement de la fabrication année par année, calculé d'un bloc
+  sous forme de matrice équipements × années (recouvrement de la période
+  d'amortissement de chaque équipement avec chaque année civile) ;
+* l'évaluation des leviers « durée de vie » et « reconditionné » sur la
+  pyramide des âges réelle du parc : l'allongement décale les
+  renouvellements, le reconditionné ne s'applique qu'aux achats futurs.
+"""
+import numpy as np
+import pandas as pd
+
+# Types reconnus -> clé du facteur de fabrication (kgCO2e / unité)
+TYPES = {
+    "PC Portable": 'fe_it_laptop',
+    "PC Fixe": 'fe_it_desktop',
+    "Écran": 'fe_it_screen',
+    "Smartphone": 'fe_it_smartphone',
+}
+FE_DEFAUT = 100.0               # Autres équipements (vidéoprojecteur...), comme le formulaire
+DUREES_DEFAUT = {"PC Portable": 4, "PC Fixe": 5, "Écran": 6, "Smartphone": 3}
+DUREE_DEFAUT = 5
+GAIN_RECONDITIONNE = 0.8        # Fabrication évitée par un achat reconditionné (levier du simulateur)
+HORIZON = 2030
+PROLONGATIONS = np.arange(0, 10.01, 0.25)   # Grille d'interpolation du levier durée de vie (années)
+# Mots-clés des saisies libres (minuscules, testés dans l'ordre)
+MOTS_CLES_TYPES = [
+    ("portable", "PC Portable"), ("laptop", "PC Portable"), ("fixe", "PC Fixe"), ("desktop", "PC Fixe"),
+    ("tour", "PC Fixe"), ("écran", "Écran"), ("ecran", "Écran"), ("moniteur", "Écran"), ("screen", "Écran"),
+    ("smartphone", "Smartphone"), ("téléphone", "Smartphone"), ("telephone", "Smartphone"),
+    ("projecteur", "Vidéoprojecteur"),
+]
+VRAI = {"oui", "o", "yes", "y", "true", "vrai", "1", "x"}
+
+
+def normaliser_type(reponse):
+    txt = str(reponse).strip()
+    if txt in TYPES or txt == "Vidéoprojecteur":
+        return txt
+    bas = txt.lower()
+    for mot, type_ in MOTS_CLES_TYPES:
+        if mot in bas:
+            return type_
+    return "Autre"
+
+
+# ==============================================================================
+# 1. LECTURE DU REGISTRE
+# ==============================================================================
+def lire_registre(df, annee_defaut):
+    """Registre brut -> (DataFrame normalisé : type, achat, durée, reconditionné, quantité ; lignes rejetées).
+
+    ``achat`` est une année décimale (2023.5 = début juillet) ; une année
+    seule est placée au milieu de l'année.
+    """
+    colonnes = {c.lower().replace(" ", "_").replace("é", "e").replace("è", "e"): c for c in df.columns}
+
+    def col(*noms):
+        return next((colonnes[n] for n in noms if n in colonnes), None)
+
+    c_type = col("type", "materiel", "equipement", "categorie")
+    c_achat = col("date_achat", "date_d'achat", "achat", "date", "annee_achat", "mise_en_service")
+    c_duree, c_recond = col("duree", "duree_vie", "duree_de_vie", "duree_prevue"), col("reconditionne", "recond", "reconditionnement")
+    c_qte = col("quantite", "qte", "nombre")
+    if c_type is None or c_achat is None:
+        raise ValueError("Colonnes attendues : Type + Date d'achat (Durée, Reconditionné, Quantité optionnelles)")
+
+    out = pd.DataFrame(index=df.index)
+    out["type"] = df[c_type].map(normaliser_type)
+    annee = pd.to_numeric(df[c_achat], errors="coerce")
+    annee = annee.where(annee.between(1980, 2100)) + 0.5
+    # ISO (2023-05-01) d'abord, puis format français (01/05/2023) : jamais d'inversion jour / mois des dates ISO
+    brut = df[c_achat].where(annee.isna()).astype(str)
+    dates = pd.to_datetime(brut, errors="coerce", format="ISO8601")
+    dates = dates.fillna(pd.to_datetime(brut, errors="coerce", format="mixed", dayfirst=True))
+    out["achat"] = annee.fillna(dates.dt.year + (dates.dt.dayofyear - 1) / 365.25)
+    duree = pd.to_numeric(df[c_duree], errors="coerce") if c_duree else pd.Series(np.nan, index=df.index)
+    out["duree"] = duree.where(duree > 0).fillna(out["type"].map(DUREES_DEFAUT)).fillna(DUREE_DEFAUT).astype(float)
+    out["reconditionne"] = df[c_recond].astype(str).str.strip().str.lower().isin(VRAI) if c_recond else False
+    out["quantite"] = pd.to_numeric(df[c_qte], errors="coerce").fillna(1.0) if c_qte else 1.0
+
+    rejets = out[out["achat"].isna() | (out["achat"] >= annee_defaut + 1)]
+    out = out.drop(rejets.index)
+    out["type"] = out["type"].astype("category")
+    return out, rejets
+
+
+def fabrication(registre, params, neuf=False):
+    """Fabrication (kgCO2e) de chaque ligne du registre, remise reconditionné comprise sauf si ``neuf``."""
+    fe = registre["type"].astype(str).map({t: params.get(cle, FE_DEFAUT) for t, cle in TYPES.items()}).fillna(FE_DEFAUT)
+    fab = fe.to_numpy(dtype=float) * registre["quantite"].to_numpy(dtype=float)
+    if neuf:
+        return fab
+    return fab * (1 - GAIN_RECONDITIONNE * registre["reconditionne"].to_numpy(dtype=float))
+
+
+def _recouvrement(debut, fin, annees):
+    """Part de chaque année civile couverte par [debut, fin) : tableau (..., années)."""
+    annees = np.asarray(annees, dtype=float)
+    return np.clip(np.minimum(fin[..., None], annees + 1) - np.maximum(debut[..., None], annees), 0.0, 1.0)
+
+
+# ==============================================================================
+# 2. AMORTISSEMENT PLURIANNUEL
+# ==============================================================================
+def matrice_amortissement(registre, params, annees):
+    """Fabrication amortie (kgCO2e) de chaque équipement pour chaque année : tableau (équipements, années)."""
+    achat, duree = registre["achat"].to_numpy(dtype=float), registre["duree"].to_numpy(dtype=float)
+    return (fabrication(registre, params) / duree)[:, None] * _recouvrement(achat, achat + duree, annees)
+
+
+def amortissement_par_type(registre, params, annees):
+    """Matrice équipements × années agrégée par type : DataFrame (types × années), kgCO2e."""
+    codes = registre["type"].cat.codes.to_numpy()
+    indicatrices = np.zeros((len(codes), len(registre["type"].cat.categories)))
+    indicatrices[np.arange(len(codes)), codes] = 1.0
+    par_type = indicatrices.T @ matrice_amortissement(registre, params, annees)
+    return pd.DataFrame(par_type, index=registre["type"].cat.categories, columns=list(annees))
+
+
+def flux_annee(registre, params, annee):
+    """Flux Numérique de l'année de reporting : un par type (parc en service, fabrication amortie)."""
+    en_service = registre[registre["achat"] < annee + 1]
+    if en_service.empty:
+        return []
+    amorti = matrice_amortissement(en_service, params, [annee])[:, 0]
+    df = pd.DataFrame({
+        "type": en_service["type"].astype(str), "quantite": en_service["quantite"], "impact": amorti,
+        "age": (annee + 1 - en_service["achat"]) * en_service["quantite"], "duree": en_service["duree"] * en_service["quantite"],
+        "recond": en_service["reconditionne"] * en_service["quantite"],
+        "fini": (en_service["achat"] + en_service["duree"] <= annee) * en_service["quantite"],
+    })
+    groupes = df.groupby("type", sort=True).sum()
+    flux = []
+    for type_, g in groupes.iterrows():
+        if g["quantite"] <= 0:
+            continue
+        q = g["quantite"]
+        flux.append({
+            "Type": type_, "Quantité": q, "Impact": g["impact"], "fe": g["impact"] / q,
+            "Détail": f"Registre parc | {q:.0f} u, âge moy. {g['age'] / q:.1f} ans | Amortissement {g['duree'] / q:.1f} ans | "
+                      f"{g['recond'] / q:.0%} reconditionné, {g['fini'] / q:.0%} amorti",
+        })
+    return flux
+
+
+# ==============================================================================
+# 3. LEVIERS SUR LA PYRAMIDE DES ÂGES
+# ==============================================================================
+def _composantes(registre, params, annee, horizon, prolongation):
+    """Amortissement de l'année ``horizon`` pour chaque prolongation (années) : ``(A, B)``.
+
+    ``A`` : équipements actuels, amortis sur leur durée prolongée.
+    ``B`` : renouvellements (achetés neufs, au rythme de la durée prolongée),
+    avant remise reconditionné. Un équipement déjà hors durée est remplacé
+    au plus tôt à la fin de l'année de référence.
+    """
+    p = np.asarray(prolongation, dtype=float)[:, None]
+    achat, duree = registre["achat"].to_numpy(dtype=float), registre["duree"].to_numpy(dtype=float)
+    vie = duree + p                                                # (prolongations, équipements)
+    remplacement = np.maximum(achat + vie, annee + 1)
+    a = fabrication(registre, params) / vie * _recouvrement(np.broadcast_to(achat, vie.shape), achat + vie, [horizon])[..., 0]
+    b = fabrication(registre, params, neuf=True) / vie * np.clip(horizon + 1 - np.maximum(remplacement, horizon), 0.0, 1.0)
+    return a.sum(axis=1), b.sum(axis=1)
+
+
+def part_reconditionnee(registre):
+    q = registre["quantite"].to_numpy(dtype=float)
+    return float((q * registre["reconditionne"].to_numpy(dtype=float)).sum() / q.sum()) if q.sum() else 0.0
+
+
+def courbes_leviers(registre, params, annee, horizon=HORIZON):
+    """Réponse du parc aux leviers, précalculée sur ``PROLONGATIONS`` (quelques tableaux légers).
+
+    Le simulateur interpole ces courbes (``facteur_parc``) au lieu de
+    reparcourir le registre à chaque scénario.
+    """
+    horizon = max(horizon, annee + 1)
+    a, b = _composantes(registre, params, annee, horizon, PROLONGATIONS)
+    q = registre["quantite"].to_numpy(dtype=float)
+    return {
+        "prolongation": PROLONGATIONS, "A": a, "B": b, "r0": part_reconditionnee(registre),
+        "annee": annee, "horizon": horizon, "equipements": float(q.sum()),
+        "age_moyen": float(((annee + 1 - registre["achat"].to_numpy()) * q).sum() / q.sum()) if q.sum() else 0.0,
+    }
+
+
+def facteur_parc(courbes, prolongation, part):
+    """Coefficient des flux du registre : amortissement à l'horizon avec leviers / statu quo.
+
+    ``part`` (0-1) est la part d'achats reconditionnés visée pour les
+    renouvellements ; elle ne descend pas sous la part actuelle du parc.
+    Fonctionne sur des tableaux de scénarios.
+    """
+    grille = courbes["prolongation"]
+    a = np.interp(prolongation, grille, courbes["A"])
+    b = np.interp(prolongation, grille, courbes["B"])
+    r = np.maximum(part, courbes["r0"])
+    ref = courbes["A"][0] + (1 - GAIN_RECONDITIONNE * courbes["r0"]) * courbes["B"][0]
+    if ref <= 0:
+        return np.ones_like(a)
+    return (a + (1 - GAIN_RECONDITIONNE * r) * b) / ref
+
+
+def trajectoire(registre, params, annee, prolongation=0.0, part=0.0, horizon=HORIZON):
+    """Amortissement annuel (tCO2e) de ``annee`` à l'horizon : statu quo et scénario."""
+    annees = list(range(annee, max(horizon, annee + 1) + 1))
+    r0 = part_reconditionnee(registre)
+    r = max(part, r0)
+    lignes = []
+    for h in annees:
+        a, b = _composantes(registre, params, annee, h, [0.0, prolongation])
+        lignes.append({"Année": h, "Statu quo": (a[0] + (1 - GAIN_RECONDITIONNE * r0) * b[0]) / 1000,
+                       "Scénario": (a[1] + (1 - GAIN_RECONDITIONNE * r) * b[1]) / 1000})
+    return pd.DataFrame(lignes)
+
+
+def analyser_registre(contenu, nom, params, annee, progression=None):
+    """Fichier registre (octets CSV/Excel) -> (registre, flux, rejets) ; exécutable en tâche de fond."""
+    import io
+
+    def etape(fraction, message):
+        if progression:
+            progression(fraction, message)
+
+    etape(0.1, "Lecture du registre")
+    df = pd.read_csv(io.BytesIO(contenu), sep=None, engine="python", dtype=str) if nom.lower().endswith(".csv") else pd.read_excel(io.BytesIO(contenu), dtype=str)
+    etape(0.3, f"Normalisation de {len(df)} équipements")
+    registre, rejets = lire_registre(df, annee)
+    etape(0.7, "Amortissement de l'année")
+    flux = flux_annee(registre, params, annee)
+    etape(1.0, "Terminé")
+    return registre, flux, rejets
@@ -0,0 +1,186 @@
+"""Instrumentation des reruns Streamlit (chronos, mémoire, tailles, profilage).
+
+Chaque rerun de ``app.py`` crée un ``Chrono`` : les grandes sections du
+script sont découpées avec ``etape()`` et les points chauds mesurés avec
+``span()``. Les N derniers reruns sont conservés par page, au niveau du
+processus, pour le panneau Performance (admin).
+
+Un rerun interrompu (``st.stop()``, ``st.rerun()``) n'atteint pas
+``terminer()`` : le ``Chrono`` suivant libère le profileur resté actif, et
+tracemalloc est arrêté dès que les mesures détaillées sont désactivées.
+"""
+import cProfile
+import io
+import os
+import pstats
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+NB_RERUNS = 20
+
+# Budget de démarrage : premier affichage d'une session après connexion
+BUDGET_PREMIER_AFFICHAGE_MS = 1500
+T0_PROCESSUS = time.perf_counter()  # Import de ce module = premier rerun du processus
+
+# Réglages du processus (modifiables depuis le panneau admin)
+REGLAGES = {
+    "actif": True,        # chronos (coût négligeable)
+    "detail": False,      # deltas mémoire (tracemalloc) + taille des graphes, plus coûteux
+    "profil": False,      # cProfile sur le prochain rerun (se désactive ensuite)
+}
+
+_historique = defaultdict(lambda: deque(maxlen=NB_RERUNS))
+_profils = {}
+_demarrage = {"froid_ms": None, "premiers_affichages": deque(maxlen=50)}
+_verrou = threading.Lock()
+_actifs = {"profileur": None, "thread": None, "tracemalloc": False}  # Ressources ouvertes par ce module
+
+
+def _liberer_profileur():
+    """Arrête le profileur d'un rerun interrompu (même thread de script ou thread terminé)."""
+    with _verrou:
+        profileur, thread = _actifs["profileur"], _actifs["thread"]
+        if profileur is None or (thread is not threading.current_thread() and thread.is_alive()):
+            return
+        _actifs["profileur"] = _actifs["thread"] = None
+    profileur.disable()
+
+
+def _suivre_memoire(actif):
+    """Démarre tracemalloc pour les mesures détaillées ; l'arrête (s'il vient d'ici) quand elles sont coupées."""
+    if actif and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _actifs["tracemalloc"] = True
+    elif not actif and _actifs["tracemalloc"]:
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        _actifs["tracemalloc"] = False
+
+
+def _memoire():
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+class Chrono:
+    """Mesures d'un rerun : étapes séquentielles + spans imbriqués."""
+
+    def __init__(self):
+        self.actif = REGLAGES["actif"]
+        self.debut = time.perf_counter()
+        self.horodatage = time.strftime("%H:%M:%S")
+        self.mesures = []
+        self.compteur = 0
+        self.etape_courante = None
+        self.profileur = None
+        _suivre_memoire(self.actif and REGLAGES["detail"])
+        _liberer_profileur()
+        if self.actif and REGLAGES["profil"]:
+            self.profileur = cProfile.Profile()
+            try:
+                self.profileur.enable()
+            except ValueError:  # Un autre profileur tourne déjà (session concurrente)
+                self.profileur = None
+            else:
+                with _verrou:
+                    _actifs["profileur"], _actifs["thread"] = self.profileur, threading.current_thread()
+
+    def _ouvrir(self, nom, niveau):
+        return {"nom": nom, "niveau": niveau, "ordre": self._suivant(), "t0": time.perf_counter(), "m0": _memoire(), "octets": None}
+
+    def _suivant(self):
+        self.compteur += 1
+        return self.compteur
+
+    def _fermer(self, mesure):
+        mesure["ms"] = (time.perf_counter() - mesure.pop("t0")) * 1000
+        mesure["memoire_ko"] = (_memoire() - mesure.pop("m0")) / 1024
+        self.mesures.append(mesure)
+
+    def etape(self, nom):
+        """Termine l'étape en cours et ouvre la suivante (sections du script)."""
+        if not self.actif:
+            return
+        if self.etape_courante:
+            self._fermer(self.etape_courante)
+        self.etape_courante = self._ouvrir(nom, 0)
+
+    @contextmanager
+    def span(self, nom):
+        """Mesure un bloc ; ``yield`` un dict où renseigner ``octets``."""
+        if not self.actif:
+            yield {}
+            return
+        mesure = self._ouvrir(nom, 1)
+        try:
+            yield mesure
+        finally:
+            self._fermer(mesure)
+
+    def terminer(self, page, premier_affichage=False):
+        """Clôture le rerun et l'archive dans l'historique de la page."""
+        with _verrou:
+            if _demarrage["froid_ms"] is None:
+                _demarrage["froid_ms"] = (time.perf_counter() - T0_PROCESSUS) * 1000
+            if premier_affichage:
+                _demarrage["premiers_affichages"].append((time.perf_counter() - self.debut) * 1000)
+        if not self.actif:
+            return
+        try:
+            if self.etape_courante:
+                self._fermer(self.etape_courante)
+                self.etape_courante = None
+            rerun = {
+                "heure": self.horodatage,
+                "total_ms": (time.perf_counter() - self.debut) * 1000,
+                "mesures": sorted(self.mesures, key=lambda m: m["ordre"]),
+            }
+            with _verrou:
+                _historique[page].append(rerun)
+        finally:
+            if self.profileur is not None:
+                profileur, self.profileur = self.profileur, None
+                profileur.disable()
+                with _verrou:
+                    if _actifs["profileur"] is profileur:
+                        _actifs["profileur"] = _actifs["thread"] = None
+                _profils[page] = exporter_profil(profileur)
+                REGLAGES["profil"] = False  # Profil ponctuel : un seul rerun
+
+
+def exporter_profil(profileur):
+    """Profil cProfile -> (résumé texte top 40, octets .prof pour snakeviz)."""
+    texte = io.StringIO()
+    pstats.Stats(profileur, stream=texte).sort_stats("cumulative").print_stats(40)
+    fd, chemin = tempfile.mkstemp(suffix=".prof")
+    os.close(fd)
+    try:
+        profileur.dump_stats(chemin)
+        with open(chemin, "rb") as f:
+            brut = f.read()
+    finally:
+        os.remove(chemin)
+    return {"heure": time.strftime("%H:%M:%S"), "texte": texte.getvalue(), "octets": brut}
+
+
+def historique(page):
+    with _verrou:
+        return list(_historique.get(page, []))
+
+
+def pages_mesurees():
+    with _verrou:
+        return list(_historique.keys())
+
+
+def demarrage():
+    """Démarrage à froid du processus + premiers affichages des sessions (ms)."""
+    with _verrou:
+        return _demarrage["froid_ms"], list(_demarrage["premiers_affichages"])
+
+
+def dernier_profil(page):
+    return _profils.get(page)
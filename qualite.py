@@ -0,0 +1,120 @@
+"""Contrôle qualité du journal des flux : doublons et valeurs aberrantes.
+
+Tout est vectorisé (pandas/NumPy) pour rester sous la seconde à 100k flux :
+
+* doublons exacts : empreinte (hash) de la ligne hors date de saisie, dans
+  une même année de reporting ;
+* quasi-doublons : même Catégorie/Item/unité, même Détail normalisé (casse,
+  espaces, ponctuation) et impact à ±``TOLERANCE_QUASI`` d'une ligne voisine
+  (tri puis comparaison des voisins) ;
+* valeurs aberrantes : z-score robuste (médiane/MAD, Iglewicz-Hoaglin) en
+  échelle log, par Catégorie/Item/unité, sur l'impact par unité et sur la
+  quantité (une faute de frappe 10 000 km au lieu de 100 ne change pas
+  l'impact unitaire d'un trajet, mais sa quantité). L'impact unitaire est
+  comparé à mode égal (« TGV | 160j/an | ... ») : un trajet en avion n'est
+  pas atypique parmi des trajets en TGV du même profil.
+"""
+import numpy as np
+import pandas as pd
+
+TOLERANCE_QUASI = 0.02      # Écart relatif d'impact pour un quasi-doublon
+SEUIL_Z = 3.5               # Seuil usuel du z-score modifié
+TAILLE_MIN_GROUPE = 5       # En dessous, pas de statistique fiable
+BRUIT_LOG = 1e-9            # Écart (log10) en dessous duquel deux valeurs sont égales
+
+COLONNES_EMPREINTE = ["Catégorie", "Item", "Quantité", "Impact_kgCO2", "Incertitude", "Détail", "Année"]
+
+
+def parser_quantites(quantite):
+    """Colonne « Quantité » ("123.4 km.pax") -> (valeurs float, unités)."""
+    morceaux = quantite.astype(str).str.strip().str.partition(" ")
+    return pd.to_numeric(morceaux[0], errors="coerce"), morceaux[2].str.strip()
+
+
+def _codes(serie, normaliser=None):
+    """Codes entiers d'une colonne texte ; la normalisation ne porte que sur les valeurs distinctes."""
+    codes, uniques = pd.factorize(serie, use_na_sentinel=False)
+    if normaliser is None:
+        return codes
+    return pd.factorize(normaliser(pd.Series(uniques, dtype=str)))[0][codes]
+
+
+def _normaliser_texte(s):
+    return s.str.lower().str.replace(r"[^\w]+", " ", regex=True).str.strip()
+
+
+def _mode_detail(s):
+    """Premier champ d'un Détail structuré (« Mode | jours | contexte ») ; vide sinon."""
+    return s.str.extract(r"^\s*([^|]*?)\s*\|", expand=False).fillna("").str.lower()
+
+
+def _z_robuste(valeurs, groupes):
+    """z-score modifié par groupe : 0.6745 (x - médiane) / MAD, repli sur l'écart absolu moyen."""
+    g = valeurs.groupby(groupes, sort=False)
+    mediane = g.transform("median")
+    ecart = (valeurs - mediane).abs()
+    ecart = ecart.where(ecart > BRUIT_LOG, 0.0)   # Arrondis flottants (20.90 / 110 != 0.19) : pas un écart
+    ge = ecart.groupby(groupes, sort=False)
+    mad = ge.transform("median")
+    moyenne_ecart = ge.transform("mean")
+    taille = g.transform("size")
+    z = np.where(mad > 0, 0.6745 * ecart / mad.where(mad > 0, 1),
+                 np.where(moyenne_ecart > 0, ecart / (1.253314 * moyenne_ecart.where(moyenne_ecart > 0, 1)), 0.0))
+    return pd.Series(np.where(taille >= TAILLE_MIN_GROUPE, z, 0.0), index=valeurs.index).fillna(0.0)
+
+
+def analyser(df):
+    """Drapeaux qualité alignés sur ``df`` (journal préparé ou brut)."""
+    if df.empty:
+        return pd.DataFrame({"doublon": False, "quasi_doublon": False, "z_unitaire": 0.0, "z_quantite": 0.0,
+                             "aberrant": False, "motif": ""}, index=df.index)
+    impact = pd.to_numeric(df["Impact_kgCO2"], errors="coerce").fillna(0)
+    valeur, unite = parser_quantites(df.get("Quantité", pd.Series("", index=df.index)))
+    cles = [c for c in COLONNES_EMPREINTE if c in df.columns]
+
+    res = pd.DataFrame(index=df.index)
+    # 1. Doublons exacts (la date de saisie est ignorée)
+    res["doublon"] = pd.util.hash_pandas_object(df[cles], index=False).duplicated(keep="first").to_numpy()
+
+    # 2. Quasi-doublons : voisins après tri par (groupe, Détail normalisé) puis impact
+    codes = pd.DataFrame({"c": _codes(df["Catégorie"]), "i": _codes(df["Item"], _normaliser_texte), "u": _codes(unite)})
+    groupe = pd.util.hash_pandas_object(codes, index=False).to_numpy()
+    detail = _codes(df["Détail"], _normaliser_texte) if "Détail" in df.columns else np.zeros(len(df), dtype=np.intp)
+    if "Année" in df.columns:  # Un même poste reconduit d'une année sur l'autre n'est pas un doublon
+        detail = pd.util.hash_pandas_object(pd.DataFrame({"d": detail, "a": _codes(df["Année"])}), index=False).to_numpy()
+    ordre = np.lexsort((impact.to_numpy(), detail, groupe))
+    g_tri, d_tri, imp_tri = groupe[ordre], detail[ordre], impact.to_numpy()[ordre]
+    proche = np.zeros(len(df), dtype=bool)
+    if len(df) > 1:
+        meme_groupe = (g_tri[1:] == g_tri[:-1]) & (d_tri[1:] == d_tri[:-1])
+        ecart_rel = np.abs(imp_tri[1:] - imp_tri[:-1]) / np.maximum(np.abs(imp_tri[1:]), 1e-9)
+        proche[ordre[1:]] = meme_groupe & (ecart_rel <= TOLERANCE_QUASI)
+    res["quasi_doublon"] = proche & ~res["doublon"]
+
+    # 3. Valeurs aberrantes (échelle log : les fautes de frappe sont multiplicatives)
+    groupes = pd.Series(groupe, index=df.index)
+    if "Détail" in df.columns:  # Facteur d'émission propre à chaque mode de transport
+        codes["m"] = _codes(df["Détail"], _mode_detail)
+    groupes_unitaire = pd.Series(pd.util.hash_pandas_object(codes, index=False).to_numpy(), index=df.index)
+    unitaire = (impact / valeur.where(valeur > 0)).where(lambda s: s > 0)
+    res["z_unitaire"] = _z_robuste(np.log10(unitaire), groupes_unitaire)
+    res["z_quantite"] = _z_robuste(np.log10(valeur.where(valeur > 0)), groupes)
+    res["aberrant"] = (res["z_unitaire"] > SEUIL_Z) | (res["z_quantite"] > SEUIL_Z)
+
+    motif = np.where(res["doublon"], "Doublon exact", np.where(res["quasi_doublon"], "Quasi-doublon", ""))
+    motif_ab = np.where(res["z_quantite"] > SEUIL_Z, "Quantité atypique", np.where(res["z_unitaire"] > SEUIL_Z, "Impact unitaire atypique", ""))
+    res["motif"] = pd.Series(motif, index=df.index).str.cat(pd.Series(motif_ab, index=df.index), sep=" · ").str.strip(" ·")
+    return res
+
+
+def synthese(df, drapeaux):
+    """Compteurs + part de l'impact portée par des lignes suspectes."""
+    impact = pd.to_numeric(df["Impact_kgCO2"], errors="coerce").fillna(0)
+    suspect = drapeaux["doublon"] | drapeaux["quasi_doublon"] | drapeaux["aberrant"]
+    total = impact.abs().sum()
+    return {
+        "nb_doublons": int(drapeaux["doublon"].sum()),
+        "nb_quasi_doublons": int(drapeaux["quasi_doublon"].sum()),
+        "nb_aberrants": int(drapeaux["aberrant"].sum()),
+        "part_suspecte": float(impact[suspect].abs().sum() / total) if total > 0 else 0.0,
+    }
@@ -0,0 +1,275 @@
+"""Rendu PDF du rapport officiel "BILAN CARBONE & FLUX" (côté serveur).
+
+Le PDF est écrit directement (PDF 1.4, polices standard Helvetica, flux
+compressés avec zlib) : aucune dépendance externe ni service distant.
+Le rendu est exécuté par l'ordonnanceur de tâches (``taches.py``) avec
+suivi de progression et cache par version des données, pour que
+l'interface ne soit jamais bloquée.
+"""
+import datetime
+import zlib
+
+# ==============================================================================
+# 1. PRIMITIVES PDF
+# ==============================================================================
+LARGEUR_A4, HAUTEUR_A4 = 595, 842
+MARGE = 50
+
+# Largeurs Helvetica (1/1000 em) pour les caractères ASCII 32..126
+_LARGEURS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+
+COULEURS_SCOPE = {"Scope 1": "#e74c3c", "Scope 2": "#f1c40f", "Scope 3": "#3498db"}
+PALETTE = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f"]
+
+
+def _rgb(couleur):
+    """'#rrggbb' -> 'r g b' (valeurs PDF entre 0 et 1)."""
+    c = couleur.lstrip("#")
+    return " ".join(f"{int(c[i:i + 2], 16) / 255:.3f}" for i in (0, 2, 4))
+
+
+def _texte_pdf(txt):
+    """Encode un texte en WinAnsi (les emojis sont ignorés) et l'échappe."""
+    brut = str(txt).encode("cp1252", errors="ignore")
+    return brut.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def largeur_texte(txt, taille, gras=False):
+    """Largeur approximative d'un texte en points (Helvetica)."""
+    total = 0
+    for ch in str(txt):
+        o = ord(ch)
+        total += _LARGEURS[o - 32] if 32 <= o <= 126 else 556
+    return total * taille / 1000 * (1.05 if gras else 1.0)
+
+
+def couper_lignes(txt, taille, largeur_max):
+    """Découpe un paragraphe en lignes qui tiennent dans la largeur donnée."""
+    lignes = []
+    for paragraphe in str(txt).split("\n"):
+        courante = ""
+        for mot in paragraphe.split(" "):
+            essai = f"{courante} {mot}".strip()
+            if courante and largeur_texte(essai, taille) > largeur_max:
+                lignes.append(courante)
+                courante = mot
+            else:
+                courante = essai
+        lignes.append(courante)
+    return lignes
+
+
+class DocumentPDF:
+    """Document PDF minimal : texte, rectangles, traits, pagination automatique."""
+
+    def __init__(self):
+        self.pages = []
+        self.nouvelle_page()
+
+    def nouvelle_page(self):
+        self.ops = []
+        self.pages.append(self.ops)
+        self.y = HAUTEUR_A4 - MARGE
+
+    def reserver(self, hauteur):
+        """Passe à la page suivante si la hauteur demandée ne tient plus."""
+        if self.y - hauteur < MARGE:
+            self.nouvelle_page()
+
+    def texte(self, x, y, txt, taille=10, gras=False, couleur="#000000"):
+        police = "F2" if gras else "F1"
+        self.ops.append(b"BT /%s %.1f Tf %s rg %.2f %.2f Td (" % (police.encode(), taille, _rgb(couleur).encode(), x, y)
+                        + _texte_pdf(txt) + b") Tj ET")
+
+    def texte_centre(self, y, txt, taille=10, gras=False, couleur="#000000"):
+        x = (LARGEUR_A4 - largeur_texte(txt, taille, gras)) / 2
+        self.texte(x, y, txt, taille, gras, couleur)
+
+    def rect(self, x, y, w, h, remplissage=None, trait=None):
+        if remplissage:
+            self.ops.append(b"%s rg %.2f %.2f %.2f %.2f re f" % (_rgb(remplissage).encode(), x, y, w, h))
+        if trait:
+            self.ops.append(b"%s RG 1 w %.2f %.2f %.2f %.2f re S" % (_rgb(trait).encode(), x, y, w, h))
+
+    def ligne(self, x1, y1, x2, y2, couleur="#000000", epaisseur=0.8):
+        self.ops.append(b"%s RG %.2f w %.2f %.2f m %.2f %.2f l S" % (_rgb(couleur).encode(), epaisseur, x1, y1, x2, y2))
+
+    def octets(self):
+        """Sérialise le document (catalogue, polices, pages, table xref)."""
+        objets = [None, None,
+                  b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+                  b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+        kids = []
+        for ops in self.pages:
+            contenu = zlib.compress(b"\n".join(ops))
+            objets.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(contenu) + contenu + b"\nendstream")
+            objets.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                          b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+                          % (LARGEUR_A4, HAUTEUR_A4, len(objets)))
+            kids.append(len(objets))
+        objets[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+        objets[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(b"%d 0 R" % k for k in kids), len(kids))
+
+        sortie = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        positions = []
+        for num, obj in enumerate(objets, start=1):
+            positions.append(len(sortie))
+            sortie += b"%d 0 obj\n" % num + obj + b"\nendobj\n"
+        debut_xref = len(sortie)
+        sortie += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objets) + 1)
+        for pos in positions:
+            sortie += b"%010d 00000 n \n" % pos
+        sortie += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objets) + 1, debut_xref)
+        return bytes(sortie)
+
+
+# ==============================================================================
+# 2. MISE EN PAGE DU RAPPORT
+# ==============================================================================
+def _titre_section(doc, txt):
+    doc.reserver(40)
+    doc.y -= 26
+    doc.texte(MARGE, doc.y, txt, 13, gras=True, couleur="#16a085")
+    doc.y -= 8
+
+
+def _tableau(doc, entetes, lignes, largeurs):
+    """Tableau simple avec en-tête grisé."""
+    hauteur = 18
+    doc.reserver(hauteur * (len(lignes) + 1) + 10)
+    x0 = MARGE
+    doc.y -= hauteur
+    doc.rect(x0, doc.y - 5, sum(largeurs), hauteur, remplissage="#ecf0f1")
+    x = x0
+    for entete, w in zip(entetes, largeurs):
+        doc.texte(x + 4, doc.y, entete, 9, gras=True)
+        x += w
+    for ligne in lignes:
+        doc.y -= hauteur
+        x = x0
+        for valeur, w in zip(ligne, largeurs):
+            doc.texte(x + 4, doc.y, valeur, 9)
+            x += w
+        doc.ligne(x0, doc.y - 5, x0 + sum(largeurs), doc.y - 5, couleur="#dddddd", epaisseur=0.5)
+
+
+def _histogramme(doc, titre, valeurs, couleurs, hauteur=150):
+    """Barres verticales (une par libellé) avec valeurs en tonnes."""
+    doc.reserver(hauteur + 50)
+    doc.y -= 18
+    doc.texte(MARGE, doc.y, titre, 10, gras=True, couleur="#34495e")
+    base = doc.y - hauteur - 10
+    maxi = max([v for _, v in valeurs] + [1e-9])
+    largeur_zone = LARGEUR_A4 - 2 * MARGE
+    pas = largeur_zone / max(len(valeurs), 1)
+    largeur_barre = min(60, pas * 0.6)
+    doc.ligne(MARGE, base, MARGE + largeur_zone, base, couleur="#7f8c8d")
+    for i, (libelle, v) in enumerate(valeurs):
+        h = (hauteur - 20) * (v / maxi)
+        x = MARGE + i * pas + (pas - largeur_barre) / 2
+        doc.rect(x, base, largeur_barre, h, remplissage=couleurs[i % len(couleurs)])
+        doc.texte(x, base + h + 4, f"{v:.2f} T", 8)
+        lib = libelle if largeur_texte(libelle, 8) < pas else libelle[:int(pas / 5)] + "."
+        doc.texte(x, base - 12, lib, 8)
+    doc.y = base - 20
+
+
+def rendre_rapport_pdf(rapport, auteur, version, commentaires, progression=None):
+    """Produit les octets PDF du rapport officiel (mêmes sections que la page 5).
+
+    ``rapport`` est le dictionnaire de ``calculs.construire_rapport``.
+    ``progression(fraction, message)`` est appelée au fil du rendu.
+    """
+    def etape(fraction, message):
+        if progression:
+            progression(fraction, message)
+
+    params, df, kpis = rapport["params"], rapport["df"], rapport["kpis"]
+    doc = DocumentPDF()
+
+    # --- EN-TÊTE ---
+    etape(0.05, "En-tête")
+    doc.rect(MARGE, doc.y - 90, LARGEUR_A4 - 2 * MARGE, 95, trait="#2c3e50")
+    doc.y -= 25
+    doc.texte_centre(doc.y, "BILAN CARBONE & FLUX", 22, gras=True, couleur="#2c3e50")
+    doc.y -= 24
+    doc.texte_centre(doc.y, params['entity_name'], 14, couleur="#7f8c8d")
+    doc.y -= 14
+    doc.ligne(MARGE + 10, doc.y, LARGEUR_A4 - MARGE - 10, doc.y, couleur="#bdc3c7")
+    doc.y -= 16
+    doc.texte(MARGE + 10, doc.y, f"Date : {datetime.date.today()} | Auteur : {auteur} | Ref : {version}", 9)
+    doc.y -= 20
+
+    # --- 1. SYNTHÈSE EXECUTIVE ---
+    etape(0.20, "Synthèse Executive")
+    tot_co2, tot_marge = kpis["total_co2_t"], kpis["total_marge_t"]
+    ratio_kg = tot_co2 * 1000 / kpis["pop_totale"]
+    _titre_section(doc, "1. Synthèse Executive")
+    cartes = [
+        ("Empreinte Totale", f"{tot_co2:.2f} T CO2e", f"± {tot_marge:.2f} T"),
+        ("Intensité Carbone", f"{ratio_kg:.0f} kg/pers", f"Cible: {params['budget_co2'] * 1000:.0f} kg"),
+        ("Coût Carbone", f"{tot_co2 * params['shadow_price']:,.0f} €", "Valorisation risque"),
+    ]
+    largeur_carte = (LARGEUR_A4 - 2 * MARGE - 20) / 3
+    doc.reserver(70)
+    for i, (titre, valeur, sous_titre) in enumerate(cartes):
+        x = MARGE + i * (largeur_carte + 10)
+        doc.rect(x, doc.y - 62, largeur_carte, 56, remplissage="#f8f9fa", trait="#e9ecef")
+        doc.texte(x + 8, doc.y - 20, titre, 9, couleur="#555555")
+        doc.texte(x + 8, doc.y - 38, valeur, 14, gras=True)
+        doc.texte(x + 8, doc.y - 53, sous_titre, 8, couleur="#7f8c8d")
+    doc.y -= 66
+
+    # --- 2. ANALYSE & CONCLUSIONS ---
+    etape(0.35, "Analyse & Conclusions")
+    _titre_section(doc, "2. Analyse & Conclusions")
+    for ligne in couper_lignes(f"Note de l'expert : {commentaires}", 10, LARGEUR_A4 - 2 * MARGE):
+        doc.reserver(14)
+        doc.y -= 14
+        doc.texte(MARGE, doc.y, ligne, 10)
+
+    # --- 3. SCOPES ---
+    etape(0.50, "Tableau des Scopes")
+    _titre_section(doc, "3. Détail des Émissions par Scope (ISO 14064)")
+    df_scope = rapport["df_scope"]
+    _tableau(doc, ["Scope", "Tonnes CO2e", "Part (%)"],
+             [[r["Scope"], f"{r['Tonnes CO2e']:.2f}", f"{r['Part (%)']:.1f}%"] for _, r in df_scope.iterrows()],
+             [165, 165, 165])
+
+    # --- 4. TOP 5 ---
+    etape(0.65, "Top 5 Pareto")
+    _titre_section(doc, "4. Top 5 des Postes d'Émission (Pareto)")
+    _tableau(doc, ["Catégorie", "Item", "Tonnes"],
+             [[r["Catégorie"], str(r["Item"])[:45], f"{r['Tonnes']:.2f}"] for _, r in rapport["df_top"].iterrows()],
+             [120, 285, 90])
+
+    # --- 5. GRAPHIQUES ---
+    etape(0.80, "Graphiques")
+    _titre_section(doc, "5. Graphiques")
+    par_scope = df_scope.set_index("Scope")["Tonnes CO2e"]
+    scopes = [s for s in ["Scope 1", "Scope 2", "Scope 3"] if s in par_scope.index]
+    _histogramme(doc, "Répartition par Scope (T CO2e)", [(s, float(par_scope[s])) for s in scopes],
+                 [COULEURS_SCOPE[s] for s in scopes])
+    par_cat = (df.groupby("Catégorie")["Impact_kgCO2"].sum() / 1000).sort_values(ascending=False).head(8)
+    _histogramme(doc, "Répartition par Grand Poste (T CO2e)", list(par_cat.items()), PALETTE)
+
+    # --- SIGNATURES ---
+    etape(0.95, "Signatures")
+    doc.reserver(80)
+    doc.y -= 50
+    doc.texte(MARGE, doc.y, "Visa Responsable RSE :", 10, gras=True)
+    doc.texte(LARGEUR_A4 / 2, doc.y, "Visa Direction :", 10, gras=True)
+    doc.y -= 30
+    doc.ligne(MARGE, doc.y, MARGE + 180, doc.y)
+    doc.ligne(LARGEUR_A4 / 2, doc.y, LARGEUR_A4 / 2 + 180, doc.y)
+
+    pdf = doc.octets()
+    etape(1.0, "Terminé")
+    return pdf
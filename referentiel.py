@@ -0,0 +1,114 @@
+"""Référentiels MSCAL sans dépendance lourde (chargés dès le démarrage).
+
+Paramètres par défaut, facteurs pays et format d'une ligne du journal.
+Ce module n'importe pas pandas : l'application peut l'utiliser avant
+d'avoir besoin des modules de calcul.
+"""
+import datetime
+import hashlib
+import json
+
+# ==============================================================================
+# PARAMÈTRES PAR DÉFAUT & RÉFÉRENTIELS
+# ==============================================================================
+DEFAULT_PARAMS = {
+    'entity_name': 'Promo MSCAL 2026',
+    'pop_etu': 20,
+    'pop_alt': 5,
+    'pop_prof': 2,
+    'jours_ouverture': 160,
+    'budget_co2': 3.5,
+    'country_choice': "France 🇫🇷",
+
+    # --- PÉRIMÈTRE & MÉTHODE ---
+    'annee_reporting': datetime.date.today().year,  # Année du bilan portée par chaque flux
+    'mode_elec': "annuel",  # "annuel" (fe_elec) ou "horaire" (profil pays 8760 h)
+
+    # --- FINANCE ---
+    'shadow_price': 100.0,
+
+    # --- ÉNERGIE & EAU ---
+    'fe_elec': 0.060,       # Mix France
+    'fe_gaz': 0.227,        # Gaz naturel
+    'fe_eau': 0.132,        # Eau potable (m3)
+    'fe_dechet': 0.200,     # Déchets moyens
+
+    # --- MOBILITÉ ---
+    'fe_voit': 0.190,       # Voiture thermique
+    'fe_voit_elec': 0.060,  # Voiture élec
+    'fe_covoit': 0.095,     # Covoiturage (voiture thermique, 2 occupants)
+    'fe_moto': 0.165,       # Moto / scooter thermique
+    'fe_metro': 0.004,      # Métro
+    'fe_avion_court': 0.258,
+    'fe_avion_long': 0.230,
+    'fe_tgv': 0.002,        # TGV
+    'fe_ter': 0.030,        # Train classique
+    'fe_bus': 0.100,        # Bus urbain
+    'fe_autocar': 0.030,    # Autocar
+
+    # --- VIE & ACHATS ---
+    'fe_boeuf': 7.0,        # Repas Bœuf
+    'fe_volaille': 1.6,     # Repas Poulet
+    'fe_vege': 0.5,         # Repas Végétarien
+    'fe_cafe': 5.0,         # Café (kg)
+
+    # --- NUMÉRIQUE (IT) ---
+    'fe_it_laptop': 156.0,  # PC Portable
+    'fe_it_desktop': 350.0, # PC Fixe
+    'fe_it_screen': 200.0,  # Écran 24"
+    'fe_it_smartphone': 60.0
+}
+
+# Base de données des Pays (fuseau : heure locale des profils horaires d'électricité)
+COUNTRY_DATA = {
+    "France 🇫🇷": {"val": 0.060, "info": "Mix Nucléaire (Bas carbone)", "fuseau": "Europe/Paris"},
+    "Allemagne 🇩🇪": {"val": 0.380, "info": "Mix Charbon/Renouvelable", "fuseau": "Europe/Berlin"},
+    "Europe (Moy) 🇪🇺": {"val": 0.255, "info": "Moyenne continentale", "fuseau": "Europe/Brussels"},
+    "USA 🇺🇸": {"val": 0.370, "info": "Mix Fossile prédominant", "fuseau": "America/Chicago"},
+    "Chine 🇨🇳": {"val": 0.550, "info": "Dominante Charbon", "fuseau": "Asia/Shanghai"}
+}
+
+SCOPES = ['Scope 1', 'Scope 2', 'Scope 3']
+
+
+def version_donnees(entries, params, *extra):
+    """Empreinte courte des données (journal + paramètres) pour les caches."""
+    h = hashlib.sha1()
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(json.dumps(list(entries), default=str).encode())
+    for e in extra:
+        h.update(json.dumps(e, sort_keys=True, default=str).encode())
+    return h.hexdigest()[:16]
+
+
+def reparer_params(params):
+    """Complète un jeu de paramètres avec les clés manquantes (auto-réparation)."""
+    params = dict(params or {})
+    for key, value in DEFAULT_PARAMS.items():
+        if key not in params:
+            params[key] = value
+    return params
+
+
+# ==============================================================================
+# SAISIE DES FLUX
+# ==============================================================================
+def creer_flux(cat, item, val, unit, fe, incertitude, detail, annee=None, date=None):
+    """Construit une ligne du journal des flux (format standardisé).
+
+    ``annee`` : année de reporting (par défaut l'année de saisie) ;
+    ``date`` : date du flux (par défaut la date de saisie).
+    """
+    impact = val * fe
+    marge = impact * (incertitude / 100.0)
+    return {
+        "Catégorie": cat,
+        "Item": item,
+        "Quantité": f"{val} {unit}",
+        "Impact_kgCO2": float(impact), # Nom standardisé
+        "Incertitude": int(incertitude),
+        "Marge": float(marge),
+        "Détail": detail,
+        "Date": str(date or datetime.date.today()),
+        "Année": int(annee or datetime.date.today().year),
+    }
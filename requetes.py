@@ -0,0 +1,274 @@
+"""Console de requêtes ad hoc sur le journal (administration).
+
+Regroupements, filtres et tableaux croisés sur les dimensions du journal
+(catégorie, scope, item, année, mois, jetons du détail, entité) pour les
+mesures impact, marge et nombre de flux, sans passer par des graphes figés.
+
+* Le journal est converti une fois par version des données en une
+  ``TableColonnes`` : chaque dimension est un tableau de codes entiers
+  (dictionnaire trié des valeurs), les mesures des tableaux ``float`` ; les
+  règles coûteuses (scope, découpage du détail) ne sont évaluées que sur
+  les valeurs distinctes.
+* Une requête est compilée en plan (codes retenus par filtre, dimensions
+  du regroupement) mis en cache dans la table ; l'exécution combine les
+  codes en une clé de groupe puis agrège par ``np.bincount``.
+* Les résultats sont gardés dans un cache LRU clé (version des données,
+  requête) : rejouer une requête après navigation est immédiat, toute
+  écriture dans le journal change la version.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from calculs import journal_en_dataframe, scopes_vectorises
+from historique import annees_flux
+
+DIMENSIONS = ["Catégorie", "Scope", "Item", "Année", "Mois", "Jeton du détail", "Entité"]
+MESURES = {  # libellé -> (colonne, facteur) ; colonne None = nombre de flux
+    "Impact (tCO2e)": ("impact", 0.001),
+    "Marge (tCO2e)": ("marge", 0.001),
+    "Nombre de flux": (None, 1),
+}
+SCOPES = np.array(["Scope 1", "Scope 2", "Scope 3"], dtype=object)
+SEPARATEUR_DETAIL = "|"
+SANS_VALEUR = "(vide)"
+LIGNES_MAX = 1000          # Lignes affichées d'un résultat (les plus gros groupes d'abord)
+TAILLE_CACHE = 64          # Résultats conservés
+TABLES_MAX = 4             # Tables en colonnes conservées (une par source / version)
+
+
+def _coder(valeurs):
+    """Valeurs -> (codes int32, dictionnaire trié en texte) ; les absents deviennent ``SANS_VALEUR``."""
+    codes, dictionnaire = pd.factorize(np.asarray(valeurs, dtype=object), sort=True)
+    dictionnaire = np.asarray(dictionnaire, dtype=object).astype(str)
+    if (codes < 0).any():
+        codes = np.where(codes < 0, len(dictionnaire), codes)
+        dictionnaire = np.append(dictionnaire, SANS_VALEUR)
+    return codes.astype(np.int32), dictionnaire
+
+
+def _combiner(*codes_tailles):
+    """Codes de plusieurs colonnes -> (codes des combinaisons distinctes, combinaisons en base mixte)."""
+    cle = np.zeros(len(codes_tailles[0][0]), dtype=np.int64)
+    for codes, taille in codes_tailles:
+        cle = cle * taille + codes
+    uniques, inverse = np.unique(cle, return_inverse=True)
+    colonnes = []
+    for _, taille in reversed(codes_tailles):
+        uniques, reste = np.divmod(uniques, taille)
+        colonnes.insert(0, reste)
+    return inverse.ravel(), colonnes
+
+
+class TableColonnes:
+    """Journal en colonnes codées, construit une fois par version des données."""
+
+    def __init__(self, df):
+        self.n = len(df)
+        vide = pd.Series(None, index=df.index, dtype=object)
+        self.mesures = {
+            "impact": pd.to_numeric(df["Impact_kgCO2"], errors="coerce").fillna(0).to_numpy(dtype=float),
+            "marge": pd.to_numeric(df.get("Marge", vide), errors="coerce").fillna(0).to_numpy(dtype=float),
+        }
+        self.codes, self.dictionnaires = {}, {}
+        for dim in ("Catégorie", "Item", "Entité", "Détail", "Date", "Année"):
+            self.codes[dim], self.dictionnaires[dim] = _coder(df[dim] if dim in df.columns else vide)
+        taille = {d: len(v) for d, v in self.dictionnaires.items()}
+
+        # Les règles (année de reporting, mois, scope) ne sont évaluées que sur les combinaisons distinctes
+        inverse, (annee, date) = _combiner((self.codes["Année"], taille["Année"]), (self.codes["Date"], taille["Date"]))
+        distinctes = pd.DataFrame({"Année": self.dictionnaires["Année"][annee], "Date": self.dictionnaires["Date"][date]})
+        for dim, valeurs in (("Année", annees_flux(distinctes)), ("Mois", distinctes["Date"].str[:7])):
+            codes, self.dictionnaires[dim] = _coder(valeurs.to_numpy())
+            self.codes[dim] = codes[inverse]
+
+        inverse, (cat, item, detail) = _combiner((self.codes["Catégorie"], taille["Catégorie"]), (self.codes["Item"], taille["Item"]),
+                                                 (self.codes["Détail"], taille["Détail"]))
+        scope = scopes_vectorises(pd.Series(self.dictionnaires["Catégorie"][cat]), pd.Series(self.dictionnaires["Item"][item]),
+                                  pd.Series(self.dictionnaires["Détail"][detail]))
+        self.codes["Scope"], self.dictionnaires["Scope"] = scope[inverse].astype(np.int32), SCOPES
+
+        self._jetons = None
+        self.plans = {}
+
+    def jetons(self):
+        """``(ligne, code du jeton)`` pour chaque jeton du détail de chaque flux (découpage à la demande)."""
+        if self._jetons is None:
+            # Découpage des détails distincts puis report sur les lignes (format CSR)
+            par_detail = [sorted({j.strip() for j in d.split(SEPARATEUR_DETAIL) if j.strip()}) or [SANS_VALEUR]
+                          for d in self.dictionnaires["Détail"]]
+            codes, dictionnaire = _coder(np.array([j for jetons in par_detail for j in jetons], dtype=object))
+            longueurs = np.array([len(jetons) for jetons in par_detail], dtype=np.int64)
+            debuts = np.concatenate([[0], np.cumsum(longueurs)[:-1]])
+            detail = self.codes["Détail"]
+            par_ligne = longueurs[detail]
+            lignes = np.repeat(np.arange(self.n), par_ligne)
+            rang = np.arange(len(lignes)) - np.repeat(np.cumsum(par_ligne) - par_ligne, par_ligne)
+            self._jetons = (lignes, codes[np.repeat(debuts[detail], par_ligne) + rang])
+            self.dictionnaires["Jeton du détail"] = dictionnaire
+        return self._jetons
+
+    def valeurs(self, dim):
+        if dim == "Jeton du détail":
+            self.jetons()
+        return list(self.dictionnaires[dim])
+
+
+def construire_table(sources):
+    """``[(entité, entries)]`` -> ``TableColonnes`` (colonne Entité ajoutée à chaque journal)."""
+    morceaux = []
+    for entite, entries in sources:
+        df = journal_en_dataframe(entries)
+        if not df.empty:
+            morceaux.append(df.assign(Entité=entite))
+    if not morceaux:
+        morceaux = [pd.DataFrame(columns=["Catégorie", "Item", "Impact_kgCO2", "Marge", "Détail", "Date", "Année", "Entité"])]
+    return TableColonnes(pd.concat(morceaux, ignore_index=True) if len(morceaux) > 1 else morceaux[0])
+
+
+# ==============================================================================
+# PLAN & EXÉCUTION
+# ==============================================================================
+def normaliser(requete):
+    """Requête canonique (dimensions ordonnées, filtres vides retirés) et son empreinte texte."""
+    propre = {
+        "lignes": [d for d in requete.get("lignes", []) if d in DIMENSIONS],
+        "colonne": requete.get("colonne") if requete.get("colonne") in DIMENSIONS else None,
+        "mesure": requete.get("mesure") if requete.get("mesure") in MESURES else next(iter(MESURES)),
+        "filtres": {d: sorted(map(str, v)) for d, v in sorted(requete.get("filtres", {}).items()) if d in DIMENSIONS and v},
+        "recherche": str(requete.get("recherche") or "").strip(),
+    }
+    if propre["colonne"] in propre["lignes"]:
+        propre["colonne"] = None
+    return propre, json.dumps(propre, ensure_ascii=False, sort_keys=True)
+
+
+def planifier(table, requete, empreinte):
+    """Compile une requête normalisée contre la table : codes retenus par filtre (mis en cache dans la table)."""
+    if empreinte not in table.plans:
+        filtres = {}
+        for dim, valeurs in requete["filtres"].items():
+            filtres[dim] = np.flatnonzero(np.isin(np.asarray(table.valeurs(dim), dtype=str), valeurs)).astype(np.int32)
+        recherche = None
+        if requete["recherche"]:
+            # Recherche plein texte évaluée sur les valeurs distinctes d'Item et de Détail
+            motif = requete["recherche"]
+            recherche = {dim: np.flatnonzero(pd.Series(table.dictionnaires[dim]).str.contains(motif, case=False, regex=False).to_numpy())
+                         for dim in ("Item", "Détail")}
+        groupes = requete["lignes"] + ([requete["colonne"]] if requete["colonne"] else [])
+        table.plans[empreinte] = {"filtres": filtres, "recherche": recherche, "groupes": groupes,
+                                  "eclate": "Jeton du détail" in groupes}
+    return table.plans[empreinte]
+
+
+def executer(table, requete, empreinte):
+    """Applique le plan : ``{"resultat": DataFrame, "flux": lignes retenues, "groupes": n, "tronque": bool}``."""
+    plan = planifier(table, requete, empreinte)
+    masque = np.ones(table.n, dtype=bool)
+    for dim, codes in plan["filtres"].items():
+        if dim == "Jeton du détail":
+            lignes, jetons = table.jetons()
+            retenues = np.zeros(table.n, dtype=bool)
+            retenues[lignes[np.isin(jetons, codes)]] = True
+            masque &= retenues
+        else:
+            masque &= np.isin(table.codes[dim], codes)
+    if plan["recherche"] is not None:
+        masque &= np.isin(table.codes["Item"], plan["recherche"]["Item"]) | np.isin(table.codes["Détail"], plan["recherche"]["Détail"])
+
+    # Lignes agrégées : un flux compte une fois par jeton si l'on regroupe par jeton du détail
+    if plan["eclate"]:
+        lignes, jetons = table.jetons()
+        garde = masque[lignes]
+        lignes, jetons = lignes[garde], jetons[garde]
+    else:
+        lignes, jetons = np.flatnonzero(masque), None
+
+    colonne, facteur = MESURES[requete["mesure"]]
+    poids = table.mesures[colonne][lignes] * facteur if colonne else None
+    dims = plan["groupes"]
+    if not dims:
+        valeur = float(poids.sum()) if colonne else len(lignes)
+        resultat = pd.DataFrame({requete["mesure"]: [valeur]}, index=pd.Index(["Total"], name=""))
+        return {"resultat": resultat, "flux": int(masque.sum()), "groupes": 1, "tronque": False}
+
+    # Clé de groupe : codes des dimensions combinés en un entier (base mixte)
+    tailles = [len(table.dictionnaires[d]) for d in dims]
+    if np.prod(np.array(tailles, dtype=float)) >= 2 ** 62:
+        raise ValueError("Trop de combinaisons de valeurs : retirez une dimension ou filtrez.")
+    inverse, combinaisons = _combiner(*[(jetons if d == "Jeton du détail" else table.codes[d][lignes], taille) for d, taille in zip(dims, tailles)])
+    groupes = len(combinaisons[0])
+    agregat = np.bincount(inverse, weights=poids, minlength=groupes) if colonne else np.bincount(inverse, minlength=groupes)
+    long = pd.DataFrame({d: table.dictionnaires[d][codes] for d, codes in zip(dims, combinaisons)})
+    long[requete["mesure"]] = agregat
+
+    if requete["colonne"]:
+        if requete["lignes"]:
+            resultat = long.pivot_table(index=requete["lignes"], columns=requete["colonne"], values=requete["mesure"], aggfunc="sum", fill_value=0)
+        else:
+            resultat = long.set_index(requete["colonne"])[[requete["mesure"]]].T
+        resultat.columns = resultat.columns.astype(str)
+        resultat["Total"] = resultat.sum(axis=1)
+        resultat = resultat.sort_values("Total", ascending=False)
+    else:
+        resultat = long.set_index(dims).sort_values(requete["mesure"], ascending=False)
+    groupes = len(resultat)
+    return {"resultat": resultat.head(LIGNES_MAX), "flux": int(masque.sum()), "groupes": groupes, "tronque": groupes > LIGNES_MAX}
+
+
+# ==============================================================================
+# CONSOLE (CACHE PARTAGÉ DU SERVEUR)
+# ==============================================================================
+class ConsoleRequetes:
+    """Tables en colonnes et résultats en cache LRU, partagés par les sessions admin du serveur."""
+
+    PARTAGE_SERVEUR = True     # Commun à toutes les sessions : hors budget mémoire de session
+
+    def __init__(self, taille_cache=TAILLE_CACHE, tables_max=TABLES_MAX):
+        self.tables = OrderedDict()     # version des données -> TableColonnes
+        self.resultats = OrderedDict()  # (version, empreinte) -> résultat
+        self.taille_cache, self.tables_max = taille_cache, tables_max
+        self.succes = self.echecs = 0
+        self._verrou = threading.Lock()
+
+    @staticmethod
+    def _lru(cache, cle, valeur, taille):
+        cache[cle] = valeur
+        cache.move_to_end(cle)
+        while len(cache) > taille:
+            cache.popitem(last=False)
+
+    def table(self, version, charger):
+        """Table en colonnes de ``version`` ; ``charger()`` -> ``[(entité, entries)]`` n'est appelé qu'en cas d'absence."""
+        with self._verrou:
+            if version in self.tables:
+                self.tables.move_to_end(version)
+                return self.tables[version]
+        table = construire_table(charger())
+        with self._verrou:
+            self._lru(self.tables, version, table, self.tables_max)
+        return table
+
+    def interroger(self, version, charger, requete):
+        """Résultat de ``requete`` sur les données ``version`` : ``(résultat, depuis le cache, durée ms)``."""
+        debut = time.perf_counter()
+        requete, empreinte = normaliser(requete)
+        cle = (version, empreinte)
+        with self._verrou:
+            if cle in self.resultats:
+                self.resultats.move_to_end(cle)
+                self.succes += 1
+                return self.resultats[cle], True, (time.perf_counter() - debut) * 1000
+        resultat = executer(self.table(version, charger), requete, empreinte)
+        with self._verrou:
+            self.echecs += 1
+            self._lru(self.resultats, cle, resultat, self.taille_cache)
+        return resultat, False, (time.perf_counter() - debut) * 1000
+
+    def etat(self):
+        with self._verrou:
+            return {"tables": len(self.tables), "resultats": len(self.resultats), "succes": self.succes, "echecs": self.echecs}
@@ -0,0 +1,99 @@
+"""Bibliothèque de scénarios du simulateur (page 4).
+
+Un scénario est un jeu nommé de positions de leviers, enregistré dans
+``params['scenarios']`` : il suit donc la sauvegarde JSON et le journal
+d'audit. La comparaison évalue tous les scénarios demandés en un seul
+passage vectorisé de ``simuler_scenario`` ; les résultats restent en
+cache tant que la baseline (population et facteurs compris) ne change pas.
+"""
+import numpy as np
+import pandas as pd
+
+from calculs import LEVIERS_DEFAUT, simuler_scenario
+from referentiel import version_donnees
+
+SCENARIO_COURANT = "✏️ Réglage courant"
+POSTES_GAINS = {"gain_total_mob": "Mobilité", "gain_total_ener": "Énergie", "gain_total_res": "Ressources"}
+
+
+def normaliser(leviers):
+    """Positions complètes (leviers inconnus ignorés, manquants à leur valeur neutre)."""
+    lv = dict(LEVIERS_DEFAUT)
+    lv.update({k: v for k, v in (leviers or {}).items() if k in LEVIERS_DEFAUT})
+    return lv
+
+
+def enregistrer(params, nom, leviers):
+    """Ajoute / remplace un scénario (nouveau dict : le changement est vu par le journal d'audit)."""
+    params['scenarios'] = {**params.get('scenarios', {}), nom: normaliser(leviers)}
+
+
+def supprimer(params, nom):
+    params['scenarios'] = {k: v for k, v in params.get('scenarios', {}).items() if k != nom}
+
+
+def version_baseline(base, params):
+    """Empreinte de ce qui détermine les résultats hors leviers (baseline, population, facteurs de report)."""
+    facteurs = ('pop_etu', 'pop_alt', 'pop_prof', 'fe_avion_long', 'fe_tgv', 'fe_vege', 'fe_boeuf', 'fe_volaille')
+    return version_donnees([], {k: params[k] for k in facteurs}, base["version"])
+
+
+def evaluer_lot(base, scenarios, params):
+    """{nom: leviers} -> DataFrame (une ligne par scénario), en un seul appel vectorisé."""
+    noms = list(scenarios)
+    positions = [normaliser(scenarios[n]) for n in noms]
+    lots = {k: np.array([p[k] for p in positions], dtype=float) for k in LEVIERS_DEFAUT}
+    res = simuler_scenario(base, lots, params)
+    return pd.DataFrame({k: np.broadcast_to(np.asarray(v, dtype=float), len(noms)) for k, v in res.items()}, index=noms)
+
+
+class CacheScenarios:
+    """Résultats par (nom, positions) ; vidé dès que la version de la baseline change."""
+
+    TAILLE_MAX = 256  # Le réglage courant ajoute une entrée à chaque mouvement de levier
+
+    def __init__(self):
+        self.version = None
+        self.lignes = {}
+
+    def comparer(self, base, scenarios, params):
+        version = version_baseline(base, params)
+        if version != self.version or len(self.lignes) > self.TAILLE_MAX:
+            self.version, self.lignes = version, {}
+        cles = {n: (n, tuple(sorted(normaliser(lv).items()))) for n, lv in scenarios.items()}
+        manquants = {n: scenarios[n] for n, c in cles.items() if c not in self.lignes}
+        if manquants:
+            for nom, ligne in evaluer_lot(base, manquants, params).iterrows():
+                self.lignes[cles[nom]] = ligne
+        return pd.DataFrame([self.lignes[cles[n]] for n in scenarios], index=list(scenarios))
+
+
+def cascade(res, libelle_base):
+    """Étapes du waterfall (Base -> Pop -> gains -> Arrivée) avec début/fin de chaque barre, en tonnes."""
+    df = pd.DataFrame([
+        {"Etape": f"1. Base {libelle_base}", "Val": res["total_ref"] / 1000, "Type": "Base", "Order": 1},
+        {"Etape": "2. Effet Pop.", "Val": res["delta_pop"] / 1000, "Type": "Hausse", "Order": 2},
+        {"Etape": "3. Gain Mobilité", "Val": -res["gain_total_mob"] / 1000, "Type": "Baisse", "Order": 3},
+        {"Etape": "4. Gain Énergie", "Val": -res["gain_total_ener"] / 1000, "Type": "Baisse", "Order": 4},
+        {"Etape": "5. Gain Ressources", "Val": -res["gain_total_res"] / 1000, "Type": "Baisse", "Order": 5},
+        {"Etape": "6. Arrivée 2030", "Val": res["total_final"] / 1000, "Type": "Final", "Order": 6},
+    ])
+    df["prev"] = df["Val"].cumsum().shift(1).fillna(0)
+    df["start"] = df["prev"]
+    df["end"] = df["prev"] + df["Val"]
+    bornes = df["Type"].isin(["Base", "Final"])
+    df.loc[bornes, "start"] = 0
+    df.loc[bornes, "end"] = df.loc[bornes, "Val"]
+    return df
+
+
+def cascades(resultats, libelle_base):
+    """Waterfalls de plusieurs scénarios empilés (colonne ``Scénario``) pour un graphe à facettes."""
+    return pd.concat([cascade(ligne, libelle_base).assign(Scénario=nom) for nom, ligne in resultats.iterrows()], ignore_index=True)
+
+
+def differences(scenarios, reference):
+    """Leviers qui diffèrent de ``reference`` pour chaque scénario (texte court)."""
+    ref = normaliser(scenarios[reference])
+    return {n: ", ".join(f"{k.removeprefix('sim_')}: {ref[k]} → {v}" for k, v in normaliser(lv).items() if v != ref[k]) or "identique"
+            for n, lv in scenarios.items()}
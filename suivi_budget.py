@@ -0,0 +1,131 @@
+"""Suivi en cours d'année du budget carbone (``budget_co2``, tCO2e / pers).
+
+Le journal est réduit en un tableau ``années × 12 mois`` (kgCO2e) d'après
+la période d'activité des flux qui en ont une (relevés de compteurs,
+``Compteur ... | AAAA-MM``) ; seuls les flux ajoutés en fin de journal
+depuis le dernier passage sont cumulés (recalcul complet après une
+correction, une suppression ou une restauration). Les autres flux
+(inventaire, formulaires, imports) sont des totaux annuels déjà acquis,
+quelle que soit leur date de saisie : ils entrent dans le cumul mais pas
+dans le rythme.
+
+La projection de fin d'année combine le rythme récent (fenêtre glissante
+de ``FENETRE`` mois, désaisonnalisée) et le profil saisonnier de l'année
+précédente (plat à défaut) ; on en déduit le dépassement par personne et
+la date d'épuisement du budget.
+"""
+import calendar
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from calculs import journal_en_dataframe, population_totale
+from historique import annees_flux
+from ingestion_compteurs import MOTIF_ETIQUETTE as MOTIF_PERIODE
+
+FENETRE = 3            # Mois glissants du rythme
+MOIS_MIN_PROFIL = 6    # Mois renseignés l'année précédente pour en tirer un profil saisonnier
+
+
+class SuiviBudget:
+    """Émissions mensuelles par année de reporting, tenues à jour au fil des ajouts (une par session)."""
+
+    def __init__(self):
+        self.mensuel = {}      # année -> np.array(12) kgCO2e des flux à période d'activité dans l'année
+        self.acquis = {}       # année -> kgCO2e des autres flux (totaux annuels)
+        self.cle = None
+
+    def _cumuler(self, df):
+        if df.empty:
+            return
+        annee = annees_flux(df).to_numpy()
+        details = df["Détail"] if "Détail" in df else pd.Series("", index=df.index)
+        periodes = pd.to_datetime(details.astype(str).str.extract(MOTIF_PERIODE)[1], errors="coerce", format="%Y-%m")
+        impact = pd.to_numeric(df["Impact_kgCO2"], errors="coerce").fillna(0).to_numpy(dtype=float)
+        dans_annee = (periodes.dt.year.to_numpy() == annee)
+        mois = np.where(dans_annee, periodes.dt.month.fillna(1).to_numpy(dtype=int) - 1, 0)
+        for a in np.unique(annee):
+            ligne = annee == a
+            mensuel = self.mensuel.setdefault(int(a), np.zeros(12))
+            mensuel += np.bincount(mois[ligne & dans_annee], weights=impact[ligne & dans_annee], minlength=12)
+            self.acquis[int(a)] = self.acquis.get(int(a), 0.0) + float(impact[ligne & ~dans_annee].sum())
+
+    def actualiser(self, entries):
+        """Cumule les seuls ajouts en fin de journal depuis le dernier passage (sinon recalcul complet)."""
+        revision, n = getattr(entries, "revision", None), len(entries)
+        if self.cle is not None and revision is not None and self.cle[0] == id(entries):
+            # Chaque écriture incrémente la révision : autant de révisions que de lignes en plus = ajouts seuls
+            ajouts = n - self.cle[2]
+            if ajouts == revision - self.cle[1] and ajouts >= 0:
+                if ajouts:
+                    self._cumuler(pd.DataFrame([entries[i] for i in range(self.cle[2], n)]))
+                self.cle = (id(entries), revision, n)
+                return
+        self.mensuel, self.acquis = {}, {}
+        self._cumuler(journal_en_dataframe(entries))
+        self.cle = (id(entries), revision, n)
+
+    def profil(self, annee):
+        """Part de chaque mois dans l'année : profil de l'année précédente s'il est assez renseigné, sinon plat."""
+        precedent = self.mensuel.get(annee - 1)
+        if precedent is not None and (precedent > 0).sum() >= MOIS_MIN_PROFIL:
+            return precedent / precedent.sum(), f"saisonnalité {annee - 1}"
+        return np.full(12, 1 / 12), "profil plat"
+
+
+def projeter(suivi, annee, params, aujourd_hui=None):
+    """Projection de fin d'année et consommation du budget.
+
+    Renvoie ``{"realise_t", "projection_t", "par_pers", "depassement", "part_consommee",
+    "date_epuisement", "profil", "serie"}`` ; ``serie`` est un DataFrame
+    mensuel (index de dates) : réalisé, projeté, glissant, cumul et budget.
+    """
+    aujourd_hui = aujourd_hui or datetime.date.today()
+    reel = suivi.mensuel.get(annee, np.zeros(12))
+    acquis = suivi.acquis.get(annee, 0.0)
+    profil, source = suivi.profil(annee)
+
+    # Part écoulée de chaque mois (1 = mois révolu, fraction pour le mois en cours)
+    if aujourd_hui.year > annee:
+        position = 12.0
+    elif aujourd_hui.year < annee:
+        position = 0.0
+    else:
+        position = aujourd_hui.month - 1 + aujourd_hui.day / calendar.monthrange(annee, aujourd_hui.month)[1]
+    couverture = np.clip(position - np.arange(12), 0.0, 1.0)
+
+    # Rythme annualisé sur la fenêtre glissante, corrigé de la saisonnalité
+    fenetre = (couverture > 0) & (np.arange(12) > np.ceil(position) - 1 - FENETRE)
+    poids = (profil * couverture)[fenetre].sum()
+    rythme = reel[fenetre].sum() / poids if poids > 0 else 0.0
+    mensuel = reel + rythme * profil * (1 - couverture)
+    cumul = acquis + np.cumsum(mensuel)
+
+    pop = population_totale(params)
+    budget = float(params['budget_co2']) * 1000 * pop
+    projection = float(cumul[-1])
+    date_epuisement = None
+    if budget > 0 and projection >= budget:
+        m = int(np.searchsorted(cumul, budget))
+        avant = cumul[m - 1] if m else acquis
+        fraction = (budget - avant) / mensuel[m] if mensuel[m] > 0 else 0.0
+        jours = calendar.monthrange(annee, m + 1)[1]
+        date_epuisement = datetime.date(annee, m + 1, 1) + datetime.timedelta(days=int(max(fraction, 0.0) * (jours - 1)))
+
+    index = pd.date_range(f"{annee}-01-01", periods=12, freq="MS")
+    serie = pd.DataFrame({"Réalisé": reel / 1000, "Projeté": rythme * profil * (1 - couverture) / 1000}, index=index)
+    serie["Glissant 3 mois"] = (serie["Réalisé"] + serie["Projeté"]).rolling(FENETRE, min_periods=1).sum()
+    serie["Cumul"] = cumul / 1000
+    serie["Budget"] = budget / 1000
+    realise = acquis + float((reel * (couverture > 0)).sum())
+    return {
+        "realise_t": realise / 1000,
+        "projection_t": projection / 1000,
+        "par_pers": projection / 1000 / pop,
+        "depassement": projection / 1000 / pop - float(params['budget_co2']),
+        "part_consommee": realise / budget if budget > 0 else 0.0,
+        "date_epuisement": date_epuisement,
+        "profil": source,
+        "serie": serie,
+    }
@@ -0,0 +1,147 @@
+"""Ordonnanceur de tâches lourdes en arrière-plan (exports, rendus, analyses).
+
+Une tâche est identifiée par ``(genre, version des données, paramètres)`` :
+soumettre deux fois le même travail renvoie la même tâche (déduplication),
+en cours ou déjà terminée (cache). Les fonctions exécutées reçoivent un
+argument ``progression(fraction, message)`` ; l'appeler après une demande
+d'annulation lève ``TacheAnnulee`` dans le worker (annulation coopérative).
+Les résultats expirent après ``DUREE_VIE_S`` et le cache est borné (LRU).
+
+Le script Streamlit ne fait que soumettre puis interroger l'état : les
+calculs ne bloquent jamais la navigation.
+"""
+import concurrent.futures as cf
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+WORKERS = 2
+TAILLE_CACHE = 64
+DUREE_VIE_S = 30 * 60
+
+
+class TacheAnnulee(Exception):
+    """Levée dans le worker quand l'utilisateur a annulé la tâche."""
+
+
+def empreinte(params):
+    return hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:12]
+
+
+class Tache:
+    """Suivi d'une tâche : progression, état, résultat ou erreur."""
+
+    def __init__(self, cle, libelle):
+        self.cle = cle
+        self.libelle = libelle
+        self.progression = 0.0
+        self.message = "En attente"
+        self.futur = None
+        self.soumise = time.time()
+        self.fin = None
+        self._annulation = threading.Event()
+
+    def maj(self, fraction, message):
+        if self._annulation.is_set():
+            raise TacheAnnulee(self.libelle)
+        self.progression, self.message = min(max(float(fraction), 0.0), 1.0), message
+
+    def annuler(self):
+        self._annulation.set()
+        if self.futur is not None and self.futur.cancel():
+            self.fin = time.time()
+
+    @property
+    def annulee(self):
+        return self._annulation.is_set()
+
+    @property
+    def termine(self):
+        return self.futur is not None and self.futur.done()
+
+    @property
+    def erreur(self):
+        if not self.termine or self.futur.cancelled():
+            return None
+        return self.futur.exception()
+
+    @property
+    def resultat(self):
+        return self.futur.result() if self.termine and not self.annulee and not self.erreur else None
+
+    @property
+    def etat(self):
+        if self.annulee:
+            return "annulée"
+        if not self.termine:
+            return "en cours" if self.progression > 0 or self.message != "En attente" else "en attente"
+        return "erreur" if self.erreur else "terminée"
+
+    def attendre(self, delai):
+        """Attend au plus ``delai`` secondes (les petites tâches s'affichent sans aller-retour)."""
+        if self.futur is not None:
+            cf.wait([self.futur], timeout=delai)
+        return self.termine
+
+    def expiree(self, duree_vie):
+        return self.fin is not None and time.time() - self.fin > duree_vie
+
+
+class Ordonnanceur:
+    """Pool de threads partagé par les sessions + cache LRU des tâches par clé."""
+
+    PARTAGE_SERVEUR = True     # Commun à toutes les sessions : hors budget mémoire de session
+
+    def __init__(self, workers=WORKERS, taille_cache=TAILLE_CACHE, duree_vie=DUREE_VIE_S):
+        self.pool = cf.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="tache")
+        self.taches = OrderedDict()
+        self.taille_cache = taille_cache
+        self.duree_vie = duree_vie
+        self.verrou = threading.Lock()
+
+    def _executer(self, tache, fonction, args, kwargs):
+        tache.maj(0.0, "Démarrage")
+        try:
+            return fonction(*args, progression=tache.maj, **kwargs)
+        finally:
+            tache.fin = time.time()
+
+    def _purger(self):
+        for cle in [c for c, t in self.taches.items() if t.expiree(self.duree_vie)]:
+            del self.taches[cle]
+        # Éviction LRU des tâches terminées (les tâches en cours ne sont jamais évincées)
+        terminees = [c for c, t in self.taches.items() if t.termine]
+        while len(self.taches) > self.taille_cache and terminees:
+            del self.taches[terminees.pop(0)]
+
+    def soumettre(self, genre, version, fonction, *args, params=None, libelle=None, **kwargs):
+        """Lance ``fonction(*args, progression=..., **kwargs)`` ou réutilise la tâche de même clé."""
+        cle = (genre, version, empreinte(params))
+        with self.verrou:
+            self._purger()
+            tache = self.taches.get(cle)
+            if tache is not None and not tache.erreur and not tache.annulee:
+                self.taches.move_to_end(cle)
+                return tache
+            tache = Tache(cle, libelle or genre)
+            tache.futur = self.pool.submit(self._executer, tache, fonction, args, kwargs)
+            self.taches[cle] = tache
+            return tache
+
+    def obtenir(self, genre, version, params=None):
+        with self.verrou:
+            tache = self.taches.get((genre, version, empreinte(params)))
+            if tache is not None and tache.expiree(self.duree_vie):
+                del self.taches[tache.cle]
+                return None
+            return tache
+
+    def etat(self):
+        """Instantané des tâches (page Performance)."""
+        with self.verrou:
+            self._purger()
+            return [{"Tâche": t.libelle, "Version": t.cle[1], "État": t.etat, "Progression": t.progression,
+                     "Message": t.message, "Durée (s)": round((t.fin or time.time()) - t.soumise, 2)}
+                    for t in reversed(self.taches.values())]
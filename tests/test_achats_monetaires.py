@@ -0,0 +1,23 @@
+"""Tests de la lecture du grand livre comptable (achats_monetaires.py)."""
+import pandas as pd
+
+from achats_monetaires import lire_grand_livre
+
+
+def test_grand_livre_dates_mixtes():
+    df = pd.DataFrame({"Compte": [6061, 6063, 6251, 6251], "Libellé": ["Électricité", "Fournitures", "Voyages", "Voyages"],
+                       "Montant": ["1 000,50 €", "20", "30", "40"],
+                       "Date": ["15/01/2024", "2023-12-31", "31/12/2022", None]})
+    gl = lire_grand_livre(df, 2025)
+    # Chaque format garde son année ; date absente -> année par défaut
+    assert gl["annee"].tolist() == [2024, 2023, 2022, 2025]
+    assert gl["montant"].tolist() == [1000.5, 20.0, 30.0, 40.0]
+    assert gl["compte"].tolist() == ["6061", "6063", "6251", "6251"]
+
+
+def test_grand_livre_debit_credit_dates_excel():
+    df = pd.DataFrame({"Libellé": ["Achat", "Avoir"], "Débit": [100, 0], "Crédit": [0, 25],
+                       "Date écriture": pd.to_datetime(["2024-06-30", "2024-07-01"])})
+    gl = lire_grand_livre(df, 2025)
+    assert gl["montant"].tolist() == [100.0, -25.0]
+    assert gl["annee"].tolist() == [2024, 2024]
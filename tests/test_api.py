@@ -0,0 +1,85 @@
+"""Tests de l'API locale (api.py) : client en mémoire sur le routeur, sans socket."""
+import asyncio
+import json
+
+import pytest
+
+from api import ErreurAPI, EtatAPI, Requete, json_strict, router
+
+FLUX = [{"cat": "Énergie", "item": "Gaz", "val": 1000, "unit": "kWh", "fe": 0.227, "incertitude": 10},
+        {"cat": "Mobilité", "item": "Train", "val": 500, "unit": "km", "fe": 0.03},
+        {"cat": "Alimentation", "item": "Repas", "val": 100, "unit": "repas", "fe": 2.0}]
+
+
+@pytest.fixture
+def client():
+    etat = EtatAPI()
+
+    def appeler(methode, cible, corps=None):
+        async def envoyer():
+            requete = Requete(methode, cible, {}, json.dumps(corps).encode() if corps is not None else b"")
+            try:
+                statut, contenu = await router(etat, requete)
+            except ErreurAPI as e:
+                return e.statut, {"erreur": str(e)}
+            if hasattr(contenu, "__aiter__"):
+                contenu = [json.loads(l) for bloc in [b async for b in contenu] for l in bloc.splitlines()]
+            return statut, json.loads(json_strict(contenu))
+        return asyncio.run(envoyer())
+    appeler.etat = etat
+    return appeler
+
+
+def test_ingestion_et_calculs(client):
+    assert client("POST", "/entites/Labo/flux", {"flux": FLUX})[0] == 201
+    statut, pareto = client("GET", "/entites/Labo/pareto?n=2")
+    assert statut == 200 and [l["Item"] for l in pareto] == ["Gaz", "Repas"]
+    statut, journal = client("GET", "/entites/Labo/journal")
+    assert statut == 200 and len(journal) == 3
+    assert client("GET", "/entites/Inconnue/kpis")[0] == 404
+    assert client("DELETE", "/entites/Labo/kpis")[0] == 405
+
+
+def test_flux_invalide_tout_ou_rien(client):
+    statut, _ = client("POST", "/entites/Labo/flux", {"flux": FLUX + [{"cat": "X", "item": "Y", "val": "abc", "fe": 1}]})
+    assert statut == 400
+    assert "Labo" not in client.etat.entites
+
+
+def test_params_valides_et_convertis(client):
+    statut, corps = client("PUT", "/entites/Labo/params", {"pop_etu": 30.0, "fe_gaz": 1, "mode_elec": "horaire"})
+    assert statut == 200
+    params = client.etat.entites["Labo"].params
+    assert params["pop_etu"] == 30 and isinstance(params["pop_etu"], int)
+    assert isinstance(params["fe_gaz"], float) and params["mode_elec"] == "horaire"
+    assert corps["revision"] == 1
+
+
+@pytest.mark.parametrize("corps", [
+    {"pop_etu": "abc"}, {"pop_etu": 2.5}, {"pop_etu": True}, {"fe_gaz": -1}, {"fe_gaz": None},
+    {"country_choice": "Atlantide"}, {"mode_elec": "mensuel"}, {"inconnu": 1}, [1, 2],
+])
+def test_params_invalides_refuses(client, corps):
+    client("POST", "/entites/Labo/flux", {"flux": FLUX})
+    statut, reponse = client("PUT", "/entites/Labo/params", corps)
+    assert statut == 400, reponse
+    # Rien n'est écrit : les calculs suivants fonctionnent toujours
+    assert client.etat.entites["Labo"].revision == 1
+    assert client("GET", "/entites/Labo/kpis")[0] == 200
+
+
+def test_pareto_n_invalide(client):
+    client("POST", "/entites/Labo/flux", {"flux": FLUX})
+    assert client("GET", "/entites/Labo/pareto?n=-1")[0] == 400
+    assert client("GET", "/entites/Labo/pareto?n=abc")[0] == 400
+
+
+def test_scenarios_et_grille(client):
+    client("POST", "/entites/Labo/flux", {"flux": FLUX})
+    statut, corps = client("POST", "/entites/Labo/scenarios", {"grille": {"sim_mob_reduce": [0, 50], "sim_led": [False, True]}})
+    assert statut == 200 and len(corps["resultats"]) == 4
+    totaux = [r["total_final"] for r in corps["resultats"]]
+    assert totaux[2] < totaux[0]  # Moins de trajets : moins d'émissions
+    assert client("POST", "/entites/Labo/scenarios", {"scenarios": [{"levier_inconnu": 1}]})[0] == 400
+    assert client("POST", "/entites/Labo/scenarios", {"scenarios": [{"sim_led": 1}]})[0] == 400
+    assert client("POST", "/entites/Labo/scenarios", {"scenarios": [{"sim_waste": "beaucoup"}]})[0] == 400
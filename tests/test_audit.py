@@ -0,0 +1,84 @@
+"""Tests du journal d'audit append-only : annuler / rétablir et reconstruction (audit.py)."""
+import pytest
+
+from audit import JournalAudit
+from memoire import JournalCompact
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+A, B, C = (creer_flux("Bâtiment", nom, 1, "u", 1.0, 10, "d") for nom in ("A", "B", "C"))
+
+
+@pytest.fixture
+def session(tmp_path):
+    params, entries = dict(DEFAULT_PARAMS), JournalCompact()
+    return JournalAudit("test", params, entries, dossier=tmp_path, intervalle=3), params, entries
+
+
+def _items(entries):
+    return [e["Item"] for e in entries]
+
+
+def test_annuler_retablir(session):
+    audit, params, entries = session
+    audit.ajout(entries, params, A)
+    audit.ajout(entries, params, B)
+    audit.correction(entries, params, 0, dict(A, Item="A2"))
+    audit.suppression(entries, params, [1])
+    assert _items(entries) == ["A2"]
+    audit.annuler(entries, params)
+    assert _items(entries) == ["A2", "B"]
+    audit.annuler(entries, params)
+    assert _items(entries) == ["A", "B"]
+    audit.retablir(entries, params)
+    assert _items(entries) == ["A2", "B"]
+    # Une nouvelle opération abandonne la branche annulée
+    audit.ajout(entries, params, C)
+    assert not audit.peut_retablir
+    assert _items(entries) == ["A2", "B", "C"]
+
+
+def test_parametres_et_restauration(session):
+    audit, params, entries = session
+    audit.ajout(entries, params, A)
+    params["fe_gaz"] = 0.5
+    assert audit.suivre_params(entries, params)
+    audit.restauration(entries, params, params, [], "Effacement")
+    assert len(entries) == 0
+    audit.annuler(entries, params)
+    assert _items(entries) == ["A"] and params["fe_gaz"] == 0.5
+    audit.annuler(entries, params)
+    assert params["fe_gaz"] == DEFAULT_PARAMS["fe_gaz"]
+
+
+def test_etat_a_rejoue_depuis_l_instantane(session):
+    audit, params, entries = session
+    etats = {}
+    for i in range(8):   # Plusieurs instantanés (intervalle 3)
+        audit.ajout(entries, params, dict(A, Item=f"A{i}"))
+        etats[audit.tete] = _items(entries)
+    audit.annuler(entries, params)
+    for noeud, items in etats.items():
+        assert _items(audit.etat_a(noeud)["db"]) == items
+    assert audit.etat_a(0)["db"] == []
+
+
+def test_reprise_apres_redemarrage(session, tmp_path):
+    audit, params, entries = session
+    audit.ajout(entries, params, A)
+    audit.ajout(entries, params, B)
+    audit.annuler(entries, params)
+    repris = JournalAudit("test", params, entries, dossier=tmp_path, intervalle=3)
+    assert len(repris) == len(audit) and repris.tete == audit.tete
+    assert [h["op"] for h in repris.historique()] == ["Ajout", "Ouverture"]
+
+
+def test_observateur_recoit_les_effets(session):
+    audit, params, entries = session
+    effets = []
+    audit.observateur = lambda effet, *args: effets.append(effet)
+    audit.ajout(entries, params, A)
+    audit.correction(entries, params, 0, B)
+    audit.annuler(entries, params)
+    audit.suppression(entries, params, [0])
+    audit.restauration(entries, params, params, [C])
+    assert effets == ["ajout", "correction", "correction", "suppression", "remplacement"]
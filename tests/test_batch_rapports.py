@@ -0,0 +1,48 @@
+"""Tests de la génération par lots des rapports (batch_rapports.py)."""
+import json
+
+import pandas as pd
+
+from batch_rapports import main, nom_fichier_sur
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+JOURNAL = [
+    creer_flux("Bâtiment", "Chauffage (Gaz)", 11_000, "kWh", 0.227, 10, "100 m²"),
+    creer_flux("Mobilité", "Trajet Quotidien (Initiale)", 20_000, "km.pax", 0.190, 10, "Voiture Thermique | 160j/an"),
+    creer_flux("Vie de Campus", "Repas Bœuf", 500, "repas", 7.0, 20, "Cantine"),
+]
+
+
+def _sauvegarde(dossier, nom, entite, db):
+    with open(dossier / nom, "w", encoding="utf-8") as f:
+        json.dump({"params": dict(DEFAULT_PARAMS, entity_name=entite), "db": db}, f)
+
+
+def test_nom_fichier_sur():
+    assert nom_fichier_sur("Promo MSCAL / 2026 ?") == "Promo_MSCAL_2026"
+    assert nom_fichier_sur("???") == "Entite"
+
+
+def test_lot_de_sauvegardes(tmp_path, capsys):
+    entree, sortie = tmp_path / "sauvegardes", tmp_path / "rapports"
+    entree.mkdir()
+    _sauvegarde(entree, "mscal_bkp_a.json", "Labo Été", JOURNAL)
+    _sauvegarde(entree, "mscal_bkp_b.json", "Vide", [])
+    (entree / "mscal_bkp_c.json").write_text("{pas du json", encoding="utf-8")
+
+    assert main([str(entree), "-o", str(sortie), "-j", "2"]) == 2   # Des erreurs, mais le lot va au bout
+    assert "1 rapport(s) générés, 2 erreur(s)" in capsys.readouterr().out
+    assert (sortie / "Bilan_Carbone_Labo_Été_mscal_bkp_a.xlsx").exists()
+
+    synthese = pd.read_excel(sortie / "Synthese_Consolidee.xlsx").set_index("Fichier")
+    ligne = synthese.loc["mscal_bkp_a.json"]
+    attendu_t = sum(f["Impact_kgCO2"] for f in JOURNAL) / 1000
+    assert ligne["Entité"] == "Labo Été" and ligne["Nb Flux"] == 3
+    assert abs(ligne["Empreinte (T CO2e)"] - attendu_t) < 1e-6
+    assert abs(ligne[["Scope 1 (T)", "Scope 2 (T)", "Scope 3 (T)"]].sum() - attendu_t) < 1e-6
+    assert synthese.loc["mscal_bkp_b.json", "Erreur"] == "Aucun flux dans la sauvegarde"
+    assert synthese.loc["mscal_bkp_c.json", "Erreur"].startswith("JSONDecodeError")
+
+
+def test_dossier_sans_sauvegarde(tmp_path):
+    assert main([str(tmp_path)]) == 1
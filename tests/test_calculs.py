@@ -0,0 +1,72 @@
+"""Tests du moteur de calcul : préparation du journal, KPIs et simulateur (calculs.py)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from calculs import (baseline_simulateur, calculer_kpis, detect_scope, population_totale, preparer_journal,
+                     scopes_vectorises, simuler_scenario, table_scopes)
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+JOURNAL = [
+    creer_flux("Bâtiment", "Chauffage (Gaz)", 11_000, "kWh", 0.227, 10, "100 m²"),
+    creer_flux("Énergie", "Conso Radiateur Élec", 7_680, "kWh", 0.060, 5, "Scope 2 | Inventaire #ab12 | Salle"),
+    creer_flux("Mobilité", "Trajet Quotidien (Initiale)", 20_000, "km.pax", 0.190, 10, "Voiture Thermique | 160j/an"),
+    creer_flux("Mobilité", "Voyage Avion", 5_000, "km", 0.230, 10, "Avion"),
+    creer_flux("Vie de Campus", "Repas Bœuf", 500, "repas", 7.0, 20, "Cantine"),
+    creer_flux("Énergie", "Gaz (Compteur GAZ-1)", 3_000, "kWh", 0.227, 2, "Scope 1 | Compteur GAZ-1 | 2026-01"),
+]
+
+
+@pytest.mark.parametrize("ligne", JOURNAL + [
+    {"Catégorie": "Bâtiment", "Item": "Fioul", "Détail": None},
+    {"Catégorie": "Achats", "Item": "Élec", "Détail": "Scope 3"},
+    {"Catégorie": "Énergie", "Item": "Éclairage"},
+])
+def test_scopes_vectorises_comme_detect_scope(ligne):
+    df = pd.DataFrame([ligne])
+    attendu = detect_scope({k: v for k, v in ligne.items() if v is not None})
+    assert preparer_journal([dict(ligne, Impact_kgCO2=1, Marge=0)])["Scope"].iloc[0] == attendu
+    codes = scopes_vectorises(*(df.get(c, pd.Series("", index=df.index)).fillna("").astype(str) for c in ("Catégorie", "Item", "Détail")))
+    assert f"Scope {codes[0] + 1}" == attendu
+
+
+def test_preparer_journal_nettoie_les_nombres():
+    df = preparer_journal([dict(JOURNAL[0], Impact_kgCO2="abc", Marge=None), JOURNAL[1]])
+    assert df["Impact_kgCO2"].tolist()[0] == 0
+    assert df["Marge"].tolist()[0] == 0
+    assert df["Scope"].tolist() == ["Scope 1", "Scope 2"]
+
+
+def test_population_jamais_nulle():
+    assert population_totale(DEFAULT_PARAMS) == 27
+    assert population_totale(dict(DEFAULT_PARAMS, pop_etu=0, pop_alt=0, pop_prof=0)) == 1
+
+
+def test_kpis_et_table_des_scopes():
+    df = preparer_journal(JOURNAL)
+    kpis = calculer_kpis(df, DEFAULT_PARAMS)
+    total = sum(e["Impact_kgCO2"] for e in JOURNAL) / 1000
+    assert kpis["total_co2_t"] == pytest.approx(total)
+    assert kpis["ratio_pers"] == pytest.approx(total / 27)
+    assert kpis["nb_flux"] == len(JOURNAL)
+    assert 0 <= kpis["dqi_score"] <= 10
+    scopes = table_scopes(df).set_index("Scope")
+    assert scopes["Part (%)"].sum() == pytest.approx(100)
+    assert scopes.loc["Scope 1", "Impact_kgCO2"] == pytest.approx(11_000 * 0.227 + 3_000 * 0.227)
+
+
+def test_simulateur_sans_levier_reproduit_la_reference():
+    base = baseline_simulateur(JOURNAL)
+    res = simuler_scenario(base, {}, DEFAULT_PARAMS)
+    assert res["total_final"] == pytest.approx(base["total_ref"])
+    assert res["total_economy"] == pytest.approx(0)
+
+
+def test_simulateur_leviers_cibles_et_lots():
+    base = baseline_simulateur(JOURNAL)
+    chauffage = simuler_scenario(base, {"sim_heat": 50}, DEFAULT_PARAMS)
+    assert chauffage["gain_total_ener"] > 0
+    assert chauffage["gain_total_mob"] == pytest.approx(0)
+    # Un lot de scénarios (tableaux) donne les mêmes valeurs que les appels un par un
+    lot = simuler_scenario(base, {"sim_heat": np.array([0.0, 50.0])}, DEFAULT_PARAMS)
+    assert lot["total_final"].tolist() == pytest.approx([base["total_ref"], chauffage["total_final"]])
@@ -0,0 +1,66 @@
+"""Tests de l'ingestion des relevés de compteurs (ingestion_compteurs.py)."""
+import pytest
+
+import ingestion_compteurs as ic
+from referentiel import DEFAULT_PARAMS
+
+ENTETE = "Compteur;Horodatage;Valeur;Unité\n"
+
+
+def _ecrire(dossier, nom, texte, mode="w"):
+    with open(dossier / nom, mode, encoding="utf-8", newline="") as f:
+        f.write(texte)
+
+
+def _totaux(resultat):
+    return {(r.compteur, r.periode): (r.kWh, r.releves) for r in resultat["agregats"].itertuples()}
+
+
+def test_reprise_ne_relit_que_les_octets_nouveaux(tmp_path):
+    _ecrire(tmp_path, "elec.csv", ENTETE + "ELEC-1;2026-01-15 10:00;100;kWh\nELEC-1;31/01/2026 23:00;50;kWh\n")
+    premier = ic.ingerer(tmp_path)
+    assert premier["fichiers"] == [("elec.csv", 2)]
+    assert _totaux(premier) == {("ELEC-1", "2026-01"): (150.0, 2)}
+    # Rien de nouveau : pas de relecture, totaux inchangés
+    assert ic.nouveautes(tmp_path) == []
+    assert ic.ingerer(tmp_path)["fichiers"] == []
+    # Lignes ajoutées en fin de fichier + nouveau fichier : seuls ces octets s'ajoutent aux totaux
+    _ecrire(tmp_path, "elec.csv", "ELEC-1;2026-02-01 00:00;1;MWh\n", mode="a")
+    _ecrire(tmp_path, "gaz.csv", "compteur,date,valeur,unite,energie\nG1,2026-01-10,10,m3,gaz\n")
+    suite = ic.ingerer(tmp_path)
+    assert suite["fichiers"] == [("elec.csv", 1), ("gaz.csv", 1)]
+    assert _totaux(suite) == {("ELEC-1", "2026-01"): (150.0, 2), ("ELEC-1", "2026-02"): (1000.0, 1),
+                              ("G1", "2026-01"): (pytest.approx(112.0), 1)}
+    assert suite["modifies"] == ["ELEC-1|elec|2026-02", "G1|gaz|2026-01"]
+
+
+def test_ligne_partielle_attend_le_passage_suivant(tmp_path):
+    _ecrire(tmp_path, "elec.csv", ENTETE + "ELEC-1;2026-03-01 10:00;100;kWh\nELEC-1;2026-03-01 11:")
+    assert _totaux(ic.ingerer(tmp_path)) == {("ELEC-1", "2026-03"): (100.0, 1)}
+    # La fin de la ligne arrive : elle est lue entière, une seule fois
+    _ecrire(tmp_path, "elec.csv", "00;40;kWh\n", mode="a")
+    resultat = ic.ingerer(tmp_path)
+    assert resultat["fichiers"] == [("elec.csv", 1)] and resultat["rejets"] == 0
+    assert _totaux(resultat) == {("ELEC-1", "2026-03"): (140.0, 2)}
+
+
+def test_fichier_tronque_ignore(tmp_path):
+    _ecrire(tmp_path, "elec.csv", ENTETE + "ELEC-1;2026-01-15 10:00;100;kWh\n")
+    ic.ingerer(tmp_path)
+    _ecrire(tmp_path, "elec.csv", ENTETE)
+    resultat = ic.ingerer(tmp_path)
+    assert resultat["fichiers"] == [("elec.csv", "tronqué, ignoré")]
+    assert _totaux(resultat) == {("ELEC-1", "2026-01"): (100.0, 1)}
+
+
+def test_flux_mis_a_jour_en_place(tmp_path):
+    _ecrire(tmp_path, "elec.csv", ENTETE + "ELEC-1;2026-01-15 10:00;100;kWh\n")
+    flux = ic.flux_compteurs(ic.ingerer(tmp_path)["agregats"], DEFAULT_PARAMS)
+    ajouts, corrections = ic.plan_upsert([], flux)
+    assert len(ajouts) == 1 and corrections == []
+    journal = list(ajouts)
+    _ecrire(tmp_path, "elec.csv", "ELEC-1;2026-01-20 10:00;20;kWh\n", mode="a")
+    flux = ic.flux_compteurs(ic.ingerer(tmp_path)["agregats"], DEFAULT_PARAMS)
+    ajouts, corrections = ic.plan_upsert(journal, flux)
+    assert ajouts == [] and [i for i, _ in corrections] == [0]
+    assert corrections[0][1]["Quantité"] == "120.0 kWh"
@@ -0,0 +1,32 @@
+"""Tests de l'import des profils horaires d'intensité carbone (intensite_horaire.py)."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from intensite_horaire import charger_profil, importer_csv
+
+
+def _csv(horodates, valeurs):
+    return io.StringIO("date,intensite_co2\n" + "\n".join(f"{h},{v}" for h, v in zip(horodates, valeurs)))
+
+
+def test_import_utc_ramene_a_l_heure_locale(tmp_path):
+    heures = pd.date_range("2026-07-01", periods=48, freq="h", tz="UTC")
+    valeurs = np.arange(48) + 100
+    meta = importer_csv(_csv([h.isoformat() for h in heures], valeurs), "France 🇫🇷", tmp_path)
+    # Été : UTC+2, la première mesure (00h UTC) est à 02h à Paris
+    assert meta["debut"] == "2026-07-01T02"
+    assert meta["fuseau"] == "Europe/Paris"
+    serie, _ = charger_profil("France 🇫🇷", tmp_path)
+    assert serie[0] == np.float32(0.100)
+
+
+def test_import_sans_decalage_suppose_local(tmp_path):
+    heures = pd.date_range("2026-01-01", periods=30, freq="h")
+    meta = importer_csv(_csv(heures, [60.0] * 30), "France 🇫🇷", tmp_path)
+    assert meta["debut"] == "2026-01-01T00"
+    assert meta["heures"] == 30
+    assert meta["moyenne"] == pytest.approx(0.060, rel=1e-6)
+
@@ -0,0 +1,137 @@
+"""Tests du magasin d'inventaire indexé et de sa synchronisation avec le journal (inventaire.py)."""
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from inventaire import InventaireIndexe, LIGNES_DEMO, plan_synchronisation, positions_journal
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+
+def _journal(inv, flux=None):
+    """Journal contenant les flux dérivés (tous, ou ``flux``) de l'inventaire."""
+    flux = [inv.derives[u] for u in inv.selection() if inv.derives.get(u)] if flux is None else flux
+    return [creer_flux(f["cat"], f["item"], f["val"], f["unit"], f["fe"], f["incertitude"], f["detail"]) for f in flux]
+
+
+@pytest.fixture
+def inv():
+    inv = InventaireIndexe(LIGNES_DEMO)
+    inv.actualiser_derives(DEFAULT_PARAMS)
+    return inv
+
+
+def test_uids_aleatoires_et_etiquettes(inv):
+    autre = InventaireIndexe(LIGNES_DEMO)
+    assert not set(inv.lignes) & set(autre.lignes)
+    positions = positions_journal(_journal(inv))
+    assert set(positions) == set(inv.lignes)
+
+
+def test_selection_ordre_d_ajout(inv):
+    uids = list(inv.lignes)
+    assert inv.selection() == uids
+    assert inv.selection(Salle="Salle de classe") == [uids[0], uids[2]]
+    assert inv.selection(Salle="Salle de classe", Type="Élec (Watts)") == [uids[2]]
+
+
+def test_appliquer_delta_editeur(inv):
+    uids = inv.selection()
+    touches = inv.appliquer({"edited_rows": {"0": {"Qté": 40}}, "deleted_rows": [1],
+                             "added_rows": [{"Objet": "Vidéoproj", "Qté": 1, "Poids/Conso": 300.0, "Type": "Élec (Watts)"}]},
+                            uids, defauts={"Salle": "Amphi"})
+    assert len(touches) == 3
+    assert inv.lignes[uids[0]]["Qté"] == 40
+    assert uids[1] not in inv.lignes
+    assert inv.valeurs("Salle") == ["Amphi", "Salle de classe"]
+
+
+def test_plan_synchronisation(inv):
+    entries = _journal(inv)
+    inv.a_publier.clear()
+    uids = inv.selection()
+    inv.appliquer({"edited_rows": {"0": {"Qté": 40}}, "deleted_rows": [1],
+                   "added_rows": [{"Objet": "Vidéoproj", "Qté": 1, "Poids/Conso": 300.0, "Type": "Élec (Watts)"}]}, uids)
+    recalcules = inv.actualiser_derives(DEFAULT_PARAMS)
+    assert len(recalcules) == 3
+    ajouts, corrections, suppressions = plan_synchronisation(inv, entries)
+    assert [f["item"] for f in ajouts] == ["Conso Vidéoproj"]
+    assert [(i, f["val"]) for i, f in corrections] == [(0, 40.0)]
+    assert suppressions == [1]
+
+
+def test_parametres_modifies_recalculent_tout(inv):
+    inv.a_publier.clear()
+    params = dict(DEFAULT_PARAMS, jours_ouverture=200)
+    assert len(inv.actualiser_derives(params)) == 3
+    assert inv.a_publier == {inv.selection(Type="Élec (Watts)")[0]}
+
+
+def test_export_restaure_sans_republier(inv):
+    restaure = InventaireIndexe.depuis_export(inv.exporter())
+    assert restaure.exporter() == inv.exporter()
+    restaure.actualiser_derives(DEFAULT_PARAMS)
+    assert restaure.derives == inv.derives
+    assert not restaure.a_publier
+
+
+def test_verifier_journal(inv):
+    inv.a_publier.clear()
+    radiateur = inv.selection(Type="Élec (Watts)")[0]
+    inv.verifier_journal(_journal(inv, [inv.derives[u] for u in inv.selection() if u != radiateur]))
+    assert inv.a_publier == {radiateur}
+
+
+def test_fusionner_garde_les_saisies_locales(inv):
+    inv.a_publier.clear()
+    publie = inv.exporter()
+    chaise, bureau, radiateur = inv.selection()
+    inv.modifier(bureau, {"Qté": 3})                      # saisie locale non enregistrée
+    publie[chaise] = dict(publie[chaise], Qté=50)          # correction d'un collègue
+    publie[bureau] = dict(publie[bureau], Qté=9)
+    del publie[radiateur]                                  # suppression d'un collègue
+    assert inv.fusionner(publie) == {chaise, radiateur}
+    assert inv.lignes[chaise]["Qté"] == 50
+    assert inv.lignes[bureau]["Qté"] == 3
+    assert radiateur not in inv.lignes
+    inv.actualiser_derives(DEFAULT_PARAMS)
+    assert inv.a_publier == {bureau}
+
+
+def test_scope2_horaire_incremental(tmp_path):
+    from intensite_horaire import coefficients_horaires, importer_csv, scope2_horaire
+
+    heures = pd.date_range("2025-01-01", "2025-12-31 23:00", freq="h")
+    valeurs = 50 + 10 * np.sin(2 * np.pi * heures.hour / 24)
+    csv = "date,intensite_g\n" + "\n".join(f"{h},{v}" for h, v in zip(heures, valeurs))
+    importer_csv(io.StringIO(csv), "France 🇫🇷", tmp_path)
+    params = dict(DEFAULT_PARAMS, mode_elec="horaire", annee_elec=2025)
+    coefficients = coefficients_horaires("France 🇫🇷", 2025, params["jours_ouverture"], dossier=tmp_path)
+
+    inv = InventaireIndexe(LIGNES_DEMO)
+    inv.actualiser_derives(params, coefficients)
+    complet = scope2_horaire(inv.dataframe(), "France 🇫🇷", 2025, params["jours_ouverture"], dossier=tmp_path)
+    radiateur = inv.selection(Type="Élec (Watts)")[0]
+    assert inv.horaire[radiateur]["kgCO2e"] == pytest.approx(complet["lignes"].loc[radiateur, "kgCO2e"])
+    assert inv.derives[radiateur]["detail"].startswith("Scope 2 | Horaire 2025")
+
+    # Une modification ne recalcule que la ligne touchée
+    inv.modifier(radiateur, {"Qté": 8})
+    assert inv.actualiser_derives(params, coefficients) == {radiateur}
+    assert inv.horaire[radiateur]["kgCO2e"] == pytest.approx(2 * complet["lignes"].loc[radiateur, "kgCO2e"])
+
+
+def test_inventaire_publie_dans_le_journal_partage(inv):
+    from journal_partage import JournalPartage, Replique
+
+    partage = JournalPartage("Promo")
+    a, b = Replique(partage, "A"), Replique(partage, "B")
+    a.publier_inventaire(inv.exporter())
+    recu = InventaireIndexe.depuis_export(b.tirer_inventaire())
+    assert recu.exporter() == inv.exporter()
+    assert b.tirer_inventaire() is None                    # Rien de nouveau
+    chaise = inv.selection()[0]
+    b.publier_inventaire({chaise: dict(inv.lignes[chaise], Qté=31)})
+    assert b.tirer_inventaire() is None                    # Sa propre publication
+    assert a.tirer_inventaire()[chaise]["Qté"] == 31
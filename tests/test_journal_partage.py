@@ -0,0 +1,73 @@
+"""Tests du journal partagé : synchronisation et annuler / rétablir (journal_partage.py)."""
+import pytest
+
+from audit import JournalAudit
+from journal_partage import JournalPartage, Replique
+from memoire import JournalCompact
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+
+def _flux(nom):
+    return creer_flux("Bâtiment", nom, 1, "u", 1.0, 10, "d")
+
+
+@pytest.fixture
+def sessions(tmp_path):
+    """Fabrique de sessions (audit, params, entries, réplique) sur un même journal partagé."""
+    partage = JournalPartage("Labo")
+
+    def ouvrir(auteur, flux=()):
+        params, entries = dict(DEFAULT_PARAMS), JournalCompact()
+        entries.extend(flux)
+        audit = JournalAudit(auteur, params, entries, dossier=tmp_path)
+        replique = Replique(partage, auteur)
+        return audit, params, entries, replique
+    return partage, ouvrir
+
+
+def _partage(partage):
+    return [e["Item"] for _, _, e in partage.instantane()[1]]
+
+
+def test_annuler_ne_defait_pas_la_connexion(sessions):
+    partage, ouvrir = sessions
+    audit_b, params_b, entries_b, bob = ouvrir("Bob")
+    bob.rejoindre(entries_b, params_b, audit_b)
+    for nom in ("B1", "B2", "B3"):
+        audit_b.ajout(entries_b, params_b, _flux(nom))
+    audit_c, params_c, entries_c, carol = ouvrir("Carol", [_flux("C")])
+    carol.rejoindre(entries_c, params_c, audit_c)
+    assert [e["Item"] for e in entries_c] == ["B1", "B2", "B3"]
+    assert not audit_c.peut_annuler
+    assert audit_c.annuler(entries_c, params_c) is None
+    assert _partage(partage) == ["B1", "B2", "B3"]
+
+
+def test_annuler_s_arrete_aux_operations_tirees(sessions):
+    partage, ouvrir = sessions
+    audit_a, params_a, entries_a, alice = ouvrir("Alice")
+    audit_b, params_b, entries_b, bob = ouvrir("Bob")
+    alice.rejoindre(entries_a, params_a, audit_a)
+    bob.rejoindre(entries_b, params_b, audit_b)
+    audit_a.ajout(entries_a, params_a, _flux("A"))
+    audit_b.ajout(entries_b, params_b, _flux("B"))
+    assert alice.tirer(entries_a, params_a, audit_a) == {"Bob": 1}
+    assert not audit_a.peut_annuler
+    audit_a.annuler(entries_a, params_a)
+    assert _partage(partage) == ["A", "B"]
+    # Les opérations locales postérieures au tirage restent annulables
+    audit_a.ajout(entries_a, params_a, _flux("A2"))
+    audit_a.annuler(entries_a, params_a)
+    assert _partage(partage) == ["A", "B"]
+    assert [e["Item"] for e in entries_a] == ["A", "B"]
+    assert not audit_a.peut_annuler
+
+
+def test_barriere_relue_apres_redemarrage(sessions, tmp_path):
+    partage, ouvrir = sessions
+    audit, params, entries, replique = ouvrir("Dan")
+    replique.rejoindre(entries, params, audit)
+    audit.ajout(entries, params, _flux("D"))
+    reprise = JournalAudit("Dan", params, entries, dossier=tmp_path)
+    assert reprise.barriere == audit.barriere
+    assert reprise.peut_annuler
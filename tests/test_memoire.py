@@ -0,0 +1,83 @@
+"""Tests du journal compact en colonnes et du comptage mémoire par session (memoire.py)."""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from memoire import JournalCompact, octets_journal, octets_session, taille_objet
+from referentiel import creer_flux
+
+FLUX = [creer_flux("Mobilité", f"Trajet {i % 3}", 100 + i, "km", 0.19, 10, f"Détail {i}") for i in range(20)]
+
+
+def test_se_comporte_comme_une_liste():
+    j = JournalCompact(FLUX)
+    assert len(j) == 20 and list(j) == FLUX and j == FLUX
+    j.insert(0, {"Catégorie": "X", "Nouvelle": 1})
+    assert j[0] == {"Catégorie": "X", "Nouvelle": 1}
+    assert "Nouvelle" not in j[1]
+    del j[0]
+    j[-1] = dict(FLUX[-1], Impact_kgCO2="n/a")        # type hétérogène : colonne dégradée en objets
+    assert j[-1]["Impact_kgCO2"] == "n/a" and j[0] == FLUX[0]
+    assert j[2:4] == FLUX[2:4]
+
+
+def test_revision_compte_les_ecritures():
+    j = JournalCompact(FLUX[:2])
+    r = j.revision
+    j.append(FLUX[2]); j[0] = FLUX[1]; del j[1]
+    assert j.revision == r + 3
+
+
+def test_vers_dataframe_avec_absents():
+    j = JournalCompact([{"a": "x", "b": 1.5}, {"a": "y"}])
+    df = j.vers_dataframe()
+    assert df["a"].tolist() == ["x", "y"]
+    assert df["b"].iloc[0] == 1.5 and np.isnan(df["b"].iloc[1])
+    pd.testing.assert_frame_equal(JournalCompact(FLUX).vers_dataframe(), pd.DataFrame(FLUX))
+
+
+def test_decharger_recharger(tmp_path):
+    j = JournalCompact(FLUX)
+    j.decharger(tmp_path)
+    assert j.decharge and j.octets() == 0 and len(list(tmp_path.iterdir())) == 1
+    assert list(j) == FLUX and not j.decharge
+    assert not list(tmp_path.iterdir())
+    assert list(pickle.loads(pickle.dumps(j))) == FLUX
+
+
+def test_compact_plus_petit_qu_une_liste_de_dicts():
+    flux = [creer_flux("Mobilité", f"Trajet {i % 3}", 100 + i, "km", 0.19, 10, f"Détail {i % 7}") for i in range(1000)]
+    assert octets_journal(flux) < taille_objet(flux) / 2
+
+
+class _Objet:
+    def __init__(self):
+        self.lignes = {i: str(i) * 1000 for i in range(10)}
+
+
+class _Fente:
+    __slots__ = ("donnees",)
+
+    def __init__(self):
+        self.donnees = ["y" * 1000, "z" * 1000]
+
+
+class _Partage:
+    PARTAGE_SERVEUR = True
+
+    def __init__(self):
+        self.gros = "w" * 100_000
+
+
+def test_taille_objet_parcourt_attributs_et_slots():
+    assert taille_objet(_Objet()) > 10_000
+    assert taille_objet(_Fente()) > 2_000
+    assert taille_objet(_Partage()) < 1_000
+    assert taille_objet(pd.DataFrame({"t": ["a" * 100] * 100})) > 10_000
+
+
+def test_octets_session_compte_une_fois_les_objets_communs():
+    commun = ["x" * 10_000]
+    octets = octets_session({"a": commun, "b": commun})
+    assert octets["a"] > 10_000 and octets["b"] < 1_000
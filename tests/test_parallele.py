@@ -0,0 +1,44 @@
+"""Tests du moteur multi-cœurs du simulateur (parallele.py)."""
+import pandas as pd
+import pytest
+
+from calculs import baseline_simulateur
+from parallele import MoteurParallele, quantiles
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+JOURNAL = [creer_flux(cat, item, val, unit, fe, incert, detail) for cat, item, val, unit, fe, incert, detail in [
+    ("Bâtiment", "Chauffage (Gaz)", 11_000, "kWh", 0.227, 10, "100 m²"),
+    ("Énergie", "Conso Radiateur Élec", 7_680, "kWh", 0.060, 5, "Scope 2"),
+    ("Mobilité", "Trajet Quotidien (Initiale)", 20_000, "km.pax", 0.190, 30, "Voiture Thermique | 160j/an"),
+    ("Mobilité", "Voyage Avion", 5_000, "km", 0.230, 20, "Avion"),
+    ("Vie de Campus", "Repas Bœuf", 500, "repas", 7.0, 20, "Cantine"),
+    ("Numérique", "Parc PC Portable", 30, "u", 39.0, 10, "Amortissement 4 ans"),
+]]
+LEVIERS = {"sim_mob_reduce": 20, "sim_food_vege": 50, "sim_led": True}
+
+
+@pytest.fixture(scope="module")
+def base():
+    return baseline_simulateur(JOURNAL)
+
+
+def test_monte_carlo_identique_local_et_pool(base):
+    local, pool = MoteurParallele(workers=1), MoteurParallele(workers=2, seuil=0)
+    try:
+        assert not local.parallele(base) and pool.parallele(base)
+        attendu = local.monte_carlo(base, LEVIERS, DEFAULT_PARAMS, tirages=60)
+        obtenu = pool.monte_carlo(base, LEVIERS, DEFAULT_PARAMS, tirages=60)
+        assert len(attendu) == 60
+        # Graines dérivées par tranche : même tirage quel que soit le nombre de cœurs
+        pd.testing.assert_frame_equal(attendu, obtenu)
+    finally:
+        local.fermer()
+        pool.fermer()
+
+
+def test_monte_carlo_centre_sur_la_reference(base):
+    moteur = MoteurParallele(workers=1)
+    tirages = moteur.monte_carlo(base, {}, DEFAULT_PARAMS, tirages=400)
+    resume = quantiles(tirages)
+    assert resume.loc["Référence", "P5"] < base["total_ref"] / 1000 < resume.loc["Référence", "P95"]
+    assert (tirages["Final"] <= tirages["Référence"] + 1e-9).all()
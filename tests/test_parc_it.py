@@ -0,0 +1,21 @@
+"""Tests du registre du parc informatique (parc_it.py)."""
+import pandas as pd
+import pytest
+
+from parc_it import lire_registre
+
+
+def test_dates_iso_et_francaises():
+    df = pd.DataFrame({"Type": ["PC portable", "Écran 24 pouces", "PC fixe", "Smartphone"],
+                       "Date d'achat": ["2023-05-01", "01/05/2023", "2023-12-01 00:00:00", 2022]})
+    registre, rejets = lire_registre(df, 2026)
+    assert rejets.empty
+    # 1er mai 2023 dans les deux formats (jamais le 5 janvier), année seule au milieu de l'année
+    assert registre["achat"].tolist() == pytest.approx([2023 + 120 / 365.25, 2023 + 120 / 365.25, 2023 + 334 / 365.25, 2022.5])
+
+
+def test_dates_excel_et_rejets():
+    df = pd.DataFrame({"Type": ["PC portable"] * 3, "Date d'achat": pd.to_datetime(["2023-05-01", "2027-02-01", None])})
+    registre, rejets = lire_registre(df, 2026)
+    assert registre["achat"].tolist() == pytest.approx([2023 + 120 / 365.25])
+    assert len(rejets) == 2  # Achat futur et date illisible
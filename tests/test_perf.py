@@ -0,0 +1,37 @@
+"""Tests de l'instrumentation des reruns (perf.py)."""
+import tracemalloc
+
+import pytest
+
+import perf
+
+
+@pytest.fixture(autouse=True)
+def reglages():
+    avant = dict(perf.REGLAGES)
+    yield
+    perf.REGLAGES.update(avant)
+    perf._suivre_memoire(False)
+
+
+def test_tracemalloc_arrete_quand_le_detail_est_coupe():
+    perf.REGLAGES.update(actif=True, detail=True)
+    perf.Chrono()
+    assert tracemalloc.is_tracing()
+    perf.REGLAGES["detail"] = False
+    perf.Chrono()
+    assert not tracemalloc.is_tracing()
+
+
+def test_profileur_libere_apres_un_rerun_interrompu():
+    perf.REGLAGES.update(actif=True, profil=True)
+    interrompu = perf.Chrono()       # st.stop() / st.rerun() : terminer() n'est jamais appelé
+    assert perf._actifs["profileur"] is interrompu.profileur
+    suivant = perf.Chrono()
+    assert suivant.profileur is not None and perf._actifs["profileur"] is suivant.profileur
+    with suivant.span("Calcul"):
+        sum(range(1000))
+    suivant.terminer("Test perf")
+    assert perf._actifs["profileur"] is None and not perf.REGLAGES["profil"]
+    assert "Calcul" in [m["nom"] for m in perf.historique("Test perf")[-1]["mesures"]]
+    assert perf.dernier_profil("Test perf")["octets"]
@@ -0,0 +1,59 @@
+"""Tests du contrôle qualité du journal : doublons et valeurs aberrantes (qualite.py)."""
+import pandas as pd
+
+from qualite import analyser, parser_quantites, synthese
+from referentiel import creer_flux
+
+
+def _df(flux):
+    return pd.DataFrame(flux)
+
+
+def test_parser_quantites():
+    valeurs, unites = parser_quantites(pd.Series(["123.4 km.pax", "5 u", "abc"]))
+    assert valeurs.tolist()[:2] == [123.4, 5.0] and pd.isna(valeurs.iloc[2])
+    assert unites.tolist() == ["km.pax", "u", ""]
+
+
+def test_doublon_exact_malgre_la_date():
+    a = creer_flux("Mobilité", "Trajet", 100, "km", 0.19, 10, "Lyon", date="2026-01-01")
+    b = dict(a, Date="2026-02-01")
+    autre_annee = creer_flux("Mobilité", "Trajet", 100, "km", 0.19, 10, "Lyon", annee=2025)
+    drapeaux = analyser(_df([a, b, autre_annee]))
+    assert drapeaux["doublon"].tolist() == [False, True, False]
+    assert drapeaux["motif"].iloc[1] == "Doublon exact"
+
+
+def test_quasi_doublon():
+    flux = [creer_flux("Mobilité", "Trajet", 100, "km", 0.19, 10, "Vers Lyon !"),
+            creer_flux("Mobilité", "trajet", 101, "km", 0.19, 10, "vers lyon")]
+    drapeaux = analyser(_df(flux))
+    assert drapeaux["quasi_doublon"].sum() == 1 and not drapeaux["doublon"].any()
+
+
+def test_quantite_aberrante():
+    flux = [creer_flux("Mobilité", "Trajet", km, "km", 0.19, 10, f"Trajet {i}") for i, km in enumerate([100, 110, 95, 105, 98, 102, 10_000])]
+    df = _df(flux)
+    drapeaux = analyser(df)
+    assert drapeaux["aberrant"].tolist() == [False] * 6 + [True]
+    assert drapeaux["motif"].iloc[-1] == "Quantité atypique"
+    s = synthese(df, drapeaux)
+    assert s["nb_aberrants"] == 1 and 0.9 < s["part_suspecte"] < 1
+
+
+def test_journal_vide():
+    drapeaux = analyser(pd.DataFrame(columns=["Catégorie", "Item", "Quantité", "Impact_kgCO2"]))
+    assert drapeaux.empty
+
+
+def test_modes_de_transport_melanges():
+    # Même Item, facteurs très différents selon le mode : rien d'atypique
+    flux = [creer_flux("Mobilité", "Trajet Étudiant", km, "km.pax", fe, 10, f"{mode} | 160j/an | ")
+            for mode, fe in (("TGV", 0.002), ("Avion", 0.23), ("Bus", 0.1)) for km in (900, 1000, 1100, 950, 1050)]
+    drapeaux = analyser(_df(flux))
+    assert not drapeaux["aberrant"].any()
+    # Une erreur de facteur à l'intérieur d'un mode reste signalée
+    flux.append(creer_flux("Mobilité", "Trajet Étudiant", 1000, "km.pax", 0.23, 10, "TGV | 160j/an | "))
+    drapeaux = analyser(_df(flux))
+    assert drapeaux["aberrant"].tolist() == [False] * 15 + [True]
+    assert drapeaux["motif"].iloc[-1] == "Impact unitaire atypique"
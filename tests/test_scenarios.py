@@ -0,0 +1,67 @@
+"""Tests de la bibliothèque de scénarios et de son cache (scenarios.py)."""
+import pytest
+
+import scenarios
+from calculs import baseline_simulateur, simuler_scenario
+from referentiel import DEFAULT_PARAMS, creer_flux
+
+JOURNAL = [
+    creer_flux("Bâtiment", "Chauffage (Gaz)", 11_000, "kWh", 0.227, 10, "100 m²"),
+    creer_flux("Mobilité", "Trajet Quotidien (Initiale)", 20_000, "km.pax", 0.190, 10, "Voiture Thermique | 160j/an"),
+    creer_flux("Mobilité", "Voyage Avion", 5_000, "km", 0.230, 10, "Avion"),
+    creer_flux("Vie de Campus", "Repas Bœuf", 500, "repas", 7.0, 20, "Cantine"),
+]
+BIBLIOTHEQUE = {"Sobriété": {"sim_mob_reduce": 30}, "Cantine": {"sim_food_vege": 60, "inconnu": 1}}
+
+
+@pytest.fixture
+def base():
+    return baseline_simulateur(JOURNAL)
+
+
+@pytest.fixture
+def appels(monkeypatch):
+    compteur = []
+    evaluer = scenarios.evaluer_lot
+
+    def compter(base, lot, params):
+        compteur.append(sorted(lot))
+        return evaluer(base, lot, params)
+    monkeypatch.setattr(scenarios, "evaluer_lot", compter)
+    return compteur
+
+
+def test_bibliotheque_dans_les_params():
+    params = dict(DEFAULT_PARAMS)
+    scenarios.enregistrer(params, "Sobriété", {"sim_mob_reduce": 30, "inconnu": 1})
+    assert params["scenarios"]["Sobriété"] == scenarios.normaliser({"sim_mob_reduce": 30})
+    scenarios.supprimer(params, "Sobriété")
+    assert params["scenarios"] == {}
+
+
+def test_lot_identique_au_calcul_unitaire(base):
+    res = scenarios.evaluer_lot(base, BIBLIOTHEQUE, DEFAULT_PARAMS)
+    for nom, leviers in BIBLIOTHEQUE.items():
+        seul = simuler_scenario(base, scenarios.normaliser(leviers), DEFAULT_PARAMS)
+        assert res.loc[nom, "total_final"] == pytest.approx(seul["total_final"])
+
+
+def test_cache_reutilise_puis_invalide(base, appels):
+    cache = scenarios.CacheScenarios()
+    premier = cache.comparer(base, BIBLIOTHEQUE, DEFAULT_PARAMS)
+    # Seul le scénario nouveau (ou modifié) est évalué
+    second = cache.comparer(base, {**BIBLIOTHEQUE, "Plus": {"sim_mob_reduce": 50}}, DEFAULT_PARAMS)
+    assert appels == [["Cantine", "Sobriété"], ["Plus"]]
+    assert second.loc["Sobriété", "total_final"] == premier.loc["Sobriété", "total_final"]
+    # Population changée : la baseline change, tout est recalculé
+    params = dict(DEFAULT_PARAMS, pop_etu=DEFAULT_PARAMS["pop_etu"] * 2)
+    cache.comparer(base, BIBLIOTHEQUE, params)
+    assert appels[-1] == ["Cantine", "Sobriété"]
+    # Nouveau journal : nouvelle version de baseline
+    cache.comparer(baseline_simulateur(JOURNAL[:2]), BIBLIOTHEQUE, params)
+    assert len(appels) == 4
+
+
+def test_differences():
+    diff = scenarios.differences({"A": {}, "B": {"sim_mob_reduce": 30}}, "A")
+    assert diff == {"A": "identique", "B": "mob_reduce: 0 → 30"}
@@ -0,0 +1,63 @@
+"""Tests du suivi en cours d'année du budget carbone (suivi_budget.py)."""
+import datetime
+
+import pytest
+
+from memoire import JournalCompact
+from referentiel import DEFAULT_PARAMS, creer_flux
+from suivi_budget import SuiviBudget, projeter
+
+PARAMS = dict(DEFAULT_PARAMS, pop_etu=20, pop_alt=5, pop_prof=2, budget_co2=3.5)   # 27 personnes
+AUJOURD_HUI = datetime.date(2026, 10, 19)
+
+
+def releve(mois, kwh, compteur="TGBT"):
+    return creer_flux("Énergie", f"Élec (Compteur {compteur})", kwh, "kWh", 1.0, 2,
+                      f"Scope 2 | Compteur {compteur} | 2026-{mois:02d}", annee=2026, date=f"2026-{mois:02d}-01")
+
+
+def suivi_de(entrees):
+    suivi = SuiviBudget()
+    suivi.actualiser(JournalCompact(entrees))
+    return suivi
+
+
+def test_inventaire_saisi_en_cours_d_annee_est_acquis():
+    # 81 t saisies le 19/10 : total annuel, pas un rythme de 81 t en 10 mois
+    inventaire = creer_flux("Bâtiment", "Mobilier", 81_000, "u", 1.0, 10, "Amortissement 10 ans | Inventaire #ab12", annee=2026, date="2026-10-19")
+    suivi = suivi_de([inventaire])
+    assert suivi.mensuel[2026].sum() == 0
+    assert suivi.acquis[2026] == pytest.approx(81_000)
+    p = projeter(suivi, 2026, PARAMS, AUJOURD_HUI)
+    assert p["par_pers"] == pytest.approx(3.0)
+    assert p["date_epuisement"] is None
+
+
+def test_releves_de_compteurs_donnent_le_rythme():
+    suivi = suivi_de([releve(m, 10_000) for m in range(1, 10)])
+    assert suivi.mensuel[2026][:9].tolist() == [10_000] * 9
+    p = projeter(suivi, 2026, PARAMS, datetime.date(2026, 9, 30))
+    # Profil plat : 10 t / mois sur l'année -> 120 t ; budget de 94,5 t atteint mi-octobre
+    assert p["projection_t"] == pytest.approx(120)
+    assert p["realise_t"] == pytest.approx(90)
+    assert p["date_epuisement"] == datetime.date(2026, 10, 14)
+
+
+def test_cumul_incremental_egal_au_recalcul():
+    journal = JournalCompact([releve(1, 5_000)])
+    suivi = SuiviBudget()
+    suivi.actualiser(journal)
+    for m in range(2, 6):
+        journal.append(releve(m, 5_000 * m))
+        suivi.actualiser(journal)
+    complet = suivi_de(list(journal))
+    assert suivi.mensuel[2026].tolist() == complet.mensuel[2026].tolist()
+
+
+def test_correction_declenche_un_recalcul():
+    journal = JournalCompact([releve(1, 5_000), releve(2, 5_000)])
+    suivi = SuiviBudget()
+    suivi.actualiser(journal)
+    journal[0] = releve(1, 1_000)
+    suivi.actualiser(journal)
+    assert suivi.mensuel[2026][:2].tolist() == [1_000, 5_000]
@@ -0,0 +1,83 @@
+"""Tests de l'ordonnanceur de tâches d'arrière-plan (taches.py)."""
+import threading
+import time
+
+import pytest
+
+from taches import Ordonnanceur
+
+
+@pytest.fixture
+def ordo():
+    o = Ordonnanceur(workers=1)
+    yield o
+    o.pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _double(x, progression):
+    progression(0.5, "Calcul")
+    return 2 * x
+
+
+def test_deduplication_et_cache(ordo):
+    appels = []
+
+    def compter(x, progression):
+        appels.append(x)
+        return x
+    t1 = ordo.soumettre("export", "v1", compter, 3, params={"a": 1})
+    assert t1.attendre(5) and t1.resultat == 3
+    assert ordo.soumettre("export", "v1", compter, 3, params={"a": 1}) is t1
+    # Autre version des données ou autres paramètres : nouvelle tâche
+    assert ordo.soumettre("export", "v2", compter, 3, params={"a": 1}) is not t1
+    t3 = ordo.soumettre("export", "v1", compter, 3, params={"a": 2})
+    t3.attendre(5)
+    assert ordo.obtenir("export", "v1", {"a": 1}) is t1
+    assert len(appels) == 3
+
+
+def test_annulation_cooperative(ordo):
+    demarree, liberer = threading.Event(), threading.Event()
+
+    def longue(progression):
+        demarree.set()
+        liberer.wait(5)
+        progression(0.9, "Fin")
+        return "fini"
+    tache = ordo.soumettre("long", "v1", longue)
+    assert demarree.wait(5)
+    tache.annuler()
+    liberer.set()
+    tache.attendre(5)
+    assert tache.annulee and tache.etat == "annulée"
+    assert tache.resultat is None
+    # Une tâche annulée n'est pas réutilisée : une nouvelle soumission relance le travail
+    assert ordo.soumettre("long", "v1", lambda progression: "relancee") is not tache
+
+
+def test_erreur_non_mise_en_cache(ordo):
+    def echec(progression):
+        raise ValueError("colonne manquante")
+    tache = ordo.soumettre("analyse", "v1", echec)
+    tache.attendre(5)
+    assert isinstance(tache.erreur, ValueError) and tache.etat == "erreur"
+    nouvelle = ordo.soumettre("analyse", "v1", _double, 4)
+    assert nouvelle is not tache
+    nouvelle.attendre(5)
+    assert nouvelle.resultat == 8
+
+
+def test_expiration_et_lru():
+    ordo = Ordonnanceur(workers=1, taille_cache=2, duree_vie=0.05)
+    try:
+        taches = [ordo.soumettre("t", f"v{i}", _double, i) for i in range(3)]
+        for t in taches:
+            t.attendre(5)
+        ordo.etat()
+        # Cache borné : la plus ancienne tâche terminée est évincée
+        assert len(ordo.taches) == 2 and ordo.obtenir("t", "v0") is None
+        time.sleep(0.1)
+        assert ordo.obtenir("t", "v2") is None
+        assert ordo.etat() == []
+    finally:
+        ordo.pool.shutdown(wait=True)
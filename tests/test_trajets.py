@@ -0,0 +1,69 @@
+"""Tests du moteur de distances des enquêtes de mobilité (trajets.py)."""
+import pandas as pd
+import pytest
+
+from referentiel import DEFAULT_PARAMS
+from trajets import MODES, agreger_flux, haversine_km, lire_enquete, normaliser_codes, normaliser_mode
+
+
+@pytest.mark.parametrize("reponse, mode", [
+    ("Vélo électrique", "Vélo/Marche"),
+    ("Trottinette électrique", "Vélo/Marche"),
+    ("VAE", "Vélo/Marche"),
+    ("Marche à pied", "Vélo/Marche"),
+    ("Scooter", "Moto/Scooter"),
+    ("Moto", "Moto/Scooter"),
+    ("Covoiturage", "Covoiturage"),
+    ("Métro", "Métro"),
+    ("metro", "Métro"),
+    ("Voiture électrique", "Voiture Élec"),
+    ("Voiture", "Voiture Thermique"),
+    ("Train", "Train/TER"),
+    ("TER", "Train/TER"),
+    ("TGV", "TGV"),
+    ("Tramway", "Bus"),
+    ("Autocar", "Autocar"),
+    ("Car", "Autocar"),
+    ("Avion", "Avion"),
+])
+def test_normaliser_mode_reponses_libres(reponse, mode):
+    assert normaliser_mode(reponse) == mode
+
+
+def test_normaliser_mode_mots_entiers():
+    # "scooter" contient "ter" et "car" n'est pas un mot de "carte" : pas de faux positifs
+    assert normaliser_mode("Scooter") != "Train/TER"
+    assert normaliser_mode("Carte") is None
+    assert normaliser_mode("Inconnu") is None
+
+
+def test_modes_reconnus_ont_un_facteur():
+    for mode, cle in MODES.items():
+        assert normaliser_mode(mode) == mode
+        assert cle is None or cle in DEFAULT_PARAMS
+
+
+def test_normaliser_codes():
+    codes = normaliser_codes(pd.Series(["54000", "4000", 54500.0, " 2a004 "]))
+    assert codes.tolist() == ["54000", "04000", "54500", "2A004"]
+
+
+def test_haversine_nancy_paris():
+    assert haversine_km(48.69, 6.18, 48.86, 2.35) == pytest.approx(281, abs=5)
+
+
+def test_agreger_flux_rejets_et_km():
+    brut = pd.DataFrame({
+        "Latitude": [48.656, 48.69, None],
+        "Longitude": [6.245, 6.18, None],
+        "Mode": ["Voiture", "Hélicoptère", "Bus"],
+        "Jours": [100, 100, 100],
+    })
+    flux, rejets = agreger_flux(lire_enquete(brut), DEFAULT_PARAMS, jours_defaut=160)
+    assert len(rejets) == 2
+    assert len(flux) == 1
+    f = flux[0]
+    assert f["Mode"] == "Voiture Thermique"
+    assert f["fe"] == DEFAULT_PARAMS["fe_voit"]
+    # 0,1° de longitude à 48,66° N ≈ 7,35 km ; A/R × détour 1,3 × 100 jours
+    assert f["km_pax"] == pytest.approx(2 * 1.3 * 7.35 * 100, rel=0.01)
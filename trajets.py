@@ -0,0 +1,184 @@
+"""Moteur de distances domicile-campus pour les enquêtes de mobilité.
+
+Une enquête (une ligne par répondant : code postal ou latitude/longitude,
+mode de transport, et optionnellement profil, personnes et jours) est
+géocodée avec la table hors-ligne ``donnees/codes_postaux.csv`` (codes
+exacts autour du campus, centroïdes de département sinon). Les distances
+sont calculées en une passe (haversine NumPy × coefficient de détour
+routier) puis agrégées en flux Mobilité par mode.
+"""
+import functools
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+CAMPUS = {"nom": "ENSAIA (Vandœuvre-lès-Nancy)", "lat": 48.656, "lon": 6.145}
+COEF_DETOUR = 1.3          # Route réelle / vol d'oiseau
+RAYON_TERRE_KM = 6371.0
+FICHIER_CODES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "donnees", "codes_postaux.csv")
+
+# Modes reconnus -> clé du facteur d'émission (None = mobilité douce, 0 kgCO2e)
+MODES = {
+    "Voiture Thermique": 'fe_voit',
+    "Voiture Élec": 'fe_voit_elec',
+    "Covoiturage": 'fe_covoit',
+    "Moto/Scooter": 'fe_moto',
+    "Train/TER": 'fe_ter',
+    "TGV": 'fe_tgv',
+    "Métro": 'fe_metro',
+    "Bus": 'fe_bus',
+    "Autocar": 'fe_autocar',
+    "Avion": 'fe_avion_long',
+    "Vélo/Marche": None,
+}
+# Motifs des réponses libres (minuscules sans accents, mots entiers, testés dans l'ordre) :
+# les mobilités douces passent avant "élec" (vélo / trottinette électrique)
+MOTS_CLES_MODES = [
+    (r"velos?|vae|bicyclette|pieds?|marche|trottinettes?", "Vélo/Marche"),
+    (r"covoit\w*", "Covoiturage"),
+    (r"motos?|scooters?|deux[ -]roues|2 ?roues", "Moto/Scooter"),
+    (r"tgv", "TGV"),
+    (r"trains?|ter|rer|sncf", "Train/TER"),
+    (r"metros?", "Métro"),
+    (r"tram\w*|bus|autobus", "Bus"),
+    (r"cars?|autocars?", "Autocar"),
+    (r"avions?", "Avion"),
+    (r"elec\w*", "Voiture Élec"),
+    (r"voitures?|autos?|automobiles?", "Voiture Thermique"),
+]
+_MOTIFS_MODES = [(re.compile(rf"\b(?:{motif})\b"), mode) for motif, mode in MOTS_CLES_MODES]
+
+
+@functools.lru_cache(maxsize=1)
+def table_codes():
+    """Table hors-ligne code -> (commune, lat, lon), chargée une fois par processus."""
+    return pd.read_csv(FICHIER_CODES, dtype={"code": str}).set_index("code")
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Distance orthodromique (km), vectorisée sur des tableaux NumPy."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float)) for x in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RAYON_TERRE_KM * np.arcsin(np.sqrt(a))
+
+
+def normaliser_codes(serie):
+    """Codes postaux saisis (54000, 54000.0, '4000', '2A004'...) -> chaînes à 5 caractères."""
+    codes = serie.astype(str).str.strip().str.upper().str.replace(r"\.0$", "", regex=True)
+    return codes.where(~codes.str.fullmatch(r"\d{4}"), "0" + codes)
+
+
+def _departements(codes):
+    """Département d'un code postal (DOM sur 3 chiffres, Corse 2A/2B)."""
+    dep = codes.str[:3].where(codes.str.startswith("97"), codes.str[:2])
+    corse = codes.str.startswith("20")
+    return dep.mask(corse, np.where(codes.str[:3].isin(["200", "201"]), "2A", "2B"))
+
+
+def normaliser_mode(reponse):
+    """Réponse libre de l'enquête -> mode de MODES (None si non reconnue)."""
+    txt = str(reponse).strip()
+    if txt in MODES:
+        return txt
+    bas = txt.lower().translate(str.maketrans("éèêëàâîïôûüç", "eeeeaaiiouuc"))
+    for motif, mode in _MOTIFS_MODES:
+        if motif.search(bas):
+            return mode
+    return None
+
+
+# ==============================================================================
+# 1. LECTURE & GÉOCODAGE DE L'ENQUÊTE
+# ==============================================================================
+def lire_enquete(df):
+    """Enquête brute -> DataFrame normalisé (lat, lon, source, mode, profil, personnes, jours)."""
+    colonnes = {c.lower().replace(" ", "_"): c for c in df.columns}
+
+    def col(*noms):
+        return next((colonnes[n] for n in noms if n in colonnes), None)
+
+    c_cp, c_lat, c_lon = col("code_postal", "cp", "code"), col("latitude", "lat"), col("longitude", "lon")
+    c_mode = col("mode", "transport", "moyen_de_transport")
+    if c_mode is None or (c_cp is None and (c_lat is None or c_lon is None)):
+        raise ValueError("Colonnes attendues : Mode + Code Postal (ou Latitude/Longitude)")
+
+    out = pd.DataFrame(index=df.index)
+    out["lat"] = pd.to_numeric(df[c_lat], errors="coerce") if c_lat else np.nan
+    out["lon"] = pd.to_numeric(df[c_lon], errors="coerce") if c_lon else np.nan
+    out["source"] = np.where(out["lat"].notna() & out["lon"].notna(), "coordonnées", "")
+
+    if c_cp:
+        table = table_codes()
+        codes = normaliser_codes(df[c_cp])
+        a_geocoder = out["source"] == ""
+        for source, cles in (("code postal", codes), ("département", _departements(codes))):
+            trouves = a_geocoder & cles.isin(table.index)
+            out.loc[trouves, "lat"] = table["lat"].reindex(cles[trouves]).to_numpy()
+            out.loc[trouves, "lon"] = table["lon"].reindex(cles[trouves]).to_numpy()
+            out.loc[trouves, "source"] = source
+            a_geocoder &= ~trouves
+
+    out["mode"] = df[c_mode].map(normaliser_mode)
+    c_profil, c_pers, c_jours = col("profil", "statut"), col("personnes", "nb_personnes"), col("jours", "jours_presence")
+    out["profil"] = df[c_profil].astype(str) if c_profil else "Tous"
+    out["personnes"] = pd.to_numeric(df[c_pers], errors="coerce").fillna(1) if c_pers else 1.0
+    out["jours"] = pd.to_numeric(df[c_jours], errors="coerce") if c_jours else np.nan
+    return out
+
+
+def distances_ar(enquete, campus=CAMPUS, detour=COEF_DETOUR):
+    """Distance aller-retour routière estimée (km) de chaque répondant au campus."""
+    return 2 * detour * haversine_km(enquete["lat"], enquete["lon"], campus["lat"], campus["lon"])
+
+
+# ==============================================================================
+# 2. AGRÉGATION EN FLUX
+# ==============================================================================
+def agreger_flux(enquete, params, jours_defaut, campus=CAMPUS, detour=COEF_DETOUR, jours_profil=None):
+    """Enquête géocodée -> (flux agrégés par profil et mode, lignes rejetées).
+
+    ``jours_profil`` (optionnel) donne les jours de présence d'un profil
+    (ex. calendrier importé) ; sinon la colonne Jours ou ``jours_defaut``.
+    """
+    df = enquete.copy()
+    df["dist_ar"] = distances_ar(df, campus, detour)
+    rejets = df[df["dist_ar"].isna() | df["mode"].isna()]
+    df = df.drop(rejets.index)
+
+    jours = df["jours"]
+    if jours_profil:
+        jours = jours.fillna(df["profil"].map(jours_profil))
+    df["jours"] = jours.fillna(jours_defaut)
+    df["km_pax"] = df["dist_ar"] * df["jours"] * df["personnes"]
+
+    groupes = df.groupby(["profil", "mode"], sort=True).agg(
+        personnes=("personnes", "sum"), km_pax=("km_pax", "sum"), dist_moy=("dist_ar", "mean"), jours_moy=("jours", "mean"))
+    flux = []
+    for (profil, mode), g in groupes.iterrows():
+        cle = MODES[mode]
+        flux.append({
+            "Profil": profil, "Mode": mode, "Personnes": g["personnes"], "km_pax": g["km_pax"],
+            "fe": params[cle] if cle else 0.0,
+            "Détail": f"{mode} | {g['jours_moy']:.0f}j/an | Enquête {g['personnes']:.0f} pers., {g['dist_moy']:.0f} km A/R moy.",
+        })
+    return flux, rejets
+
+
+def analyser_enquete(contenu, nom, params, jours_defaut, campus=CAMPUS, detour=COEF_DETOUR, jours_profil=None, progression=None):
+    """Fichier d'enquête (octets CSV/Excel) -> (enquête géocodée, flux, rejets) ; exécutable en tâche de fond."""
+    import io
+
+    def etape(fraction, message):
+        if progression:
+            progression(fraction, message)
+
+    etape(0.1, "Lecture du fichier")
+    df = pd.read_csv(io.BytesIO(contenu)) if nom.lower().endswith(".csv") else pd.read_excel(io.BytesIO(contenu))
+    etape(0.4, f"Géocodage de {len(df)} répondants")
+    enquete = lire_enquete(df)
+    etape(0.8, "Distances et agrégation")
+    flux, rejets = agreger_flux(enquete, params, jours_defaut, campus, detour, jours_profil)
+    etape(1.0, "Terminé")
+    return enquete, flux, rejets